@@ -1,55 +1,26 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import numpy as np
-from io import BytesIO
-import pandas as pd
-import requests
 import random
+import datetime
 import os
-import matplotlib.font_manager as fm
+import time
+import charts
+from monitor.downsample import minmax_decimate
+from monitor import api, correlation, metrics, online, quality, rules, service
+from monitor.multisource import MultiSource
+from monitor.service import CUSTOM_RANGE, TIME_RANGES, select_range
+from monitor.store import SENSOR_KEYS, SENSOR_LABELS
+from monitor.stream import StreamHub
 
-# 强制使用当前目录的字体文件
-def setup_chinese_font():
-    """强制使用当前目录的字体文件，如果找不到则报错"""
-    try:
-        # 强制查找当前目录的字体文件
-        current_dir_fonts = ['SimHei.ttf', 'simhei.ttf']
-        
-        font_path = None
-        for font_file in current_dir_fonts:
-            if os.path.exists(font_file):
-                font_path = os.path.abspath(font_file)
-                break
-        
-        if not font_path:
-            raise FileNotFoundError("未在当前目录找到 SimHei.ttf 字体文件")
-        
-        # 清除字体缓存并设置字体
-        if hasattr(fm, '_rebuild'):
-            fm._rebuild()
-        
-        font_prop = fm.FontProperties(fname=font_path)
-        plt.rcParams['font.family'] = [font_prop.get_name()]
-        plt.rcParams['font.sans-serif'] = [font_prop.get_name()]
-        plt.rcParams['axes.unicode_minus'] = False
-        
-        return font_path
-        
-    except Exception as e:
-        st.error(f"字体设置失败: {str(e)}")
-        st.error("请确保 SimHei.ttf 文件在当前目录中")
-        st.stop()
-        return None
-
-# 初始化字体
-font_path = setup_chinese_font()
+# 本次执行的开始时刻（整页耗时按页面记入指标）
+rerun_start = time.perf_counter()
 
-def get_font_properties():
-    """获取字体属性"""
-    try:
-        return fm.FontProperties(fname=font_path)
-    except:
-        return None
+# 强制使用当前目录的字体文件（字体注册在 charts 中每个进程只做一次，首次绘图时进行）
+font_path = charts.find_font()
+if not font_path:
+    st.error("字体设置失败: 未在当前目录找到 SimHei.ttf 字体文件")
+    st.error("请确保 SimHei.ttf 文件在当前目录中")
+    st.stop()
 
 # 设置页面
 st.set_page_config(
@@ -138,51 +109,151 @@ header {visibility: hidden;}
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data(ttl=3600)
-def load_data_from_github():
-    """从GitHub自动读取数据"""
+# 数据源（DCM_DATA_URL、DCM_CACHE_DIR、DCM_CHUNK_ROWS、DCM_SITES_DIR、DCM_REFRESH_INTERVAL）见 monitor/service.py
+# 实时推送服务地址，端口未设置或为 0 时不启动（实时指标和实时图表也不定时刷新）
+STREAM_HOST = os.environ.get('DCM_STREAM_HOST', '127.0.0.1')
+STREAM_PORT = int(os.environ.get('DCM_STREAM_PORT') or 0)
+# 实时指标和实时图表的刷新间隔（秒），只在推送服务启动时生效
+STREAM_REFRESH = float(os.environ.get('DCM_STREAM_REFRESH', 1.0))
+LIVE_CHART_REFRESH = 5.0
+# Prometheus 指标端口，未设置或为 0 时不启动（指标照常登记，诊断页面通过 ?diagnostics 打开）
+METRICS_HOST = os.environ.get('DCM_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('DCM_METRICS_PORT') or 0)
+DIAGNOSTICS_PAGE = "🔧 诊断"
+DEFAULT_SITE = "全部/默认数据源"
+# JSON 查询 API 端口（见 monitor/api.py），未设置或为 0 时不随页面启动
+API_HOST = os.environ.get('DCM_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('DCM_API_PORT') or 0)
+
+@st.cache_resource
+def get_monitor():
+    """进程内共享的数据源和多站点分区存储（与 JSON API 共用）"""
+    return service.Monitor.from_env()
+
+def get_data_source():
+    return get_monitor().source
+
+def get_partitions():
+    """多站点分区存储，未设置 DCM_SITES_DIR 时为 None"""
+    return get_monitor().partitions
+
+@st.cache_resource
+def get_stream_hub():
+    """进程内共享的实时读数缓冲区和推送服务"""
+    hub = StreamHub()
+    if STREAM_PORT > 0:
+        hub.start_server(STREAM_HOST, STREAM_PORT)
+    return hub
+
+@st.cache_resource
+def get_metrics_server():
+    """登记各缓存的计数并启动指标服务（进程内一次）"""
+    source = get_data_source()
+    hub = get_stream_hub()
+    
+    def collect():
+        items = [
+            ('dcm_render_cache_hits_total', 'counter', '图表渲染缓存命中', {}, charts.render_cache.hits),
+            ('dcm_render_cache_misses_total', 'counter', '图表渲染缓存未命中', {}, charts.render_cache.misses),
+            ('dcm_render_cache_bytes', 'gauge', '图表渲染缓存占用字节', {}, charts.render_cache.nbytes),
+            ('dcm_bytes_fetched_total', 'counter', '从数据源下载的字节数', {}, source.bytes_fetched),
+            ('dcm_stream_readings_total', 'counter', '实时推送的读数条数', {}, hub.received),
+            ('dcm_online_updates_total', 'counter', '并入在线统计的读数条数', {}, hub.online.updates),
+        ]
+        if source.disk_cache:
+            items.append(('dcm_disk_cache_hits_total', 'counter', '磁盘缓存命中', {}, source.disk_cache.hits))
+            items.append(('dcm_disk_cache_misses_total', 'counter', '磁盘缓存未命中', {}, source.disk_cache.misses))
+        partitions = get_partitions()
+        if partitions:
+            items.append(('dcm_partitions_read_total', 'counter', '读取的站点日期分区数', {}, partitions.partitions_read))
+        if isinstance(source, MultiSource):
+            for status in source.status():
+                items.append(('dcm_source_up', 'gauge', '数据源最近一次刷新是否成功', {'source': status['name']}, int(status['ok'])))
+        store = source.snapshot()
+        items.append(('dcm_dataset_rows', 'gauge', '当前数据集行数', {}, len(store) if store is not None else 0))
+        memory = get_monitor().memory()
+        for part in ('raw', 'hour', 'day', 'cache'):
+            items.append(('dcm_dataset_bytes', 'gauge', '当前数据集常驻内存字节', {'part': part}, memory[f'{part}_bytes']))
+        if memory['budget_bytes'] is not None:
+            items.append(('dcm_memory_budget_bytes', 'gauge', '数据集常驻内存上限字节', {}, memory['budget_bytes']))
+        items.append(('dcm_compactions_total', 'counter', '按保留策略聚合较早数据的次数', {}, memory['compactions']))
+        if memory['process_resident_bytes'] is not None:
+            items.append(('dcm_process_resident_bytes', 'gauge', '进程常驻内存字节', {}, memory['process_resident_bytes']))
+        return items
+    
+    metrics.registry.add_collector(collect)
+    get_api_server()
+    if METRICS_PORT <= 0:
+        return None
     try:
-        url = "https://raw.githubusercontent.com/1574602830lck-cmd/data-center-monitor/1ae0c6874e16ad216a229cc1451e8dfed81e282d/data_centre_df.csv"
-        
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        df = pd.read_csv(BytesIO(response.content))
-        
-        all_data = {
-            'time': [], 'ZJFTemp': [], 'ZJFHum': [], 'LTDTemp': [], 'LTDHum': [],
-            'DCJTemp': [], 'DCJHum': [], 'YYJTemp': [], 'YYJHum': [], 'PDJTemp': [],
-            'PDJHum': [], 'hydr': [], 'PUE': []
-        }
-        
-        # 日期列处理
-        date_columns = [col for col in df.columns if col.lower() in ['record_date', 'date', '时间', '日期']]
-        if date_columns:
-            all_data['time'] = pd.to_datetime(df[date_columns[0]]).dt.date.tolist()
+        return metrics.MetricsServer(metrics.registry, METRICS_HOST, METRICS_PORT).start()
+    except OSError:
+        return None
+
+@st.cache_resource
+def get_api_server():
+    """随页面进程启动的 JSON 查询 API（共用数据源和实时读数），未设置 DCM_API_PORT 时为 None"""
+    if API_PORT <= 0:
+        return None
+    query_api = api.QueryApi(get_monitor(), get_stream_hub())
+    metrics.registry.add_collector(lambda: [
+        ('dcm_api_requests_total', 'counter', 'JSON API 请求数', {}, query_api.requests),
+        ('dcm_api_cache_hits_total', 'counter', 'JSON API 响应缓存命中', {}, query_api.cache.hits),
+    ])
+    try:
+        return api.ApiServer(query_api, API_HOST, API_PORT).start()
+    except OSError:
+        return None
+
+def load_data_from_github():
+    """从GitHub自动读取数据：立即返回进程内共享的当前版本 (版本号, 数据集)，过期时在后台刷新"""
+    version, all_data = get_monitor().current()
+    source = get_data_source()
+    if source.last_error is not None:
+        if all_data is None:
+            st.error(f"数据加载失败: {str(source.last_error)}")
         else:
-            all_data['time'] = list(range(1, len(df) + 1))
-        
-        # 列映射
-        column_mapping = {
-            'computer_room_temp': 'ZJFTemp', 'computer_room_humidity': 'ZJFHum',
-            'cold_aisle_temp': 'LTDTemp', 'cold_aisle_humidity': 'LTDHum',
-            'battery_room_temp': 'DCJTemp', 'battery_room_humidity': 'DCJHum',
-            'carrier_room_temp': 'YYJTemp', 'carrier_room_humidity': 'YYJHum',
-            'power_room_temp': 'PDJTemp', 'power_room_humidity': 'PDJHum',
-            'hydrogen_sensor': 'hydr', 'pue': 'PUE'
-        }
-        
-        for csv_col, internal_key in column_mapping.items():
-            if csv_col in df.columns:
-                all_data[internal_key] = pd.to_numeric(df[csv_col], errors='coerce').fillna(0).tolist()
-            else:
-                all_data[internal_key] = [0] * len(df)
-        
-        return all_data, True
-        
-    except Exception as e:
-        st.error(f"数据加载失败: {str(e)}")
-        return None, False
+            st.warning(f"⚠️ 数据更新失败: {str(source.last_error)}；{snapshot_age(source, all_data)}")
+    return version, all_data
+
+def snapshot_age(source, store):
+    """当前显示的数据是多久以前加载的、最后一条记录的时刻"""
+    if source.last_success is None:
+        loaded = "当前显示的是本地缓存的数据"
+    else:
+        age = np.timedelta64(int(time.time() - source.last_success), 's')
+        loaded = f"当前显示的是 {quality.format_duration(age)}前加载的数据"
+    last = store.last_time
+    if last is None:
+        return loaded
+    return f"{loaded}（最后一条记录 {np.datetime_as_string(last, unit='m').replace('T', ' ')}）"
+
+def current_data():
+    """当前共享版本的数据集（局部刷新时使用，不在会话中保存数据集本身）"""
+    return get_data_source().snapshot()
+
+# 各区域图表颜色
+AREA_COLORS = ['red', 'blue', 'green', 'orange', 'purple']
+
+# 各页面的统计、告警和图表都只用侧边栏所选时间范围（TIME_RANGES，见 monitor/service.py）内的数据。
+# "全部" 时图表只显示最近几个数据点，其余范围显示范围内的全部数据（按图表宽度降采样）
+
+def site_range(site, time_range, dates=None):
+    """站点在所选时间范围内的数据（只读取与范围相交的日期分区）"""
+    return get_monitor().site_range(site, time_range, dates)
+
+def selected_data():
+    """当前共享版本（或所选站点）中所选时间范围的数据（局部刷新时使用）"""
+    site = st.session_state.get('site')
+    if site is not None:
+        return site_range(site, st.session_state.time_range, st.session_state.get('date_range'))
+    return select_range(current_data(), st.session_state.time_range, st.session_state.get('date_range'))
+
+def chart_window(store, time_range):
+    """图表时间窗口：None 表示只显示最近几个数据点，否则覆盖整个所选范围"""
+    if time_range == "全部" or len(store) == 0:
+        return None
+    return store.last_time - store.first_time
 
 # 侧边栏
 with st.sidebar:
@@ -190,15 +261,27 @@ with st.sidebar:
     st.markdown("---")
     page = st.radio(
         "选择监控页面", 
-        ["📊 主界面", "🌡️ 数据中心温度", "💧 数据中心湿度", "⚡ PUE指标", "🎈 氢气传感器"],
+        ["📊 主界面", "🌡️ 数据中心温度", "💧 数据中心湿度", "⚡ PUE指标", "🎈 氢气传感器", "🔗 相关性分析"],
         label_visibility="collapsed"
     )
+    sites = get_partitions().sites() if get_partitions() else []
+    # None 表示默认数据源（含实时数据流），始终可选
+    site = st.selectbox("站点", [None] + sites, key='site',
+                        format_func=lambda name: DEFAULT_SITE if name is None else name) if sites else None
+    time_range = st.selectbox("时间范围", list(TIME_RANGES), key='time_range')
 
-# 初始化状态
-if 'data_loaded' not in st.session_state:
-    st.session_state.data_loaded = False
-if 'all_data' not in st.session_state:
-    st.session_state.all_data = None
+# 隐藏的诊断页面
+if 'diagnostics' in st.query_params:
+    page = DIAGNOSTICS_PAGE
+get_metrics_server()
+
+def span(name):
+    """计时代码块，按当前页面记入指标"""
+    return metrics.registry.span(name, page=page)
+
+# 初始化状态：会话只记录数据版本号，数据集由进程内所有会话共享
+if 'data_version' not in st.session_state:
+    st.session_state.data_version = 0
 
 # 初始化温度页面区域选择状态
 if 'temp_areas' not in st.session_state:
@@ -212,121 +295,456 @@ if 'hum_areas' not in st.session_state:
     selected_areas = random.sample(areas, 2)
     st.session_state.hum_areas = {area: (area in selected_areas) for area in areas}
 
-# 自动加载数据
-if not st.session_state.data_loaded:
-    with st.spinner("🔄 正在从GitHub加载数据..."):
-        all_data, success = load_data_from_github()
-        if success and all_data:
-            st.session_state.all_data = all_data
-            st.session_state.data_loaded = True
+# 自动加载数据（不阻塞页面渲染）；选择了站点时只读取该站点所选范围内的分区
+all_data, first_date, last_date = None, None, None
+if site is None:
+    with span('load_data'):
+        data_version, all_data = load_data_from_github()
+    if all_data is not None and data_version != st.session_state.data_version:
+        if st.session_state.data_version:
+            st.toast("🔄 数据已更新")
+        st.session_state.data_version = data_version
+    if all_data:
+        first_date, last_date = all_data.first_date(), all_data.latest_date()
+    data_ready = bool(all_data)
+else:
+    site_dates = get_partitions().dates(site)
+    if len(site_dates):
+        first_date, last_date = site_dates[0].item(), site_dates[-1].item()
+    data_ready = len(site_dates) > 0
+
+# 自定义时间范围：日期选择范围由数据集决定
+if time_range == CUSTOM_RANGE and data_ready:
+    with st.sidebar:
+        st.date_input("日期范围", value=(max(first_date, last_date - datetime.timedelta(days=6)), last_date),
+                      min_value=first_date, max_value=last_date, key='date_range')
+if site is not None:
+    with span('load_data'):
+        data = site_range(site, time_range, st.session_state.get('date_range')) if data_ready else None
+else:
+    data = select_range(all_data, time_range, st.session_state.get('date_range')) if all_data is not None else None
+if data is not None:
+    with st.sidebar:
+        if len(data):
+            first, last = (np.datetime_as_string(t, unit='m').replace('T', ' ') for t in (data.first_time, data.last_time))
+            st.caption(f"{first} ~ {last}，{len(data):,} 条记录")
+            # 保留策略聚合过的时段每个桶一条记录
+            if data.compacted_until is not None and data.first_time < data.compacted_until:
+                cut = np.datetime_as_string(data.compacted_until, unit='m').replace('T', ' ')
+                st.caption(f"{cut} 之前的数据已按小时 / 天聚合，每个桶一条记录（均值）")
+        else:
+            st.caption("所选时间范围内没有数据")
+        # 多个数据源时某个数据源失败只影响它提供的传感器
+        stale_keys = get_monitor().stale_keys() if site is None else set()
+        if stale_keys:
+            st.warning("⚠️ 部分数据源更新失败，以下传感器的数据可能已过期：" +
+                       "、".join(SENSOR_LABELS[key] for key in SENSOR_KEYS if key in stale_keys))
 
 # 图表绘制函数
-def plot_recent_data(time_data, data_dict, title, ylabel, colors=None, recent_points=8, figsize=(6.5, 3.2)):
-    if colors is None:
-        colors = ['red', 'blue', 'green', 'orange', 'purple']
+def plot_recent_data(store, series, title, ylabel, colors=None, recent_points=8, figsize=(6.5, 3.2), window=None, hlines=None):
+    """series: 图例标签 -> 数据列键，返回 (图表, 是否有数据)，参数见 charts.recent_chart_spec"""
+    with span('chart_spec'):
+        spec = charts.recent_chart_spec(store, series, title, ylabel, colors, recent_points, figsize, window, hlines)
+    if spec is None:
+        return None, False
+    return render_charts([spec])[0], True
+
+def render_charts(specs):
+    """渲染多张图表（经过缓存和渲染进程池）"""
+    with span('chart_render'):
+        return charts.render_many(specs, font_path)
+
+def show_chart(chart):
+    """输出图表（PNG 字节或 Vega-Lite 描述，见 charts.CHART_BACKEND），记录发送耗时和字节数"""
+    with span('chart_emit'):
+        if isinstance(chart, bytes):
+            st.image(chart)
+        else:
+            st.vega_lite_chart(chart, width='stretch')
+    metrics.registry.inc('dcm_chart_bytes_total', charts.chart_bytes(chart), help='发送给浏览器的图表字节数', page=page)
+
+def toggle_area(state_key, area):
+    """按钮回调：在重跑之前切换区域选择，按钮颜色随本次重跑更新"""
+    st.session_state[state_key][area] = not st.session_state[state_key][area]
+
+@st.fragment
+def temperature_panel():
+    """区域选择、图表和统计；切换区域时只重跑这一部分"""
+    data = selected_data()
+    window = chart_window(data, st.session_state.time_range)
+    # 区域选择
+    st.subheader("📍 选择监控区域")
+    areas = ['主机房', '冷通道', '电池间', '运营间', '配电间']
     
-    font_prop = get_font_properties()
+    cols = st.columns(3)
+    for i, area in enumerate(areas):
+        with cols[i % 3]:
+            st.button(area, key=f"btn_{area}", use_container_width=True,
+                      type="primary" if st.session_state.temp_areas[area] else "secondary",
+                      on_click=toggle_area, args=('temp_areas', area))
     
-    # 使用传入的图表尺寸
-    fig_width, fig_height = figsize
-    fig, ax = plt.subplots(figsize=(fig_width, fig_height))
-    has_data = False
+    selected = [area for area, selected in st.session_state.temp_areas.items() if selected]
+    if selected:
+        st.info(f"已选择: {', '.join(selected)}")
+    else:
+        st.warning("请至少选择一个监控区域")
     
-    for i, (label, data) in enumerate(data_dict.items()):
-        if data and any(x != 0 for x in data):
-            valid_data = [x for x in data if x != 0]
-            valid_times = [time_data[i] for i, x in enumerate(data) if x != 0]
+    # 温度图表：每个区域一张，并行渲染
+    area_mapping = {
+        '主机房': 'ZJFTemp', '冷通道': 'LTDTemp', '电池间': 'DCJTemp',
+        '运营间': 'YYJTemp', '配电间': 'PDJTemp'
+    }
+    
+    with span('chart_spec'):
+        specs = []
+        for i, area in enumerate(areas):
+            if st.session_state.temp_areas[area]:
+                specs.append(charts.recent_chart_spec(data, {area: area_mapping[area]}, f'{area}温度', '温度 (℃)', 
+                                                      colors=[AREA_COLORS[i]], recent_points=6, figsize=(5.5, 2.8),
+                                                      window=window))
+    pngs = [png for png in render_charts(specs) if png]
+    
+    if pngs:
+        cols = st.columns(2)
+        for i, png in enumerate(pngs):
+            with cols[i % 2]:
+                show_chart(png)
+    else:
+        st.warning("所选区域暂无温度数据")
+    
+    # 温度统计
+    with span('page_stats'):
+        area_stats = {area: data.summary(area_mapping[area]) for area in areas if st.session_state.temp_areas[area]}
+        live = includes_latest(data)
+        area_tiles = {area: tile_stats(data, area_mapping[area], live) for area in area_stats}
+    st.subheader("📊 温度统计")
+    for area in areas:
+        if st.session_state.temp_areas[area]:
+            stats = area_stats[area]
             
-            if len(valid_data) > recent_points:
-                valid_data = valid_data[-recent_points:]
-                valid_times = valid_times[-recent_points:]
+            if stats:
+                avg_temp = stats['mean']
+                max_temp = stats['max']
+                min_temp = stats['min']
+                
+                st.write(f"**{area}**")
+                col1, col2 = st.columns(2)
+                col3, col4 = st.columns(2)
+                
+                with col1:
+                    tile = area_tiles[area]
+                    st.metric("当前温度", f"{tile['value']:.1f}℃", delta=f"{tile['trend']:+.1f}℃", delta_color="inverse",
+                              help=f"平滑 {tile['ewma']:.1f}℃")
+                with col2:
+                    st.metric("平均温度", f"{avg_temp:.1f}℃")
+                with col3:
+                    st.metric("最高温度", f"{max_temp:.1f}℃")
+                with col4:
+                    st.metric("最低温度", f"{min_temp:.1f}℃")
+                
+                st.markdown("---")
+
+@st.fragment
+def humidity_panel():
+    """区域选择、图表和统计；切换区域时只重跑这一部分"""
+    data = selected_data()
+    window = chart_window(data, st.session_state.time_range)
+    # 区域选择
+    st.subheader("📍 选择监控区域")
+    areas = ['主机房', '冷通道', '电池间', '运营间', '配电间']
+    
+    cols = st.columns(3)
+    for i, area in enumerate(areas):
+        with cols[i % 3]:
+            st.button(area, key=f"hum_btn_{area}", use_container_width=True,
+                      type="primary" if st.session_state.hum_areas[area] else "secondary",
+                      on_click=toggle_area, args=('hum_areas', area))
+    
+    selected = [area for area, selected in st.session_state.hum_areas.items() if selected]
+    if selected:
+        st.info(f"已选择: {', '.join(selected)}")
+    else:
+        st.warning("请至少选择一个监控区域")
+    
+    # 湿度图表：每个区域一张，并行渲染
+    area_mapping = {
+        '主机房': 'ZJFHum', '冷通道': 'LTDHum', '电池间': 'DCJHum',
+        '运营间': 'YYJHum', '配电间': 'PDJHum'
+    }
+    
+    with span('chart_spec'):
+        specs = []
+        for i, area in enumerate(areas):
+            if st.session_state.hum_areas[area]:
+                specs.append(charts.recent_chart_spec(data, {area: area_mapping[area]}, f'{area}湿度', '湿度 (%)', 
+                                                      colors=[AREA_COLORS[i]], recent_points=6, figsize=(5.5, 2.8),
+                                                      window=window))
+    pngs = [png for png in render_charts(specs) if png]
+    
+    if pngs:
+        cols = st.columns(2)
+        for i, png in enumerate(pngs):
+            with cols[i % 2]:
+                show_chart(png)
+    else:
+        st.warning("所选区域暂无湿度数据")
+    
+    # 湿度统计
+    with span('page_stats'):
+        area_stats = {area: data.summary(area_mapping[area]) for area in areas if st.session_state.hum_areas[area]}
+    st.subheader("📊 湿度统计")
+    for area in areas:
+        if st.session_state.hum_areas[area]:
+            stats = area_stats[area]
             
-            if valid_data:
-                ax.plot(valid_times, valid_data, label=label, color=colors[i % len(colors)], 
-                       linewidth=1.5, marker='o', markersize=2.5)
-                has_data = True
-    
-    if has_data:
-        # 字体大小设置
-        title_size = 10
-        label_size = 8
-        legend_size = 7
-        tick_size = 7
-        
-        if font_prop:
-            ax.set_title(title, fontproperties=font_prop, fontsize=title_size, fontweight='bold', pad=8)
-            ax.set_ylabel(ylabel, fontproperties=font_prop, fontsize=label_size)
-            ax.set_xlabel('时间', fontproperties=font_prop, fontsize=label_size)
-            # 图例放在右上角，去除边框
-            ax.legend(prop=font_prop, fontsize=legend_size, loc='upper right', frameon=False)
-            plt.xticks(rotation=45, fontproperties=font_prop, fontsize=tick_size)
-            plt.yticks(fontproperties=font_prop, fontsize=tick_size)
+            if stats:
+                latest_hum = stats['latest']
+                avg_hum = stats['mean']
+                max_hum = stats['max']
+                min_hum = stats['min']
+                
+                st.write(f"**{area}**")
+                col1, col2 = st.columns(2)
+                col3, col4 = st.columns(2)
+                
+                with col1:
+                    st.metric("当前湿度", f"{latest_hum:.1f}%")
+                with col2:
+                    st.metric("平均湿度", f"{avg_hum:.1f}%")
+                with col3:
+                    st.metric("最高湿度", f"{max_hum:.1f}%")
+                with col4:
+                    st.metric("最低湿度", f"{min_hum:.1f}%")
+                
+                st.markdown("---")
+
+# 实时数据：推送服务运行时，相关指标和图表按定时器局部刷新，不重跑整个页面
+stream_hub = get_stream_hub()
+# 相关性分析的滚动窗口
+CORRELATION_WINDOWS = {"24小时": np.timedelta64(1, 'D'), "7天": np.timedelta64(7, 'D'), "30天": np.timedelta64(30, 'D')}
+CORRELATION_TOP = 5
+
+@st.fragment
+def correlation_panel():
+    """各传感器与目标指标的相关热力图、主要影响因素和滚动相关；结果按数据版本、时间范围和窗口缓存"""
+    data = selected_data()
+    col1, col2 = st.columns(2)
+    target = col1.selectbox("目标指标", SENSOR_KEYS, index=SENSOR_KEYS.index('PUE'), format_func=SENSOR_LABELS.get,
+                            key='corr_target')
+    window_name = col2.selectbox("滚动窗口", list(CORRELATION_WINDOWS), index=1, key='corr_window')
+    if len(data) < correlation.MIN_SAMPLES * 2:
+        st.info("所选时间范围内的数据太少，无法计算相关性")
+        return
+    
+    with span('correlation'):
+        result = data.derived(f'correlation_{target}_{window_name}',
+                              lambda s: correlation.analysis(s, CORRELATION_WINDOWS[window_name], target, CORRELATION_TOP))
+        heatmap = charts.heatmap_spec('传感器相关系数', [SENSOR_LABELS[key] for key in SENSOR_KEYS], SENSOR_KEYS,
+                                      result['matrix'], (7, 6))
+        specs = [heatmap]
+        series = []
+        times = result['rolling_time']
+        for i, driver in enumerate(result['drivers'][:3]):
+            values = result['rolling'][:, SENSOR_KEYS.index(driver['key'])]
+            valid = ~np.isnan(values)
+            series.append((SENSOR_LABELS[driver['key']], *minmax_decimate(times[valid], values[valid], int(7 * charts.PIXELS_PER_INCH)),
+                           AREA_COLORS[i]))
+        series = [s for s in series if len(s[2])]
+        if series:
+            specs.append(charts.make_spec(f'与{SENSOR_LABELS[target]}的滚动相关（{window_name}窗口）', '相关系数', series, (7, 3.2),
+                                          hlines=[{'y': 0, 'color': 'gray', 'alpha': 0.5, 'label': '无相关', 'label_en': 'No correlation'}]))
+    pngs = render_charts(specs)
+    
+    st.subheader("🗺️ 相关热力图")
+    show_chart(pngs[0])
+    
+    st.subheader(f"🏆 {SENSOR_LABELS[target]} 的主要影响因素")
+    block = np.timedelta64(int(result['block_seconds']), 's')
+    rows = []
+    for driver in result['drivers']:
+        rows.append({
+            '传感器': SENSOR_LABELS[driver['key']],
+            '同期相关': round(float(driver['corr']), 3),
+            '最强滞后': f"领先 {quality.format_duration(block * driver['lag'])}" if driver['lag'] else "同期",
+            '滞后相关': round(float(driver['lag_corr']), 3),
+            f'最近{window_name}相关': round(float(driver['recent']), 3),
+        })
+    st.dataframe(rows, use_container_width=True)
+    st.caption(f"滞后相关按约 {quality.format_duration(block)} 的分块均值计算；相关不代表因果")
+    
+    if len(pngs) > 1:
+        st.subheader("📈 滚动相关")
+        show_chart(pngs[1])
+
+live_fragment = st.fragment(run_every=STREAM_REFRESH if stream_hub.server else None)
+live_chart_fragment = st.fragment(run_every=LIVE_CHART_REFRESH if stream_hub.server else None)
+HYDROGEN_RULES = [rule for rule in rules.DEFAULT_RULES if 'hydr' in rule['sensors']]
+
+def includes_latest(data):
+    """所选范围是否包含数据集的最后时刻：只有这时才叠加实时推送的读数（实时读数不区分站点，站点数据不叠加）"""
+    if st.session_state.get('site') is not None:
+        return False
+    store = current_data()
+    return len(store) == 0 or (len(data) > 0 and data.last_time == store.last_time)
+
+def tile_stats(store, key, live=True):
+    """指标卡片的当前值 / 平滑值（EWMA）/ 趋势，没有数据时返回 None
+
+    所选范围包含最新时刻时取自进程内共享的在线统计（已并入实时推送的读数，数据集的新行只并入一次），
+    不回看历史；否则取所选范围末尾的读数计算（按数据集缓存）。
+    """
+    if live:
+        stream_hub.online.sync(current_data())
+        return stream_hub.online.get(key)
+    return store.derived(f'online_{key}', lambda s: online.recent(s, key))
+
+def hydrogen_alarm_active(store, live=True):
+    """氢气是否处于告警状态：有更新的实时读数时按实时读数判断"""
+    if live and stream_hub.latest_value('hydr', after=store.latest_time('hydr')) is not None:
+        alarms = rules.evaluate(stream_hub.store('hydr'), HYDROGEN_RULES)
+    else:
+        alarms = store.derived('alarms', rules.evaluate)
+    return rules.is_active(alarms, 'hydr')
+
+@live_fragment
+def key_metrics():
+    """关键指标 - 统一使用2x2布局"""
+    data = selected_data()
+    with span('key_metrics'):
+        live = includes_latest(data)
+        avg_temp = data.pooled_mean(['ZJFTemp', 'LTDTemp', 'DCJTemp', 'YYJTemp', 'PDJTemp'])
+        avg_hum = data.pooled_mean(['ZJFHum', 'LTDHum', 'DCJHum', 'YYJHum', 'PDJHum'])
+        pue = tile_stats(data, 'PUE', live)
+        hydr = tile_stats(data, 'hydr', live)
+        hydr_alarm = hydr is not None and hydrogen_alarm_active(data, live)
+        stale = get_monitor().stale_keys()
+    
+    col1, col2 = st.columns(2)
+    col3, col4 = st.columns(2)
+    
+    with col1:
+        st.metric("平均温度", f"{avg_temp:.1f}℃" if avg_temp is not None else "无数据")
+    
+    with col2:
+        st.metric("平均湿度", f"{avg_hum:.1f}%" if avg_hum is not None else "无数据")
+    
+    with col3:
+        if pue is not None:
+            # 等级按平滑值判断，单个噪声读数不会改变状态
+            status = service.PUE_STATUS[rules.pue_level(pue['ewma'])]
+            st.metric("最新PUE", f"{pue['value']:.2f}", delta=f"{pue['trend']:+.2f}", delta_color="inverse")
+            st.caption(f"平滑 {pue['ewma']:.2f} · {status}" + (" · ⚠️ 数据源更新失败" if 'PUE' in stale else ""))
         else:
-            ax.set_title(title, fontsize=title_size, fontweight='bold', pad=8)
-            ax.set_ylabel(ylabel, fontsize=label_size)
-            ax.set_xlabel('Time', fontsize=label_size)
-            # 图例放在右上角，去除边框
-            ax.legend(fontsize=legend_size, loc='upper right', frameon=False)
-            plt.xticks(rotation=45, fontsize=tick_size)
-            plt.yticks(fontsize=tick_size)
+            st.metric("最新PUE", "无数据")
+    
+    with col4:
+        if hydr is not None:
+            status = "注意" if hydr_alarm else "安全"
+            st.metric("氢气浓度", f"{hydr['value']:.1f}ppm", delta=f"{hydr['trend']:+.1f}ppm", delta_color="inverse")
+            st.caption(f"平滑 {hydr['ewma']:.1f}ppm · {status}" + (" · ⚠️ 数据源更新失败" if 'hydr' in stale else ""))
+        else:
+            st.metric("氢气浓度", "无数据")
+
+@live_fragment
+def hydrogen_status():
+    """氢气最新浓度和安全状态"""
+    data = selected_data()
+    with span('page_stats'):
+        hydr_stats = data.summary('hydr')
+        if hydr_stats is None:
+            st.info("所选时间范围内没有氢气数据")
+            return
+        live = includes_latest(data)
+        hydr, avg_hydr = tile_stats(data, 'hydr', live), hydr_stats['mean']
+        hydr_alarm = hydrogen_alarm_active(data, live)
+    
+    col1, col2 = st.columns(2)
+    col3 = st.columns(1)[0]
         
-        ax.grid(True, alpha=0.3)
-        plt.tight_layout()
-        return fig, True
-    return None, False
+    col1.metric("最新浓度", f"{hydr['value']:.1f}ppm", delta=f"{hydr['trend']:+.1f}ppm", delta_color="inverse",
+                help=f"平滑 {hydr['ewma']:.1f}ppm")
+    col2.metric("平均浓度", f"{avg_hydr:.1f}ppm")
+    col3.metric("最高浓度", f"{hydr_stats['max']:.1f}ppm")
+    
+    # 安全状态
+    st.subheader("🛡️ 安全状态")
+    if not hydr_alarm:
+        st.success("✅ 安全 - 氢气浓度在安全范围内")
+    else:
+        st.warning("⚠️ 注意 - 氢气浓度超过安全阈值")
+
+@live_chart_fragment
+def hydrogen_live_chart():
+    """实时推送的氢气读数，没有读数时不显示"""
+    times, values = stream_hub.series('hydr')
+    if len(values) == 0:
+        return
+    max_points = int(7 * charts.PIXELS_PER_INCH)
+    times, values = minmax_decimate(times, values, max_points)
+    spec = charts.make_spec('实时氢气浓度', '氢气浓度 (ppm)', [('实时', times, values, 'purple')], (7, 3.5),
+                            hlines=[{'y': rules.HYDROGEN_LIMIT, 'color': 'green', 'alpha': 0.7, 'label': '安全阈值 (50ppm)', 'label_en': 'Safety Threshold (50ppm)'}])
+    show_chart(render_charts([spec])[0])
 
 # 页面路由
 if page == "📊 主界面":
     st.title("数据中心综合监控系统")
     
-    if st.session_state.data_loaded and st.session_state.all_data:
-        all_data = st.session_state.all_data
+    if data_ready:
         
-        # 关键指标 - 统一使用2x2布局
+        # 关键指标
         st.subheader("📈 关键指标概览")
-        col1, col2 = st.columns(2)
-        col3, col4 = st.columns(2)
-        
-        with col1:
-            temp_data = []
-            for key in ['ZJFTemp', 'LTDTemp', 'DCJTemp', 'YYJTemp', 'PDJTemp']:
-                if all_data[key] and any(x != 0 for x in all_data[key]):
-                    temp_data.extend([x for x in all_data[key] if x != 0])
-            st.metric("平均温度", f"{np.mean(temp_data):.1f}℃" if temp_data else "无数据")
-        
-        with col2:
-            hum_data = []
-            for key in ['ZJFHum', 'LTDHum', 'DCJHum', 'YYJHum', 'PDJHum']:
-                if all_data[key] and any(x != 0 for x in all_data[key]):
-                    hum_data.extend([x for x in all_data[key] if x != 0])
-            st.metric("平均湿度", f"{np.mean(hum_data):.1f}%" if hum_data else "无数据")
-        
-        with col3:
-            if all_data['PUE'] and any(x != 0 for x in all_data['PUE']):
-                latest_pue = [x for x in all_data['PUE'] if x != 0][-1]
-                status = "优秀" if latest_pue < 1.5 else "良好" if latest_pue < 1.6 else "需关注"
-                st.metric("最新PUE", f"{latest_pue:.1f}", delta=status)
-            else:
-                st.metric("最新PUE", "无数据")
+        key_metrics()
+        
+        # 告警
+        st.subheader("🚨 告警")
+        with span('alarms'):
+            alarms = data.derived('alarms', rules.evaluate)
+        active_alarms = rules.alarm_records(alarms, active_only=True)
+        if active_alarms:
+            for alarm in active_alarms:
+                show = st.error if alarm['级别'] == '严重' else st.warning
+                show(f"{alarm['级别']} · {alarm['传感器']} {alarm['规则']}，开始于 {alarm['开始']}，峰值 {alarm['峰值']}")
+        else:
+            st.success("✅ 当前无告警")
         
-        with col4:
-            if all_data['hydr'] and any(x != 0 for x in all_data['hydr']):
-                latest_hydr = [x for x in all_data['hydr'] if x != 0][-1]
-                status = "安全" if latest_hydr < 50 else "注意"
-                st.metric("氢气浓度", f"{latest_hydr:.1f}ppm", delta=status)
-            else:
-                st.metric("氢气浓度", "无数据")
+        alarm_history = rules.alarm_records(alarms, limit=20)
+        if alarm_history:
+            with st.expander(f"历史告警（最近 {len(alarm_history)} 条）"):
+                st.dataframe(alarm_history, use_container_width=True)
         
         # 数据统计
         st.subheader("📊 数据质量分析")
+        with span('quality_cards'):
+            # 质量概况按数据版本和时间范围缓存，重跑页面时只计算距今多久
+            profile = data.derived('quality', quality.profile)
+            sensors = profile['sensors']
+            total_datasets = len(SENSOR_KEYS)
+            valid_datasets = sum(1 for stats in sensors.values() if stats['valid'])
+            completeness_rate = (valid_datasets / total_datasets) * 100
+            total_points = profile['rows'] * len(SENSOR_KEYS)
+            valid_points = sum(stats['valid'] for stats in sensors.values())
+            valid_rate = (valid_points / total_points) * 100 if total_points > 0 else 0
+            time_points = profile['rows']
+            unique_dates = profile['dates']
+            missing_days = len(profile['missing_dates'])
+            coverage_rate = unique_dates / profile['calendar_days'] * 100 if profile['calendar_days'] else 0
+            if profile['end'] is not None:
+                latest_date = data.latest_date()
+                age = quality.staleness(profile['end'])
+                days_ago = f"{quality.format_duration(age)}前"
+                # 距今不超过两个采样间隔为及时，超过一天、一周依次降级
+                cadence = profile['cadence'] if profile['cadence'] is not None else np.timedelta64(1, 'D')
+                freshness = (0 if age <= 2 * cadence else 1 if age <= np.timedelta64(1, 'D')
+                             else 2 if age <= np.timedelta64(7, 'D') else 3)
+            else:
+                latest_date = "无数据"
+                days_ago = "---"
+                freshness = 3
+        
         col1, col2 = st.columns(2)
         col3, col4 = st.columns(2)
         
         with col1:
-            total_datasets = len(all_data) - 1
-            valid_datasets = sum(1 for key in all_data if key != 'time' and any(x != 0 for x in all_data[key]))
-            completeness_rate = (valid_datasets / total_datasets) * 100
-            
             st.markdown(f"""
             <div class="stats-card">
                 <h3>📋 数据完整性</h3>
@@ -343,10 +761,6 @@ if page == "📊 主界面":
             """, unsafe_allow_html=True)
         
         with col2:
-            total_points = sum(len(all_data[key]) for key in all_data if key != 'time')
-            valid_points = sum(len([x for x in all_data[key] if x != 0]) for key in all_data if key != 'time')
-            valid_rate = (valid_points / total_points) * 100 if total_points > 0 else 0
-            
             st.markdown(f"""
             <div class="stats-card">
                 <h3>📊 有效数据量</h3>
@@ -363,78 +777,80 @@ if page == "📊 主界面":
             """, unsafe_allow_html=True)
         
         with col3:
-            time_points = len(all_data['time'])
-            unique_dates = len(set(all_data['time']))
-            
             st.markdown(f"""
             <div class="stats-card">
                 <h3>⏰ 时间覆盖</h3>
                 <div class="value">{time_points}</div>
                 <div class="subtitle">数据采集点</div>
                 <div class="progress-container">
-                    <div class="progress-bar" style="width: 100%"></div>
+                    <div class="progress-bar" style="width: {coverage_rate}%"></div>
                 </div>
                 <div class="data-quality">
-                    <div class="quality-dot quality-excellent"></div>
-                    {unique_dates} 个不同日期
+                    <div class="quality-dot {'quality-excellent' if coverage_rate > 90 else 'quality-good' if coverage_rate > 70 else 'quality-fair' if coverage_rate > 50 else 'quality-poor'}"></div>
+                    {unique_dates} 个不同日期，缺 {missing_days} 天
                 </div>
             </div>
             """, unsafe_allow_html=True)
         
         with col4:
-            if all_data['time'] and len(all_data['time']) > 0:
-                latest_date = all_data['time'][-1]
-                days_ago = "最新"
-            else:
-                latest_date = "无数据"
-                days_ago = "---"
-            
             st.markdown(f"""
             <div class="stats-card">
                 <h3>🔄 数据更新</h3>
                 <div class="value">{days_ago}</div>
                 <div class="subtitle">最后更新</div>
                 <div class="progress-container">
-                    <div class="progress-bar" style="width: 100%"></div>
+                    <div class="progress-bar" style="width: {[100, 75, 50, 25][freshness]}%"></div>
                 </div>
                 <div class="data-quality">
-                    <div class="quality-dot quality-excellent"></div>
+                    <div class="quality-dot {['quality-excellent', 'quality-good', 'quality-fair', 'quality-poor'][freshness]}"></div>
                     {latest_date}
                 </div>
             </div>
             """, unsafe_allow_html=True)
         
+        with st.expander("🔍 传感器质量明细"):
+            if profile['cadence'] is not None:
+                st.caption(f"采样间隔约 {quality.format_duration(profile['cadence'])}，"
+                           f"相邻读数间隔超过 {quality.GAP_FACTOR} 倍记为中断，"
+                           f"连续 {quality.STUCK_MIN_SAMPLES} 个相同读数记为卡滞")
+            st.dataframe([{
+                '传感器': SENSOR_LABELS[key],
+                '有效读数': stats['valid'],
+                '缺失率': f"{stats['missing_ratio'] * 100:.1f}%",
+                '中断次数': len(stats['gap_starts']),
+                '最长中断': quality.format_duration(stats['longest_gap']) if stats['longest_gap'] is not None else '-',
+                '落后于最新记录': quality.format_duration(stats['lag']) if stats['lag'] is not None else '-',
+                '卡滞段数': len(stats['stuck_starts']),
+                '最长卡滞': f"{stats['stuck_lengths'].max()} 个读数" if len(stats['stuck_lengths']) else '-',
+            } for key, stats in sensors.items()], use_container_width=True)
+            if missing_days:
+                shown = ', '.join(str(day) for day in profile['missing_dates'][:20])
+                st.caption(f"缺失日期：{shown}{' 等' if missing_days > 20 else ''}")
+        
         # 图表预览 - 一行显示两张图
         st.subheader("📈 数据趋势预览")
         
+        # 两张图一起交给渲染进程池
+        temp_spec = charts.recent_chart_spec(data, {'主机房': 'ZJFTemp', '冷通道': 'LTDTemp'}, '温度趋势', '温度 (℃)', 
+                                             recent_points=6, figsize=(5.5, 2.8),
+                                             window=chart_window(data, time_range))
+        pue_spec = charts.recent_chart_spec(data, {'PUE': 'PUE'}, 'PUE趋势', 'PUE值', 
+                                            colors=['blue'], recent_points=6, figsize=(5.5, 2.8),
+                                            window=chart_window(data, time_range),
+                                            hlines=[{'y': 1.5, 'color': 'green', 'alpha': 0.5, 'label': '目标值 1.5', 'label_en': 'Target 1.5'}])
+        temp_png, pue_png = render_charts([temp_spec, pue_spec])
+        
         col1, col2 = st.columns(2)
         
         with col1:
-            temp_dict = {'主机房': all_data['ZJFTemp'], '冷通道': all_data['LTDTemp']}
-            fig, has_data = plot_recent_data(all_data['time'], temp_dict, '温度趋势', '温度 (℃)', 
-                                           recent_points=6, figsize=(5.5, 2.8))
-            if has_data:
-                st.pyplot(fig)
+            if temp_png:
+                show_chart(temp_png)
             else:
                 st.info("暂无温度数据")
         
         with col2:
-            if all_data['PUE'] and any(x != 0 for x in all_data['PUE']):
-                pue_dict = {'PUE': all_data['PUE']}
-                fig, has_data = plot_recent_data(all_data['time'], pue_dict, 'PUE趋势', 'PUE值', 
-                                               colors=['blue'], recent_points=6, figsize=(5.5, 2.8))
-                if has_data:
-                    ax = fig.axes[0]
-                    font_prop = get_font_properties()
-                    if font_prop:
-                        ax.axhline(y=1.5, color='green', linestyle='--', alpha=0.5, label='目标值 1.5')
-                        ax.legend(prop=font_prop, fontsize=7, loc='upper right', frameon=False)
-                    else:
-                        ax.axhline(y=1.5, color='green', linestyle='--', alpha=0.5, label='Target 1.5')
-                        ax.legend(fontsize=7, loc='upper right', frameon=False)
-                    st.pyplot(fig)
-                else:
-                    st.info("暂无PUE数据")
+            if pue_png:
+                show_chart(pue_png)
             else:
                 st.info("暂无PUE数据")
     
@@ -444,74 +860,9 @@ if page == "📊 主界面":
 elif page == "🌡️ 数据中心温度":
     st.title("🌡️ 数据中心温度监控")
     
-    if st.session_state.data_loaded and st.session_state.all_data:
-        all_data = st.session_state.all_data
-        
-        # 区域选择
-        st.subheader("📍 选择监控区域")
-        areas = ['主机房', '冷通道', '电池间', '运营间', '配电间']
-        
-        cols = st.columns(3)
-        for i, area in enumerate(areas):
-            with cols[i % 3]:
-                if st.button(area, key=f"btn_{area}", use_container_width=True,
-                            type="primary" if st.session_state.temp_areas[area] else "secondary"):
-                    st.session_state.temp_areas[area] = not st.session_state.temp_areas[area]
-                    st.rerun()
-        
-        selected = [area for area, selected in st.session_state.temp_areas.items() if selected]
-        if selected:
-            st.info(f"已选择: {', '.join(selected)}")
-        else:
-            st.warning("请至少选择一个监控区域")
+    if data_ready:
         
-        # 温度图表
-        temp_dict = {}
-        area_mapping = {
-            '主机房': 'ZJFTemp', '冷通道': 'LTDTemp', '电池间': 'DCJTemp',
-            '运营间': 'YYJTemp', '配电间': 'PDJTemp'
-        }
-        
-        for area in areas:
-            if st.session_state.temp_areas[area]:
-                data_key = area_mapping[area]
-                temp_dict[area] = all_data[data_key]
-        
-        fig, has_data = plot_recent_data(all_data['time'], temp_dict, '数据中心温度监控', '温度 (℃)', 
-                                       recent_points=6, figsize=(7, 3.5))
-        if has_data:
-            st.pyplot(fig)
-        else:
-            st.warning("所选区域暂无温度数据")
-        
-        # 温度统计
-        st.subheader("📊 温度统计")
-        for area in areas:
-            if st.session_state.temp_areas[area]:
-                data_key = area_mapping[area]
-                data = all_data[data_key]
-                valid_data = [x for x in data if x != 0]
-                
-                if valid_data:
-                    latest_temp = valid_data[-1] if valid_data else 0
-                    avg_temp = np.mean(valid_data)
-                    max_temp = np.max(valid_data)
-                    min_temp = np.min(valid_data)
-                    
-                    st.write(f"**{area}**")
-                    col1, col2 = st.columns(2)
-                    col3, col4 = st.columns(2)
-                    
-                    with col1:
-                        st.metric("当前温度", f"{latest_temp:.1f}℃")
-                    with col2:
-                        st.metric("平均温度", f"{avg_temp:.1f}℃")
-                    with col3:
-                        st.metric("最高温度", f"{max_temp:.1f}℃")
-                    with col4:
-                        st.metric("最低温度", f"{min_temp:.1f}℃")
-                    
-                    st.markdown("---")
+        temperature_panel()
     
     else:
         st.info("⏳ 数据加载中，请稍候...")
@@ -519,74 +870,9 @@ elif page == "🌡️ 数据中心温度":
 elif page == "💧 数据中心湿度":
     st.title("💧 数据中心湿度监控")
     
-    if st.session_state.data_loaded and st.session_state.all_data:
-        all_data = st.session_state.all_data
-        
-        # 区域选择
-        st.subheader("📍 选择监控区域")
-        areas = ['主机房', '冷通道', '电池间', '运营间', '配电间']
-        
-        cols = st.columns(3)
-        for i, area in enumerate(areas):
-            with cols[i % 3]:
-                if st.button(area, key=f"hum_btn_{area}", use_container_width=True,
-                            type="primary" if st.session_state.hum_areas[area] else "secondary"):
-                    st.session_state.hum_areas[area] = not st.session_state.hum_areas[area]
-                    st.rerun()
-        
-        selected = [area for area, selected in st.session_state.hum_areas.items() if selected]
-        if selected:
-            st.info(f"已选择: {', '.join(selected)}")
-        else:
-            st.warning("请至少选择一个监控区域")
-        
-        # 湿度图表
-        hum_dict = {}
-        area_mapping = {
-            '主机房': 'ZJFHum', '冷通道': 'LTDHum', '电池间': 'DCJHum',
-            '运营间': 'YYJHum', '配电间': 'PDJHum'
-        }
-        
-        for area in areas:
-            if st.session_state.hum_areas[area]:
-                data_key = area_mapping[area]
-                hum_dict[area] = all_data[data_key]
-        
-        fig, has_data = plot_recent_data(all_data['time'], hum_dict, '数据中心湿度监控', '湿度 (%)', 
-                                       recent_points=6, figsize=(7, 3.5))
-        if has_data:
-            st.pyplot(fig)
-        else:
-            st.warning("所选区域暂无湿度数据")
+    if data_ready:
         
-        # 湿度统计
-        st.subheader("📊 湿度统计")
-        for area in areas:
-            if st.session_state.hum_areas[area]:
-                data_key = area_mapping[area]
-                data = all_data[data_key]
-                valid_data = [x for x in data if x != 0]
-                
-                if valid_data:
-                    latest_hum = valid_data[-1] if valid_data else 0
-                    avg_hum = np.mean(valid_data)
-                    max_hum = np.max(valid_data)
-                    min_hum = np.min(valid_data)
-                    
-                    st.write(f"**{area}**")
-                    col1, col2 = st.columns(2)
-                    col3, col4 = st.columns(2)
-                    
-                    with col1:
-                        st.metric("当前湿度", f"{latest_hum:.1f}%")
-                    with col2:
-                        st.metric("平均湿度", f"{avg_hum:.1f}%")
-                    with col3:
-                        st.metric("最高湿度", f"{max_hum:.1f}%")
-                    with col4:
-                        st.metric("最低湿度", f"{min_hum:.1f}%")
-                    
-                    st.markdown("---")
+        humidity_panel()
     
     else:
         st.info("⏳ 数据加载中，请稍候...")
@@ -594,47 +880,42 @@ elif page == "💧 数据中心湿度":
 elif page == "⚡ PUE指标":
     st.title("⚡ PUE能效指标监控")
     
-    if st.session_state.data_loaded and st.session_state.all_data:
-        all_data = st.session_state.all_data
+    if data_ready:
         
-        if all_data['PUE'] and any(x != 0 for x in all_data['PUE']):
+        if data.has_data('PUE'):
             # PUE图表
-            fig, has_data = plot_recent_data(all_data['time'], {'PUE': all_data['PUE']}, 'PUE能效指标', 'PUE值', 
-                                           colors=['blue'], recent_points=6, figsize=(7, 3.5))
+            png, has_data = plot_recent_data(data, {'PUE': 'PUE'}, 'PUE能效指标', 'PUE值', 
+                                           colors=['blue'], recent_points=6, figsize=(7, 3.5),
+                                           window=chart_window(data, time_range),
+                                           hlines=[
+                                               {'y': 1.5, 'color': 'green', 'alpha': 0.7, 'label': '优秀目标 (1.5)', 'label_en': 'Excellent (1.5)'},
+                                               {'y': 1.6, 'color': 'orange', 'alpha': 0.7, 'label': '良好目标 (1.6)', 'label_en': 'Good (1.6)'},
+                                               {'y': 1.8, 'color': 'red', 'alpha': 0.7, 'label': '警戒线 (1.8)', 'label_en': 'Warning (1.8)'},
+                                           ])
             if has_data:
-                ax = fig.axes[0]
-                font_prop = get_font_properties()
-                if font_prop:
-                    ax.axhline(y=1.5, color='green', linestyle='--', alpha=0.7, label='优秀目标 (1.5)')
-                    ax.axhline(y=1.6, color='orange', linestyle='--', alpha=0.7, label='良好目标 (1.6)')
-                    ax.axhline(y=1.8, color='red', linestyle='--', alpha=0.7, label='警戒线 (1.8)')
-                    ax.legend(prop=font_prop, fontsize=7, loc='upper right', frameon=False)
-                else:
-                    ax.axhline(y=1.5, color='green', linestyle='--', alpha=0.7, label='Excellent (1.5)')
-                    ax.axhline(y=1.6, color='orange', linestyle='--', alpha=0.7, label='Good (1.6)')
-                    ax.axhline(y=1.8, color='red', linestyle='--', alpha=0.7, label='Warning (1.8)')
-                    ax.legend(fontsize=7, loc='upper right', frameon=False)
-                st.pyplot(fig)
+                show_chart(png)
             
             # PUE统计
-            valid_pue = [x for x in all_data['PUE'] if x != 0]
-            latest_pue, avg_pue = valid_pue[-1], np.mean(valid_pue)
+            with span('page_stats'):
+                pue_stats = data.summary('PUE')
+            latest_pue, avg_pue = pue_stats['latest'], pue_stats['mean']
             
             col1, col2 = st.columns(2)
             col3, col4 = st.columns(2)
                 
             col1.metric("最新PUE", f"{latest_pue:.3f}")
             col2.metric("平均PUE", f"{avg_pue:.3f}")
-            col3.metric("最低PUE", f"{np.min(valid_pue):.3f}")
-            col4.metric("最高PUE", f"{np.max(valid_pue):.3f}")
+            col3.metric("最低PUE", f"{pue_stats['min']:.3f}")
+            col4.metric("最高PUE", f"{pue_stats['max']:.3f}")
             
             # 评级
             st.subheader("📈 PUE能效评级")
-            if latest_pue < 1.5:
+            level = rules.pue_level(latest_pue)
+            if level == 0:
                 st.success("🎉 优秀 - 能效表现卓越")
-            elif latest_pue < 1.6:
+            elif level == 1:
                 st.info("👍 良好 - 能效表现良好")
-            elif latest_pue < 1.8:
+            elif level == 2:
                 st.warning("⚠️ 一般 - 有改进空间")
             else:
                 st.error("❌ 较差 - 需要优化能效")
@@ -647,43 +928,88 @@ elif page == "⚡ PUE指标":
 elif page == "🎈 氢气传感器":
     st.title("🎈 氢气浓度监控")
     
-    if st.session_state.data_loaded and st.session_state.all_data:
-        all_data = st.session_state.all_data
+    if data_ready:
         
-        if all_data['hydr'] and any(x != 0 for x in all_data['hydr']):
+        if data.has_data('hydr'):
             # 氢气图表
-            fig, has_data = plot_recent_data(all_data['time'], {'氢气浓度': all_data['hydr']}, '氢气浓度监测', '氢气浓度 (ppm)', 
-                                           colors=['purple'], recent_points=6, figsize=(7, 3.5))
+            png, has_data = plot_recent_data(data, {'氢气浓度': 'hydr'}, '氢气浓度监测', '氢气浓度 (ppm)', 
+                                           colors=['purple'], recent_points=6, figsize=(7, 3.5),
+                                           window=chart_window(data, time_range),
+                                           hlines=[{'y': 50, 'color': 'green', 'alpha': 0.7, 'label': '安全阈值 (50ppm)', 'label_en': 'Safety Threshold (50ppm)'}])
             if has_data:
-                ax = fig.axes[0]
-                font_prop = get_font_properties()
-                if font_prop:
-                    ax.axhline(y=50, color='green', linestyle='--', alpha=0.7, label='安全阈值 (50ppm)')
-                    ax.legend(prop=font_prop, fontsize=7, loc='upper right', frameon=False)
-                else:
-                    ax.axhline(y=50, color='green', linestyle='--', alpha=0.7, label='Safety Threshold (50ppm)')
-                    ax.legend(fontsize=7, loc='upper right', frameon=False)
-                st.pyplot(fig)
+                show_chart(png)
+            if site is None:
+                # 实时推送的读数不区分站点
+                hydrogen_live_chart()
             
             # 氢气统计
-            valid_hydr = [x for x in all_data['hydr'] if x != 0]
-            latest_hydr, avg_hydr = valid_hydr[-1], np.mean(valid_hydr)
-            
-            col1, col2 = st.columns(2)
-            col3 = st.columns(1)[0]
-                
-            col1.metric("最新浓度", f"{latest_hydr:.1f}ppm")
-            col2.metric("平均浓度", f"{avg_hydr:.1f}ppm")
-            col3.metric("最高浓度", f"{np.max(valid_hydr):.1f}ppm")
-            
-            # 安全状态
-            st.subheader("🛡️ 安全状态")
-            if latest_hydr < 50:
-                st.success("✅ 安全 - 氢气浓度在安全范围内")
-            else:
-                st.warning("⚠️ 注意 - 氢气浓度超过安全阈值")
+            hydrogen_status()
         else:
             st.warning("暂无氢气浓度数据")
     
     else:
-        st.info("⏳ 数据加载中，请稍候...")
\ No newline at end of file
+        st.info("⏳ 数据加载中，请稍候...")
+
+elif page == "🔗 相关性分析":
+    st.title("🔗 传感器相关性分析")
+    
+    if data_ready:
+        
+        correlation_panel()
+    
+    else:
+        st.info("⏳ 数据加载中，请稍候...")
+
+elif page == DIAGNOSTICS_PAGE:
+    st.title("🔧 诊断")
+    st.caption("进程内所有会话的累计耗时（毫秒）与计数；Prometheus 格式见指标端口 /metrics")
+    
+    rows = []
+    for name, labels, count, total, p50, p95, p99 in metrics.registry.histograms():
+        rows.append({
+            '指标': labels.get('span', '整页执行') if name == 'dcm_span_seconds' else '整页执行',
+            '页面': labels.get('page', ''),
+            '次数': count,
+            '平均': round(total / count * 1000, 2),
+            'p50': round(p50 * 1000, 2),
+            'p95': round(p95 * 1000, 2),
+            'p99': round(p99 * 1000, 2),
+        })
+    if rows:
+        st.subheader("⏱️ 耗时")
+        st.dataframe(rows, use_container_width=True)
+    
+    st.subheader("🔢 计数")
+    st.dataframe([{'指标': name, '标签': ', '.join(f'{k}={v}' for k, v in labels.items()), '数值': value}
+                  for name, labels, value in metrics.registry.counters()], use_container_width=True)
+    
+    st.subheader("💾 内存")
+    memory = get_monitor().memory()
+    st.dataframe([
+        {'部分': '原始数据', '行数 / 桶数': memory['raw_rows'], 'MB': round(memory['raw_bytes'] / 1e6, 2), '起点': memory['raw_since'] or ''},
+        {'部分': '小时桶', '行数 / 桶数': memory['hour_buckets'], 'MB': round(memory['hour_bytes'] / 1e6, 2), '起点': memory['hourly_since'] or ''},
+        {'部分': '天桶', '行数 / 桶数': memory['day_buckets'], 'MB': round(memory['day_bytes'] / 1e6, 2), '起点': ''},
+        {'部分': '范围缓存', '行数 / 桶数': None, 'MB': round(memory['cache_bytes'] / 1e6, 2), '起点': ''},
+    ], use_container_width=True)
+    budget = f"{memory['budget_bytes'] / 1e6:.1f} MB" if memory['budget_bytes'] is not None else "不限"
+    resident = f"{memory['process_resident_bytes'] / 1e6:.0f} MB" if memory['process_resident_bytes'] is not None else "未知"
+    st.caption(f"数据集常驻 {memory['total_bytes'] / 1e6:.1f} MB + 范围缓存 {memory['cache_bytes'] / 1e6:.1f} MB，"
+               f"上限 {budget}（含范围缓存）；已聚合 {memory['compactions']} 次；"
+               f"进程常驻内存 {resident}")
+    
+    with st.expander("Prometheus 文本"):
+        st.code(metrics.registry.render_prometheus(), language='text')
+
+# 整页执行耗时（不含诊断页面本身）
+if page != DIAGNOSTICS_PAGE:
+    metrics.registry.observe('dcm_rerun_seconds', time.perf_counter() - rerun_start,
+                             help='整页执行耗时', page=page)
+
+# 片段函数的全局变量就是本次执行的模块字典，会一直保留到下次执行：
+# 结束前释放对数据集的引用，空闲的会话不会让旧版本常驻内存
+waiting_for_data, all_data, data = site is None and all_data is None, None, None
+
+# 首次加载仍在后台进行时，稍后自动刷新页面
+if waiting_for_data and get_data_source().refreshing:
+    time.sleep(1)
+    st.rerun()
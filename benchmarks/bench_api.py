@@ -0,0 +1,81 @@
+"""JSON API 基准：各接口首次计算 / 缓存命中 / 304 的耗时，以及多个客户端并发轮询的吞吐量
+
+对比：同样的数字通过 Streamlit 获取需要一次完整的页面重跑（见 bench_startup、bench_sessions）。
+
+用法: python -m benchmarks.bench_api [行数] [并发客户端数]
+"""
+import http.client
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv
+
+PATHS = ['/api/latest', '/api/stats?range=7d', '/api/stats?range=1y', '/api/alarms?range=30d&limit=20', '/api/quality?range=30d']
+POLLS = 2000
+
+
+def get(conn, path, etag=None):
+    """返回 (状态码, ETag, 耗时 ms)"""
+    start = time.perf_counter()
+    conn.request('GET', path, headers={'If-None-Match': etag} if etag else {})
+    response = conn.getresponse()
+    response.read()
+    return response.status, response.getheader('ETag'), (time.perf_counter() - start) * 1000
+
+
+def poll(url, paths, count, etags, results):
+    host, port = url.split('//')[1].split(':')
+    conn = http.client.HTTPConnection(host, int(port))
+    for i in range(count):
+        path = paths[i % len(paths)]
+        status, _, _ = get(conn, path, etags.get(path))
+        results.append(status)
+    conn.close()
+
+
+def main(rows=525_600, clients=8):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        generate_csv(path, rows)
+        with LocalServer({'/data.csv': path}) as data_server:
+            os.environ.update(DCM_DATA_URL=data_server.url('/data.csv'), DCM_CACHE_DIR=os.path.join(tmp, 'cache'))
+            from monitor import api, service
+
+            monitor = service.Monitor.from_env()
+            monitor.current()
+            while monitor.source.refreshing or len(monitor.snapshot() or ()) < rows // 2:
+                time.sleep(0.2)
+            server = api.ApiServer(api.QueryApi(monitor), port=0).start()
+            host, port = server.url.split('//')[1].split(':')
+            conn = http.client.HTTPConnection(host, int(port))
+            print(f"{len(monitor.snapshot()):,} 行")
+
+            etags = {}
+            for path in PATHS:
+                _, etag, cold = get(conn, path)
+                cached = min(get(conn, path)[2] for _ in range(20))
+                not_modified = min(get(conn, path, etag)[2] for _ in range(20))
+                etags[path] = etag
+                print(f"{path:<34} 首次 {cold:8.1f} ms  缓存命中 {cached:6.2f} ms  304 {not_modified:6.2f} ms")
+
+            for label, tags in (('完整响应', {}), ('带 If-None-Match', etags)):
+                results = []
+                threads = [threading.Thread(target=poll, args=(server.url, PATHS, POLLS // clients, tags, results))
+                           for _ in range(clients)]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+                print(f"{clients} 个客户端并发轮询（{label}）  {len(results) / elapsed:8.0f} 次/秒")
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 525_600,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 8)
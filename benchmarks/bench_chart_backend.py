@@ -0,0 +1,97 @@
+"""图表后端基准：matplotlib（服务器绘制 PNG）与 vega（浏览器绘制）每次重跑的服务器 CPU 和发送的字节数
+
+每个页面先清空渲染缓存再重跑（相当于数据更新后的第一次重跑），CPU 为页面进程的 process_time，
+渲染在页面进程内串行进行（DCM_RENDER_WORKERS=0，进程池的 CPU 不计入 process_time）。
+另外单独计时氢气实时图（每个刷新周期一次）的单张图表。
+
+用法: python -m benchmarks.bench_chart_backend [行数] [时间范围]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.bench_sessions import wait_for_version
+from benchmarks.bench_startup import APP, find_font
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv
+
+PAGES = ["📊 主界面", "🌡️ 数据中心温度", "⚡ PUE指标", "🎈 氢气传感器", "🔗 相关性分析"]
+REPEAT = 3
+
+
+def chart_bytes():
+    from monitor import metrics
+
+    return sum(value for name, _, value in metrics.registry.counters() if name == 'dcm_chart_bytes_total')
+
+
+def rerun(at, charts):
+    """清空渲染缓存后重跑一次，返回 (CPU ms, 图表字节数)"""
+    charts.render_cache.clear()
+    sent = chart_bytes()
+    start = time.process_time()
+    at.run()
+    return (time.process_time() - start) * 1000, chart_bytes() - sent
+
+
+def live_update(charts, backend, font_path):
+    """一张 7 英寸宽的实时图（降采样到 700 点）：转换 / 绘制的 CPU ms 和字节数"""
+    times = np.datetime64('2024-01-01', 'ns') + np.arange(700) * np.timedelta64(1, 's')
+    values = (30 + np.random.default_rng(0).normal(0, 2, 700)).astype(np.float32)
+    spec = charts.make_spec('实时氢气浓度', '氢气浓度 (ppm)', [('实时', times, values, 'purple')], (7, 3.5),
+                            hlines=[{'y': 50, 'color': 'green', 'alpha': 0.7, 'label': '安全阈值 (50ppm)', 'label_en': 'Safety Threshold (50ppm)'}])
+    charts.render_many([spec], font_path, backend)
+    samples = []
+    for _ in range(REPEAT):
+        charts.render_cache.clear()
+        start = time.process_time()
+        chart = charts.render_many([spec], font_path, backend)[0]
+        samples.append((time.process_time() - start) * 1000)
+    return min(samples), charts.chart_bytes(chart)
+
+
+def main(rows=525_600, time_range='最近30天'):
+    warnings.filterwarnings('ignore')
+    from streamlit.testing.v1 import AppTest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        generate_csv(path, rows)
+        shutil.copy(find_font(), os.path.join(tmp, 'SimHei.ttf'))
+        os.chdir(tmp)
+
+        with LocalServer({'/data.csv': path}) as server:
+            os.environ.update(DCM_DATA_URL=server.url('/data.csv'), DCM_REFRESH_INTERVAL='3600',
+                              DCM_CACHE_DIR=os.path.join(tmp, 'cache'), DCM_STREAM_PORT='0',
+                              DCM_METRICS_PORT='0', DCM_RENDER_WORKERS='0')
+            at = AppTest.from_file(APP, default_timeout=300)
+            wait_for_version(at, 1)
+            at.sidebar.selectbox(key='time_range').set_value(time_range).run()
+
+            import charts
+            font_path = charts.find_font()
+            print(f"{rows:,} 行，时间范围 {time_range}，每页清空渲染缓存后重跑（{REPEAT} 次取最小）")
+            for page in PAGES:
+                at.sidebar.radio[0].set_value(page).run()
+                line = f"{page:<10}"
+                for backend in charts.BACKENDS:
+                    charts.CHART_BACKEND = backend
+                    results = [rerun(at, charts) for _ in range(REPEAT)]
+                    assert not at.exception, at.exception
+                    cpu = min(ms for ms, _ in results)
+                    line += f"  {backend} {cpu:7.1f} ms CPU {results[-1][1] / 1024:7.1f} KB"
+                print(line)
+
+            for backend in charts.BACKENDS:
+                cpu, size = live_update(charts, backend, font_path)
+                print(f"实时图单次更新  {backend:<10} {cpu:7.2f} ms CPU {size / 1024:7.1f} KB")
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 525_600,
+         sys.argv[2] if len(sys.argv) > 2 else '最近30天')
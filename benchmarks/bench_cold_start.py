@@ -0,0 +1,66 @@
+"""冷启动基准：解析 CSV vs 内存映射磁盘缓存
+
+两条路径都计时到主界面首屏所需的数值（最新值、均值）可用为止。
+
+用法: python -m benchmarks.bench_cold_start [行数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import write_csv
+from monitor.disk_cache import DiskCache, content_digest
+from monitor.fetch import parse_csv
+from monitor.store import SENSOR_KEYS
+
+
+def first_page(store):
+    """主界面关键指标用到的读取"""
+    store.pooled_mean(['ZJFTemp', 'LTDTemp', 'DCJTemp', 'YYJTemp', 'PDJTemp'])
+    store.latest('PUE')
+    store.latest('hydr')
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main(rows=500_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        write_csv(path, rows)
+        cache = DiskCache(os.path.join(tmp, 'cache'))
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = content_digest(data)
+        cache.save(digest, parse_csv(data))
+
+        def csv_path():
+            with open(path, 'rb') as f:
+                first_page(parse_csv(f.read()))
+
+        def mmap_path():
+            first_page(cache.load(digest))
+
+        def mmap_open_only():
+            store = cache.load(digest)
+            store.latest('PUE')
+
+        csv_ms = best_of(csv_path, repeat=3)
+        mmap_ms = best_of(mmap_path)
+        open_ms = best_of(mmap_open_only)
+        print(f"{rows:,} 行 x {len(SENSOR_KEYS)} 列, CSV {len(data):,} 字节")
+        print(f"CSV 解析          {csv_ms:9.1f} ms")
+        print(f"内存映射 + 首屏   {mmap_ms:9.1f} ms  ({csv_ms / mmap_ms:.0f}x)")
+        print(f"内存映射 + 最新值 {open_ms:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
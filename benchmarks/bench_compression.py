@@ -0,0 +1,102 @@
+"""历史数据压缩基准：秒级数据的常驻内存、编码 / 解码速度，以及按时间范围查询的耗时
+
+两种数据：
+- 平稳：缓慢变化的读数（温湿度、氢气 0.1 精度，PUE 0.01 精度），接近真实传感器
+- 噪声：日周期 + 白噪声，两位小数（与 benchmarks.synthetic 相同的分布），是定点编码的较差情况
+
+对比不压缩的 SensorStore（列数组 + 多级聚合）。
+
+用法: python -m benchmarks.bench_compression [天数] [不压缩的最近天数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from monitor.compressed import CompressedStore
+from monitor.store import SENSOR_KEYS, SensorStore
+
+ROWS_PER_YEAR = 365 * 86400
+RANGES = [('最近24小时', np.timedelta64(1, 'D')), ('最近7天', np.timedelta64(7, 'D')), ('全部', None)]
+MAX_POINTS = 1200
+
+
+def _resolution(key):
+    return 0.01 if key == 'PUE' else 0.1
+
+
+def make_data(rows, profile, seed=0, missing_ratio=0.01):
+    """每秒一行（偶有中断），返回 SensorStore"""
+    rng = np.random.default_rng(seed)
+    steps = np.ones(rows, dtype=np.int64)
+    gaps = rng.random(rows) < 1e-5
+    steps[gaps] += rng.integers(1, 3600, gaps.sum())
+    times = np.datetime64('2024-01-01T00:00', 'ns') + np.cumsum(steps) * np.timedelta64(1, 's')
+    day_phase = (times - times.astype('datetime64[D]')).astype(np.float64) / 86400e9 * 2 * np.pi
+    columns = {}
+    for key in SENSOR_KEYS:
+        center = 1.55 if key == 'PUE' else 3.0 if key == 'hydr' else 50.0 if key.endswith('Hum') else 22.0
+        scale = center * 0.03
+        if profile == '平稳':
+            walk = np.cumsum(rng.normal(0, scale * 0.002, rows))
+            values = np.round((center + scale * np.sin(day_phase) + walk - walk.mean()) / _resolution(key)) * _resolution(key)
+        else:
+            values = np.round((center + scale * np.sin(day_phase) + rng.normal(0, scale * 0.5, rows)) * 100) / 100
+        values[rng.random(rows) < missing_ratio] = np.nan
+        columns[key] = values.astype(np.float32)
+    return SensorStore(times, columns, assume_sorted=True)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def query(store, window):
+    """选定范围 + 全部传感器的统计 + 每个传感器一张降采样图表"""
+    subset = store.between() if window is None else store.last(window)
+    for key in SENSOR_KEYS:
+        subset.summary(key)
+        subset.decimated_since(key, subset.last_time - subset.first_time, MAX_POINTS)
+    return subset
+
+
+def main(days=30, hot_days=1):
+    rows = days * 86400
+    hot = np.timedelta64(hot_days, 'D')
+    print(f"{days} 天秒级数据，{rows:,} 行 x {len(SENSOR_KEYS)} 列，最近 {hot_days} 天不压缩")
+    for profile in ('平稳', '噪声'):
+        raw = make_data(rows, profile)
+        _, rollup_ms = timed(raw.rollups)
+        raw_bytes = raw.nbytes + raw.rollups().nbytes
+
+        compressed, encode_ms = timed(lambda: CompressedStore.from_store(raw, hot))
+        sealed_per_row = compressed.compressed_bytes / max(compressed.sealed_rows, 1)
+        decoded, decode_ms = timed(compressed.to_store)
+        assert np.array_equal(decoded.time, raw.time)
+        for key in SENSOR_KEYS:
+            assert np.array_equal(decoded.columns[key], raw.columns[key], equal_nan=True)
+        del decoded
+
+        print(f"\n[{profile}]")
+        print(f"  不压缩：列数组 {raw.nbytes / 1e6:7.1f} MB + 多级聚合 {raw.rollups().nbytes / 1e6:5.1f} MB"
+              f"（生成 {rollup_ms:5.0f} ms）")
+        print(f"  压缩：  {compressed.nbytes / 1e6:7.1f} MB（块 {compressed.compressed_bytes / 1e6:.1f} MB + "
+              f"块头 {compressed.index.nbytes / 1e6:.2f} MB + 未压缩 {compressed.hot.nbytes / 1e6:.1f} MB），"
+              f"{raw_bytes / compressed.nbytes:.1f} 倍")
+        print(f"  压缩部分每行 {sealed_per_row:.2f} 字节（不压缩 {raw.nbytes / rows:.0f} 字节），"
+              f"每年约 {sealed_per_row * ROWS_PER_YEAR / 1e6:.0f} MB（不压缩 {raw.nbytes / rows * ROWS_PER_YEAR / 1e6:.0f} MB）")
+        print(f"  编码 {encode_ms:6.0f} ms（{raw.nbytes / encode_ms / 1e3:.0f} MB/s）   "
+              f"整体解码 {decode_ms:6.0f} ms（{raw.nbytes / decode_ms / 1e3:.0f} MB/s），无损")
+        for name, window in RANGES:
+            _, raw_ms = timed(lambda: query(raw, window))
+            subset, cold_ms = timed(lambda: query(compressed, window))
+            _, warm_ms = timed(lambda: query(compressed, window))
+            print(f"  {name:<6} {len(subset):>10,} 行  统计+图表：不压缩 {raw_ms:6.1f} ms   "
+                  f"压缩 首次(解码) {cold_ms:7.1f} ms / 缓存 {warm_ms:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1)
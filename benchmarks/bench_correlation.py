@@ -0,0 +1,57 @@
+"""相关性分析基准：块统计量的构建 / 追加更新、各滚动窗口的分析耗时、页面重跑（结果已缓存）
+
+对比：pandas 按时间窗口的 rolling().corr() 加上 DataFrame.corr()。
+
+用法: python -m benchmarks.bench_correlation [行数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_rules import make_store
+from monitor import correlation
+from monitor.store import SENSOR_KEYS, SensorStore
+
+WINDOWS = {'24小时': np.timedelta64(1, 'D'), '7天': np.timedelta64(7, 'D'), '30天': np.timedelta64(30, 'D')}
+TARGET = 'PUE'
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def pandas_analysis(store, window):
+    import pandas as pd
+
+    frame = pd.DataFrame({key: store.columns[key] for key in SENSOR_KEYS}, index=pd.DatetimeIndex(store.time))
+    frame.corr()
+    frame.drop(columns=TARGET).rolling(pd.Timedelta(window)).corr(frame[TARGET])
+
+
+def main(rows=525_600):
+    store = make_store(rows)
+    print(f"{rows:,} 行（分钟级），目标 {TARGET}")
+
+    (b, _, _), ms = timed_ms(lambda: correlation.blocks(store))
+    print(f"构建块统计量 {ms:8.1f} ms（{len(b)} 块 x {b.block_rows} 行，{b.nbytes / 1e6:.1f} MB，每个数据版本一次）")
+
+    extra = 60
+    tail = SensorStore(store.time[-1] + np.arange(1, extra + 1) * np.timedelta64(1, 'm'),
+                       {key: store.columns[key][-extra:].copy() for key in SENSOR_KEYS}, assume_sorted=True)
+    appended = store.append(tail)
+    _, ms = timed_ms(lambda: correlation.blocks(appended))
+    print(f"追加 {extra} 行后更新 {ms:8.1f} ms")
+
+    for name, window in WINDOWS.items():
+        _, cold = timed_ms(lambda: correlation.analysis(appended, window, TARGET))
+        appended.derived(f'correlation_{name}', lambda s: correlation.analysis(s, window, TARGET))
+        _, rerun = timed_ms(lambda: appended.derived(f'correlation_{name}', lambda s: correlation.analysis(s, window, TARGET)))
+        _, naive = timed_ms(lambda: pandas_analysis(appended, window))
+        print(f"滚动窗口 {name:<5} 分析 {cold:7.1f} ms  重跑（已缓存）{rerun:6.3f} ms   pandas rolling corr {naive:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 525_600)
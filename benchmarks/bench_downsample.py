@@ -0,0 +1,97 @@
+"""图表降采样基准：一年的分钟数据 vs 最近 6 个点，minmax_decimate 与 LTTB（保持曲线形状，点数更少）对比
+
+用法: python -m benchmarks.bench_downsample [行数]
+"""
+import sys
+import time
+from io import BytesIO
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from monitor.downsample import minmax_decimate
+
+
+def _as_float(x):
+    """datetime64 转为 float64 便于计算面积"""
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, max_points):
+    """Largest-Triangle-Three-Buckets 降采样，保留首尾两点"""
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return x, y
+
+    xf = _as_float(x)
+    yf = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+    index = np.empty(max_points, dtype=np.int64)
+    index[0] = 0
+    index[-1] = n - 1
+    prev = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个分桶的平均点（最后一个分桶用末点）
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = xf[next_start:next_end].mean()
+            avg_y = yf[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = xf[-1], yf[-1]
+
+        area = np.abs((xf[prev] - avg_x) * (yf[start:end] - yf[prev])
+                      - (xf[prev] - xf[start:end]) * (avg_y - yf[prev]))
+        prev = start + int(area.argmax())
+        index[i + 1] = prev
+    return x[index], y[index]
+
+
+def render(x, y, figsize=(7, 3.5)):
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.plot(x, y, linewidth=1.5, marker='o' if len(y) <= 60 else None, markersize=2.5)
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(BytesIO(), format='png')
+    plt.close(fig)
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return result, best
+
+
+def main(rows=525_600):
+    x = np.datetime64('2025-01-01T00:00', 'ns') + np.arange(rows).astype('timedelta64[m]')
+    rng = np.random.default_rng(0)
+    y = (22 + 3 * np.sin(np.arange(rows) / 1440 * 2 * np.pi) + rng.normal(0, 0.3, rows)).astype(np.float32)
+    y[rows // 3] = 40.0  # 单点尖峰
+    max_points = 7 * 100
+
+    _, ms = timed(lambda: render(x[-6:], y[-6:]))
+    print(f"最近 6 个点             渲染 {ms:8.1f} ms")
+
+    (dx, dy), dec_ms = timed(lambda: minmax_decimate(x, y, max_points))
+    _, ms = timed(lambda: render(dx, dy))
+    print(f"minmax {rows:,} -> {len(dy)}  降采样 {dec_ms:6.1f} ms  渲染 {ms:8.1f} ms  峰值保留: {dy.max() == y.max()}")
+
+    (lx, ly), dec_ms = timed(lambda: lttb(x, y, max_points))
+    _, ms = timed(lambda: render(lx, ly))
+    print(f"lttb   {rows:,} -> {len(ly)}  降采样 {dec_ms:6.1f} ms  渲染 {ms:8.1f} ms  峰值保留: {ly.max() == y.max()}")
+
+    _, ms = timed(lambda: render(x, y), repeat=1)
+    print(f"不降采样 {rows:,} 点       渲染 {ms:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 525_600)
@@ -0,0 +1,49 @@
+"""CsvSource 刷新耗时基准：全量加载 / 未变化 / 追加少量行
+
+用法: python -m benchmarks.bench_fetch [行数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import make_rows, write_csv
+from monitor.fetch import CsvSource
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(rows=100_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        write_csv(path, rows)
+
+        with LocalServer({'/data.csv': path}) as server:
+            source = CsvSource(server.url('/data.csv'))
+
+            sent = server.bytes_sent
+            _, ms = timed(source.refresh)
+            print(f"全量加载   {rows:>9,} 行  {ms:8.1f} ms  {server.bytes_sent - sent:>12,} 字节")
+
+            sent = server.bytes_sent
+            _, ms = timed(source.refresh)
+            print(f"未变化     {'':>9}     {ms:8.1f} ms  {server.bytes_sent - sent:>12,} 字节")
+
+            # 确保 Last-Modified 改变
+            time.sleep(1.1)
+            with open(path, 'a') as f:
+                f.write(make_rows(rows, 10))
+            sent = server.bytes_sent
+            _, ms = timed(source.refresh)
+            print(f"追加 10 行 {'':>9}     {ms:8.1f} ms  {server.bytes_sent - sent:>12,} 字节")
+
+            assert len(source.snapshot()) == rows + 10
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
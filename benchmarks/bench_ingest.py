@@ -0,0 +1,76 @@
+"""分块流式导入基准：不同文件大小和 chunk_rows 下全量加载的峰值内存和耗时
+
+每种配置在独立的子进程中运行（峰值内存取自 /proc/self/status 的 VmHWM），
+子进程通过本地 HTTP 服务下载 CSV，与生产环境的 CsvSource 路径相同。
+chunk_rows 为 0 时是整体读入内存后解析的原有路径。
+
+用法: python -m benchmarks.bench_ingest [行数,行数...] [chunk_rows,chunk_rows...]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_csv
+
+FILE_ROWS = [1_000_000, 4_000_000]
+CHUNK_ROWS = [0, 10_000, 50_000, 200_000, 1_000_000]
+
+
+def _status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def child(path, chunk_rows):
+    """子进程：加载一次，输出 JSON"""
+    from benchmarks.local_server import LocalServer
+    from monitor.fetch import CsvSource
+
+    base = _status_mb('VmRSS')
+    with LocalServer({'/data.csv': path}) as server:
+        source = CsvSource(server.url('/data.csv'), chunk_rows=chunk_rows or None)
+        start = time.perf_counter()
+        source.refresh()
+        elapsed = time.perf_counter() - start
+        store = source.snapshot()
+    print(json.dumps({'rows': len(store), 'seconds': elapsed, 'base_mb': base,
+                      'peak_mb': _status_mb('VmHWM'), 'rss_mb': _status_mb('VmRSS')}))
+
+
+def run(path, chunk_rows):
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-m', 'benchmarks.bench_ingest', '--child', path,
+                          str(chunk_rows)], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(file_rows=FILE_ROWS, chunk_sizes=CHUNK_ROWS):
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in file_rows:
+            path = os.path.join(tmp, f'{rows}.csv')
+            size = generate_csv(path, rows)
+            print(f"{rows:,} 行  CSV {size / 1e6:.0f} MB")
+            for chunk_rows in chunk_sizes:
+                result = run(path, chunk_rows)
+                name = '整体解析' if chunk_rows == 0 else f'{chunk_rows:,} 行/块'
+                print(f"  {name:<14} 耗时 {result['seconds']:6.2f} s  峰值 RSS {result['peak_mb']:7.0f} MB"
+                      f"（导入前 {result['base_mb']:.0f} MB，增加 {result['peak_mb'] - result['base_mb']:6.0f} MB）"
+                      f"  完成后 {result['rss_mb']:6.0f} MB")
+                assert result['rows'] == rows
+
+
+def _ints(text):
+    return [int(float(value)) for value in text.split(',')]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(_ints(sys.argv[1]) if len(sys.argv) > 1 else FILE_ROWS,
+             _ints(sys.argv[2]) if len(sys.argv) > 2 else CHUNK_ROWS)
@@ -0,0 +1,173 @@
+"""并发会话压测：N 个模拟会话同时在 app.py 中切换页面、点击区域按钮、切换时间范围
+
+每个会话是一个 AppTest（与真实部署一样在同一进程内运行，共享数据集和渲染缓存），各自在一个线程中
+按固定随机种子执行一串操作，每次操作记录一次重跑的耗时。每个并发数报告重跑耗时的 p50/p95/p99/最大值、
+吞吐量、CPU 时间和利用率（页面进程 + 渲染进程池），以及这一轮的峰值常驻内存（/proc/self/clear_refs 重置）。
+数据从本地 HTTP 服务读取（代替 GitHub）。
+
+用法: python -m benchmarks.bench_load [并发数列表，如 1,4,16] [行数] [每个会话的操作数]
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.bench_sessions import wait_for_version
+from benchmarks.bench_startup import APP, find_font
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv
+from monitor import metrics
+
+PAGES = ["📊 主界面", "🌡️ 数据中心温度", "💧 数据中心湿度", "⚡ PUE指标", "🎈 氢气传感器", "🔗 相关性分析"]
+AREAS = ['主机房', '冷通道', '电池间', '运营间', '配电间']
+AREA_BUTTONS = {"🌡️ 数据中心温度": 'btn_', "💧 数据中心湿度": 'hum_btn_'}
+TIME_RANGES = ['最近24小时', '最近7天', '最近30天', '最近90天']
+
+
+def reset_peak_rss():
+    """把进程的峰值常驻内存（VmHWM）重置为当前值，不支持时返回 False（峰值从进程启动算起）"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def cpu_seconds():
+    """页面进程（全部线程）和渲染进程池的 CPU 时间"""
+    total = time.process_time()
+    ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+    for child in multiprocessing.active_children():
+        try:
+            with open(f'/proc/{child.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / ticks
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+
+def script(seed, actions):
+    """一个会话的操作序列：(说明, 操作)，操作接收 AppTest 并返回要执行的 AppTest"""
+    rng = random.Random(seed)
+    page = PAGES[0]
+    steps = []
+    for _ in range(actions):
+        roll = rng.random()
+        if page in AREA_BUTTONS and roll < 0.4:
+            key = AREA_BUTTONS[page] + rng.choice(AREAS)
+            steps.append((key, lambda at, key=key: at.button(key=key).click()))
+        elif roll < 0.85:
+            page = rng.choice([p for p in PAGES if p != page])
+            steps.append((page, lambda at, page=page: at.sidebar.radio[0].set_value(page)))
+        else:
+            choice = rng.choice(TIME_RANGES)
+            steps.append((choice, lambda at, choice=choice: at.sidebar.selectbox(key='time_range').set_value(choice)))
+    return steps
+
+
+def run_session(index, actions, barrier, latencies, errors):
+    """一个会话：首次执行后依次操作；出现异常时记录并结束这个会话（页面已不完整，后续操作没有意义）"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=300)
+    steps = script(index, actions)
+    barrier.wait()
+    start = time.perf_counter()
+    at.run()
+    latencies.append(time.perf_counter() - start)
+    if at.exception:
+        errors.append(f"会话 {index} 首次执行: {at.exception[0].message}")
+        return
+    for name, action in steps:
+        start = time.perf_counter()
+        action(at).run()
+        latencies.append(time.perf_counter() - start)
+        if at.exception:
+            errors.append(f"会话 {index} {name}: {at.exception[0].message}")
+            return
+
+
+def run_level(sessions, actions):
+    """sessions 个会话同时执行，返回这一轮的统计"""
+    latencies, errors = [], []
+    barrier = threading.Barrier(sessions + 1)
+    threads = [threading.Thread(target=run_session, args=(i, actions, barrier, latencies, errors), daemon=True)
+               for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    peak_reset = reset_peak_rss()
+    cpu = cpu_seconds()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    cpu = cpu_seconds() - cpu
+    memory = metrics.process_memory()
+    ms = np.array(latencies) * 1000
+    return {
+        'sessions': sessions,
+        'reruns': len(ms),
+        'p50': np.percentile(ms, 50),
+        'p95': np.percentile(ms, 95),
+        'p99': np.percentile(ms, 99),
+        'max': ms.max(),
+        'throughput': len(ms) / wall,
+        'cpu': cpu,
+        'utilization': cpu / wall,
+        'rss': memory[0] / 1024 ** 2 if memory else float('nan'),
+        'peak': memory[1] / 1024 ** 2 if memory else float('nan'),
+        'peak_reset': peak_reset,
+        'errors': errors,
+    }
+
+
+def main(levels=(1, 4, 16), rows=500_000, actions=20):
+    warnings.filterwarnings('ignore')
+    from streamlit.testing.v1 import AppTest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        generate_csv(path, rows)
+        shutil.copy(find_font(), os.path.join(tmp, 'SimHei.ttf'))
+        os.chdir(tmp)
+
+        with LocalServer({'/data.csv': path}) as server:
+            os.environ.update(DCM_DATA_URL=server.url('/data.csv'), DCM_REFRESH_INTERVAL='3600',
+                              DCM_CACHE_DIR=os.path.join(tmp, 'cache'), DCM_STREAM_PORT='0', DCM_METRICS_PORT='0')
+            # 渲染进程池沿用部署时的 DCM_RENDER_WORKERS（默认按 CPU 核数）
+            # 先等后台加载完成（数据地址不是默认地址，合成数据就是第一个版本），
+            # 再让每个页面执行一次（进程池、字体等一次性开销不计入第一轮）
+            first = AppTest.from_file(APP, default_timeout=300)
+            wait_for_version(first, 1)
+            for page in PAGES:
+                first.sidebar.radio[0].set_value(page).run()
+            print(f"{rows:,} 行，{os.cpu_count()} 个 CPU，每个会话首次执行 + {actions} 次操作"
+                  f"（切换页面 / 区域按钮 / 时间范围）")
+            print(f"{'会话':>4} {'重跑':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'最大':>8} {'次/秒':>7} "
+                  f"{'CPU':>7} {'利用率':>6} {'RSS':>8} {'峰值':>8}")
+            for sessions in levels:
+                result = run_level(sessions, actions)
+                print(f"{result['sessions']:>6} {result['reruns']:>6} {result['p50']:>6.0f}ms {result['p95']:>6.0f}ms "
+                      f"{result['p99']:>6.0f}ms {result['max']:>6.0f}ms {result['throughput']:>7.1f} "
+                      f"{result['cpu']:>6.1f}s {result['utilization']:>6.0%} {result['rss']:>6.0f}MB "
+                      f"{result['peak']:>6.0f}MB{'' if result['peak_reset'] else '*'}", flush=True)
+                for error in result['errors'][:3]:
+                    print(f"       异常 {error}")
+            if not result['peak_reset']:
+                print("* 不能重置峰值内存，峰值从进程启动算起")
+
+
+if __name__ == '__main__':
+    main(tuple(int(n) for n in sys.argv[1].split(',')) if len(sys.argv) > 1 else (1, 4, 16),
+         int(float(sys.argv[2])) if len(sys.argv) > 2 else 500_000,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 20)
@@ -0,0 +1,109 @@
+"""多数据源并发下载基准：每个区域一个导出文件，替身服务器上有慢速、一直失败和偶发失败的数据源
+
+- 总耗时：逐个串行下载 vs 并发下载（应接近最慢的一个数据源，而不是全部之和）
+- 偶发失败的数据源经退避重试后成功；一直失败的数据源只让它的传感器标记为过期
+- 合并后的数据集与原始完整 CSV 一致（失败数据源的列除外）
+- 已加载过的数据源之后开始失败时保留它上次的数据，只把它的传感器标记为过期
+
+用法: python -m benchmarks.bench_multisource [行数] [慢速数据源延迟秒数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv
+from monitor.fetch import CsvSource, make_session, parse_csv
+from monitor.multisource import MultiSource
+from monitor.store import COLUMN_MAPPING, ROOM_SENSORS
+
+KEY_COLUMNS = {key: column for column, key in COLUMN_MAPPING.items()}
+# 各导出文件包含的传感器：每个区域一个，PUE 和氢气各一个
+EXPORTS = {**{room: list(keys) for room, keys in ROOM_SENSORS.items()}, '能效': ['PUE'], '氢气': ['hydr']}
+
+
+def split_exports(path, directory):
+    """把完整 CSV 按导出拆成多个文件，返回 {名称: 文件路径}"""
+    import pandas as pd
+
+    frame = pd.read_csv(path)
+    date_column = frame.columns[0]
+    files = {}
+    for i, (name, keys) in enumerate(EXPORTS.items()):
+        files[name] = os.path.join(directory, f'export-{i}.csv')
+        frame[[date_column] + [KEY_COLUMNS[key] for key in keys]].to_csv(files[name], index=False)
+    return files
+
+
+def main(rows=200_000, slow=2.0):
+    with tempfile.TemporaryDirectory() as tmp:
+        full = os.path.join(tmp, 'full.csv')
+        generate_csv(full, rows)
+        files = split_exports(full, tmp)
+        names = list(files)
+        paths = {name: f'/{os.path.basename(path)}' for name, path in files.items()}
+        slow_name, failing_name, flaky_name = names[1], names[2], names[3]
+
+        delays = {paths[name]: 0.3 for name in names}
+        delays[paths[slow_name]] = slow
+        with LocalServer({paths[name]: files[name] for name in names}, delays=delays,
+                         failures={paths[failing_name]: float('inf'), paths[flaky_name]: 2}) as server:
+            configs = [{'name': name, 'url': server.url(paths[name]), 'timeout': 10, 'retries': 2, 'sensors': EXPORTS[name]}
+                       for name in names]
+            print(f"{len(names)} 个导出文件 x {rows:,} 行；{slow_name} 延迟 {slow:.1f} s，其余 0.3 s；"
+                  f"{failing_name} 一直失败，{flaky_name} 前 2 次失败")
+
+            # 逐个串行下载（没有失败的数据源，只看耗时）
+            session = make_session()
+            start = time.perf_counter()
+            for config in configs:
+                if config['name'] not in (failing_name, flaky_name):
+                    CsvSource(config['url'], session=session, timeout=10).refresh()
+            serial = time.perf_counter() - start
+
+            multi = MultiSource(configs, backoff=0.2)
+            start = time.perf_counter()
+            multi.refresh()
+            concurrent = time.perf_counter() - start
+            print(f"串行下载（不含失败的数据源） {serial:6.2f} s   并发下载（含重试） {concurrent:6.2f} s")
+
+            for status in multi.status():
+                state = '成功' if status['ok'] else f"失败: {status['error'][:50]}"
+                print(f"  {status['name']:<4} {status['elapsed']:6.2f} s  尝试 {status['attempts']} 次  "
+                      f"{status['rows']:>8,} 行  {','.join(status['keys']) or '-'}  {state}")
+            stale = multi.stale_keys()
+            print(f"过期的传感器: {', '.join(sorted(stale))}")
+
+            # 合并结果与完整 CSV 一致（失败数据源的列为空）
+            with open(full, 'rb') as f:
+                expected = parse_csv(f.read())
+            merged = multi.snapshot()
+            assert np.array_equal(merged.time, np.unique(expected.time))
+            for key in expected.columns:
+                if key in stale:
+                    assert np.isnan(merged.columns[key]).all()
+                else:
+                    # 同一时刻有重复行时合并为一行（取最后一个有效值），逐行比较只用无重复的时刻
+                    unique = np.append(expected.time[1:] != expected.time[:-1], True) & np.append(True, expected.time[1:] != expected.time[:-1])
+                    np.testing.assert_array_equal(merged.columns[key][np.searchsorted(merged.time, expected.time[unique])],
+                                                  expected.columns[key][unique])
+            print(f"合并后 {len(merged):,} 行，与完整 CSV 一致（过期传感器的列为空）")
+
+            # 已加载过的数据源开始失败：保留上次的数据，只有它的传感器过期
+            with server.httpd.lock:
+                server.httpd.failures[paths[slow_name]] = float('inf')
+            multi.last_checked = 0
+            start = time.perf_counter()
+            multi.refresh()
+            print(f"{slow_name} 开始失败后再次刷新 {time.perf_counter() - start:6.2f} s，"
+                  f"过期的传感器: {', '.join(sorted(multi.stale_keys()))}")
+            assert multi.stale_keys() == stale | set(EXPORTS[slow_name])
+            assert multi.snapshot() is merged
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 200_000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 2.0)
@@ -0,0 +1,81 @@
+"""在线统计基准：指标卡片每次重跑的取值耗时、单个读数的更新耗时、噪声读数造成的状态跳变
+
+对比：每次重跑从全部历史重新计算均值/方差/最值和 EWMA（pandas ewm）。
+
+用法: python -m benchmarks.bench_online [行数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_rules import make_store
+from monitor import rules
+from monitor.online import EWMA_SPAN, OnlineEngine, OnlineStats
+
+TILE_KEYS = ['PUE', 'hydr', 'ZJFTemp', 'ZJFHum']
+
+
+def full_recompute(store):
+    import pandas as pd
+
+    for key in TILE_KEYS:
+        _, values = store.valid(key)
+        values = values.astype(np.float64)
+        values.mean(), values.std(ddof=1), values.min(), values.max()
+        pd.Series(values).ewm(span=EWMA_SPAN, adjust=False).mean().iloc[-1]
+
+
+def engine_tiles(engine, store):
+    engine.sync(store)
+    for key in TILE_KEYS:
+        engine.get(key)
+
+
+def timed_ms(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def status_flips(levels):
+    return int(np.count_nonzero(levels[1:] != levels[:-1]))
+
+
+def main(rows=2_600_000):
+    store = make_store(rows)
+    for key in TILE_KEYS:
+        store.valid_index(key)
+    print(f"{rows:,} 行，{len(TILE_KEYS)} 个指标卡片")
+
+    engine = OnlineEngine()
+    start = time.perf_counter()
+    engine.sync(store)
+    print(f"首次并入整个数据集 {(time.perf_counter() - start) * 1000:8.1f} ms（每个进程一次）")
+    print(f"每次重跑  全部历史重算 {timed_ms(lambda: full_recompute(store)):8.1f} ms  "
+          f"在线统计 {timed_ms(lambda: engine_tiles(engine, store)):8.3f} ms")
+
+    # 单个实时读数的更新
+    readings = [('PUE', store.time[-1] + np.timedelta64(i + 1, 's'), 1.55) for i in range(10_000)]
+    start = time.perf_counter()
+    engine.ingest(readings)
+    print(f"单个读数更新 {(time.perf_counter() - start) / len(readings) * 1e6:6.2f} µs")
+
+    # PUE 在 1.6（良好 / 需关注 的分界）附近带噪声时，按原始读数和按平滑值判断的等级跳变次数
+    rng = np.random.default_rng(0)
+    values = 1.59 + rng.normal(0, 0.02, 1_000)
+    stats = OnlineStats()
+    smoothed = []
+    for i, value in enumerate(values):
+        stats.update(np.datetime64(i, 's'), value)
+        smoothed.append(stats.ewma)
+    raw_levels = np.array([rules.pue_level(v) for v in values])
+    smooth_levels = np.array([rules.pue_level(v) for v in smoothed])
+    print(f"PUE 1.59±0.02 的 1000 个读数  等级跳变  原始读数 {status_flips(raw_levels)} 次  平滑值 {status_flips(smooth_levels)} 次")
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 2_600_000)
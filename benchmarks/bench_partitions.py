@@ -0,0 +1,50 @@
+"""多站点分区存储基准：写入、按站点和时间范围读取（条件下推）、只读部分区域的列
+
+对比：同样的查询先把整个站点读入内存再截取。
+
+用法: python -m benchmarks.bench_partitions [站点数] [每站点行数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_rules import make_store
+from monitor.partitions import PartitionedStore
+
+RANGES = {'最近7天': np.timedelta64(7, 'D'), '最近30天': np.timedelta64(30, 'D'), '最近1年': np.timedelta64(365, 'D')}
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(sites=10, rows=525_600):
+    store = make_store(rows)
+    with tempfile.TemporaryDirectory() as root:
+        partitions = PartitionedStore(root, cache_bytes=0)
+        names = [f'site-{i:02d}' for i in range(sites)]
+        _, ms = timed_ms(lambda: [partitions.write(name, store) for name in names])
+        days = len(partitions.dates(names[0]))
+        print(f"{sites} 个站点 x {rows:,} 行（每站点 {days} 个日期分区）  写入 {ms / 1000:.1f} s")
+
+        site = names[sites // 2]
+        last = partitions.last_time(site)
+        for name, window in RANGES.items():
+            partitions.partitions_read = 0
+            subset, pushed = timed_ms(lambda: partitions.read(site, last - window))
+            read = partitions.partitions_read
+            full, scanned = timed_ms(lambda: partitions.read(site).between(last - window))
+            assert len(full) == len(subset)
+            _, rooms = timed_ms(lambda: partitions.read(site, last - window, rooms=['主机房']))
+            print(f"{name:<6} {len(subset):>9,} 行  下推 {pushed:8.1f} ms（读取 {read} 个分区）  "
+                  f"只读主机房 {rooms:8.1f} ms   整站读取后截取 {scanned:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+         int(float(sys.argv[2])) if len(sys.argv) > 2 else 525_600)
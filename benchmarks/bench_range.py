@@ -0,0 +1,64 @@
+"""时间范围查询基准：多年分钟级数据上取 "最近24小时" 等范围并计算各列统计
+
+对比按时间逐行比较的布尔掩码（O(n)）与二分查找切片（O(log n + k)）。
+
+用法: python -m benchmarks.bench_range [行数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_rules import make_store
+from monitor.store import SENSOR_KEYS
+
+RANGES = {'最近24小时': np.timedelta64(1, 'D'), '最近7天': np.timedelta64(7, 'D'), '最近30天': np.timedelta64(30, 'D')}
+
+
+def masked_summaries(store, window):
+    """布尔掩码取范围，再逐列去掉缺失值"""
+    mask = store.time >= store.time[-1] - window
+    for key in SENSOR_KEYS:
+        values = store.columns[key][mask]
+        values = values[~np.isnan(values)]
+        if len(values):
+            values.mean(dtype=np.float64), values.max(), values.min()
+
+
+def range_summaries(store, window):
+    subset = store.last(window)
+    for key in SENSOR_KEYS:
+        subset.summary(key)
+
+
+def timed_ms(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main(rows=2_600_000):
+    store = make_store(rows)
+    years = (store.time[-1] - store.time[0]) / np.timedelta64(365, 'D')
+    print(f"{rows:,} 行（约 {years:.1f} 年）x {len(SENSOR_KEYS)} 列")
+
+    # 数据集首次使用时按列建立有效值索引（每个版本一次），之后的范围查询都从中截取
+    start = time.perf_counter()
+    for key in SENSOR_KEYS:
+        store.valid_index(key)
+    print(f"建立有效值索引 {(time.perf_counter() - start) * 1000:8.2f} ms（每个数据版本一次）")
+
+    for name, window in RANGES.items():
+        masked = timed_ms(lambda: masked_summaries(store, window))
+        start = time.perf_counter()
+        range_summaries(store, window)
+        first = (time.perf_counter() - start) * 1000
+        cached = timed_ms(lambda: range_summaries(store, window))
+        print(f"{name:<8} 布尔掩码 {masked:8.2f} ms  二分切片首次 {first:8.2f} ms  再次 {cached:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 2_600_000)
@@ -0,0 +1,53 @@
+"""多图页面渲染基准：串行 vs 渲染进程池
+
+用法: python -m benchmarks.bench_render_pool [图表数]
+"""
+import sys
+import time
+
+import numpy as np
+
+import charts
+from monitor import render_worker
+
+
+def make_specs(count, points=700):
+    x = np.datetime64('2025-01-01T00:00', 'ns') + np.arange(points).astype('timedelta64[h]')
+    specs = []
+    for i in range(count):
+        y = (22 + np.random.default_rng(i).normal(0, 1, points)).astype(np.float32)
+        specs.append(charts.make_spec(f'chart {i}', 'value', [(f's{i}', x, y, 'red')], (5.5, 2.8)))
+    return specs
+
+
+def main(count=5):
+    specs = make_specs(count)
+
+    start = time.perf_counter()
+    for spec in specs:
+        charts.render_chart(spec)
+    serial_ms = (time.perf_counter() - start) * 1000
+
+    # 启动并预热进程池，不计入页面耗时
+    pool = charts.get_render_pool()
+    if pool is not None:
+        pool.submit(render_worker.noop).result()
+    charts.render_many(make_specs(charts.RENDER_WORKERS * 2))
+
+    charts.render_cache.clear()
+    start = time.perf_counter()
+    charts.render_many(specs)
+    pool_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    charts.render_many(specs)
+    cached_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{count} 张图, {charts.RENDER_WORKERS} 个渲染进程")
+    print(f"串行       {serial_ms:8.1f} ms")
+    print(f"进程池     {pool_ms:8.1f} ms")
+    print(f"缓存命中   {cached_ms:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,110 @@
+"""保留策略基准：长期按天追加分钟级数据，对比不聚合（内存持续增长）与按保留期限 / 内存上限聚合后的常驻内存、
+每次整理的耗时，以及聚合后较早时间范围的查询耗时和统计误差
+
+用法: python -m benchmarks.bench_retention [天数] [原始数据保留天数] [小时桶保留天数] [内存上限 MB]
+"""
+import sys
+import time
+
+import numpy as np
+
+from monitor.fetch import prepare
+from monitor.retention import Retention, memory_usage
+from monitor.store import SENSOR_KEYS, SensorStore
+
+ROWS_PER_DAY = 1440
+MAX_POINTS = 1200
+D = np.timedelta64(1, 'D')
+
+
+def make_day(day, rng):
+    """第 day 天的分钟级数据（日周期 + 噪声，偶有缺失）"""
+    times = np.datetime64('2024-01-01', 'ns') + day * D + np.arange(ROWS_PER_DAY) * np.timedelta64(1, 'm')
+    phase = np.arange(ROWS_PER_DAY) / ROWS_PER_DAY * 2 * np.pi
+    columns = {}
+    for key in SENSOR_KEYS:
+        center = 1.55 if key == 'PUE' else 3.0 if key == 'hydr' else 50.0 if key.endswith('Hum') else 22.0
+        values = center * (1 + 0.03 * np.sin(phase + day * 0.1) + rng.normal(0, 0.01, ROWS_PER_DAY))
+        values[rng.random(ROWS_PER_DAY) < 0.01] = np.nan
+        columns[key] = values.astype(np.float32)
+    return SensorStore(times, columns, assume_sorted=True)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def query(store, start, end):
+    """选定范围 + 全部传感器的统计 + 每个传感器一张降采样图表"""
+    subset = store.between(start, end)
+    if len(subset) == 0:
+        return subset
+    for key in SENSOR_KEYS:
+        subset.summary(key)
+        subset.decimated_since(key, subset.last_time - subset.first_time, MAX_POINTS)
+    return subset
+
+
+def main(days=365, raw_days=30, hourly_days=90, budget_mb=2):
+    policies = [('不聚合', None),
+                (f'保留 {raw_days}/{hourly_days} 天', Retention(raw_days * D, hourly_days * D)),
+                (f'+ 上限 {budget_mb:g} MB', Retention(raw_days * D, hourly_days * D, int(budget_mb * 1024 * 1024)))]
+    print(f"{days} 天分钟级数据，每天 {ROWS_PER_DAY} 行 x {len(SENSOR_KEYS)} 列，逐天追加")
+    stores = {name: None for name, _ in policies}
+    elapsed = {name: [] for name, _ in policies}
+    rng = np.random.default_rng(0)
+    print(f"\n{'天数':>6}" + ''.join(f"{name:>20}" for name, _ in policies))
+    for day in range(days):
+        chunk = make_day(day, rng)
+        for name, retention in policies:
+            store = stores[name]
+            store = chunk if store is None else store.append(chunk)
+            stores[name], ms = timed(lambda: prepare(store, retention=retention))
+            elapsed[name].append(ms)
+        if (day + 1) % 30 == 0 or day + 1 == days:
+            print(f"{day + 1:>6}" + ''.join(f"{memory_usage(stores[name])['total_bytes'] / 1e6:>17.2f} MB"
+                                            for name, _ in policies))
+
+    raw = stores['不聚合']
+    print()
+    for name, retention in policies[1:]:
+        usage = memory_usage(stores[name])
+        times = np.array(elapsed[name])
+        print(f"[{name}] 原始 {usage['raw_rows']:,} 行 / 小时桶 {usage['hour_buckets']:,} / 天桶 {usage['day_buckets']:,}，"
+              f"丢弃 {retention.dropped_days} 天；每次整理 中位 {np.median(times):.1f} ms / 最大 {times.max():.1f} ms")
+
+
+    last = raw.last_time
+    ranges = [('最近7天', last - 7 * D, None), (f'{raw_days + 30}~{raw_days} 天前', last - (raw_days + 30) * D, last - raw_days * D),
+              ('一年前的一个月', last - 365 * D, last - 335 * D), ('全部', None, None)]
+    for label, start, end in ranges:
+        reference, raw_ms = timed(lambda: query(raw, start, end))
+        line = f"  {label:<14} 不聚合 {raw_ms:6.1f} ms"
+        for name, _ in policies[1:]:
+            store = stores[name]
+            subset, cold_ms = timed(lambda: query(store, start, end))
+            _, warm_ms = timed(lambda: query(store, start, end))
+            # 均值相对误差与最大值是否一致（只统计数据仍在保留范围内的传感器）
+            errors, exact = [], True
+            for key in SENSOR_KEYS:
+                expected, actual = reference.summary(key), subset.summary(key)
+                if expected and actual:
+                    errors.append(abs(actual['mean'] - expected['mean']) / abs(expected['mean']))
+                    exact &= actual['max'] == expected['max']
+            error = f"{max(errors):.1e}" if errors else '已丢弃'
+            line += f" | {name} 首次 {cold_ms:6.1f} / 缓存 {warm_ms:5.1f} ms，均值误差 {error}{'' if exact else '，极值不一致'}"
+        print(line)
+    for name, retention in policies[1:]:
+        if retention.cache_bytes is not None:
+            usage = memory_usage(stores[name])
+            print(f"[{name}] 数据集 {usage['total_bytes'] / 1e6:.2f} MB + 范围缓存 {usage['cache_bytes'] / 1e6:.2f} MB"
+                  f"（容量 {retention.cache_bytes / 1e6:.2f} MB），上限 {retention.max_bytes / 1e6:.2f} MB")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 365,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 30,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 90,
+         float(sys.argv[4]) if len(sys.argv) > 4 else 2)
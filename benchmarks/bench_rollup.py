@@ -0,0 +1,82 @@
+"""多级预聚合基准：长时间窗口的统计和图表取数，原始数据 vs 预聚合；追加数据时的增量更新
+
+用法: python -m benchmarks.bench_rollup [行数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_rules import make_store
+from monitor.downsample import minmax_decimate
+from monitor.rollup import Rollups
+from monitor.store import SENSOR_KEYS, SensorStore
+
+WINDOWS = {'最近30天': np.timedelta64(30, 'D'), '最近1年': np.timedelta64(365, 'D'), '全部': None}
+CHART_POINTS = 550
+
+
+def raw_summaries(store):
+    for key in SENSOR_KEYS:
+        _, values = store.valid(key)
+        if len(values):
+            values.mean(dtype=np.float64), values.max(), values.min()
+
+
+def raw_charts(store, window):
+    for key in SENSOR_KEYS:
+        minmax_decimate(*store.valid_since(key, window), CHART_POINTS)
+
+
+def rollup_summaries(store):
+    for key in SENSOR_KEYS:
+        store.summary(key)
+
+
+def rollup_charts(store, window):
+    for key in SENSOR_KEYS:
+        store.decimated_since(key, window, CHART_POINTS)
+
+
+def timed_ms(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main(rows=2_600_000):
+    store = make_store(rows)
+    print(f"{rows:,} 行 x {len(SENSOR_KEYS)} 列, 统计和图表均为全部 {len(SENSOR_KEYS)} 列")
+    for key in SENSOR_KEYS:
+        store.valid_index(key)
+
+    build = timed_ms(lambda: Rollups.build(store.time, store.columns), repeat=3)
+    rollups = store.rollups()
+    print(f"生成预聚合 {build:8.1f} ms  {rollups.nbytes / 1e6:.1f} MB（原始数据 {store.nbytes / 1e6:.0f} MB）  "
+          + ' '.join(f"{tier.name} {len(tier):,} 桶" for tier in rollups.tiers))
+
+    # 追加 1 小时的新数据：增量更新 vs 全部重算
+    step = store.time[-1] - store.time[-2]
+    new_time = store.time[-1] + step * np.arange(1, 61)
+    new_rows = SensorStore(new_time, {key: np.full(60, 20, np.float32) for key in SENSOR_KEYS}, assume_sorted=True)
+    appended = store.append(new_rows)
+    incremental = timed_ms(lambda: rollups.extend(appended.time, appended.columns))
+    full = timed_ms(lambda: Rollups.build(appended.time, appended.columns), repeat=3)
+    print(f"追加 60 行  增量更新 {incremental:8.2f} ms  全部重算 {full:8.1f} ms")
+
+    for name, window in WINDOWS.items():
+        subset = store if window is None else store.last(window)
+        chart_window = window if window is not None else store.time[-1] - store.time[0]
+        raw_stats = timed_ms(lambda: raw_summaries(subset))
+        stats = timed_ms(lambda: rollup_summaries(subset))
+        raw_chart = timed_ms(lambda: raw_charts(subset, chart_window))
+        chart = timed_ms(lambda: rollup_charts(subset, chart_window))
+        print(f"{name:<6} 统计 原始 {raw_stats:8.2f} ms  预聚合 {stats:6.2f} ms   "
+              f"图表取数 原始 {raw_chart:8.2f} ms  预聚合 {chart:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 2_600_000)
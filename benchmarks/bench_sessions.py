@@ -0,0 +1,111 @@
+"""多会话内存基准：N 个会话打开主界面，数据更新若干次后的进程内存和存活的数据集版本数
+
+数据集由进程内所有会话共享，会话只记录版本号：RSS 不应随会话数成倍增长，
+数据更新后只有当前版本存活（空闲的会话不会把旧版本留在内存里）。
+
+用法: python -m benchmarks.bench_sessions [会话数] [行数] [更新次数]
+"""
+import ctypes
+import ctypes.util
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.bench_startup import APP, find_font
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv, make_rows
+from monitor.store import SensorStore
+
+
+def rss_mb():
+    """当前常驻内存（MB）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def trimmed_rss_mb():
+    """让 glibc 归还空闲堆内存后的常驻内存：旧版本释放后的内存 malloc 通常不会立即还给系统"""
+    try:
+        ctypes.CDLL(ctypes.util.find_library('c')).malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        pass
+    return rss_mb()
+
+
+def memory():
+    return f"RSS {rss_mb():6.0f} MB（归还后 {trimmed_rss_mb():6.0f} MB）"
+
+
+def live_stores(min_rows):
+    gc.collect()
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, SensorStore) and len(obj) >= min_rows)
+
+
+def wait_for_version(at, version, timeout=120):
+    """重跑该会话直到看到不低于 version 的数据版本"""
+    deadline = time.time() + timeout
+    while True:
+        at.run()
+        if at.session_state.data_version >= version:
+            return at.session_state.data_version
+        if time.time() > deadline:
+            raise TimeoutError(f"等待数据版本 {version} 超时")
+        time.sleep(0.5)
+
+
+def main(sessions=200, rows=1_000_000, updates=3):
+    warnings.filterwarnings('ignore')
+    from streamlit.testing.v1 import AppTest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        generate_csv(path, rows)
+        shutil.copy(find_font(), os.path.join(tmp, 'SimHei.ttf'))
+        os.chdir(tmp)
+
+        with LocalServer({'/data.csv': path}) as server:
+            os.environ.update(DCM_DATA_URL=server.url('/data.csv'), DCM_REFRESH_INTERVAL='1',
+                              DCM_CACHE_DIR=os.path.join(tmp, 'cache'), DCM_STREAM_PORT='0',
+                              DCM_METRICS_PORT='0', DCM_RENDER_WORKERS='0')
+            base = trimmed_rss_mb()
+
+            # 第一个会话等后台加载完成（随仓库的数据只用于默认数据地址，合成数据就是第一个版本）
+            first = AppTest.from_file(APP, default_timeout=120)
+            version = wait_for_version(first, 1)
+            apps = [first]
+            one_session = trimmed_rss_mb()
+            print(f"{rows:,} 行, 基线 {base:.0f} MB, 1 个会话 {one_session:.0f} MB")
+
+            start = time.perf_counter()
+            for i in range(1, sessions):
+                at = AppTest.from_file(APP, default_timeout=120)
+                at.run()
+                apps.append(at)
+                if (i + 1) % 50 == 0 or i + 1 == sessions:
+                    print(f"{i + 1:>5} 个会话  {memory()}  存活数据集 {live_stores(rows)}", flush=True)
+            per_run = (time.perf_counter() - start) / max(sessions - 1, 1) * 1000
+            per_session = (trimmed_rss_mb() - one_session) / max(sessions - 1, 1)
+            print(f"每个会话约 {per_session * 1024:.0f} KB, 首次执行平均 {per_run:.0f} ms")
+
+            # 数据追加后只让一个会话重跑，其余会话保持空闲
+            for update in range(updates):
+                time.sleep(1.1)
+                with open(path, 'a') as f:
+                    f.write(make_rows(rows + update * 100, 100))
+                version = wait_for_version(first, version + 1)
+                print(f"更新 {update + 1} -> 版本 {version}  {memory()}  存活数据集 {live_stores(rows)}", flush=True)
+
+
+if __name__ == '__main__':
+    main(*(int(float(arg)) for arg in sys.argv[1:4]))
@@ -0,0 +1,121 @@
+"""启动耗时基准：新进程中首次执行 app.py 到首屏指标输出、整页绘制完成的时间
+
+分别测量没有磁盘缓存（解析随仓库的 CSV）和磁盘缓存已就绪两种情况，
+以及同一进程内第二次执行（重跑）的耗时。每种情况都在全新的子进程中运行。
+
+指定提交时（如最初的提交 4c30b59）同样测量该提交的 app.py 作为对比：用 git archive 导出到临时目录，
+其中写死的 raw.githubusercontent.com 地址改为本地服务器（benchmarks.local_server）提供的随仓库 CSV，
+不计网络耗时，只比较脚本本身的执行时间。
+
+用法: python -m benchmarks.bench_startup [重复次数] [对比的提交]
+"""
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+from benchmarks.local_server import LocalServer
+from monitor.service import DEFAULT_DATA_URL, SEED_CSV
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO_DIR, 'app.py')
+GITHUB = 'https://raw.githubusercontent.com'
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+
+# 第一个指标卡片输出的时刻视为首屏
+painted = []
+_metric = streamlit.metric
+def metric(*args, **kwargs):
+    if not painted:
+        painted.append(time.perf_counter())
+    return _metric(*args, **kwargs)
+streamlit.metric = metric
+
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+first = time.perf_counter()
+at.run()
+second = time.perf_counter()
+print(json.dumps({
+    'streamlit_import_ms': (imported - start) * 1000,
+    'first_paint_ms': (painted[0] - imported) * 1000 if painted else float('nan'),
+    'first_run_ms': (first - imported) * 1000,
+    'rerun_ms': (second - first) * 1000,
+    'modules': sorted(m for m in ('matplotlib', 'pandas', 'requests') if m in sys.modules),
+}))
+'''
+
+
+def find_font():
+    """优先使用仓库目录里的 SimHei.ttf，没有时用 matplotlib 自带字体代替"""
+    for name in ('SimHei.ttf', 'simhei.ttf'):
+        path = os.path.join(os.path.dirname(APP), name)
+        if os.path.exists(path):
+            return path
+    import matplotlib
+    return os.path.join(os.path.dirname(matplotlib.__file__), 'mpl-data', 'fonts', 'ttf', 'DejaVuSans.ttf')
+
+
+def export_rev(rev, directory, server):
+    """把提交 rev 的文件导出到 directory，数据地址改为本地服务器，返回其中的 app.py 路径"""
+    archive = subprocess.run(['git', 'archive', '--format=tar', rev], cwd=REPO_DIR,
+                             capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+    app = os.path.join(directory, 'app.py')
+    with open(app, encoding='utf-8') as f:
+        source = f.read()
+    with open(app, 'w', encoding='utf-8') as f:
+        f.write(source.replace(GITHUB, server.url('')))
+    return app
+
+
+def run_once(app, workdir, cache_dir):
+    env = dict(os.environ, DCM_CACHE_DIR=cache_dir, DCM_RENDER_WORKERS='0')
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', CHILD, app], cwd=workdir, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(repeat=3, rev=None):
+    # 旧版本写死的数据地址与 DEFAULT_DATA_URL 相同，由本地服务器返回随仓库的 CSV
+    files = {DEFAULT_DATA_URL[len(GITHUB):]: SEED_CSV}
+    with tempfile.TemporaryDirectory() as tmp, LocalServer(files) as server:
+        shutil.copy(find_font(), os.path.join(tmp, 'SimHei.ttf'))
+        cache_dir = os.path.join(tmp, 'cache')
+        apps = {'': (APP, tmp)}
+        if rev:
+            old = os.path.join(tmp, 'rev')
+            os.mkdir(old)
+            app = export_rev(rev, old, server)
+            shutil.copy(find_font(), os.path.join(old, 'SimHei.ttf'))
+            apps[f'{rev} '] = (app, old)
+
+        results = {}
+        for prefix, (app, workdir) in apps.items():
+            cold, warm = results[prefix + 'cold_cache'], results[prefix + 'warm_cache'] = [], []
+            for _ in range(repeat):
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                cold.append(run_once(app, workdir, cache_dir))
+                warm.append(run_once(app, workdir, cache_dir))
+
+        for name, runs in results.items():
+            paint = min(r['first_paint_ms'] for r in runs)
+            first = min(r['first_run_ms'] for r in runs)
+            rerun = min(r['rerun_ms'] for r in runs)
+            print(f"{name:<19} 首屏 {paint:8.1f} ms  首次执行 {first:8.1f} ms  重跑 {rerun:8.1f} ms"
+                  f"  已加载: {', '.join(runs[0]['modules']) or '-'}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3, sys.argv[2] if len(sys.argv) > 2 else None)
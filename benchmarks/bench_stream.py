@@ -0,0 +1,46 @@
+"""实时推送基准：环形缓冲区写入吞吐、HTTP 推送到可读的延迟、读取最新值的耗时
+
+用法: python -m benchmarks.bench_stream [推送次数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from monitor.simulator import post
+from monitor.stream import StreamHub
+
+
+def main(pushes=500):
+    hub = StreamHub()
+
+    # 直接写入：每批 100 条氢气读数
+    now = np.datetime64('2026-01-01T00:00', 'ns')
+    batch = [('hydr', now + np.timedelta64(i, 'ms'), 3.0) for i in range(100)]
+    start = time.perf_counter()
+    for _ in range(1000):
+        hub.ingest(batch)
+    ingest_s = time.perf_counter() - start
+
+    # 单条 HTTP 推送，写入后立即可读
+    server = hub.start_server('127.0.0.1', 0)
+    latencies = []
+    for i in range(pushes):
+        start = time.perf_counter()
+        post(server.url, {'sensor': 'hydr', 'value': float(i)})
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert hub.latest('hydr')[1] == i
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        hub.latest_value('hydr')
+    latest_us = (time.perf_counter() - start) / 10000 * 1e6
+    server.shutdown()
+
+    print(f"直接写入   {100 * 1000 / ingest_s:12.0f} 条/秒")
+    print(f"HTTP 推送  p50 {np.percentile(latencies, 50):6.2f} ms  p99 {np.percentile(latencies, 99):6.2f} ms")
+    print(f"读取最新值 {latest_us:8.2f} us")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
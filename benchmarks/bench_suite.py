@@ -0,0 +1,196 @@
+"""合成数据基准套件：数据量从 10^3 到 10^8 行时，各阶段分别计时
+
+阶段:
+    generate        生成合成 CSV（不计入回归比较）
+    fetch_parse     从本地替身服务器全量加载（load_data_from_github 的冷启动路径：下载 + 解析 + 列映射）
+    parse           仅解析 + 列映射（内存中的 CSV 字节）
+    rollups         生成多级预聚合（数据加载时进行一次，之后追加数据时增量更新）
+    main_aggregates 主界面关键指标（平均温湿度、最新 PUE/氢气）和告警计算
+    quality_cards   主界面数据质量卡片（质量概况：缺失率、中断、卡滞等；按数据版本缓存，这里是首次计算）
+    plot_spec       plot_recent_data 的取数和降采样（最近数据点 / 最近1年）
+    plot_render     plot_recent_data 的 matplotlib 渲染（不经过缓存）
+    page_stats      温度/湿度/PUE/氢气页面的统计
+
+除 generate 外每个阶段都在新的 SensorStore 上计时（不复用有效值索引等缓存，多级聚合与应用中一样事先生成），
+取多次运行中的最小值。
+结果写入 JSON，--compare 与之前版本的结果对比，变慢超过阈值的阶段标记为回归。
+
+用法: python -m benchmarks.bench_suite [--rows 1e3,1e4,1e5,1e6] [--out results.json] [--compare baseline.json]
+10^8 行的 CSV 约 9GB，解析需要数十 GB 内存，按机器条件选择行数。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+import charts
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv
+from monitor import quality, rules
+from monitor.fetch import CsvSource, parse_csv
+from monitor.store import SENSOR_KEYS, SensorStore
+
+TEMP_KEYS = ['ZJFTemp', 'LTDTemp', 'DCJTemp', 'YYJTemp', 'PDJTemp']
+HUM_KEYS = ['ZJFHum', 'LTDHum', 'DCJHum', 'YYJHum', 'PDJHum']
+# 图表时间范围：与页面的 "最近数据点" / "最近1年" 对应
+PLOT_WINDOWS = {'recent': None, 'year': np.timedelta64(365, 'D')}
+# 比基准慢这么多倍、且至少慢 REGRESSION_MIN_MS 毫秒时视为回归（过滤小数据量下的计时噪声）
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_MS = 5
+
+
+def fresh(store, rollups=True):
+    """同一份数据的新 SensorStore，不带任何缓存；rollups 为 True 时带上已生成的多级聚合（应用在加载时生成）"""
+    new = SensorStore(store.time, store.columns, assume_sorted=True)
+    if rollups:
+        new._rollups = store.rollups()
+    return new
+
+
+def main_aggregates(store):
+    store.pooled_mean(TEMP_KEYS)
+    store.pooled_mean(HUM_KEYS)
+    rules.pue_level(store.latest('PUE'))
+    store.latest('hydr')
+    store.derived('alarms', rules.evaluate)
+
+
+def quality_cards(store):
+    store.derived('quality', quality.profile)
+    store.latest_date()
+
+
+def plot_specs(store):
+    """主界面两张图 + 各页面一张图"""
+    specs = []
+    for window in PLOT_WINDOWS.values():
+        specs.append(charts.recent_chart_spec(store, {'主机房': 'ZJFTemp', '冷通道': 'LTDTemp'}, '温度趋势', '温度 (℃)',
+                                              recent_points=6, figsize=(5.5, 2.8), window=window))
+        specs.append(charts.recent_chart_spec(store, {'PUE': 'PUE'}, 'PUE趋势', 'PUE值', colors=['blue'],
+                                              recent_points=6, figsize=(5.5, 2.8), window=window))
+        specs.append(charts.recent_chart_spec(store, {'氢气浓度': 'hydr'}, '氢气浓度监测', '氢气浓度 (ppm)',
+                                              colors=['purple'], recent_points=6, figsize=(7, 3.5), window=window))
+    return specs
+
+
+def page_stats(store):
+    for key in SENSOR_KEYS:
+        store.summary(key)
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def run_size(rows, tmp, repeat):
+    path = os.path.join(tmp, f'data_{rows}.csv')
+    start = time.perf_counter()
+    csv_bytes = generate_csv(path, rows)
+    stages = {'generate': (time.perf_counter() - start) * 1000}
+    # 大数据量只跑一次
+    repeat = repeat if rows <= 1_000_000 else 1
+
+    with LocalServer({'/data.csv': path}) as server:
+        stages['fetch_parse'] = best_of(lambda: CsvSource(server.url('/data.csv')).refresh(), repeat)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    stages['parse'] = best_of(lambda: parse_csv(data), repeat)
+    store = parse_csv(data)
+    del data
+    os.remove(path)
+
+    stages['rollups'] = best_of(lambda: fresh(store, rollups=False).rollups(), repeat)
+    stages['main_aggregates'] = best_of(lambda: main_aggregates(fresh(store)), repeat)
+    stages['quality_cards'] = best_of(lambda: quality_cards(fresh(store)), repeat)
+    stages['plot_spec'] = best_of(lambda: plot_specs(fresh(store)), repeat)
+    specs = [spec for spec in plot_specs(store) if spec is not None]
+    stages['plot_render'] = best_of(lambda: [charts.render_chart(spec) for spec in specs], repeat)
+    stages['page_stats'] = best_of(lambda: page_stats(fresh(store)), repeat)
+
+    return {'rows': rows, 'csv_bytes': csv_bytes, 'store_bytes': store.nbytes, 'stages_ms': stages}
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """打印与基准结果的对比，返回回归的 (行数, 阶段) 列表"""
+    base = {r['rows']: r['stages_ms'] for r in baseline['results']}
+    regressions = []
+    print(f"\n对比 {baseline.get('revision') or '基准'}:")
+    for result in results:
+        old = base.get(result['rows'])
+        if old is None:
+            continue
+        for stage, ms in result['stages_ms'].items():
+            if stage == 'generate' or stage not in old or old[stage] <= 0:
+                continue
+            ratio = ms / old[stage]
+            regressed = ratio > REGRESSION_RATIO and ms - old[stage] >= REGRESSION_MIN_MS
+            flag = '  <-- 回归' if regressed else ''
+            if flag:
+                regressions.append((result['rows'], stage))
+            print(f"{result['rows']:>12,}  {stage:<16} {old[stage]:10.1f} -> {ms:10.1f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', default='1e3,1e4,1e5,1e6', help='逗号分隔的行数列表，如 1e3,1e6,1e8')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help='结果 JSON 的输出路径')
+    parser.add_argument('--compare', help='与之前的结果 JSON 对比')
+    args = parser.parse_args(argv)
+
+    # 没有中文字体时 matplotlib 对每个汉字告警，不影响计时
+    warnings.filterwarnings('ignore', message='Glyph .* missing from font')
+    sizes = [int(float(size)) for size in args.rows.split(',')]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            result = run_size(rows, tmp, args.repeat)
+            results.append(result)
+            stages = '  '.join(f"{stage} {ms:.1f}" for stage, ms in result['stages_ms'].items())
+            print(f"{rows:>12,} 行  {stages}", flush=True)
+
+    report = {
+        'revision': git_revision(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""本地 HTTP 替身服务器，模拟 raw.githubusercontent.com
+
+支持 ETag / Last-Modified 条件请求和单段 Range 请求，用于基准测试，不访问外网。
+可以让指定路径延迟响应或返回 500，模拟慢速和故障的数据源。
+"""
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        delay = self.server.delays.get(self.path)
+        if delay:
+            time.sleep(delay)
+        with self.server.lock:
+            failures = self.server.failures.get(self.path, 0)
+            if failures:
+                self.server.failures[self.path] = failures - 1
+        if failures:
+            self.server.requests += 1
+            self._send(500, b'internal error')
+            return
+        path = self.server.files.get(self.path)
+        if path is None:
+            self._send(404, b'')
+            return
+
+        # 校验信息取自文件大小和修改时间，不读取整个文件（大文件按块发送）
+        stat = os.stat(path)
+        size, mtime = stat.st_size, stat.st_mtime
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+        last_modified = formatdate(mtime, usegmt=True)
+        headers = {'ETag': etag, 'Last-Modified': last_modified, 'Accept-Ranges': 'bytes'}
+        self.server.requests += 1
+
+        if self.headers.get('If-None-Match') == etag or self._not_modified_since(mtime):
+            self._send(304, b'', headers)
+            return
+
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes=') and self.server.support_range:
+            start = int(range_header[6:].split('-')[0])
+            if start >= size and size > 0:
+                self._send(416, b'', {'Content-Range': f'bytes */{size}'})
+                return
+            headers['Content-Range'] = f'bytes {start}-{size - 1}/{size}'
+            self._send_file(206, path, start, size, headers)
+            return
+
+        self._send_file(200, path, 0, size, headers)
+
+    def _send_file(self, status, path, start, size, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(size - start))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = size - start
+            while remaining > 0:
+                block = f.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                self.wfile.write(block)
+                self.server.bytes_sent += len(block)
+                remaining -= len(block)
+
+    def _not_modified_since(self, mtime):
+        since = self.headers.get('If-Modified-Since')
+        if not since or self.headers.get('If-None-Match'):
+            return False
+        try:
+            return int(mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    def _send(self, status, body, headers=None):
+        self.server.bytes_sent += len(body)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LocalServer:
+    """在后台线程运行的替身服务器
+
+    files: URL 路径 -> 本地文件路径
+    delays: URL 路径 -> 响应前等待的秒数
+    failures: URL 路径 -> 前多少次请求返回 500（float('inf') 表示一直失败）
+    """
+
+    def __init__(self, files, support_range=True, delays=None, failures=None):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.files = dict(files)
+        self.httpd.support_range = support_range
+        self.httpd.delays = dict(delays or {})
+        self.httpd.failures = dict(failures or {})
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.bytes_sent = 0
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}{path}'
+
+    @property
+    def bytes_sent(self):
+        return self.httpd.bytes_sent
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
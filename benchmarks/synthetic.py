@@ -0,0 +1,75 @@
+"""基准测试用的合成数据，列结构与 data_centre_df.csv 相同"""
+import os
+
+import numpy as np
+
+from monitor.store import COLUMN_MAPPING
+
+HEADER = ('record_date,computer_room_temp,computer_room_humidity,cold_aisle_temp,cold_aisle_humidity,'
+          'battery_room_temp,battery_room_humidity,carrier_room_temp,carrier_room_humidity,'
+          'power_room_temp,power_room_humidity,hydrogen_sensor,pue\n')
+
+
+def make_rows(start, count):
+    """按分钟生成 count 行随机数据"""
+    times = np.datetime64('2025-01-01T00:00') + np.arange(start, start + count).astype('timedelta64[m]')
+    values = np.random.default_rng(start).uniform(1, 60, size=(count, 12)).round(2)
+    return ''.join(f"{t},{','.join(map(str, row))}\n" for t, row in zip(times.astype(str), values))
+
+
+def write_csv(path, rows):
+    with open(path, 'w') as f:
+        f.write(HEADER + make_rows(0, rows))
+
+
+# 各列的中心值和波动幅度
+_LEVELS = {'ZJFTemp': (23, 1.5), 'LTDTemp': (21, 1.0), 'DCJTemp': (20, 1.0), 'YYJTemp': (21.5, 1.0),
+           'PDJTemp': (23, 1.5), 'hydr': (3, 1.0), 'PUE': (1.55, 0.05)}
+
+# 0.00 ~ 200.00 的两位小数字符串表，最后一项为空字段（缺失值）
+_MAX_CENTS = 20000
+_VALUE_STRINGS = None
+
+
+def _level(key):
+    return _LEVELS.get(key, (50, 8))
+
+
+def _format_values(values):
+    """数值 -> 两位小数字符串列表（查表，比逐个格式化快一个数量级）"""
+    global _VALUE_STRINGS
+    if _VALUE_STRINGS is None:
+        _VALUE_STRINGS = np.array([f'{i / 100:.2f}' for i in range(_MAX_CENTS + 1)] + [''])
+    cents = np.clip(np.round(values * 100), 0, _MAX_CENTS)
+    cents = np.where(np.isnan(values), _MAX_CENTS + 1, cents).astype(np.int64)
+    return _VALUE_STRINGS[cents].tolist()
+
+
+def generate_csv(path, rows, seed=0, cadence_s=60, gap_ratio=0.001, missing_ratio=0.02, chunk_rows=1_000_000):
+    """每 cadence_s 秒一行，生成接近真实分布的数据（日周期 + 噪声），分块写入，返回文件字节数
+
+    gap_ratio: 时间序列中断的比例（每次中断跳过 1 到 1000 个采样周期）
+    missing_ratio: 单元格缺失（空字段）的比例
+    """
+    rng = np.random.default_rng(seed)
+    current = np.datetime64('2020-01-01T00:00', 's')
+    with open(path, 'w') as f:
+        f.write(HEADER)
+        for start in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - start)
+            steps = np.ones(count, dtype=np.int64)
+            gaps = rng.random(count) < gap_ratio
+            steps[gaps] += rng.integers(1, 1000, gaps.sum())
+            times = current + (np.cumsum(steps) * cadence_s).astype('timedelta64[s]')
+            current = times[-1]
+
+            day_phase = (times - times.astype('datetime64[D]')).astype(np.float64) / 86400 * 2 * np.pi
+            columns = [times.astype(str).tolist()]
+            for key in COLUMN_MAPPING.values():
+                center, scale = _level(key)
+                values = center + scale * 0.5 * np.sin(day_phase) + rng.normal(0, scale * 0.2, count)
+                values[rng.random(count) < missing_ratio] = np.nan
+                columns.append(_format_values(values))
+            f.write('\n'.join(map(','.join, zip(*columns))))
+            f.write('\n')
+    return os.path.getsize(path)
@@ -0,0 +1,430 @@
+"""图表渲染与渲染结果缓存
+
+图表用一个 spec 字典描述（数据切片、标题、尺寸、阈值线），渲染成 PNG 字节。
+渲染结果按 spec 内容摘要缓存在进程内的 LRU 中，所有会话共享：切回之前选过的区域、
+或者其他用户打开同一页面时不再调用 matplotlib。
+
+渲染使用 matplotlib.figure.Figure 而不是 pyplot，图表不会登记到 pyplot 的全局状态里，
+渲染结束后显式清空释放。
+
+一个页面上的多张图表通过 render_many 交给进程池并行渲染（matplotlib 不是线程安全的），
+工作进程（monitor/render_worker.py）使用 Agg 后端并在启动时加载好字体，页面耗时取决于最慢的一张图。
+
+matplotlib 只在真正需要绘图时才导入，字体每个进程只注册一次；
+缓存命中或交给进程池渲染时，页面进程不需要加载 matplotlib。
+
+DCM_CHART_BACKEND=vega 时不在服务器上绘图：同一个 spec 转换为 Vega-Lite 描述，
+降采样后的序列以 Arrow 格式随描述发送，由浏览器绘制（可缩放、悬停查看数值），
+阈值线作为规则线图层；服务器只做格式转换，中文由浏览器字体显示。
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from monitor import render_worker
+from monitor.lru import LRUCache
+
+# 图表逻辑分辨率（降采样按 宽度英寸 x PIXELS_PER_INCH 个点）
+PIXELS_PER_INCH = 100
+# 输出 PNG 的分辨率
+OUTPUT_DPI = 200
+# 点数不超过该值时画数据点标记
+MARKER_MAX_POINTS = 60
+
+# 渲染进程数，0 表示在当前进程内串行渲染（单核机器上进程池没有收益，默认不启用）
+_cpus = os.cpu_count() or 1
+RENDER_WORKERS = int(os.environ.get('DCM_RENDER_WORKERS', min(4, _cpus) if _cpus > 1 else 0))
+
+# 图表后端：matplotlib（服务器绘制 PNG）或 vega（浏览器绘制）
+BACKENDS = ('matplotlib', 'vega')
+CHART_BACKEND = os.environ.get('DCM_CHART_BACKEND', 'matplotlib')
+if CHART_BACKEND not in BACKENDS:
+    raise ValueError(f"DCM_CHART_BACKEND 应为 {' / '.join(BACKENDS)}，而不是 {CHART_BACKEND!r}")
+# Vega-Lite 图表高度：按 spec 的 figsize 高度（英寸）换算的像素
+VEGA_PIXELS_PER_INCH = 80
+
+# 在当前目录查找的字体文件
+FONT_FILES = ['SimHei.ttf', 'simhei.ttf']
+
+# 渲染结果缓存（进程内共享）
+render_cache = LRUCache(max_bytes=64 * 1024 * 1024)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# 已注册的字体：路径 -> FontProperties（注册失败时为 False）
+_font_props = {}
+_font_lock = threading.Lock()
+
+
+def find_font():
+    """在当前目录查找字体文件，返回绝对路径，找不到时返回 None"""
+    for font_file in FONT_FILES:
+        if os.path.exists(font_file):
+            return os.path.abspath(font_file)
+    return None
+
+
+def get_font_properties(font_path):
+    """注册字体并设置为默认字体（每个进程一次），返回共享的 FontProperties"""
+    if not font_path:
+        return None
+    prop = _font_props.get(font_path)
+    if prop is None:
+        with _font_lock:
+            prop = _font_props.get(font_path)
+            if prop is None:
+                import matplotlib
+                import matplotlib.font_manager as fm
+                try:
+                    fm.fontManager.addfont(font_path)
+                    prop = fm.FontProperties(fname=font_path)
+                    matplotlib.rcParams['font.family'] = [prop.get_name()]
+                    matplotlib.rcParams['font.sans-serif'] = [prop.get_name()]
+                    matplotlib.rcParams['axes.unicode_minus'] = False
+                except Exception:
+                    prop = False
+                _font_props[font_path] = prop
+    return prop or None
+
+
+def make_spec(title, ylabel, series, figsize, hlines=None):
+    """构建图表描述
+
+    series: [(标签, 时间数组, 数值数组, 颜色), ...]
+    hlines: [{'y': 1.5, 'color': 'green', 'alpha': 0.5, 'label': '目标值 1.5', 'label_en': 'Target 1.5'}, ...]
+    """
+    return {
+        'title': title,
+        'ylabel': ylabel,
+        'series': series,
+        'figsize': tuple(figsize),
+        'hlines': hlines or [],
+    }
+
+
+def heatmap_spec(title, labels, labels_en, matrix, figsize):
+    """相关矩阵热力图的描述：matrix 为 [-1, 1] 内的方阵（NaN 显示为空白），labels 为行列标签"""
+    return {
+        'kind': 'heatmap',
+        'title': title,
+        'labels': list(labels),
+        'labels_en': list(labels_en),
+        'matrix': matrix,
+        'figsize': tuple(figsize),
+    }
+
+
+def recent_chart_spec(store, series, title, ylabel, colors=None, recent_points=8, figsize=(6.5, 3.2), window=None, hlines=None):
+    """从数据集取出各序列构建图表描述，没有数据时返回 None
+
+    series: 图例标签 -> 数据列键。window 为 None 时只取最近 recent_points 个点；
+    否则取最近 window 时间内的全部数据，并按图表宽度（像素）降采样（数据量大时取自多级聚合）。
+    """
+    if colors is None:
+        colors = ['red', 'blue', 'green', 'orange', 'purple']
+
+    max_points = int(figsize[0] * PIXELS_PER_INCH)
+    chart_series = []
+    for i, (label, key) in enumerate(series.items()):
+        if window is None:
+            valid_times, valid_data = store.valid(key, recent_points)
+        else:
+            valid_times, valid_data = store.decimated_since(key, window, max_points)
+        if len(valid_data):
+            chart_series.append((label, valid_times, valid_data, colors[i % len(colors)]))
+
+    if not chart_series:
+        return None
+    return make_spec(title, ylabel, chart_series, figsize, hlines)
+
+
+def spec_key(spec, font_path=None, backend='matplotlib'):
+    """图表描述和渲染方式（后端、字体）的内容摘要，作为缓存键"""
+    h = hashlib.blake2b(digest_size=16)
+    if spec.get('kind') == 'heatmap':
+        h.update(repr((spec['kind'], spec['title'], spec['labels'], spec['figsize'], backend, font_path)).encode())
+        h.update(spec['matrix'].tobytes())
+        return h.hexdigest()
+    h.update(repr((spec['title'], spec['ylabel'], spec['figsize'], spec['hlines'], backend, font_path)).encode())
+    for label, times, values, color in spec['series']:
+        h.update(repr((label, color, len(values))).encode())
+        h.update(times.tobytes())
+        h.update(values.tobytes())
+    return h.hexdigest()
+
+
+def render_chart(spec, font_path=None):
+    """把图表描述渲染为 PNG 字节"""
+    if spec.get('kind') == 'heatmap':
+        return render_heatmap(spec, font_path)
+    from matplotlib.figure import Figure
+
+    font_prop = get_font_properties(font_path)
+    fig = Figure(figsize=spec['figsize'], dpi=PIXELS_PER_INCH)
+    try:
+        ax = fig.subplots()
+        for label, times, values, color in spec['series']:
+            marker = 'o' if len(values) <= MARKER_MAX_POINTS else None
+            ax.plot(times, values, label=label, color=color,
+                    linewidth=1.5, marker=marker, markersize=2.5)
+        for line in spec['hlines']:
+            ax.axhline(y=line['y'], color=line['color'], linestyle='--', alpha=line['alpha'],
+                       label=line['label'] if font_prop else line['label_en'])
+
+        # 字体大小设置
+        title_size = 10
+        label_size = 8
+        legend_size = 7
+        tick_size = 7
+
+        if font_prop:
+            ax.set_title(spec['title'], fontproperties=font_prop, fontsize=title_size, fontweight='bold', pad=8)
+            ax.set_ylabel(spec['ylabel'], fontproperties=font_prop, fontsize=label_size)
+            ax.set_xlabel('时间', fontproperties=font_prop, fontsize=label_size)
+            # 图例放在右上角，去除边框
+            ax.legend(prop=font_prop, fontsize=legend_size, loc='upper right', frameon=False)
+        else:
+            ax.set_title(spec['title'], fontsize=title_size, fontweight='bold', pad=8)
+            ax.set_ylabel(spec['ylabel'], fontsize=label_size)
+            ax.set_xlabel('Time', fontsize=label_size)
+            # 图例放在右上角，去除边框
+            ax.legend(fontsize=legend_size, loc='upper right', frameon=False)
+        for tick in ax.get_xticklabels() + ax.get_yticklabels():
+            if font_prop:
+                tick.set_fontproperties(font_prop)
+            tick.set_fontsize(tick_size)
+        for tick in ax.get_xticklabels():
+            tick.set_rotation(45)
+
+        ax.grid(True, alpha=0.3)
+        fig.tight_layout()
+
+        buf = BytesIO()
+        fig.savefig(buf, format='png', dpi=OUTPUT_DPI)
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+
+def render_heatmap(spec, font_path=None):
+    """把热力图描述渲染为 PNG 字节，每格标注数值"""
+    from matplotlib.figure import Figure
+
+    font_prop = get_font_properties(font_path)
+    matrix = spec['matrix']
+    labels = spec['labels'] if font_prop else spec['labels_en']
+    fig = Figure(figsize=spec['figsize'], dpi=PIXELS_PER_INCH)
+    try:
+        ax = fig.subplots()
+        image = ax.imshow(matrix, cmap='RdBu_r', vmin=-1, vmax=1)
+        fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04).ax.tick_params(labelsize=7)
+        ticks = range(len(labels))
+        ax.set_xticks(ticks)
+        ax.set_yticks(ticks)
+        text = {'fontproperties': font_prop} if font_prop else {}
+        ax.set_xticklabels(labels, rotation=45, ha='right', fontsize=7, **text)
+        ax.set_yticklabels(labels, fontsize=7, **text)
+        for i in ticks:
+            for j in ticks:
+                value = matrix[i, j]
+                if value == value:
+                    ax.text(j, i, f'{value:.2f}', ha='center', va='center', fontsize=5,
+                            color='white' if abs(value) > 0.6 else 'black')
+        ax.set_title(spec['title'], fontsize=10, fontweight='bold', pad=8, **text)
+        fig.tight_layout()
+
+        buf = BytesIO()
+        fig.savefig(buf, format='png', dpi=OUTPUT_DPI)
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+
+# ---- 浏览器端绘制（Vega-Lite） ----
+
+def _arrow_bytes(columns):
+    """列字典 -> Arrow IPC 字节（Streamlit 前端直接读取）"""
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _labels_array(codes, labels):
+    """字典编码的标签列：每行只占一个字节的编号"""
+    import pyarrow as pa
+
+    return pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int8()), pa.array(labels, type=pa.string()))
+
+
+def vega_chart(spec):
+    """把图表描述转换为 Vega-Lite 描述（字典），数据以 Arrow 字节放在 datasets 中"""
+    if spec.get('kind') == 'heatmap':
+        return vega_heatmap(spec)
+    import numpy as np
+
+    labels = [label for label, _, _, _ in spec['series']]
+    colors = [color for _, _, _, color in spec['series']]
+    counts = [len(values) for _, _, values, _ in spec['series']]
+    data = _arrow_bytes({
+        'time': np.concatenate([times for _, times, _, _ in spec['series']]).astype('datetime64[ms]'),
+        'value': np.concatenate([values for _, _, values, _ in spec['series']]).astype(np.float32),
+        'series': _labels_array(np.repeat(np.arange(len(labels), dtype=np.int8), counts), labels),
+    })
+    layers = [{
+        'data': {'name': 'series'},
+        'mark': {'type': 'line', 'strokeWidth': 1.5, 'point': max(counts) <= MARKER_MAX_POINTS},
+        'encoding': {
+            # 时间按原样显示（与服务器绘制一致，不换算到浏览器时区）
+            'x': {'field': 'time', 'type': 'temporal', 'title': '时间', 'scale': {'type': 'utc'}},
+            'y': {'field': 'value', 'type': 'quantitative', 'title': spec['ylabel'], 'scale': {'zero': False}},
+            'color': {'field': 'series', 'type': 'nominal', 'title': None,
+                      'scale': {'domain': labels, 'range': colors}, 'legend': {'orient': 'top-right'}},
+            'tooltip': [
+                {'field': 'series', 'type': 'nominal', 'title': '序列'},
+                {'field': 'time', 'type': 'temporal', 'title': '时间', 'format': '%Y-%m-%d %H:%M', 'formatType': 'utc'},
+                {'field': 'value', 'type': 'quantitative', 'title': spec['ylabel'], 'format': '.3~f'},
+            ],
+        },
+    }]
+    for line in spec['hlines']:
+        rule = {'data': {'values': [{'y': line['y'], 'label': line['label']}]}}
+        layers.append({**rule, 'mark': {'type': 'rule', 'strokeDash': [4, 4], 'color': line['color'], 'opacity': line['alpha']},
+                       'encoding': {'y': {'field': 'y', 'type': 'quantitative'},
+                                    'tooltip': [{'field': 'label', 'type': 'nominal', 'title': '阈值'}]}})
+        layers.append({**rule, 'mark': {'type': 'text', 'align': 'left', 'x': 4, 'dy': -6, 'fontSize': 10, 'color': line['color']},
+                       'encoding': {'y': {'field': 'y', 'type': 'quantitative'}, 'text': {'field': 'label'}}})
+    return {
+        'title': spec['title'],
+        'height': int(spec['figsize'][1] * VEGA_PIXELS_PER_INCH),
+        'datasets': {'series': data},
+        'layer': layers,
+    }
+
+
+def vega_heatmap(spec):
+    """热力图的 Vega-Lite 描述，每格标注数值"""
+    import numpy as np
+
+    labels = spec['labels']
+    k = len(labels)
+    matrix = np.asarray(spec['matrix'], dtype=np.float32)
+    # NaN 的格子不发送（显示为空白）
+    cell = np.flatnonzero(~np.isnan(matrix.ravel()))
+    data = _arrow_bytes({
+        'row': _labels_array((cell // k).astype(np.int8), labels),
+        'column': _labels_array((cell % k).astype(np.int8), labels),
+        'value': matrix.ravel()[cell],
+    })
+    axis = {'type': 'nominal', 'sort': labels, 'title': None}
+    encoding = {'x': {**axis, 'field': 'column', 'axis': {'labelAngle': -45}}, 'y': {**axis, 'field': 'row'}}
+    return {
+        'title': spec['title'],
+        'height': int(spec['figsize'][1] * VEGA_PIXELS_PER_INCH),
+        'datasets': {'cells': data},
+        'data': {'name': 'cells'},
+        'encoding': encoding,
+        'layer': [
+            {'mark': 'rect', 'encoding': {
+                'color': {'field': 'value', 'type': 'quantitative', 'title': None,
+                          'scale': {'scheme': 'redblue', 'domain': [-1, 1], 'reverse': True}},
+                'tooltip': [{'field': 'row', 'title': '行'}, {'field': 'column', 'title': '列'},
+                            {'field': 'value', 'type': 'quantitative', 'title': '相关系数', 'format': '.3f'}],
+            }},
+            {'mark': {'type': 'text', 'fontSize': 9}, 'encoding': {
+                'text': {'field': 'value', 'type': 'quantitative', 'format': '.2f'},
+                'color': {'condition': {'test': 'abs(datum.value) > 0.6', 'value': 'white'}, 'value': 'black'},
+            }},
+        ],
+    }
+
+
+def chart_bytes(chart):
+    """发送给浏览器的字节数：PNG 的长度，或 Vega-Lite 描述的 JSON 加上 Arrow 数据"""
+    if isinstance(chart, bytes):
+        return len(chart)
+    spec = {key: value for key, value in chart.items() if key != 'datasets'}
+    return len(json.dumps(spec, ensure_ascii=False).encode()) + sum(len(data) for data in chart['datasets'].values())
+
+
+# ---- 渲染入口 ----
+
+def render_cached(spec, font_path=None):
+    """带缓存的渲染"""
+    return render_many([spec], font_path)[0]
+
+
+def render_many(specs, font_path=None, backend=None):
+    """并行渲染多张图表，返回与 specs 对应的结果列表（spec 为 None 时对应 None）：
+    matplotlib 后端为 PNG 字节，vega 后端为 Vega-Lite 描述（字典）；backend 默认为 CHART_BACKEND"""
+    backend = backend or CHART_BACKEND
+    results = [None] * len(specs)
+    misses = []
+    for i, spec in enumerate(specs):
+        if spec is None:
+            continue
+        # vega 描述与字体无关
+        key = spec_key(spec, font_path if backend == 'matplotlib' else None, backend)
+        png = render_cache.get(key)
+        if png is None:
+            misses.append((i, key, spec))
+        else:
+            results[i] = png
+
+    if backend == 'vega':
+        for i, key, spec in misses:
+            results[i] = vega_chart(spec)
+            render_cache.put(key, results[i], size=chart_bytes(results[i]))
+        return results
+
+    pool = get_render_pool(font_path) if len(misses) > 1 else None
+    if pool is not None:
+        try:
+            futures = [(i, key, pool.submit(render_worker.render, spec)) for i, key, spec in misses]
+            for i, key, future in futures:
+                results[i] = future.result()
+                render_cache.put(key, results[i])
+            return results
+        except BrokenProcessPool:
+            _discard_pool(pool)
+
+    for i, key, spec in misses:
+        if results[i] is None:
+            results[i] = render_chart(spec, font_path)
+            render_cache.put(key, results[i])
+    return results
+
+
+# ---- 渲染进程池 ----
+
+def get_render_pool(font_path=None):
+    """进程内共享的渲染进程池（工作进程见 monitor.render_worker），RENDER_WORKERS 为 0 时返回 None"""
+    global _pool
+    if RENDER_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = render_worker.start_pool(RENDER_WORKERS, font_path)
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,5 @@
+"""数据中心监控核心模块（不依赖 Streamlit）"""
+
+from monitor.store import COLUMN_MAPPING, SENSOR_KEYS, SensorStore
+
+__all__ = ['COLUMN_MAPPING', 'SENSOR_KEYS', 'SensorStore']
@@ -0,0 +1,192 @@
+"""只读 JSON 查询 API，不依赖 Streamlit / matplotlib
+
+    GET /api/version                          当前数据版本、行数和站点列表
+    GET /api/latest                           各传感器最新读数、平滑值和趋势，PUE 等级和氢气告警
+    GET /api/stats?range=7d&keys=PUE,hydr     所选范围内的均值 / 最小 / 最大 / 最新值
+    GET /api/alarms?range=30d&active=1&limit=100
+    GET /api/quality?range=30d
+    GET /api/memory                           数据集常驻内存（原始数据 / 小时桶 / 天桶）、内存上限和进程内存（不缓存）
+
+range 取 all / 24h / 7d / 30d / 90d / 1y（默认 all），或用 start=2024-01-01&end=2024-01-31 指定日期范围；
+site=<站点> 查询多站点分区数据（DCM_SITES_DIR）。
+
+响应体按 (路径, 参数, 数据版本) 缓存在进程内的 LRU 中，数据版本不变时重复请求不再计算；
+响应带 ETag，客户端带 If-None-Match 轮询时未变化返回 304。和页面进程一起运行时（DCM_API_PORT），
+/api/latest 包含实时推送的读数，版本随读数变化。
+
+单独运行（按 DCM_* 环境变量加载数据）：python -m monitor.api [端口]
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from monitor import service
+from monitor.lru import LRUCache
+from monitor.store import SENSOR_KEYS
+
+# 响应缓存的容量
+CACHE_BYTES = 16 * 1024 * 1024
+DEFAULT_PORT = 8766
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _range(params):
+    """参数 -> (时间范围名称, 自定义日期)"""
+    if 'start' in params or 'end' in params:
+        try:
+            dates = [np.datetime64(params[name], 'D') for name in ('start', 'end') if name in params]
+        except ValueError:
+            raise ApiError(400, 'start / end 应为 YYYY-MM-DD 格式的日期')
+        return service.CUSTOM_RANGE, dates
+    name = params.get('range', 'all')
+    name = service.RANGE_ALIASES.get(name, name)
+    if name not in service.TIME_RANGES or name == service.CUSTOM_RANGE:
+        raise ApiError(400, f"range 应为 {' / '.join(service.RANGE_ALIASES)}")
+    return name, None
+
+
+def _keys(params):
+    if 'keys' not in params:
+        return None
+    keys = [key for key in params['keys'].split(',') if key]
+    unknown = [key for key in keys if key not in SENSOR_KEYS]
+    if unknown:
+        raise ApiError(400, f"未知的传感器: {', '.join(unknown)}")
+    return keys
+
+
+def _int(params, name):
+    if name not in params:
+        return None
+    try:
+        return max(int(params[name]), 0)
+    except ValueError:
+        raise ApiError(400, f"{name} 应为整数")
+
+
+class QueryApi:
+    """查询分发和响应缓存，与 HTTP 无关（便于在页面进程或单独的进程中使用）"""
+
+    ENDPOINTS = ('version', 'latest', 'stats', 'alarms', 'quality', 'memory')
+
+    def __init__(self, monitor, hub=None, cache_bytes=CACHE_BYTES):
+        self.monitor = monitor
+        # 实时推送的读数（和页面进程一起运行时）
+        self.hub = hub
+        self.cache = LRUCache(cache_bytes)
+        self.requests = 0
+
+    def handle(self, endpoint, params):
+        """返回 (ETag, JSON 字节)；出错时抛出 ApiError"""
+        if endpoint not in self.ENDPOINTS:
+            raise ApiError(404, 'not found')
+        self.requests += 1
+        if endpoint == 'memory':
+            body = json.dumps(self.monitor.memory(), ensure_ascii=False).encode()
+            return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"', body
+        site = params.get('site')
+        time_range, dates = _range(params) if endpoint not in ('version', 'latest') else ("全部", None)
+        try:
+            version, store = self.monitor.select(time_range, dates, site)
+        except KeyError:
+            raise ApiError(404, f"未知的站点: {site}")
+        if endpoint == 'latest' and site is None:
+            # 实时读数和数据源的过期状态变化时数据版本不变
+            version = (version, self.hub.received if self.hub is not None else 0, tuple(sorted(self.monitor.stale_keys())))
+        key = (endpoint, tuple(sorted(params.items())), version)
+        etag = '"' + hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest() + '"'
+        body = self.cache.get(key)
+        if body is None:
+            if store is None:
+                raise ApiError(503, '数据加载中')
+            body = json.dumps(self._query(endpoint, params, store, site, version), ensure_ascii=False).encode()
+            self.cache.put(key, body)
+        return etag, body
+
+    def _query(self, endpoint, params, store, site, version):
+        if endpoint == 'version':
+            # 站点的版本为 ('site', 站点, 分区目录修改时间)
+            return {'version': version if site is None else version[-1], 'rows': len(store), 'sites': self.monitor.sites()}
+        if endpoint == 'latest':
+            engine = self.hub.online if self.hub is not None and site is None else None
+            return service.latest(store, engine, self.monitor.stale_keys() if site is None else ())
+        if endpoint == 'stats':
+            return service.window_stats(store, _keys(params))
+        if endpoint == 'alarms':
+            return service.alarms(store, params.get('active') in ('1', 'true'), _int(params, 'limit'))
+        return service.quality_report(store)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，保持连接轮询时避免与延迟确认叠加成 40 ms 的等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.startswith('/api/'):
+            self._send(404, b'{"error": "not found"}')
+            return
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            etag, body = self.server.api.handle(url.path[len('/api/'):], params)
+        except ApiError as e:
+            self._send(e.status, json.dumps({'error': str(e)}, ensure_ascii=False).encode())
+            return
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, b'', etag)
+        else:
+            self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """GET /api/... 返回 JSON"""
+
+    daemon_threads = True
+
+    def __init__(self, api, host='127.0.0.1', port=DEFAULT_PORT):
+        self.api = api
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='api', daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get('DCM_API_PORT') or DEFAULT_PORT)
+    server = ApiServer(QueryApi(service.Monitor.from_env()), os.environ.get('DCM_API_HOST', '127.0.0.1'), port)
+    print(f"JSON API: {server.url}/api/latest")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
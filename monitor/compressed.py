@@ -0,0 +1,675 @@
+"""较早历史数据的内存压缩存储
+
+最近 hot_window 时间内的数据保持为普通的 SensorStore（追加、查询都不需要解码），更早的数据
+按约 BLOCK_ROWS 行一块无损压缩：
+
+- 时间：块内首个时刻 + 首个间隔 + 二阶差分（采样间隔固定时几乎全为 0）
+- 数值：只编码有效值，缺失位置单独存位图。有效值都是 10^-d（d ≤ MAX_DECIMALS）的整数倍时
+  按定点整数存相邻差值（缓慢变化的读数差值很小），否则存相邻两个 float32 位模式的异或（高位多为 0）
+- 整数先做 zigzag 变换并取能容纳的最窄类型，按字节重排（各值的同一字节放在一起）后 zlib 压缩
+- 每块一个块头：各列的 count / sum / min / max / last，与 monitor.rollup 中的桶相同；
+  同一时刻的行不跨块
+
+按时间范围查询时只解码与范围相交的块，结果是普通的 SensorStore（按范围缓存）；
+其统计和长时间窗口的图表用范围内完整的块的块头合并，只扫描两端不足一块的部分，不再生成多级聚合。
+整个数据集和解码后较大的范围不整体解码，返回 CompressedRange：统计、最新值和图表取自块头和两端的块，
+告警、数据质量等需要逐行扫描的分析逐块（chunks）解码。
+"""
+import itertools
+import zlib
+
+import numpy as np
+
+from monitor.downsample import minmax_decimate
+from monitor.lru import LRUCache
+from monitor.rollup import combine, raw_stats, raw_values, row_stats
+from monitor.store import ROLLUP_MIN_ROWS, SENSOR_KEYS, SensorStore
+
+# 每块的行数（同一时刻的行不跨块，实际行数可能略少）
+BLOCK_ROWS = 4096
+# 定点编码尝试的最多小数位数
+MAX_DECIMALS = 4
+# 压缩级别：更高的级别只小几个百分点，封块慢一倍
+ZLIB_LEVEL = 1
+# 每个数据集缓存的解码结果（按时间范围）的默认容量：压缩后常驻内存的 CACHE_RATIO 倍，不少于 CACHE_MIN_BYTES；
+# 设置内存上限时由保留策略按上限另行设置（见 monitor.retention）
+CACHE_RATIO = 0.25
+CACHE_MIN_BYTES = 8 * 1024 * 1024
+# 未压缩时每行的字节数：时间 8 字节 + 每列 float32
+RAW_ROW_BYTES = 8 + 4 * len(SENSOR_KEYS)
+# 按时间范围查询时，解码后不超过这个大小（且能放进解码结果的缓存）的范围整体解码为 SensorStore，
+# 更大的范围和整个数据集按需解码
+MATERIALIZE_BYTES = 64 * 1024 * 1024
+# 按需解码的范围逐块扫描时，每次合并解码的行数
+CHUNK_ROWS = 1 << 18
+
+_UINT_TYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+_block_ids = itertools.count()
+
+
+def _shuffle(values):
+    """按字节重排后压缩"""
+    return zlib.compress(values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes(), ZLIB_LEVEL)
+
+
+def _unshuffle(data, dtype):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+    return raw.reshape(dtype.itemsize, -1).T.copy().view(dtype).ravel()
+
+
+def pack_ints(values):
+    """int64 数组 -> (类型, 字节)：zigzag 后取最窄的无符号类型"""
+    values = np.asarray(values, dtype=np.int64)
+    zigzag = ((values << 1) ^ (values >> 63)).view(np.uint64)
+    top = int(zigzag.max()) if len(zigzag) else 0
+    dtype = next(t for t in _UINT_TYPES if top <= np.iinfo(t).max)
+    return np.dtype(dtype).str, _shuffle(zigzag.astype(dtype))
+
+
+def unpack_ints(packed):
+    dtype, data = packed
+    zigzag = _unshuffle(data, dtype).astype(np.uint64)
+    return ((zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64))
+
+
+def encode_time(time):
+    """datetime64[ns] 数组 -> 二阶差分编码"""
+    ns = np.asarray(time, dtype='datetime64[ns]').view(np.int64)
+    delta = np.diff(ns)
+    return {
+        'first': int(ns[0]) if len(ns) else 0,
+        'delta': int(delta[0]) if len(delta) else 0,
+        'dod': pack_ints(np.diff(delta)),
+    }
+
+
+def decode_time(encoded, rows):
+    if rows == 0:
+        return np.zeros(0, dtype='datetime64[ns]')
+    delta = np.cumsum(np.concatenate([[encoded['delta']], unpack_ints(encoded['dod'])]))[:rows - 1]
+    ns = np.empty(rows, dtype=np.int64)
+    ns[0] = encoded['first']
+    ns[1:] = encoded['first'] + np.cumsum(delta)
+    return ns.view('datetime64[ns]')
+
+
+def _decimals(values):
+    """有效值都是 10^-d 的整数倍（换算回 float32 完全一致，且没有 -0.0）时返回最小的 d，否则返回 None"""
+    if np.signbit(values[values == 0]).any():
+        # 定点整数没有 -0.0
+        return None
+    wide = values.astype(np.float64)
+    for decimals in range(MAX_DECIMALS + 1):
+        scaled = np.round(wide * 10.0 ** decimals)
+        if np.abs(scaled).max(initial=0) >= 2 ** 53:
+            return None
+        if np.array_equal((scaled / 10.0 ** decimals).astype(np.float32), values):
+            return decimals
+    return None
+
+
+def encode_values(values):
+    """float32 数组（NaN 为缺失）-> 编码（无损）"""
+    values = np.asarray(values, dtype=np.float32)
+    valid = ~np.isnan(values)
+    mask = None if valid.all() else zlib.compress(np.packbits(valid).tobytes(), ZLIB_LEVEL)
+    values = values[valid]
+    decimals = _decimals(values)
+    if decimals is not None:
+        ints = np.round(values.astype(np.float64) * 10.0 ** decimals).astype(np.int64)
+        return {'mask': mask, 'decimals': decimals, 'data': pack_ints(np.diff(ints, prepend=0))}
+    bits = values.view(np.uint32)
+    xor = bits ^ np.concatenate([[0], bits[:-1]]).astype(np.uint32)
+    return {'mask': mask, 'decimals': None, 'data': (xor.dtype.str, _shuffle(xor))}
+
+
+def decode_values(encoded, rows):
+    if encoded['decimals'] is not None:
+        values = (np.cumsum(unpack_ints(encoded['data'])) / 10.0 ** encoded['decimals']).astype(np.float32)
+    else:
+        dtype, data = encoded['data']
+        values = np.bitwise_xor.accumulate(_unshuffle(data, dtype)).view(np.float32)
+    if encoded['mask'] is None:
+        return values
+    valid = np.unpackbits(np.frombuffer(zlib.decompress(encoded['mask']), dtype=np.uint8), count=rows).astype(bool)
+    result = np.full(rows, np.nan, dtype=np.float32)
+    result[valid] = values
+    return result
+
+
+class BlockIndex:
+    """各块的块头：起止时刻、行数和各列的 count/sum/min/max/last（与块对齐的数组）
+
+    查询接口与 monitor.rollup.Rollups 相同（range_stats / envelope），作为解码出的数据集的多级聚合使用。
+    """
+
+    def __init__(self, start, end, rows, stats):
+        self.start = start  # 各块首个时刻
+        self.end = end      # 各块最后一个时刻
+        self.rows = rows
+        self.stats = stats
+
+    def __len__(self):
+        return len(self.start)
+
+    @classmethod
+    def empty(cls):
+        stats = {key: {'count': np.zeros(0, np.int64), 'sum': np.zeros(0), 'min': np.zeros(0, np.float32),
+                       'max': np.zeros(0, np.float32), 'last': np.zeros(0, np.float32)} for key in SENSOR_KEYS}
+        return cls(np.zeros(0, 'datetime64[ns]'), np.zeros(0, 'datetime64[ns]'), np.zeros(0, np.int64), stats)
+
+    def concat(self, other):
+        return BlockIndex(np.concatenate([self.start, other.start]), np.concatenate([self.end, other.end]),
+                          np.concatenate([self.rows, other.rows]),
+                          {key: {stat: np.concatenate([values, other.stats[key][stat]]) for stat, values in s.items()}
+                           for key, s in self.stats.items()})
+
+    def tail(self, i):
+        """从第 i 块起的块头"""
+        return BlockIndex(self.start[i:], self.end[i:], self.rows[i:],
+                          {key: {stat: values[i:] for stat, values in s.items()} for key, s in self.stats.items()})
+
+    def intersecting(self, start, end):
+        """与 [start, end) 相交的块号区间，None 表示不限"""
+        i0 = 0 if start is None else int(np.searchsorted(self.end, start, side='left'))
+        i1 = len(self) if end is None else int(np.searchsorted(self.start, end, side='left'))
+        return i0, max(i0, i1)
+
+    def inside(self, start, end):
+        """完全落在 [start, end) 内的块号区间"""
+        i0 = int(np.searchsorted(self.start, start, side='left'))
+        i1 = int(np.searchsorted(self.end, end, side='left'))
+        return i0, max(i0, i1)
+
+    # ---- 与 Rollups 相同的查询 ----
+
+    def range_stats(self, store, key, start, end):
+        """[start, end) 内该列的 (count, sum, min, max)：完整的块合并块头，两端用原始数据"""
+        i0, i1 = self.inside(start, end)
+        if i0 >= i1:
+            return raw_stats(store, key, start, end)
+        return combine([raw_stats(store, key, start, self.start[i0]), self.block_stats(key, i0, i1),
+                        raw_stats(store, key, self.end[i1 - 1] + np.timedelta64(1, 'ns'), end)])
+
+    def block_stats(self, key, i0, i1):
+        """第 i0 到 i1 块合并的 (count, sum, min, max)"""
+        s = self.stats[key]
+        count = int(s['count'][i0:i1].sum())
+        return (count, float(s['sum'][i0:i1].sum()),
+                float(np.fmin.reduce(s['min'][i0:i1], initial=np.nan)) if count else None,
+                float(np.fmax.reduce(s['max'][i0:i1], initial=np.nan)) if count else None)
+
+    def block_envelope(self, key, i0, i1):
+        """第 i0 到 i1 块的 (时间, 数值)：每块的最小值和最大值（分别记在块的起止时刻）"""
+        s = self.stats[key]
+        keep = s['count'][i0:i1] > 0
+        times = np.column_stack([self.start[i0:i1][keep], self.end[i0:i1][keep]]).ravel()
+        values = np.column_stack([s['min'][i0:i1][keep], s['max'][i0:i1][keep]]).ravel()
+        return times, values
+
+    def envelope(self, store, key, start, end, max_points):
+        """图表用的 (时间, 数值)：范围内完整的块数足够时每块取最小值和最大值，两端取原始数据；
+        块数不够时返回 None（直接用原始数据）"""
+        i0, i1 = self.inside(start, end)
+        if i1 - i0 < max_points // 2:
+            return None
+        times, values = self.block_envelope(key, i0, i1)
+        head = raw_values(store, key, start, self.start[i0])
+        tail = raw_values(store, key, self.end[i1 - 1] + np.timedelta64(1, 'ns'), end)
+        return np.concatenate([head[0], times, tail[0]]), np.concatenate([head[1], values, tail[1]])
+
+    @property
+    def nbytes(self):
+        return (self.start.nbytes + self.end.nbytes + self.rows.nbytes
+                + sum(v.nbytes for s in self.stats.values() for v in s.values()))
+
+
+def _block_cuts(time, rows, block_rows):
+    """前 rows 行（rows < len(time)）分块的边界 [0, ..., 封块的行数]：每块约 block_rows 行，
+    同一时刻的行不跨块，不足一块的行不封块"""
+    cuts = np.arange(block_rows, rows + 1, block_rows)
+    cuts = np.searchsorted(time, time[cuts], side='left')
+    return np.unique(np.concatenate([[0], cuts]))
+
+
+def encode_blocks(time, columns, cuts):
+    """按 cuts 分块编码，返回 (块列表, 块头)"""
+    starts, ends = cuts[:-1], cuts[1:]
+    blocks = []
+    for lo, hi in zip(starts.tolist(), ends.tolist()):
+        block = {
+            'id': next(_block_ids),
+            'rows': hi - lo,
+            'time': encode_time(time[lo:hi]),
+            'columns': {key: encode_values(values[lo:hi]) for key, values in columns.items()},
+        }
+        block['nbytes'] = 16 + len(block['time']['dod'][1]) + sum(
+            len(c['data'][1]) + len(c['mask'] or b'') for c in block['columns'].values())
+        blocks.append(block)
+    n = int(cuts[-1])
+    stats = row_stats(starts, {key: values[:n] for key, values in columns.items()})
+    return blocks, BlockIndex(np.asarray(time[starts]), np.asarray(time[ends - 1]), np.diff(cuts).astype(np.int64), stats)
+
+
+def decode_block(block):
+    """-> (时间, {列键: 数值})"""
+    rows = block['rows']
+    return decode_time(block['time'], rows), {key: decode_values(c, rows) for key, c in block['columns'].items()}
+
+
+class CompressedStore:
+    """较早的数据按块压缩、最近 hot_window 内的数据不压缩的只读数据集
+
+    对外用法与整个数据集的 SensorStore 相同的部分：len / first_date / latest_date / append / between / last；
+    between / last 返回解码后的普通 SensorStore；整个数据集和较大的范围返回按需解码的 CompressedRange。
+    """
+
+    def __init__(self, blocks, index, hot, hot_window, block_rows=BLOCK_ROWS, cache_bytes=None):
+        self.blocks = blocks
+        self.index = index
+        self.hot = hot
+        self.hot_window = hot_window
+        self.block_rows = block_rows
+        self.compressed_bytes = sum(block['nbytes'] for block in blocks)
+        self.sealed_rows = int(index.rows.sum())
+        self.compacted_until = None  # 与 SensorStore 相同的属性：不含聚合桶
+        self.cache_bytes = cache_bytes  # 解码结果的缓存容量，None 表示按数据集大小（见 CACHE_RATIO）
+        self._ranges = LRUCache(cache_bytes if cache_bytes is not None else
+                                max(int(self.nbytes * CACHE_RATIO), CACHE_MIN_BYTES))
+
+    @classmethod
+    def from_store(cls, store, hot_window, block_rows=BLOCK_ROWS, cache_bytes=None):
+        """由 SensorStore 生成：早于最后时刻 - hot_window 的行整块压缩"""
+        return cls._seal([], BlockIndex.empty(), store, hot_window, block_rows, cache_bytes)
+
+    @classmethod
+    def _seal(cls, blocks, index, hot, hot_window, block_rows, cache_bytes):
+        if len(hot):
+            rows = int(np.searchsorted(hot.time, hot.time[-1] - hot_window, side='left'))
+            cuts = _block_cuts(hot.time, rows, block_rows)
+            if len(cuts) > 1:
+                new_blocks, new_index = encode_blocks(hot.time, hot.columns, cuts)
+                blocks = blocks + new_blocks
+                index = index.concat(new_index)
+                # 复制剩下的行，不再引用原数组（可能是整个数据集）
+                n = int(cuts[-1])
+                hot = SensorStore(hot.time[n:].copy(), {key: values[n:].copy() for key, values in hot.columns.items()},
+                                  assume_sorted=True)
+        return cls(blocks, index, hot, hot_window, block_rows, cache_bytes)
+
+    def append(self, other):
+        """返回追加了 other 各行的新数据集（已压缩的块共用，缓存容量的设置不变）；新行早于已有数据时整体重建"""
+        if len(other) == 0:
+            return self
+        cache_bytes = self.cache_bytes
+        if len(self) and other.time[0] < self.last_time:
+            return CompressedStore.from_store(self.to_store().append(other), self.hot_window, self.block_rows, cache_bytes)
+        return CompressedStore._seal(self.blocks, self.index, self.hot.append(other), self.hot_window, self.block_rows,
+                                     cache_bytes)
+
+    def split(self, cut):
+        """(早于 cut 的行解码为 SensorStore, 其余行的 CompressedStore)：之后的块共用，
+        跨 cut 的块只重新编码 cut 之后的部分；用于按保留策略聚合较早的数据"""
+        cut = np.datetime64(cut, 'ns')
+        older = self._decode(None, cut)
+        i0, _ = self.index.intersecting(cut, None)
+        blocks, index = self.blocks[i0:], self.index.tail(i0)
+        if len(index) and index.start[0] < cut:
+            time, columns = decode_block(blocks[0])
+            lo = int(np.searchsorted(time, cut, side='left'))
+            head, head_index = encode_blocks(time[lo:], {key: values[lo:] for key, values in columns.items()},
+                                             np.array([0, len(time) - lo]))
+            blocks, index = head + blocks[1:], head_index.concat(index.tail(1))
+        hot = self.hot
+        if len(hot) and hot.time[0] < cut:
+            lo, _ = hot.range_index(cut)
+            hot = SensorStore(hot.time[lo:].copy(), {key: values[lo:].copy() for key, values in hot.columns.items()},
+                              assume_sorted=True)
+        newer = CompressedStore(blocks, index, hot, self.hot_window, self.block_rows, self.cache_bytes)
+        return SensorStore(older.time, older.columns, assume_sorted=True), newer
+
+    def __len__(self):
+        return self.sealed_rows + len(self.hot)
+
+    @property
+    def nbytes(self):
+        """常驻内存：压缩的块 + 块头 + 未压缩部分（不含解码结果的缓存）"""
+        return self.compressed_bytes + self.index.nbytes + self.hot.nbytes
+
+    @property
+    def raw_nbytes(self):
+        """不压缩时的大小"""
+        return len(self) * RAW_ROW_BYTES
+
+    @property
+    def cache_nbytes(self):
+        return self._ranges.nbytes
+
+    def limit_cache(self, max_bytes):
+        """解码结果的缓存容量设为 max_bytes（追加后的新数据集沿用）"""
+        self.cache_bytes = max_bytes
+        self._ranges.resize(max_bytes)
+
+    @property
+    def first_time(self):
+        if len(self.index):
+            return self.index.start[0]
+        return self.hot.time[0] if len(self.hot) else None
+
+    @property
+    def last_time(self):
+        if len(self.hot):
+            return self.hot.time[-1]
+        return self.index.end[-1] if len(self.index) else None
+
+    def first_date(self):
+        return None if self.first_time is None else self.first_time.astype('datetime64[D]').item()
+
+    def latest_date(self):
+        return None if self.last_time is None else self.last_time.astype('datetime64[D]').item()
+
+    def chunks(self, start=None):
+        """逐块解码，依次返回各块和未压缩部分（SensorStore），跳过早于 start 的块；
+        用于写入磁盘缓存、并入在线统计等不需要整体解码的场合"""
+        i0, _ = self.index.intersecting(start, None)
+        for block in self.blocks[i0:]:
+            time, columns = decode_block(block)
+            yield SensorStore(time, columns, assume_sorted=True)
+        yield self.hot
+
+    def to_store(self):
+        """整体解码为 SensorStore（不缓存）"""
+        return self._decode(None, None)
+
+    def between(self, start=None, end=None):
+        """时间在 [start, end) 内的数据，按范围缓存：整个数据集或解码后超过 MATERIALIZE_BYTES 时
+        返回按需解码的 CompressedRange，否则只解码与范围相交的块，返回 SensorStore"""
+        start = None if start is None else np.datetime64(start, 'ns')
+        end = None if end is None else np.datetime64(end, 'ns')
+        store = self._ranges.get((start, end))
+        if store is None:
+            i0, i1 = self.index.intersecting(start, end)
+            lo, hi = self.hot.range_index(start, end)
+            rows = int(self.index.rows[i0:i1].sum()) + hi - lo
+            if (start is None and end is None) or rows * RAW_ROW_BYTES > min(MATERIALIZE_BYTES, self._ranges.max_bytes):
+                store = CompressedRange(self, start, end)
+            else:
+                store = self._decode(start, end)
+            self._ranges.put((start, end), store, store.nbytes)
+        return store
+
+    def last(self, window):
+        """最近 window（timedelta64）时间内的数据，以整个数据集的最后时刻为终点"""
+        if len(self) == 0:
+            return self.hot
+        return self.between(self.last_time - window)
+
+    def _decode(self, start, end):
+        i0, i1 = self.index.intersecting(start, end)
+        parts = [decode_block(block) for block in self.blocks[i0:i1]]
+        lo, hi = self.hot.range_index(start, end)
+        time = np.concatenate([p[0] for p in parts] + [self.hot.time[lo:hi]])
+        columns = {key: np.concatenate([p[1][key] for p in parts] + [self.hot.columns[key][lo:hi]])
+                   for key in SENSOR_KEYS}
+        # 两端的块只取范围内的行
+        lo = 0 if start is None else int(np.searchsorted(time, start, side='left'))
+        hi = len(time) if end is None else int(np.searchsorted(time, end, side='left'))
+        if lo > 0 or hi < len(time):
+            time, columns = time[lo:hi], {key: values[lo:hi] for key, values in columns.items()}
+        # 统计和图表用块头代替多级聚合；数据量小时直接扫描
+        rollups = self.index if i1 > i0 and hi - lo >= ROLLUP_MIN_ROWS else None
+        return SensorStore(time, columns, assume_sorted=True, rollups=rollups)
+
+
+class CompressedRange:
+    """CompressedStore 中 [start, end) 内数据的按需解码视图（只读）
+
+    由三类片段组成：两端与范围部分相交的块（解码后只取范围内的行）、中间完整的块（不解码）、
+    未压缩部分的子集。查询接口与 SensorStore 相同的部分：len / totals / summary / pooled_mean / latest /
+    latest_time / valid（取最近 N 个点）/ decimated_since / between / last / chunks / rows / derived；
+    统计和图表取自块头，不需要整体解码。
+    """
+
+    def __init__(self, store, start, end):
+        self._store = store
+        self.start = start
+        self.end = end
+        # 与 SensorStore 相同的属性：不含聚合桶，不是其他数据集的子集
+        self.compacted_until = None
+        self._parent = None
+        self._derived = {}
+        index = store.index
+        i0, i1 = index.intersecting(start, end)
+        head = tail = None
+        if i0 < i1 and start is not None and index.start[i0] < start:
+            head, i0 = self._decode_rows(i0), i0 + 1
+        if i0 < i1 and end is not None and index.end[i1 - 1] >= end:
+            tail, i1 = self._decode_rows(i1 - 1), i1 - 1
+        # 片段：SensorStore 或 (起始块号, 结束块号)
+        segments = [head, (i0, i1) if i0 < i1 else None, tail, store.hot.between(start, end)]
+        self._segments = [part for part in segments if part is not None and (isinstance(part, tuple) or len(part))]
+        self._rows = [self._segment_rows(part) for part in self._segments]
+        # 两端解码的块（未压缩部分与整个数据集共用内存）
+        self.nbytes = sum(part.nbytes for part in (head, tail) if part is not None)
+
+    def _decode_rows(self, i):
+        """第 i 块解码后范围内的行"""
+        time, columns = decode_block(self._store.blocks[i])
+        lo = 0 if self.start is None else int(np.searchsorted(time, self.start, side='left'))
+        hi = len(time) if self.end is None else int(np.searchsorted(time, self.end, side='left'))
+        return SensorStore(time[lo:hi], {key: values[lo:hi] for key, values in columns.items()}, assume_sorted=True)
+
+    def _segment_rows(self, part):
+        if isinstance(part, tuple):
+            return int(self._store.index.rows[part[0]:part[1]].sum())
+        return len(part)
+
+    def _decode_blocks(self, i0, i1):
+        """第 i0 到 i1 块整体解码为 SensorStore"""
+        parts = [decode_block(block) for block in self._store.blocks[i0:i1]]
+        return SensorStore(np.concatenate([p[0] for p in parts]),
+                           {key: np.concatenate([p[1][key] for p in parts]) for key in SENSOR_KEYS},
+                           assume_sorted=True)
+
+    def __len__(self):
+        return sum(self._rows)
+
+    def derived(self, name, compute):
+        """按名称缓存由本范围计算出的结果"""
+        if name not in self._derived:
+            self._derived[name] = compute(self)
+        return self._derived[name]
+
+    @property
+    def first_time(self):
+        if not self._segments:
+            return None
+        part = self._segments[0]
+        return self._store.index.start[part[0]] if isinstance(part, tuple) else part.time[0]
+
+    @property
+    def last_time(self):
+        if not self._segments:
+            return None
+        part = self._segments[-1]
+        return self._store.index.end[part[1] - 1] if isinstance(part, tuple) else part.time[-1]
+
+    def first_date(self):
+        return None if self.first_time is None else self.first_time.astype('datetime64[D]').item()
+
+    def latest_date(self):
+        return None if self.last_time is None else self.last_time.astype('datetime64[D]').item()
+
+    # ---- 统计：完整的块取自块头 ----
+
+    def totals(self, key):
+        """该列有效值的 (count, sum, min, max)"""
+        index = self._store.index
+        return combine([index.block_stats(key, *part) if isinstance(part, tuple) else part.totals(key)
+                        for part in self._segments])
+
+    def summary(self, key):
+        count, total, low, high = self.totals(key)
+        if count == 0:
+            return None
+        return {'latest': self.latest(key), 'mean': total / count, 'max': high, 'min': low}
+
+    def pooled_mean(self, keys):
+        count = total = 0
+        for key in keys:
+            key_count, key_total, _, _ = self.totals(key)
+            count += key_count
+            total += key_total
+        return total / count if count else None
+
+    def valid_count(self, key):
+        return self.totals(key)[0]
+
+    def has_data(self, key):
+        return self.valid_count(key) > 0
+
+    def _latest_block(self, key, part):
+        """片段中最后一个有该列读数的块号，没有时返回 None"""
+        counts = self._store.index.stats[key]['count'][part[0]:part[1]]
+        found = np.flatnonzero(counts)
+        return part[0] + int(found[-1]) if len(found) else None
+
+    def latest(self, key):
+        """最新有效值（完整的块取自块头的最后一个值），没有数据时返回 None"""
+        for part in reversed(self._segments):
+            if isinstance(part, tuple):
+                i = self._latest_block(key, part)
+                if i is not None:
+                    return float(self._store.index.stats[key]['last'][i])
+            elif part.has_data(key):
+                return part.latest(key)
+        return None
+
+    def latest_time(self, key):
+        """最新有效值的时刻（只解码该值所在的块），没有数据时返回 None"""
+        for part in reversed(self._segments):
+            if isinstance(part, tuple):
+                i = self._latest_block(key, part)
+                if i is not None:
+                    return self._decode_blocks(i, i + 1).latest_time(key)
+            elif part.has_data(key):
+                return part.latest_time(key)
+        return None
+
+    def unique_dates(self):
+        days = [np.unique(time.astype('datetime64[D]')) for time in self.times()]
+        return len(np.unique(np.concatenate(days))) if days else 0
+
+    # ---- 读取数据：只解码需要的块 ----
+
+    def valid(self, key, recent_points=None):
+        """(时间, 数值)，只包含有效值；recent_points 限定为最近 N 个（从末尾起逐块解码，够数即止）"""
+        parts = []
+        found = 0
+        for chunk in self._reversed_chunks():
+            times, values = chunk.valid(key)
+            parts.append((times, values))
+            found += len(values)
+            if recent_points is not None and found >= recent_points:
+                break
+        if not parts:
+            return np.zeros(0, dtype='datetime64[ns]'), np.zeros(0, dtype=np.float32)
+        times = np.concatenate([p[0] for p in reversed(parts)])
+        values = np.concatenate([p[1] for p in reversed(parts)])
+        if recent_points is not None:
+            times, values = times[-recent_points:], values[-recent_points:]
+        return times, values
+
+    def decimated_since(self, key, window, max_points):
+        """最近 window 时间内的有效值降到约 max_points 个点：完整的块取每块的最小值和最大值，其余取原始数据"""
+        start = self.last_time - window
+        subset = self if start <= self.first_time else self.between(start)
+        if not isinstance(subset, CompressedRange):
+            return subset.decimated_since(key, window, max_points)
+        index = self._store.index
+        parts = [index.block_envelope(key, *part) if isinstance(part, tuple) else part.valid(key)
+                 for part in subset._segments]
+        if not parts:
+            return minmax_decimate(np.zeros(0, dtype='datetime64[ns]'), np.zeros(0, dtype=np.float32), max_points)
+        return minmax_decimate(np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]), max_points)
+
+    def between(self, start=None, end=None):
+        """范围内 [start, end) 的数据（由所属的 CompressedStore 按范围缓存）"""
+        start = self.start if start is None else np.datetime64(start, 'ns')
+        end = self.end if end is None else np.datetime64(end, 'ns')
+        if self.start is not None:
+            start = max(start, self.start)
+        if self.end is not None:
+            end = min(end, self.end)
+        if start == self.start and end == self.end:
+            return self
+        return self._store.between(start, end)
+
+    def last(self, window):
+        if len(self) == 0:
+            return self
+        return self.between(self.last_time - window)
+
+    def chunks(self, start=None):
+        """按时间顺序分块返回 SensorStore（完整的块每 CHUNK_ROWS 行左右合并解码），跳过早于 start 的部分"""
+        index = self._store.index
+        for part in self._segments:
+            if not isinstance(part, tuple):
+                if start is None or part.time[-1] >= start:
+                    yield part
+                continue
+            i0, i1 = part
+            if start is not None:
+                i0 = max(i0, int(np.searchsorted(index.end, start, side='left')))
+            first, rows = i0, 0
+            for i in range(i0, i1):
+                rows += int(index.rows[i])
+                if rows >= CHUNK_ROWS or i == i1 - 1:
+                    yield self._decode_blocks(first, i + 1)
+                    first, rows = i + 1, 0
+
+    def _reversed_chunks(self):
+        """从末尾起逐块（单个块）解码"""
+        for part in reversed(self._segments):
+            if isinstance(part, tuple):
+                for i in range(part[1] - 1, part[0] - 1, -1):
+                    yield self._decode_blocks(i, i + 1)
+            else:
+                yield part
+
+    def times(self):
+        """按时间顺序分块返回时间数组（只解码时间）"""
+        for part in self._segments:
+            if isinstance(part, tuple):
+                for block in self._store.blocks[part[0]:part[1]]:
+                    yield decode_time(block['time'], block['rows'])
+            else:
+                yield part.time
+
+    def rows(self, lo, hi):
+        """第 [lo, hi) 行（范围内的行号），只解码涉及的块"""
+        parts = []
+        offset = 0
+        index = self._store.index
+        for part, rows in zip(self._segments, self._rows):
+            a, b = max(lo - offset, 0), min(hi - offset, rows)
+            if a < b:
+                if isinstance(part, tuple):
+                    # 片段内的行号 -> 块号，只解码涉及的块
+                    ends = np.cumsum(index.rows[part[0]:part[1]])
+                    j0 = int(np.searchsorted(ends, a, side='right'))
+                    j1 = int(np.searchsorted(ends, b - 1, side='right')) + 1
+                    skipped = int(ends[j0 - 1]) if j0 else 0
+                    part = self._decode_blocks(part[0] + j0, part[0] + j1)
+                    a, b = a - skipped, b - skipped
+                parts.append((part.time[a:b], {key: values[a:b] for key, values in part.columns.items()}))
+            offset += rows
+        if not parts:
+            return SensorStore(np.zeros(0, dtype='datetime64[ns]'), {})
+        return SensorStore(np.concatenate([p[0] for p in parts]),
+                           {key: np.concatenate([p[1][key] for p in parts]) for key in SENSOR_KEYS}, assume_sorted=True)
+
+    def to_store(self):
+        """整体解码为 SensorStore（不缓存，统计和图表仍用块头）"""
+        return self._store._decode(self.start, self.end)
@@ -0,0 +1,292 @@
+"""传感器之间的滚动相关和滞后相关
+
+数据按行切成每 block_rows 行一块（按采样间隔换算成约 BLOCK_SECONDS 一块，块数不超过 MAX_BLOCKS），
+每块用一次批量矩阵乘法（块数据是 (块数, 行数, 列数) 的步长视图）得到 12 列两两之间的充分统计量：
+两列同时有效的行数、各自的和与平方和、乘积和（缺失值按 0 参与，只在两列同时有效的行上累计）。之后：
+
+- 任意范围的相关矩阵：范围内完整块的统计量相加，两端不足一块的行直接计算，O(块数)
+- 滚动相关：块统计量的前缀和相减，每个窗口 O(1)，窗口每次滑动一块
+- 滞后相关：块均值序列用 sliding_window_view 一次取出各滞后的对齐序列，向量化计算
+- 数据追加时只重算最后一个不完整块及之后的块
+
+块统计量随最上层的数据集缓存（数据集释放时一起释放），分析结果由页面按
+(数据版本, 时间范围, 窗口) 通过 store.derived 缓存。
+"""
+import threading
+import weakref
+
+import numpy as np
+
+from monitor import quality
+from monitor.store import SENSOR_KEYS
+
+BLOCK_SECONDS = 3600
+MAX_BLOCKS = 10_000
+# 每次批量矩阵乘法处理的行数（限制临时内存，至少一块）
+BATCH_ROWS = 1 << 18
+# 共同有效的样本少于这个数量时相关系数记为 NaN
+MIN_SAMPLES = 3
+
+_K = len(SENSOR_KEYS)
+_cache = weakref.WeakKeyDictionary()
+_latest = None  # 最近一次计算的 (数据集弱引用, Blocks)，数据追加后由此增量更新
+_lock = threading.Lock()
+
+
+class Blocks:
+    """每块的统计量：n / sx / sxx / sxy 形状均为 (块数, 列数, 列数)
+
+    n[b, i, j]: 第 i、j 列同时有效的行数；sx[b, i, j]: 这些行上第 i 列的和；
+    sxx[b, i, j]: 这些行上第 i 列的平方和；sxy[b, i, j]: 这些行上两列的乘积和。
+    数值先减去每列的 offset 再累计，减少相减时的精度损失。
+    """
+
+    def __init__(self, block_rows, offset, start, n, sx, sxx, sxy, rows):
+        self.block_rows = block_rows
+        self.offset = offset
+        self.start = start  # 各块第一行的时刻
+        self.n = n
+        self.sx = sx
+        self.sxx = sxx
+        self.sxy = sxy
+        self.rows = rows    # 覆盖的行数（最后一块可能不完整）
+
+    def __len__(self):
+        return len(self.start)
+
+    @classmethod
+    def build(cls, store, block_rows=None, offset=None):
+        if block_rows is None:
+            block_rows = _block_rows(store)
+        if offset is None:
+            offset = np.array([np.nan_to_num(store.latest(key) or 0.0) for key in SENSOR_KEYS])
+        n, sx, sxx, sxy, start = _block_stats(store, 0, len(store), block_rows, offset)
+        return cls(block_rows, offset, start, n, sx, sxx, sxy, len(store))
+
+    def extend(self, store):
+        """store 是在已覆盖的行后追加了新行的数据集：保留完整块，重算最后一个不完整块及之后的块"""
+        keep = self.rows // self.block_rows
+        lo = keep * self.block_rows
+        n, sx, sxx, sxy, start = _block_stats(store, lo, len(store), self.block_rows, self.offset)
+        return Blocks(self.block_rows, self.offset, np.concatenate([self.start[:keep], start]),
+                      np.concatenate([self.n[:keep], n]), np.concatenate([self.sx[:keep], sx]),
+                      np.concatenate([self.sxx[:keep], sxx]), np.concatenate([self.sxy[:keep], sxy]), len(store))
+
+    @property
+    def nbytes(self):
+        return self.n.nbytes + self.sx.nbytes + self.sxx.nbytes + self.sxy.nbytes
+
+    def block_seconds(self, store):
+        """每块平均覆盖的时间（秒）"""
+        if len(store) < 2:
+            return 0.0
+        return (store.last_time - store.first_time) / np.timedelta64(1, 's') / max(len(store) - 1, 1) * self.block_rows
+
+
+def _block_rows(store):
+    expected = quality.cadence(store.rows(0, min(len(store), 100_000)).time)
+    seconds = expected / np.timedelta64(1, 's') if expected is not None else BLOCK_SECONDS
+    return max(1, int(round(BLOCK_SECONDS / max(seconds, 1e-9))), -(-len(store) // MAX_BLOCKS))
+
+
+def _matrix(rows, offset):
+    """rows（store.rows 的结果）的 (数值, 有效掩码)，形状 (行数, 列数)，缺失值为 0"""
+    values = np.empty((len(rows), _K), dtype=np.float64)
+    for i, key in enumerate(SENSOR_KEYS):
+        values[:, i] = rows.columns[key]
+    values -= offset
+    mask = ~np.isnan(values)
+    values[~mask] = 0.0
+    return values, mask.astype(np.float64)
+
+
+def _block_stats(store, lo, hi, block_rows, offset):
+    """[lo, hi) 行按每 block_rows 行一块的统计量（最后一块可不完整）和各块第一行的时刻；
+    每批只取出（压缩的数据集只解码）这一批的行"""
+    blocks = -(-(hi - lo) // block_rows)
+    n = np.zeros((blocks, _K, _K))
+    sx, sxx, sxy = np.zeros_like(n), np.zeros_like(n), np.zeros_like(n)
+    start = np.empty(blocks, dtype='datetime64[ns]')
+    batch = max(1, BATCH_ROWS // block_rows)
+    for b0 in range(0, blocks, batch):
+        b1 = min(blocks, b0 + batch)
+        r0, r1 = lo + b0 * block_rows, min(hi, lo + b1 * block_rows)
+        rows = store.rows(r0, r1)
+        start[b0:b1] = rows.time[::block_rows]
+        values, mask = _matrix(rows, offset)
+        pad = (b1 - b0) * block_rows - (r1 - r0)
+        if pad:
+            values = np.concatenate([values, np.zeros((pad, _K))])
+            mask = np.concatenate([mask, np.zeros((pad, _K))])
+        # (块数, 行数, 列数) 的视图，转置后批量矩阵乘法
+        x = values.reshape(b1 - b0, block_rows, _K)
+        m = mask.reshape(b1 - b0, block_rows, _K)
+        xt, mt = x.transpose(0, 2, 1), m.transpose(0, 2, 1)
+        n[b0:b1] = mt @ m
+        sx[b0:b1] = xt @ m
+        sxx[b0:b1] = (xt * xt) @ m
+        sxy[b0:b1] = xt @ x
+    return n, sx, sxx, sxy, start
+
+
+def _root(store):
+    """(最上层的数据集, store 在其中的起始行号)"""
+    lo = 0
+    while store._parent is not None:
+        parent = store._parent[0]()
+        if parent is None:
+            break
+        lo += store._parent[1]
+        store = parent
+    return store, lo
+
+
+def _appended(previous, old, root):
+    """root 是否由 previous 追加新行而来（与 CsvSource 的增量刷新相同，只比较时间）"""
+    return (previous is not None and previous is not root and 0 < old.rows < len(root)
+            and previous.first_time == root.first_time
+            and previous.rows(old.rows - 1, old.rows).time[0] == root.rows(old.rows - 1, old.rows).time[0])
+
+
+def blocks(store):
+    """(块统计量, 最上层的数据集, store 在其中的起始行号)：按最上层的数据集缓存，
+    由上一个版本追加而来时增量更新"""
+    global _latest
+    root, lo = _root(store)
+    with _lock:
+        result = _cache.get(root)
+        if result is None:
+            previous, old = (_latest[0](), _latest[1]) if _latest else (None, None)
+            result = old.extend(root) if _appended(previous, old, root) else Blocks.build(root)
+            _cache[root] = result
+            _latest = (weakref.ref(root), result)
+    return result, root, lo
+
+
+# ---- 由统计量计算相关系数 ----
+
+def _corr(n, sx, sxx, sxy):
+    """由（若干块相加后的）统计量计算相关矩阵，形状与输入相同（最后两维为列）"""
+    sy = np.swapaxes(sx, -1, -2)
+    syy = np.swapaxes(sxx, -1, -2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sxy - sx * sy
+        var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        r = cov / np.sqrt(var)
+    r[(n < MIN_SAMPLES) | ~(var > 0)] = np.nan
+    return np.clip(r, -1, 1)
+
+
+def _range_blocks(b, lo, hi):
+    """[lo, hi) 行内完整块的块号区间和两端不足一块的行区间"""
+    first = -(-lo // b.block_rows)
+    last = hi // b.block_rows
+    if first >= last:
+        return first, first, [(lo, hi)]
+    return first, last, [(lo, first * b.block_rows), (last * b.block_rows, hi)]
+
+
+def matrix(store):
+    """数据集（可以是时间范围子集）上 12 列两两之间的相关矩阵"""
+    b, root, lo = blocks(store)
+    hi = lo + len(store)
+    first, last, edges = _range_blocks(b, lo, hi)
+    totals = [b.n[first:last].sum(axis=0), b.sx[first:last].sum(axis=0),
+              b.sxx[first:last].sum(axis=0), b.sxy[first:last].sum(axis=0)]
+    for r0, r1 in edges:
+        if r1 > r0:
+            for total, part in zip(totals, _block_stats(root, r0, r1, r1 - r0, b.offset)[:4]):
+                total += part[0]
+    return _corr(*totals)
+
+
+def rolling(store, window_blocks, target):
+    """范围内完整块上、窗口为 window_blocks 块的滚动相关：(各窗口结束时刻, (窗口数, 列数) 与 target 的相关)"""
+    b, root, lo = blocks(store)
+    first, last, _ = _range_blocks(b, lo, lo + len(store))
+    if last - first < window_blocks:
+        return np.zeros(0, dtype='datetime64[ns]'), np.zeros((0, _K))
+    t = SENSOR_KEYS.index(target)
+    sums = []
+    for stat in (b.n, b.sx, b.sxx, b.sxy):
+        pair = np.stack([stat[first:last, :, t], stat[first:last, t, :]], axis=-1)  # (块数, 列数, 2)
+        prefix = np.concatenate([np.zeros((1,) + pair.shape[1:]), np.cumsum(pair, axis=0)])
+        sums.append(prefix[window_blocks:] - prefix[:-window_blocks])
+    n, sx, sxx, sxy = sums
+    # [..., 0] 为 (i, target)，[..., 1] 为 (target, i)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n[..., 0] * sxy[..., 0] - sx[..., 0] * sx[..., 1]
+        var = (n[..., 0] * sxx[..., 0] - sx[..., 0] ** 2) * (n[..., 0] * sxx[..., 1] - sx[..., 1] ** 2)
+        r = cov / np.sqrt(var)
+    r[(n[..., 0] < MIN_SAMPLES) | ~(var > 0)] = np.nan
+    ends = b.start[first + window_blocks - 1:last]
+    return ends, np.clip(r, -1, 1)
+
+
+def lagged(store, target, max_lag=None):
+    """块均值序列上各列领先 target 0..max_lag 块时的相关：(列数, max_lag + 1)"""
+    b, root, lo = blocks(store)
+    first, last, _ = _range_blocks(b, lo, lo + len(store))
+    count = np.diagonal(b.n[first:last], axis1=1, axis2=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.diagonal(b.sx[first:last], axis1=1, axis2=2) / count  # (块数, 列数)
+    if max_lag is None:
+        max_lag = max(0, min(24, len(means) // 4))
+    lags = np.full((_K, max_lag + 1), np.nan)
+    if len(means) <= max_lag + MIN_SAMPLES:
+        return lags
+    y = means[max_lag:, SENSOR_KEYS.index(target)]
+    for i in range(_K):
+        # windows[t, j] = x[t + j]；第 max_lag - k 列与 y[t] 对齐时 x 领先 k 块
+        windows = np.lib.stride_tricks.sliding_window_view(means[:, i], max_lag + 1)[:, ::-1]
+        lags[i] = _nan_corr(windows, y[:, None])
+    return lags
+
+
+def _nan_corr(x, y):
+    """按列计算 x 与 y 的相关（只用两者都有效的行）"""
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    n = valid.sum(axis=0)
+    x, y = np.where(valid, x, 0.0), np.where(valid, y, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx, my = x.sum(axis=0) / n, y.sum(axis=0) / n
+        cov = (x * y).sum(axis=0) / n - mx * my
+        var = ((x * x).sum(axis=0) / n - mx * mx) * ((y * y).sum(axis=0) / n - my * my)
+        r = cov / np.sqrt(var)
+    r[(n < MIN_SAMPLES) | ~(var > 0)] = np.nan
+    return np.clip(r, -1, 1)
+
+
+def analysis(store, window, target='PUE', top=5):
+    """相关性分析页面所需的全部结果（字典），window 为滚动窗口（timedelta64，按块数取整，至少 2 块）
+
+    matrix: 相关矩阵；rolling_time / rolling: 与 target 的滚动相关；lags: 滞后相关；
+    drivers: 按最强（任意滞后下绝对值最大）相关排序的前 top 个列
+    [{'key', 'corr', 'lag', 'lag_corr', 'recent'}, ...]（lag 为块数）；
+    block_seconds: 每块的时间（秒）；window_blocks: 滚动窗口的块数
+    """
+    b, root, _ = blocks(store)
+    block_seconds = b.block_seconds(root)
+    window_blocks = max(2, int(round(window / np.timedelta64(1, 's') / block_seconds))) if block_seconds else 2
+    corr = matrix(store)
+    ends, roll = rolling(store, window_blocks, target)
+    lags = lagged(store, target)
+    t = SENSOR_KEYS.index(target)
+    drivers = []
+    for i, key in enumerate(SENSOR_KEYS):
+        if i == t:
+            continue
+        best = int(np.nanargmax(np.abs(lags[i]))) if not np.all(np.isnan(lags[i])) else 0
+        recent = roll[:, i][~np.isnan(roll[:, i])]
+        drivers.append({'key': key, 'corr': corr[i, t], 'lag': best, 'lag_corr': lags[i, best],
+                        'recent': recent[-1] if len(recent) else np.nan})
+    drivers.sort(key=lambda d: np.nan_to_num(np.nanmax([abs(d['corr']), abs(d['lag_corr']), -1.0])), reverse=True)
+    return {
+        'matrix': corr,
+        'rolling_time': ends,
+        'rolling': roll,
+        'lags': lags,
+        'drivers': drivers[:top],
+        'block_seconds': block_seconds,
+        'window_blocks': window_blocks,
+    }
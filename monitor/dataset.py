@@ -0,0 +1,36 @@
+"""进程内共享的数据集版本
+
+整个进程只保留一个当前版本的 SensorStore（数组只读），新数据到达时整体替换并递增版本号。
+会话只记录版本号，每次执行时取当前版本；旧版本在没有执行中的页面引用后即被回收，
+内存不随会话数增长。
+"""
+import threading
+
+
+class SharedDataset:
+    """(版本号, 数据集) 的原子替换"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 读取不加锁：单个属性的赋值是原子的，读到的版本号和数据集总是配对的
+        self._current = (0, None)
+
+    def current(self):
+        """返回 (版本号, 数据集)，尚未加载时为 (0, None)"""
+        return self._current
+
+    @property
+    def version(self):
+        return self._current[0]
+
+    def get(self):
+        return self._current[1]
+
+    def publish(self, store):
+        """发布新版本，返回版本号；与当前是同一个数据集时不递增"""
+        with self._lock:
+            version, current = self._current
+            if store is not current:
+                version += 1
+                self._current = (version, store)
+            return version
@@ -0,0 +1,169 @@
+"""解析结果的本地磁盘缓存
+
+每个数据集按内容摘要存一个目录，每列一个 .npy 文件，启动时以内存映射方式打开，
+不需要网络，也不需要重新解析 CSV：
+
+    <cache_dir>/v<格式版本>-<digest>/time.npy, ZJFTemp.npy, ...
+    <cache_dir>/v<格式版本>-<digest>/tiers.npz   # 按保留策略聚合过的数据集的各级桶（time.npy 等只有原始数据部分）
+    <cache_dir>/sources/<url摘要>.json          # 数据源最近一次快照的摘要与校验信息
+
+目录名带格式版本：解析或存储格式改变后旧缓存不再命中（由 _prune 清理），不会读出按旧规则解析的数据。
+数据集每次命中或写入时更新目录的修改时间，_prune 按修改时间只保留最近使用的若干个。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from monitor import ingest
+from monitor.compressed import CompressedStore
+from monitor.retention import RetainedStore
+from monitor.store import SENSOR_KEYS, SensorStore
+
+TIERS_FILE = 'tiers.npz'
+# 缓存格式版本：CSV 解析规则（parse_csv / ingest）或列文件格式改变时加一
+FORMAT_VERSION = 1
+
+
+def content_digest(data):
+    """CSV 内容摘要"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def chained_digest(digest, appended):
+    """在已有摘要上追加新内容后的摘要"""
+    return hashlib.sha256(digest.encode() + appended).hexdigest()
+
+
+class DiskCache:
+    """按内容摘要存取数据集：压缩存储解码后写入，读取时是内存映射的 SensorStore；
+    按保留策略聚合过的数据集另存各级桶，读取时恢复为 RetainedStore（原始数据部分内存映射）"""
+
+    def __init__(self, cache_dir, max_entries=3):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, digest):
+        return os.path.join(self.cache_dir, f'v{FORMAT_VERSION}-{digest}')
+
+    @staticmethod
+    def _touch(entry):
+        """标记为最近使用，_prune 不会删除正在使用的数据集"""
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+    def _source_file(self, url):
+        name = hashlib.sha1(url.encode()).hexdigest() + '.json'
+        return os.path.join(self.cache_dir, 'sources', name)
+
+    # ---- 数据集 ----
+
+    def load(self, digest):
+        """以内存映射方式打开缓存的数据集，不存在或已损坏时返回 None"""
+        entry = self._entry_dir(digest)
+        try:
+            time = np.load(os.path.join(entry, 'time.npy'), mmap_mode='r')
+            columns = {key: np.load(os.path.join(entry, f'{key}.npy'), mmap_mode='r') for key in SENSOR_KEYS}
+            store = SensorStore(time, columns, assume_sorted=True)
+            if os.path.exists(os.path.join(entry, TIERS_FILE)):
+                with np.load(os.path.join(entry, TIERS_FILE)) as arrays:
+                    store = RetainedStore.from_arrays(dict(arrays), store)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self._touch(entry)
+        self.hits += 1
+        return store
+
+    def save(self, digest, store):
+        """写入数据集（先写临时目录再改名，其它进程不会读到写了一半的缓存）
+
+        缓存写入失败不影响数据加载，返回是否写入成功。
+        """
+        entry = self._entry_dir(digest)
+        if os.path.isdir(entry):
+            self._touch(entry)
+            return True
+        tmp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+            if isinstance(store, RetainedStore):
+                np.savez(os.path.join(tmp, TIERS_FILE), **store.tier_arrays())
+                store = store.recent
+            if isinstance(store, CompressedStore):
+                # 逐块解码写入，不整体解码
+                files = ingest.ColumnFiles(tmp)
+                for chunk in store.chunks():
+                    files.append(chunk)
+                files.close()
+            else:
+                np.save(os.path.join(tmp, 'time.npy'), store.time)
+                for key in SENSOR_KEYS:
+                    np.save(os.path.join(tmp, f'{key}.npy'), store.columns[key])
+            os.rename(tmp, entry)
+        except OSError:
+            if tmp:
+                shutil.rmtree(tmp, ignore_errors=True)
+            # 另一个进程可能已经写好了同一个数据集
+            return os.path.isdir(entry)
+        self._prune()
+        return True
+
+    def new_entry(self):
+        """分块导入时写入列文件的临时目录，写完后用 commit 按摘要登记"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+
+    def commit(self, tmp, digest):
+        """把 new_entry 目录登记为 digest 对应的数据集（已打开的内存映射不受影响），返回是否成功"""
+        entry = self._entry_dir(digest)
+        try:
+            if os.path.isdir(entry):
+                shutil.rmtree(tmp, ignore_errors=True)
+                self._touch(entry)
+            else:
+                os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._prune()
+        return os.path.isdir(entry)
+
+    def _prune(self):
+        """只保留最近使用（命中或写入）的若干个数据集，包括格式版本不同的旧缓存"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name != 'sources' and not name.startswith('.') and os.path.isdir(path):
+                entries.append((os.path.getmtime(path), path))
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    # ---- 数据源状态 ----
+
+    def load_source_state(self, url):
+        try:
+            with open(self._source_file(url), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_source_state(self, url, state):
+        path = self._source_file(url)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,30 @@
+"""图表降采样
+
+长时间窗口的数据点远多于图表像素，绘图前先降到约等于图表宽度的点数：
+minmax_decimate 每个分桶保留最小值和最大值，峰谷不会丢失，完全向量化。
+"""
+import numpy as np
+
+
+def minmax_decimate(x, y, max_points):
+    """分桶保留最小值/最大值（按时间顺序），返回不超过 max_points 个点"""
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return x, y
+
+    buckets = max_points // 2
+    size = -(-n // buckets)
+    buckets = -(-n // size)
+    pad = buckets * size - n
+
+    values = y.astype(np.float64)
+    low = np.concatenate([values, np.full(pad, np.inf)]).reshape(buckets, size)
+    high = np.concatenate([values, np.full(pad, -np.inf)]).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    imin = offsets + low.argmin(axis=1)
+    imax = offsets + high.argmax(axis=1)
+
+    index = np.sort(np.concatenate([imin, imax]))
+    # 同一个点既是最小也是最大时只保留一次
+    index = index[np.concatenate([[True], index[1:] != index[:-1]])]
+    return x[index], y[index]
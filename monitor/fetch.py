@@ -0,0 +1,403 @@
+"""CSV 数据源：条件请求 + 增量解析 + 后台刷新
+
+- 复用带连接池的 requests.Session
+- 发送 If-None-Match / If-Modified-Since，未变化时服务器返回 304
+- 文件只是追加了新行时，通过 Range 请求只下载并解析新增部分
+- 刷新在后台线程进行，期间始终返回最近一次成功的快照
+- 可选的磁盘缓存：重启后直接内存映射上次的解析结果；追加新行后的快照在后台写入，
+  每次写入整个数据集，所以至少间隔 save_interval 秒，期间的多次追加合并为一次写入
+- 解析结果发布到 SharedDataset，所有会话读取同一个只读版本；发布前生成多级聚合，追加时增量更新
+- 设置 chunk_rows 时全量下载改为分块流式导入（见 monitor.ingest），不把响应体和整个 DataFrame 留在内存中
+- 设置 hot_window 时发布压缩存储（见 monitor.compressed）：只有最近 hot_window 内的数据不压缩，块头代替多级聚合
+- 设置 retention 时按保留策略把较早的数据聚合为小时 / 天的桶（见 monitor.retention）：追加新行后先发布，
+  需要聚合时在后台线程整理后再发布，期间页面照常读取上一个版本
+"""
+import base64
+import hashlib
+import threading
+import time
+from io import BytesIO
+
+from monitor import ingest
+from monitor.compressed import CompressedStore
+from monitor.dataset import SharedDataset
+from monitor.disk_cache import chained_digest, content_digest
+from monitor.retention import RetainedStore
+from monitor.store import COLUMN_MAPPING, SensorStore
+
+# Range 请求时与已有数据重叠的字节数，用于确认文件只是被追加
+OVERLAP_BYTES = 64
+# 追加新行后写入磁盘缓存的最短间隔（秒）
+SAVE_INTERVAL = 300
+
+
+def make_session(pool_size=4):
+    """带连接池的 Session"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_csv(data):
+    """把 CSV 字节解析为 SensorStore"""
+    import pandas as pd
+
+    return SensorStore.from_dataframe(pd.read_csv(BytesIO(data)))
+
+
+def prepare(store, hot_window=None, retention=None):
+    """发布前整理数据集：生成多级聚合；设置了 hot_window 时改为压缩较早的数据；
+    设置了 retention 时先按保留策略聚合较早的数据，只整理剩下的原始数据"""
+    if retention is not None:
+        return retention.apply(store, lambda recent: prepare(recent, hot_window))
+    if isinstance(store, RetainedStore):
+        return store.with_recent(prepare(store.recent, hot_window))
+    if hot_window is None:
+        store.rollups()
+        return store
+    if isinstance(store, CompressedStore):
+        return store
+    return CompressedStore.from_store(store, hot_window)
+
+
+def _complete_lines(data):
+    """只保留到最后一个换行符为止的完整行"""
+    end = data.rfind(b'\n')
+    return data[:end + 1] if end >= 0 else b''
+
+
+class CsvSource:
+    """远程 CSV 数据源，进程内共享"""
+
+    def __init__(self, url, session=None, timeout=30, seed_path=None, error_retry=60, disk_cache=None, chunk_rows=None,
+                 hot_window=None, retention=None, save_interval=SAVE_INTERVAL):
+        self.url = url
+        self._session = session
+        self.timeout = timeout
+        self.error_retry = error_retry  # 刷新失败后多久重试（秒）
+        self.disk_cache = disk_cache
+        self.chunk_rows = chunk_rows  # 全量下载时分块导入的每块行数，None 表示整体解析
+        self.hot_window = hot_window  # 不压缩的最近数据时长（timedelta64），None 表示不压缩
+        self.retention = retention    # 保留策略（monitor.retention.Retention），None 表示保留全部原始数据
+        self.save_interval = save_interval  # 追加后写入磁盘缓存的最短间隔（秒）
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.dataset = SharedDataset()
+        self._etag = None
+        self._last_modified = None
+        self._header = b''       # 表头行（含换行符）
+        self._length = 0         # 已解析的字节数
+        self._prefix_hash = None  # 已解析部分的 sha1，仅在持有完整内容时可知
+        self._tail = b''         # 已解析部分末尾的若干字节
+        self.digest = None       # 内容摘要，追加时链式更新，也是磁盘缓存的键
+        self._saved_digest = None  # 已写入磁盘缓存的快照的摘要
+        self._saver = None       # 等待写入追加后快照的后台线程
+        self._last_save = 0.0
+
+        self.last_checked = 0.0
+        self.last_success = None  # 最近一次成功刷新的时刻；快照来自磁盘缓存或随仓库提供的数据时为 None
+        self.last_error = None
+        self.bytes_fetched = 0
+
+        if not self._restore() and seed_path:
+            try:
+                with open(seed_path, 'rb') as f:
+                    self._load_full(f.read())
+            except (OSError, ValueError):
+                pass
+
+    @property
+    def session(self):
+        """首次请求时才创建 Session（导入 requests）"""
+        if self._session is None:
+            self._session = make_session()
+        return self._session
+
+    # ---- 快照 ----
+
+    def snapshot(self):
+        """最近一次成功加载的数据集，尚未加载时返回 None"""
+        return self.dataset.get()
+
+    @property
+    def _store(self):
+        return self.dataset.get()
+
+    def _prepare(self, store):
+        return prepare(store, self.hot_window, self.retention)
+
+    @property
+    def refreshing(self):
+        return self._refresh_lock.locked()
+
+    @property
+    def keys(self):
+        """表头中出现的传感器键（尚未加载时为空）"""
+        names = self._header.decode('utf-8-sig', 'replace').strip().split(',')
+        names = [name.strip().strip('"') for name in names]
+        return [COLUMN_MAPPING[name] for name in names if name in COLUMN_MAPPING]
+
+    def is_stale(self, max_age):
+        if self.last_error is not None:
+            max_age = min(max_age, self.error_retry)
+        return time.time() - self.last_checked >= max_age
+
+    # ---- 刷新 ----
+
+    def refresh_in_background(self, max_age):
+        """快照过期时在后台线程刷新，立即返回"""
+        if not self.is_stale(max_age) or self.refreshing:
+            return False
+        thread = threading.Thread(target=self._refresh_quietly, daemon=True)
+        thread.start()
+        return True
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # 错误已记录在 last_error，继续提供旧快照
+            pass
+
+    def refresh(self):
+        """同步刷新一次，返回是否有新数据"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            changed = self._fetch()
+            self.last_error = None
+            self.last_success = time.time()
+            return changed
+        except Exception as e:
+            self.last_error = e
+            raise
+        finally:
+            self.last_checked = time.time()
+            self._refresh_lock.release()
+
+    def _fetch(self):
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+        start = max(self._length - OVERLAP_BYTES, 0)
+        if self._length:
+            headers['Range'] = f'bytes={start}-'
+
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout, stream=self.chunk_rows is not None)
+        if self.chunk_rows is not None and response.status_code == 200:
+            # 全量响应（首次加载，或服务器不支持 Range）：分块导入，不读入整个响应体
+            self._load_stream(response)
+            self._remember_validators(response)
+            self._persist()
+            return True
+        self.bytes_fetched += len(response.content)
+
+        if response.status_code == 304:
+            return False
+        if response.status_code == 416:
+            # 文件变短了，重新全量下载
+            return self._refetch_full()
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            body = response.content
+            overlap = self._length - start
+            if not _content_range_starts_at(response, start) or body[:overlap] != self._tail:
+                return self._refetch_full()
+            changed = self._append(body[overlap:])
+            total = start + len(body)
+        elif self._length and self._same_prefix(response.content):
+            # 服务器不支持 Range，但文件只是追加
+            changed = self._append(response.content[self._length:])
+            self._prefix_hash = hashlib.sha1(response.content[:self._length]).digest()
+            total = len(response.content)
+        else:
+            self._load_full(response.content)
+            changed = True
+            total = len(response.content)
+
+        # 末尾还有未写完的行时不记录校验信息，下次继续请求剩余部分
+        if self._length == total:
+            self._remember_validators(response)
+        self._persist()
+        return changed
+
+    def _refetch_full(self):
+        response = self.session.get(self.url, timeout=self.timeout, stream=self.chunk_rows is not None)
+        response.raise_for_status()
+        if self.chunk_rows is not None:
+            self._load_stream(response)
+        else:
+            self.bytes_fetched += len(response.content)
+            self._load_full(response.content)
+        self._remember_validators(response)
+        self._persist()
+        return True
+
+    def _remember_validators(self, response):
+        self._etag = response.headers.get('ETag')
+        self._last_modified = response.headers.get('Last-Modified')
+
+    def _same_prefix(self, data):
+        return (self._prefix_hash is not None and len(data) >= self._length
+                and hashlib.sha1(data[:self._length]).digest() == self._prefix_hash)
+
+    def _load_full(self, data):
+        digest = content_digest(data)
+        if digest == self.digest and self._store is not None:
+            # 校验信息变了但内容没变
+            store = self._store
+        else:
+            store = self.disk_cache.load(digest) if self.disk_cache else None
+            if store is None:
+                store = parse_csv(data)
+                if self.disk_cache:
+                    self.disk_cache.save(digest, store)
+            store = self._prepare(store)
+        header_end = data.find(b'\n')
+        with self._lock:
+            self._header = data[:header_end + 1] if header_end >= 0 else data
+            self._length = len(data)
+            self._prefix_hash = hashlib.sha1(data).digest()
+            self._tail = data[-OVERLAP_BYTES:]
+            self.digest = digest
+            self._saved_digest = digest
+            self.dataset.publish(store)
+
+    def _load_stream(self, response):
+        """分块导入完整的响应体：列数组写入磁盘缓存的新目录（没有磁盘缓存时写入临时目录）后内存映射打开"""
+        response.raw.decode_content = True
+        reader = ingest.HashingReader(response.raw)
+        directory = self.disk_cache.new_entry() if self.disk_cache else ingest.temporary_directory()
+        try:
+            store, ordered = ingest.read_csv_stream(reader, directory, self.chunk_rows)
+        except Exception:
+            ingest.remove_directory(directory)
+            raise
+        finally:
+            response.close()
+            self.bytes_fetched += reader.length
+        digest = reader.sha256.hexdigest()
+        if self.disk_cache and ordered:
+            self.disk_cache.commit(directory, digest)
+        else:
+            # 内存映射已打开（无序时已读入内存重新排序），目录可以删除
+            ingest.remove_directory(directory)
+            if self.disk_cache:
+                self.disk_cache.save(digest, store)
+        store = self._prepare(store)
+        with self._lock:
+            self._header = reader.header
+            self._length = reader.length
+            self._prefix_hash = reader.sha1.digest()
+            self._tail = reader.tail
+            self.digest = digest
+            self._saved_digest = digest
+            self.dataset.publish(store)
+
+    def _append(self, data):
+        """解析追加的完整行，不完整的末行留到下次"""
+        data = _complete_lines(data)
+        if not data.strip():
+            return False
+        new_rows = parse_csv(self._header + data)
+        with self._lock:
+            store = self._store.append(new_rows)
+            if self.hot_window is not None and self.retention is None:
+                # 从磁盘缓存恢复的快照可能还没有压缩
+                store = self._prepare(store)
+            self.dataset.publish(store)
+            self._length += len(data)
+            self._prefix_hash = None
+            self._tail = (self._tail + data)[-OVERLAP_BYTES:]
+            self.digest = chained_digest(self.digest, data)
+        if self.retention is not None and self.retention.due(store):
+            self._prepare_in_background(store)
+        return True
+
+    def _prepare_in_background(self, store):
+        threading.Thread(target=self._prepare_published, args=(store,), daemon=True).start()
+
+    def _prepare_published(self, store):
+        """整理已发布的快照（生成多级聚合、压缩、按保留策略聚合），期间没有新数据时发布结果"""
+        prepared = self._prepare(store)
+        with self._lock:
+            if self._store is store:
+                self.dataset.publish(prepared)
+
+    # ---- 磁盘缓存 ----
+
+    def _persist(self):
+        """记录当前快照对应的摘要和校验信息，供下次启动恢复；追加后的快照还没写入磁盘缓存时改为在后台写入"""
+        if not self.disk_cache or self.digest is None:
+            return
+        if self.digest == self._saved_digest:
+            self.disk_cache.save_source_state(self.url, self._source_state())
+            return
+        with self._lock:
+            if self._saver is not None:
+                # 已在等待，届时写入最新的快照
+                return
+            self._saver = threading.Thread(target=self._save_later, daemon=True)
+            self._saver.start()
+
+    def _source_state(self):
+        return {
+            'digest': self.digest,
+            'etag': self._etag,
+            'last_modified': self._last_modified,
+            'length': self._length,
+            'header': base64.b64encode(self._header).decode('ascii'),
+            'tail': base64.b64encode(self._tail).decode('ascii'),
+        }
+
+    def _save_later(self):
+        """距上次写入满 save_interval 秒后写入当前快照，写入成功后再记录对应的校验信息"""
+        time.sleep(max(self._last_save + self.save_interval - time.time(), 0))
+        with self._lock:
+            store, state = self._store, self._source_state()
+            self._saver = None
+        try:
+            if self.disk_cache.save(state['digest'], store):
+                self.disk_cache.save_source_state(self.url, state)
+                self._saved_digest = state['digest']
+        finally:
+            self._last_save = time.time()
+
+    def _restore(self):
+        """从磁盘缓存恢复上次的快照，成功返回 True"""
+        if not self.disk_cache:
+            return False
+        state = self.disk_cache.load_source_state(self.url)
+        if not state:
+            return False
+        store = self.disk_cache.load(state['digest'])
+        if store is None:
+            return False
+        self.dataset.publish(store)
+        # 多级聚合、压缩和按保留策略聚合都在后台进行，不拖慢启动；生成多级聚合前的查询会等待同一次生成
+        self._prepare_in_background(store)
+        self.digest = self._saved_digest = state['digest']
+        self._etag = state['etag']
+        self._last_modified = state['last_modified']
+        self._length = state['length']
+        self._header = base64.b64decode(state['header'])
+        self._tail = base64.b64decode(state['tail'])
+        return True
+
+
+def _content_range_starts_at(response, start):
+    """检查 206 响应的 Content-Range 起点"""
+    content_range = response.headers.get('Content-Range', '')
+    try:
+        return int(content_range.split()[1].split('-')[0]) == start
+    except (IndexError, ValueError):
+        return False
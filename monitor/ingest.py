@@ -0,0 +1,170 @@
+"""分块流式导入
+
+多年的分钟级导出有数 GB，一次读进内存再交给 pd.read_csv 会占用文件大小数倍的内存。
+分块导入从流中每次解析 chunk_rows 行：
+
+- 每块转换为列数组后直接追加写入每列一个的 .npy 文件，写完后以内存映射方式打开
+- 多级聚合随块增量生成，只在内存中保留最后一个周桶起的原始行
+- 读取时顺带计算内容摘要、记录表头和末尾字节，供磁盘缓存和之后的 Range 增量刷新使用
+
+峰值内存取决于 chunk_rows，与文件大小无关；时间不是整体有序时最后在内存中排序一次。
+"""
+import hashlib
+import io
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+from monitor.rollup import Rollups
+from monitor.store import ROLLUP_MIN_ROWS, SENSOR_KEYS, SensorStore
+
+DEFAULT_CHUNK_ROWS = 100_000
+# 读取流时每次读取的字节数
+READ_BYTES = 1 << 20
+# .npy 文件头固定占用的字节数（行数在写完后填入，长度不变）
+HEADER_BYTES = 128
+# 记录的末尾字节数，与 CsvSource 的 Range 重叠校验一致
+TAIL_BYTES = 64
+
+
+def _npy_header(dtype, rows):
+    """版本 1.0 的 .npy 文件头，用空格补齐到 HEADER_BYTES"""
+    text = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': (rows,)})
+    size = HEADER_BYTES - 10
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', size) + text.encode('latin1').ljust(size - 1) + b'\n'
+
+
+class ColumnFiles:
+    """按列追加写入 directory 下的 time.npy 和各传感器的 .npy 文件"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.rows = 0
+        self._files = {}
+        for name, dtype in [('time', 'datetime64[ns]')] + [(key, np.float32) for key in SENSOR_KEYS]:
+            f = open(os.path.join(directory, f'{name}.npy'), 'wb')
+            f.write(_npy_header(dtype, 0))
+            self._files[name] = (f, dtype)
+
+    def append(self, store):
+        self._files['time'][0].write(store.time.tobytes())
+        for key in SENSOR_KEYS:
+            self._files[key][0].write(store.columns[key].tobytes())
+        self.rows += len(store)
+
+    def close(self):
+        """写入最终行数并关闭文件"""
+        for f, dtype in self._files.values():
+            f.seek(0)
+            f.write(_npy_header(dtype, self.rows))
+            f.close()
+
+    def open(self):
+        """以内存映射方式打开写好的数据集"""
+        time = np.load(os.path.join(self.directory, 'time.npy'), mmap_mode='r')
+        columns = {key: np.load(os.path.join(self.directory, f'{key}.npy'), mmap_mode='r') for key in SENSOR_KEYS}
+        return SensorStore(time, columns, assume_sorted=True)
+
+
+class HashingReader(io.RawIOBase):
+    """包装只读字节流：读取的同时计算 sha256（磁盘缓存的键）和 sha1（前缀校验），记录长度、表头和末尾字节"""
+
+    def __init__(self, raw):
+        super().__init__()
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.sha1 = hashlib.sha1()
+        self.length = 0
+        self.header = b''
+        self.tail = b''
+        self._header_done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        if not data:
+            return 0
+        self.sha256.update(data)
+        self.sha1.update(data)
+        self.length += len(data)
+        self.tail = (self.tail + data[-TAIL_BYTES:])[-TAIL_BYTES:]
+        if not self._header_done:
+            self.header += data
+            end = self.header.find(b'\n')
+            if end >= 0:
+                self.header = self.header[:end + 1]
+                self._header_done = True
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_csv_stream(stream, directory, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """从字节流（有 read 方法即可）分块解析 CSV，列数组写入 directory，返回 (SensorStore, 是否整体有序)
+
+    返回的数据集以内存映射方式打开，并带有随块生成的多级聚合。
+    """
+    import pandas as pd
+
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream, READ_BYTES)
+    files = ColumnFiles(directory)
+    rollups = None
+    carry = None      # 最后一个周桶起的原始行（生成下一块的聚合时需要）
+    last_time = None
+    ordered = True
+    try:
+        for frame in pd.read_csv(stream, chunksize=chunk_rows):
+            chunk = SensorStore.from_dataframe(frame)
+            del frame
+            if len(chunk) == 0:
+                continue
+            if last_time is not None and chunk.time[0] < last_time:
+                ordered = False
+            last_time = chunk.time[-1] if last_time is None else max(last_time, chunk.time[-1])
+            files.append(chunk)
+            if ordered:
+                rollups, carry = _extend_rollups(rollups, carry, chunk, files.rows)
+    finally:
+        files.close()
+
+    store = files.open()
+    if not ordered:
+        # 整体无序时在内存中排序一次，聚合等需要时再生成
+        return SensorStore(np.array(store.time), {key: np.array(values) for key, values in store.columns.items()}), False
+    if rollups is not None and rollups.tiers and len(store) >= ROLLUP_MIN_ROWS:
+        store._rollups = rollups
+    return store, True
+
+
+def _extend_rollups(rollups, carry, chunk, rows):
+    """把一块有序数据并入聚合，返回 (聚合, 新的保留行)"""
+    if rollups is None:
+        rollups = Rollups.build(chunk.time, chunk.columns)
+        if not rollups.tiers:
+            return rollups, None
+        pending = chunk
+    elif not rollups.tiers:
+        # 数据过于稀疏、没有可用的级别：导入结束后需要时再整体生成
+        return rollups, None
+    else:
+        pending = carry.append(chunk)
+        rollups = rollups.replace_tail(pending.time, pending.columns, rows)
+    cut = rollups.cut
+    lo = int(np.searchsorted(pending.time, cut))
+    carry = SensorStore(pending.time[lo:].copy(), {key: values[lo:].copy() for key, values in pending.columns.items()},
+                        assume_sorted=True)
+    return rollups, carry
+
+
+def temporary_directory():
+    """没有磁盘缓存时写入列文件的临时目录（打开内存映射后即可删除）"""
+    return tempfile.mkdtemp(prefix='dcm-ingest-')
+
+
+def remove_directory(directory):
+    shutil.rmtree(directory, ignore_errors=True)
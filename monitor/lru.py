@@ -0,0 +1,58 @@
+"""按字节数限制容量的线程安全 LRU 缓存"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """键 -> 值，总大小超过 max_bytes 时淘汰最久未使用的条目"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """命中时返回值并标记为最近使用，未命中返回 None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size=None):
+        """size 默认为 len(value)；单个条目超过容量时不缓存"""
+        if size is None:
+            size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._items[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.nbytes -= evicted
+
+    def resize(self, max_bytes):
+        """修改容量，超出时淘汰最久未使用的条目"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.nbytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
@@ -0,0 +1,208 @@
+"""运行耗时和计数指标
+
+- 直方图：固定分桶（秒），按标签（页面、阶段）分别累计，可估算 p50/p95/p99
+- 计数器：单调递增，如各页面发送的图表字节数
+- 采集函数：导出时读取其他模块已有的计数（渲染缓存命中、下载字节数、数据集和进程的内存等）
+
+进程内所有会话共享一个 registry，可渲染为 Prometheus 文本格式，由 MetricsServer 通过 HTTP 提供。
+"""
+import bisect
+import contextlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 直方图分桶上限（秒），最后隐含 +Inf
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """固定分桶直方图（不加锁，由 Registry 加锁）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数（与 Prometheus histogram_quantile 相同），
+        并限制在实际观测到的最小/最大值之间；没有数据时返回 None"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        estimate = self.max
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count > 0:
+                if i < len(self.buckets):
+                    lower = self.buckets[i - 1] if i > 0 else 0.0
+                    estimate = lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+                break
+            cumulative += count
+        return min(max(estimate, self.min), self.max)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _with_label(labels, name, value):
+    return _label_text(tuple(labels) + ((name, value),))
+
+
+class Registry:
+    """指标集合：名称 + 标签 -> 直方图 / 计数器"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, help='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+                self._help.setdefault(name, help)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, help='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help)
+
+    @contextlib.contextmanager
+    def span(self, name, **labels):
+        """计时代码块，耗时记入 dcm_span_seconds{span=name, ...}"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('dcm_span_seconds', time.perf_counter() - start,
+                         help='各阶段耗时', span=name, **labels)
+
+    def add_collector(self, collect):
+        """collect() 返回 [(名称, 类型 counter/gauge, 说明, 标签字典, 数值), ...]，导出时调用"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def histograms(self):
+        """[(名称, 标签字典, count, sum, p50, p95, p99), ...] 的快照"""
+        with self._lock:
+            return [(name, dict(labels), h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                    for (name, labels), h in sorted(self._histograms.items())]
+
+    def counters(self):
+        """[(名称, 标签字典, 数值), ...]，包括采集函数的结果"""
+        with self._lock:
+            items = [(name, dict(labels), value) for (name, labels), value in sorted(self._counters.items())]
+            collectors = list(self._collectors)
+        for collect in collectors:
+            items.extend((name, labels, value) for name, _, _, labels, value in collect())
+        return items
+
+    def render_prometheus(self):
+        """Prometheus 文本格式（0.0.4）"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            collectors = list(self._collectors)
+            helps = dict(self._help)
+
+        declared = set()
+
+        def declare(name, kind, help):
+            if name not in declared:
+                declared.add(name)
+                if help:
+                    lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), h in histograms:
+            declare(name, 'histogram', helps.get(name))
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_with_label(labels, "le", repr(bound))} {cumulative}')
+            lines.append(f'{name}_bucket{_with_label(labels, "le", "+Inf")} {h.count}')
+            lines.append(f'{name}_sum{_label_text(labels)} {h.sum}')
+            lines.append(f'{name}_count{_label_text(labels)} {h.count}')
+        for (name, labels), value in counters:
+            declare(name, 'counter', helps.get(name))
+            lines.append(f'{name}{_label_text(labels)} {value}')
+        for collect in collectors:
+            for name, kind, help, labels, value in collect():
+                declare(name, kind, help)
+                lines.append(f'{name}{_label_text(tuple(sorted(labels.items())))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def process_memory():
+    """进程常驻内存 (当前, 峰值)，字节；读不到时为 None（取自 Linux 的 /proc/self/status）"""
+    values = {}
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'VmHWM'):
+                    values[name] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+# 进程内共享的指标
+registry = Registry()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            body, status = b'not found\n', 404
+        else:
+            body, status = self.server.registry.render_prometheus().encode(), 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """GET /metrics 返回 Prometheus 文本格式"""
+
+    daemon_threads = True
+
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        self.registry = registry
+        super().__init__((host, port), _Handler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='metrics', daemon=True).start()
+        return self
@@ -0,0 +1,237 @@
+"""多个 CSV 导出（每个区域或设备一个文件）的并发下载与合并
+
+- 每个数据源是一个 CsvSource（条件请求、Range 增量下载、磁盘缓存照旧），共用一个带连接池的 Session
+- 一次刷新用有界线程池并发刷新全部数据源，总耗时取决于最慢的一个而不是全部之和
+- 每个数据源有自己的超时和重试次数，失败后按指数退避（带随机抖动）重试
+- 全部完成后按时间戳合并为一个数据集发布：同一时刻各数据源的行合并为一行，每个数据源只提供
+  其表头中出现的传感器列；任何数据源都没有新数据时不重新合并
+- 某个数据源失败时保留它上次成功的数据，只把它提供的传感器标记为过期（stale_keys），其余照常更新
+- 设置 hot_window 时各数据源和合并结果都压缩保存（见 monitor.compressed），合并时临时解码
+- 设置 retention 时各数据源按相同的保留期限聚合较早的数据，各级桶按传感器合并（见 monitor.retention）；
+  内存上限只约束合并后发布的数据集
+
+对外接口与 CsvSource 相同（dataset / snapshot / refresh / refresh_in_background / refreshing /
+last_error / last_success / bytes_fetched），可以直接替换。
+
+数据源列表（DCM_SOURCES）：JSON 文件路径，内容为
+[{"name": "主机房", "url": "...", "timeout": 10, "retries": 2, "sensors": ["ZJFTemp", "ZJFHum"]}, ...]；
+或逗号分隔的 名称=URL / URL。sensors 可省略（取自文件表头），写明时从未成功下载过的数据源也能标记过期。
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from monitor.compressed import CompressedStore
+from monitor.dataset import SharedDataset
+from monitor.fetch import CsvSource, make_session, prepare
+from monitor.retention import RetainedStore, Retention, memory_usage, merge_sources
+from monitor.store import COLUMN_MAPPING, SensorStore
+
+# 每个数据源的默认超时（秒，连接和每次读取）和失败后的重试次数
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 2
+# 第 n 次重试前等待 BACKOFF_BASE * 2^n 秒（乘以 0.5 ~ 1.5 的随机抖动）
+BACKOFF_BASE = 0.5
+# 同时下载的数据源数
+MAX_WORKERS = 8
+
+
+def parse_sources(value):
+    """DCM_SOURCES 的值 -> [{'name', 'url', 'timeout', 'retries', 'sensors'}, ...]"""
+    if value.strip().endswith('.json'):
+        with open(value.strip(), encoding='utf-8') as f:
+            items = json.load(f)
+    else:
+        items = []
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            name, sep, url = part.partition('=')
+            items.append({'name': name, 'url': url} if sep and '://' not in name else {'url': part})
+    sources = []
+    for item in items:
+        url = item['url']
+        sources.append({
+            'name': item.get('name') or os.path.basename(url.split('?')[0]) or url,
+            'url': url,
+            'timeout': float(item.get('timeout', DEFAULT_TIMEOUT)),
+            'retries': int(item.get('retries', DEFAULT_RETRIES)),
+            # 传感器键或 CSV 列名，None 表示取自文件表头
+            'sensors': [COLUMN_MAPPING.get(key, key) for key in item['sensors']] if item.get('sensors') else None,
+        })
+    if not sources:
+        raise ValueError("数据源列表为空")
+    return sources
+
+
+def merge(parts):
+    """[(数据集, 传感器键列表), ...] 按时间戳合并；同一时刻多个数据源提供同一列时取后面的有效值"""
+    parts = [(store, keys) for store, keys in parts if store is not None and len(store)]
+    if not parts:
+        return SensorStore(np.zeros(0, dtype='datetime64[ns]'), {})
+    time = np.unique(np.concatenate([store.time for store, _ in parts]))
+    columns = {}
+    for store, keys in parts:
+        rows = np.searchsorted(time, store.time)
+        for key in keys:
+            values = store.columns[key]
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = np.full(len(time), np.nan, dtype=np.float32)
+            valid = ~np.isnan(values)
+            column[rows[valid]] = values[valid]
+    return SensorStore(time, columns, assume_sorted=True)
+
+
+class MultiSource:
+    """多个远程 CSV 数据源，合并为一个数据集，进程内共享"""
+
+    def __init__(self, sources, session=None, disk_cache=None, chunk_rows=None, error_retry=60,
+                 max_workers=MAX_WORKERS, backoff=BACKOFF_BASE, hot_window=None, retention=None):
+        self.error_retry = error_retry
+        self.hot_window = hot_window
+        self.retention = retention
+        source_retention = None if retention is None else Retention(retention.raw_window, retention.hour_window)
+        self.disk_cache = disk_cache
+        self.backoff = backoff
+        self.dataset = SharedDataset()
+        self._session = session or make_session(pool_size=min(len(sources), max_workers))
+        self._pool = ThreadPoolExecutor(max_workers=min(len(sources), max_workers), thread_name_prefix='fetch')
+        self._refresh_lock = threading.Lock()
+        self.sources = []
+        for config in sources:
+            source = CsvSource(config['url'], session=self._session, timeout=config['timeout'],
+                               disk_cache=disk_cache, chunk_rows=chunk_rows, hot_window=hot_window,
+                               retention=source_retention)
+            self.sources.append({**config, 'source': source, 'ok': True, 'error': None, 'attempts': 0,
+                                 'elapsed': None, 'last_success': None})
+
+        self.last_checked = 0.0
+        self.last_success = None  # 最近一次至少有一个数据源成功的刷新时刻
+        self.last_error = None
+        self.last_elapsed = None
+        # 从磁盘缓存恢复的数据立即合并发布
+        if any(entry['source'].snapshot() is not None for entry in self.sources):
+            self._publish()
+
+    # ---- 与 CsvSource 相同的接口 ----
+
+    def snapshot(self):
+        return self.dataset.get()
+
+    @property
+    def bytes_fetched(self):
+        return sum(entry['source'].bytes_fetched for entry in self.sources)
+
+    @property
+    def refreshing(self):
+        return self._refresh_lock.locked()
+
+    def is_stale(self, max_age):
+        if self.last_error is not None:
+            max_age = min(max_age, self.error_retry)
+        return time.time() - self.last_checked >= max_age
+
+    def refresh_in_background(self, max_age):
+        """快照过期时在后台线程刷新，立即返回"""
+        if not self.is_stale(max_age) or self.refreshing:
+            return False
+        threading.Thread(target=self._refresh_quietly, daemon=True).start()
+        return True
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass
+
+    def refresh(self):
+        """并发刷新全部数据源，有新数据时重新合并发布，返回是否有新数据；全部失败时抛出最后一个错误"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            start = time.perf_counter()
+            changed = list(self._pool.map(self._refresh_source, self.sources))
+            self.last_elapsed = time.perf_counter() - start
+            failed = [entry for entry in self.sources if not entry['ok']]
+            if any(changed) or (self.snapshot() is None and len(failed) < len(self.sources)):
+                self._publish()
+            self.last_error = failed[-1]['error'] if failed else None
+            if failed and len(failed) == len(self.sources):
+                raise self.last_error
+            self.last_success = time.time()
+            return any(changed)
+        finally:
+            self.last_checked = time.time()
+            self._refresh_lock.release()
+
+    # ---- 各数据源 ----
+
+    def _refresh_source(self, entry):
+        """刷新一个数据源（失败时按指数退避重试），返回是否有新数据；错误记录在 entry 中"""
+        source = entry['source']
+        start = time.perf_counter()
+        for attempt in range(entry['retries'] + 1):
+            entry['attempts'] = attempt + 1
+            try:
+                changed = source.refresh()
+            except Exception as e:
+                if attempt < entry['retries']:
+                    time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                    continue
+                entry.update(ok=False, error=e, elapsed=time.perf_counter() - start)
+                return False
+            entry.update(ok=True, error=None, elapsed=time.perf_counter() - start, last_success=time.time())
+            return changed
+        return False
+
+    def _publish(self):
+        parts, retained = [], []
+        for entry in self.sources:
+            store = entry['source'].snapshot()
+            if isinstance(store, RetainedStore):
+                retained.append((store, self._keys(entry)))
+                store = store.recent
+            if isinstance(store, CompressedStore):
+                store = store.to_store()
+            parts.append((store, self._keys(entry)))
+        store = merge(parts)
+        # 解码出的各数据源在压缩合并结果前释放
+        del parts
+        if retained:
+            store = merge_sources(retained, store)
+        self.dataset.publish(prepare(store, self.hot_window, self.retention))
+
+    @staticmethod
+    def _keys(entry):
+        """数据源提供的传感器：配置中写明的，否则取自文件表头"""
+        return entry.get('sensors') or entry['source'].keys
+
+    def stale_keys(self):
+        """最近一次刷新失败（或从未成功加载）的数据源提供的传感器"""
+        keys = set()
+        for entry in self.sources:
+            if not entry['ok'] or entry['source'].snapshot() is None:
+                keys.update(self._keys(entry))
+        return keys
+
+    def status(self):
+        """各数据源的状态（字典列表）"""
+        return [{
+            'name': entry['name'],
+            'url': entry['url'],
+            'ok': entry['ok'],
+            'error': None if entry['error'] is None else str(entry['error']),
+            'attempts': entry['attempts'],
+            'elapsed': entry['elapsed'],
+            'last_success': entry['last_success'],
+            'keys': self._keys(entry),
+            'rows': len(entry['source'].snapshot() or ()),
+            'bytes': memory_usage(entry['source'].snapshot())['total_bytes'],
+        } for entry in self.sources]
@@ -0,0 +1,238 @@
+"""在线统计：每个传感器的均值/方差（Welford）、最小/最大值、EWMA 和短期线性趋势
+
+每个新读数 O(1) 更新，不回看历史；进程内所有会话共享同一个 OnlineEngine：
+
+- 实时推送的读数写入 StreamHub 时逐条更新
+- 数据集发布新版本后只并入比上次更新的行（sync），新版本不是追加的结果时从整个数据集重建；
+  一批读数的均值/方差和最小/最大值向量化合并，EWMA 和趋势只需要最后 SEED_POINTS 个读数（更早读数的权重已可以忽略）
+- EWMA 和趋势按读数个数衰减：采样间隔从秒级到天级都有，历史数据和实时推送之间还可能有很长的间隔；
+  趋势是对读数序号的指数加权最小二乘斜率，显示为最近约 TREND_SPAN 个读数上的变化量
+
+均值/方差/最小/最大值覆盖并入的全部读数；EWMA 和趋势只接受时间不早于上一个读数的读数。
+"""
+import math
+import threading
+import weakref
+
+import numpy as np
+
+from monitor.store import SENSOR_KEYS
+
+EWMA_SPAN = 10
+TREND_SPAN = 30
+# 0.935 ** 300 ≈ 2e-9：一批读数较多时，EWMA 和趋势只从最后这么多个读数开始计算
+SEED_POINTS = 300
+
+_EWMA_ALPHA = 2 / (EWMA_SPAN + 1)
+_TREND_DECAY = 1 - 2 / (TREND_SPAN + 1)
+
+
+class OnlineStats:
+    """单个传感器的在线统计（不加锁，由 OnlineEngine 加锁）"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.time = None      # 最后一个读数的时刻（整数纳秒）
+        self.value = None
+        self.ewma = None
+        # 趋势回归（自变量为读数序号）的加权和，以最后一个读数为原点
+        self._w = self._x = self._y = self._xx = self._xy = 0.0
+
+    def update(self, time, value):
+        """并入一个读数，NaN 忽略"""
+        value = float(value)
+        if math.isnan(value):
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._recent(int(np.datetime64(time, 'ns').astype(np.int64)), value)
+
+    def extend(self, times, values):
+        """并入一批按时间排序的读数"""
+        values = np.asarray(values, dtype=np.float32)
+        valid = ~np.isnan(values)
+        times, values = np.asarray(times, dtype='datetime64[ns]')[valid], values[valid]
+        n = len(values)
+        if n == 0:
+            return
+        # 两组的均值/方差合并（Chan 等人的并行公式）
+        batch_mean = float(values.mean(dtype=np.float64))
+        batch_m2 = float(values.var(dtype=np.float64)) * n
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+        tail_times = times[-SEED_POINTS:].view(np.int64)
+        if n > SEED_POINTS and (self.time is None or tail_times[0] >= self.time):
+            self._reset_recent()
+        for t, value in zip(tail_times.tolist(), values[-SEED_POINTS:].tolist()):
+            self._recent(t, value)
+
+    def _reset_recent(self):
+        self.time = self.value = self.ewma = None
+        self._w = self._x = self._y = self._xx = self._xy = 0.0
+
+    def _recent(self, t, value):
+        """更新最新值、EWMA 和趋势回归"""
+        if self.time is not None and t < self.time:
+            return
+        if self.time is None:
+            self.ewma = value
+        else:
+            self.ewma += _EWMA_ALPHA * (value - self.ewma)
+            # 原点后移一个读数并衰减
+            self._xx = _TREND_DECAY * (self._xx - 2 * self._x + self._w)
+            self._x = _TREND_DECAY * (self._x - self._w)
+            self._xy = _TREND_DECAY * (self._xy - self._y)
+            self._w *= _TREND_DECAY
+            self._y *= _TREND_DECAY
+        # 新读数位于原点（x = 0），只增加 w 和 y
+        self._w += 1
+        self._y += value
+        self.time = t
+        self.value = value
+
+    def slope(self):
+        """趋势回归的斜率（每个读数），读数不足时为 0"""
+        denominator = self._w * self._xx - self._x * self._x
+        if denominator <= 1e-12 * max(self._w * self._xx, 1e-300):
+            return 0.0
+        return (self._w * self._xy - self._x * self._y) / denominator
+
+    def snapshot(self):
+        """当前统计（字典），没有读数时返回 None"""
+        if self.count == 0 or self.time is None:
+            return None
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0,
+            'min': self.min,
+            'max': self.max,
+            'time': np.datetime64(self.time, 'ns'),
+            'value': self.value,
+            'ewma': self.ewma,
+            # 最近约 TREND_SPAN 个读数上的变化量
+            'trend': self.slope() * TREND_SPAN,
+        }
+
+
+class OnlineEngine:
+    """各传感器的在线统计，线程安全"""
+
+    def __init__(self, keys=SENSOR_KEYS, replay=None):
+        self._stats = {key: OnlineStats() for key in keys}
+        self._lock = threading.Lock()
+        self._replay = replay      # 传感器键 -> 已推送的 (时间, 数值)，重建统计时补回数据集之后的实时读数
+        self._synced = {}          # 各列已并入的数据集最后时刻
+        self._synced_store = None  # 最近一次并入的数据集（弱引用）
+        self._synced_until = None  # 最近一次并入的数据集的最后时刻
+        self._synced_first = None  # 最近一次并入的数据集的第一个时刻
+        self._synced_rows = 0      # 最近一次并入的数据集的行数
+        self._synced_tail = None   # 最近一次并入的数据集最后时刻的各列读数
+        self.updates = 0
+        self.resets = 0
+
+    def ingest(self, readings):
+        """并入 [(传感器键, datetime64, 数值), ...]（与 StreamHub.ingest 相同）"""
+        with self._lock:
+            for key, time, value in readings:
+                self._stats[key].update(time, value)
+            self.updates += len(readings)
+
+    def sync(self, store):
+        """并入数据集中比上次并入的更新的行，返回并入的读数个数；同一个数据集只处理一次。
+        新版本不是在上次的数据集之后追加（重新下载后内容不同、乱序数据重建、保留策略聚合了旧数据）时
+        丢弃已有的统计，从整个数据集重建"""
+        if store is None or (self._synced_store is not None and self._synced_store() is store):
+            return 0
+        added = 0
+        with self._lock:
+            reset = self._synced_until is not None and not self._appended(store)
+            if reset:
+                self._reset()
+            # 压缩存储逐块解码，已并入的块跳过
+            for chunk in store.chunks(self._synced_until):
+                for key, stats in self._stats.items():
+                    times, values = chunk.valid(key)
+                    since = self._synced.get(key)
+                    if since is not None:
+                        lo = int(np.searchsorted(times, since, side='right'))
+                        times, values = times[lo:], values[lo:]
+                    if len(times):
+                        stats.extend(times, values)
+                        self._synced[key] = times[-1]
+                        added += len(times)
+            if reset and self._replay is not None:
+                added += self._replay_live()
+            self._synced_store = weakref.ref(store)
+            self._synced_until = store.last_time
+            self._synced_first = store.first_time
+            self._synced_rows = len(store)
+            self._synced_tail = self._tail(store, self._synced_until)
+            self.updates += added
+        return added
+
+    def _appended(self, store):
+        """store 是否为上次并入的数据集追加新行的结果：第一个时刻、不晚于上次最后时刻的行数、
+        上次最后时刻的读数都相同"""
+        if len(store) == 0 or store.first_time != self._synced_first:
+            return False
+        newer = store.between(self._synced_until + np.timedelta64(1, 'ns'))
+        if len(store) - len(newer) != self._synced_rows:
+            return False
+        tail = self._tail(store, self._synced_until)
+        return all(np.array_equal(tail[key], self._synced_tail[key], equal_nan=True) for key in self._stats)
+
+    def _tail(self, store, time):
+        """store 中时刻为 time 的各行读数"""
+        if time is None:
+            return None
+        rows = store.between(time, time + np.timedelta64(1, 'ns'))
+        return {key: np.asarray(rows.columns[key]) for key in self._stats}
+
+    def _reset(self):
+        self._stats = {key: OnlineStats() for key in self._stats}
+        self._synced = {}
+        self._synced_until = None
+        self.resets += 1
+
+    def _replay_live(self):
+        """重建后补回晚于数据集的实时读数"""
+        added = 0
+        for key, stats in self._stats.items():
+            times, values = self._replay(key)
+            order = np.argsort(times, kind='stable')
+            times, values = times[order], values[order]
+            since = self._synced.get(key)
+            if since is not None:
+                keep = times > since
+                times, values = times[keep], values[keep]
+            stats.extend(times, values)
+            added += int(np.count_nonzero(~np.isnan(values)))
+        return added
+
+    def get(self, key):
+        """该传感器的当前统计，没有读数时返回 None"""
+        with self._lock:
+            return self._stats[key].snapshot()
+
+
+def recent(store, key, points=SEED_POINTS):
+    """数据集末尾 points 个读数上的统计（所选范围不含最新时刻时使用）"""
+    stats = OnlineStats()
+    stats.extend(*store.valid(key, recent_points=points))
+    return stats.snapshot()
@@ -0,0 +1,215 @@
+"""按站点和日期分区的多站点存储
+
+每个站点每天一个分区目录，格式与磁盘缓存相同（每列一个 .npy 文件）：
+
+    <root>/<站点>/<YYYY-MM-DD>/time.npy, ZJFTemp.npy, ...
+
+查询时条件下推到目录和文件：
+
+- 站点：只列出该站点的目录，不接触其它站点的文件
+- 时间范围：按目录名二分查找，只读取与 [start, end) 相交的日期分区，最后按时间精确截取
+- 区域 / 传感器：只读取对应列的文件，其余列为不占内存的全 NaN 视图
+
+写入按天拆分，与已有的分区合并（同一时刻保留新写入的行）后整个分区替换：先写临时目录再改名，
+读取方不会看到写了一半的分区。站点目录的修改时间作为版本号，查询结果按 (站点, 版本, 条件) 缓存。
+
+导入 CSV: python -m monitor.partitions <根目录> <站点> <CSV 文件>
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from monitor.lru import LRUCache
+from monitor.store import ROOM_SENSORS, SENSOR_KEYS, SensorStore
+
+DAY = np.timedelta64(1, 'D')
+# 查询结果缓存的容量
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+def room_keys(rooms):
+    """区域名称列表对应的传感器键"""
+    return [key for room in rooms for key in ROOM_SENSORS[room]]
+
+
+def _parse_day(name):
+    """分区目录名对应的日期，不是 YYYY-MM-DD 格式的目录（临时目录、其它文件）返回 None"""
+    try:
+        day = np.datetime64(name, 'D')
+    except ValueError:
+        return None
+    return day if not np.isnat(day) and str(day) == name else None
+
+
+class PartitionedStore:
+    """<root> 下按站点 / 日期分区的传感器数据"""
+
+    def __init__(self, root, cache_bytes=CACHE_BYTES):
+        self.root = root
+        self.cache = LRUCache(cache_bytes)
+        self.partitions_read = 0  # 累计读取的分区数（验证条件下推）
+        self._write_lock = threading.Lock()
+
+    def _site_dir(self, site):
+        if not site or site.startswith('.') or os.sep in site or (os.altsep and os.altsep in site):
+            raise ValueError(f"无效的站点名称: {site!r}")
+        return os.path.join(self.root, site)
+
+    def _partition_dir(self, site, day):
+        return os.path.join(self._site_dir(site), str(day))
+
+    # ---- 元数据 ----
+
+    def sites(self):
+        """所有站点名称（排序）"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if not name.startswith('.') and os.path.isdir(os.path.join(self.root, name)))
+
+    def dates(self, site):
+        """站点已有数据的日期（datetime64[D] 升序数组）"""
+        try:
+            names = os.listdir(self._site_dir(site))
+        except FileNotFoundError:
+            return np.zeros(0, dtype='datetime64[D]')
+        return np.sort(np.array([day for day in map(_parse_day, names) if day is not None], dtype='datetime64[D]'))
+
+    def version(self, site):
+        """站点的数据版本：分区目录增加或替换时改变"""
+        try:
+            return os.stat(self._site_dir(site)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def last_time(self, site):
+        """站点最后一条记录的时刻，没有数据时返回 None（只读取最后一个分区的时间列）"""
+        key = ('last_time', site, self.version(site))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0]
+        days = self.dates(site)
+        last = None
+        if len(days):
+            time = np.load(os.path.join(self._partition_dir(site, days[-1]), 'time.npy'), mmap_mode='r')
+            last = time[-1] if len(time) else None
+        self.cache.put(key, (last,), size=0)
+        return last
+
+    # ---- 查询 ----
+
+    def read(self, site, start=None, end=None, rooms=None, keys=None):
+        """站点在 [start, end) 内的数据（None 表示不限）；rooms / keys 限定读取的列，默认全部"""
+        keys = list(SENSOR_KEYS if keys is None and rooms is None else (keys or []) + room_keys(rooms or []))
+        start = None if start is None else np.datetime64(start, 'ns')
+        end = None if end is None else np.datetime64(end, 'ns')
+        cache_key = ('read', site, self.version(site), start, end, tuple(keys))
+        store = self.cache.get(cache_key)
+        if store is None:
+            store = self._read(site, start, end, keys)
+            self.cache.put(cache_key, store, size=store.nbytes)
+        return store
+
+    def _read(self, site, start, end, keys):
+        # 读取期间分区可能被替换（目录改名），重新列出后再读
+        for attempt in range(3):
+            days = self.dates(site)
+            lo = 0 if start is None else int(np.searchsorted(days, start.astype('datetime64[D]'), side='left'))
+            hi = len(days) if end is None else int(np.searchsorted(days, (end - np.timedelta64(1, 'ns')).astype('datetime64[D]'), side='right'))
+            try:
+                parts = [self._load(site, day, keys) for day in days[lo:hi]]
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+        self.partitions_read += len(parts)
+
+        if parts:
+            time = np.concatenate([part[0] for part in parts])
+            columns = {key: np.concatenate([part[1][key] for part in parts]) for key in keys}
+        else:
+            time, columns = np.zeros(0, dtype='datetime64[ns]'), {key: np.zeros(0, dtype=np.float32) for key in keys}
+        i0 = 0 if start is None else int(np.searchsorted(time, start, side='left'))
+        i1 = len(time) if end is None else int(np.searchsorted(time, end, side='left'))
+        missing = np.broadcast_to(np.float32(np.nan), (max(i1 - i0, 0),))
+        columns = {key: columns[key][i0:i1] if key in columns else missing for key in SENSOR_KEYS}
+        return SensorStore(time[i0:i1], columns, assume_sorted=True)
+
+    def _load(self, site, day, keys):
+        directory = self._partition_dir(site, day)
+        return (np.load(os.path.join(directory, 'time.npy')),
+                {key: np.load(os.path.join(directory, f'{key}.npy')) for key in keys})
+
+    # ---- 写入 ----
+
+    def write(self, site, store):
+        """写入一个站点的数据（按天拆分后与已有分区合并），返回写入的分区数"""
+        if len(store) == 0:
+            return 0
+        site_dir = self._site_dir(site)
+        days = store.time.astype('datetime64[D]')
+        bounds = np.concatenate([[0], np.flatnonzero(days[1:] != days[:-1]) + 1, [len(days)]])
+        with self._write_lock:
+            os.makedirs(site_dir, exist_ok=True)
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                day = days[lo]
+                part = store.between(day.astype('datetime64[ns]'), (day + DAY).astype('datetime64[ns]'))
+                self._write_partition(site, day, self._merge(site, day, part))
+        return len(bounds) - 1
+
+    def _merge(self, site, day, part):
+        """与已有分区合并；同一时刻有多行时保留新写入的"""
+        directory = self._partition_dir(site, day)
+        if not os.path.isdir(directory):
+            return part
+        time, columns = self._load(site, day, SENSOR_KEYS)
+        merged = SensorStore(time, columns, assume_sorted=True).append(part)
+        keep = np.append(merged.time[1:] != merged.time[:-1], True)
+        if keep.all():
+            return merged
+        return SensorStore(merged.time[keep], {key: values[keep] for key, values in merged.columns.items()},
+                           assume_sorted=True)
+
+    def _write_partition(self, site, day, store):
+        site_dir = self._site_dir(site)
+        target = self._partition_dir(site, day)
+        tmp = tempfile.mkdtemp(dir=site_dir, prefix='.tmp-')
+        try:
+            np.save(os.path.join(tmp, 'time.npy'), store.time)
+            for key in SENSOR_KEYS:
+                np.save(os.path.join(tmp, f'{key}.npy'), store.columns[key])
+            old = None
+            if os.path.isdir(target):
+                old = tempfile.mkdtemp(dir=site_dir, prefix='.old-')
+                os.rename(target, os.path.join(old, 'partition'))
+            os.rename(tmp, target)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def import_csv(partitions, site, path, chunk_rows=100_000):
+    """分块读取 CSV 写入站点分区，返回行数"""
+    import pandas as pd
+
+    rows = 0
+    for frame in pd.read_csv(path, chunksize=chunk_rows):
+        chunk = SensorStore.from_dataframe(frame)
+        partitions.write(site, chunk)
+        rows += len(chunk)
+    return rows
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print(__doc__.strip().splitlines()[-1], file=sys.stderr)
+        sys.exit(2)
+    count = import_csv(PartitionedStore(sys.argv[1]), sys.argv[2], sys.argv[3])
+    print(f"{sys.argv[2]}: 导入 {count:,} 行")
@@ -0,0 +1,243 @@
+"""数据质量分析
+
+对数据集做一次向量化扫描，得到：
+
+- 整体：行数、时间跨度、采样间隔（相邻时间差的中位数）、覆盖的日期和缺失的日期
+- 每个传感器：缺失率（只把 NaN 当作缺失，0 是有效读数）、相对采样间隔的中断区间、
+  最后一次读数的时刻和落后于数据集末尾多久（距今多久由显示时计算）、读数长时间不变的卡滞区间
+
+按保留策略聚合过的数据集（compacted_until 之前每个桶一行）只有日期统计计入聚合时段，
+采样间隔、行数、缺失率、中断和卡滞只针对其后的原始数据。
+
+结果只依赖数据集本身，通过 store.derived('quality', profile) 按数据版本缓存，重跑页面不再计算。
+数据逐块扫描（跨块的间隔和连续段照常计入），压缩的数据集不需要整体解码。
+"""
+import datetime
+
+import numpy as np
+
+from monitor.store import SENSOR_KEYS
+
+# 相邻两次有效读数的间隔超过采样间隔的这么多倍时视为中断
+GAP_FACTOR = 1.5
+# 连续这么多个有效读数完全相同时视为卡滞
+STUCK_MIN_SAMPLES = 30
+
+
+def cadence(time):
+    """采样间隔：相邻时间差（去掉重复时刻）的中位数，少于两个时刻时返回 None"""
+    if len(time) < 2:
+        return None
+    diffs = np.diff(time)
+    diffs = diffs[diffs > np.timedelta64(0, 'ns')]
+    if len(diffs) == 0:
+        return None
+    return np.median(diffs.astype(np.int64)).astype('timedelta64[ns]')
+
+
+def gaps(time, expected):
+    """相邻时刻的间隔超过 GAP_FACTOR 倍采样间隔的区间 (起始数组, 结束数组)"""
+    if expected is None or len(time) < 2:
+        empty = np.zeros(0, dtype='datetime64[ns]')
+        return empty, empty
+    limit = (expected.astype(np.int64) * GAP_FACTOR).astype('timedelta64[ns]')
+    index = np.flatnonzero(np.diff(time) > limit)
+    return time[index], time[index + 1]
+
+
+def stuck_runs(time, values, min_samples=STUCK_MIN_SAMPLES):
+    """连续 min_samples 个以上相同读数的区间 (起始, 结束, 读数, 个数)"""
+    if len(values) < max(min_samples, 2):
+        empty = np.zeros(0, dtype='datetime64[ns]')
+        return empty, empty, np.zeros(0, dtype=values.dtype), np.zeros(0, dtype=np.int64)
+    # 相邻读数相等的连续段：只取段的边界，不为每个读数生成分段
+    equal = np.concatenate([[False], values[1:] == values[:-1], [False]])
+    edges = np.flatnonzero(equal[1:] != equal[:-1])
+    starts, ends = edges[::2], edges[1::2]
+    lengths = ends - starts + 1
+    keep = lengths >= min_samples
+    starts, ends, lengths = starts[keep], ends[keep], lengths[keep]
+    return time[starts], time[ends], values[starts], lengths
+
+
+def missing_dates(time):
+    """第一天到最后一天之间没有任何记录的日期"""
+    if len(time) == 0:
+        return np.zeros(0, dtype='datetime64[D]')
+    return _missing(np.unique(time.astype('datetime64[D]')))
+
+
+def _missing(present):
+    """有记录的日期（排序）之间缺失的日期"""
+    calendar = np.arange(present[0], present[-1] + np.timedelta64(1, 'D'))
+    return calendar[~np.isin(calendar, present, assume_unique=True)]
+
+
+def _raw_part(time, cut):
+    """块内不早于 cut（聚合时段的终点，None 表示没有聚合）的原始数据的起始行号"""
+    return 0 if cut is None else int(np.searchsorted(time, cut))
+
+
+def _scan_times(store, cut=None):
+    """逐块扫描时间：(采样间隔, 有记录的日期)；采样间隔与 cadence(cut 之后的时间数组) 相同，
+    由各块相邻时间差的取值和个数合并得到（跨块的时间差也计入）；日期包括聚合时段"""
+    values, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    days = []
+    previous = None
+    for time in store.times():
+        if len(time) == 0:
+            continue
+        day = time.astype('datetime64[D]')
+        days.append(day[np.concatenate([[True], day[1:] != day[:-1]])])
+        time = time[_raw_part(time, cut):]
+        if len(time) == 0:
+            continue
+        ns = time.view(np.int64)
+        diffs = np.diff(ns) if previous is None else np.diff(ns, prepend=previous)
+        diffs = diffs[diffs > 0]
+        values, inverse = np.unique(np.concatenate([values, diffs]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([counts, np.ones(len(diffs), dtype=np.int64)]),
+                             minlength=len(values)).astype(np.int64)
+        previous = ns[-1]
+    present = np.unique(np.concatenate(days)) if days else np.zeros(0, dtype='datetime64[D]')
+    total = int(counts.sum())
+    if total == 0:
+        return None, present
+    # 加权中位数：与 np.median 相同，个数为偶数时取中间两个的平均
+    cumulative = np.cumsum(counts)
+    low = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+    high = values[np.searchsorted(cumulative, total // 2, side='right')]
+    return np.float64((low + high) / 2).astype('timedelta64[ns]'), present
+
+
+class _SensorScan:
+    """逐块累积一个传感器的有效读数数、中断区间和卡滞区间（跨块的间隔和连续段也计入）"""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.valid = 0
+        self.gaps = []
+        self.stuck = []
+        self.latest = None
+        self.run = None  # 末尾相同读数的连续段 (起始时刻, 读数, 个数)
+
+    def add(self, time, values):
+        if len(values) == 0:
+            return
+        self.valid += len(values)
+        head = time if self.latest is None else np.concatenate([[self.latest], time])
+        self.gaps.append(gaps(head, self.expected))
+        if self.run is not None:
+            time = np.concatenate([[self.run[0]], time])
+            values = np.concatenate([[self.run[1]], values])
+        # 相邻读数相等的连续段：只取段的边界（首个位置可能是上一块末尾的连续段）
+        equal = np.concatenate([[False], values[1:] == values[:-1], [False]])
+        edges = np.flatnonzero(equal[1:] != equal[:-1])
+        starts, ends = edges[::2], edges[1::2]
+        lengths = ends - starts + 1
+        if self.run is not None and len(starts) and starts[0] == 0:
+            lengths[0] += self.run[2] - 1
+        if len(ends) and ends[-1] == len(values) - 1:
+            self.run = (time[starts[-1]], values[-1], int(lengths[-1]))
+            starts, ends, lengths = starts[:-1], ends[:-1], lengths[:-1]
+        else:
+            self.run = (time[-1], values[-1], 1)
+        keep = lengths >= STUCK_MIN_SAMPLES
+        self.stuck.append((time[starts[keep]], time[ends[keep]], values[starts[keep]], lengths[keep]))
+        self.latest = time[-1]
+
+    def finish(self):
+        """(中断起始, 中断结束, 卡滞起始, 卡滞结束, 卡滞读数, 卡滞个数)"""
+        if self.run is not None and self.run[2] >= STUCK_MIN_SAMPLES:
+            self.stuck.append((np.array([self.run[0]]), np.array([self.latest]),
+                               np.array([self.run[1]]), np.array([self.run[2]])))
+        empty = np.zeros(0, dtype='datetime64[ns]')
+        gap_parts = self.gaps or [(empty, empty)]
+        stuck_parts = self.stuck or [(empty, empty, np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64))]
+        return (*(np.concatenate(arrays) for arrays in zip(*gap_parts)),
+                *(np.concatenate(arrays) for arrays in zip(*stuck_parts)))
+
+
+def profile(store):
+    """数据集的质量概况（字典），见模块说明；逐块（store.chunks）扫描，压缩的数据集不需要整体解码"""
+    cut = store.compacted_until
+    expected, present = _scan_times(store, cut)
+    scans = {key: _SensorScan(expected) for key in SENSOR_KEYS}
+    rows = 0
+    row_gaps = []
+    previous = None
+    for chunk in store.chunks(cut):
+        lo = _raw_part(chunk.time, cut)
+        if lo:
+            chunk = chunk.rows(lo, len(chunk))
+        time = chunk.time
+        if len(time) == 0:
+            continue
+        rows += len(time)
+        row_gaps.append(gaps(time if previous is None else np.concatenate([[previous], time]), expected))
+        previous = time[-1]
+        for key, scan in scans.items():
+            index = chunk.valid_index(key)
+            if len(index) == len(time):
+                scan.add(time, chunk.columns[key])
+            else:
+                scan.add(time[index], chunk.columns[key][index])
+
+    sensors = {}
+    for key, scan in scans.items():
+        gap_starts, gap_ends, stuck_starts, stuck_ends, stuck_values, stuck_lengths = scan.finish()
+        sensors[key] = {
+            'valid': scan.valid,
+            'missing_ratio': 1 - scan.valid / rows if rows else 0.0,
+            'gap_starts': gap_starts,
+            'gap_ends': gap_ends,
+            'longest_gap': (gap_ends - gap_starts).max() if len(gap_starts) else None,
+            'latest': scan.latest,
+            # 落后于整个数据集最后一条记录多久：其他传感器还在更新而它已停止
+            'lag': previous - scan.latest if scan.latest is not None else None,
+            'stuck_starts': stuck_starts,
+            'stuck_ends': stuck_ends,
+            'stuck_values': stuck_values,
+            'stuck_lengths': stuck_lengths,
+        }
+
+    empty = np.zeros(0, dtype='datetime64[ns]')
+    row_gap_starts, row_gap_ends = (np.concatenate(arrays) for arrays in zip(*(row_gaps or [(empty, empty)])))
+    dates_missing = _missing(present) if len(present) else np.zeros(0, dtype='datetime64[D]')
+    return {
+        'rows': rows,
+        'start': store.first_time,
+        'end': previous,
+        'compacted_until': cut,
+        'cadence': expected,
+        'dates': len(present),
+        'calendar_days': len(present) + len(dates_missing),
+        'missing_dates': dates_missing,
+        'row_gap_starts': row_gap_starts,
+        'row_gap_ends': row_gap_ends,
+        'sensors': sensors,
+    }
+
+
+def now():
+    """当前本地时间（与数据的时间戳一样不带时区）"""
+    return np.datetime64(datetime.datetime.now(), 'ns')
+
+
+def staleness(latest, current=None):
+    """最后一次读数距今多久（timedelta64），没有读数时返回 None"""
+    if latest is None:
+        return None
+    return (now() if current is None else current) - latest
+
+
+def format_duration(delta):
+    """时间长度的简短中文表示"""
+    seconds = delta / np.timedelta64(1, 's')
+    if seconds < 60:
+        return f"{max(seconds, 0):.0f} 秒"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} 分钟"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} 小时"
+    return f"{seconds / 86400:.0f} 天"
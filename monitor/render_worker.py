@@ -0,0 +1,78 @@
+"""图表渲染进程池（见 charts.render_many）的工作进程
+
+进程池用 spawn 启动（不从多线程的服务进程 fork）。spawn 的子进程默认先重新导入 __main__，
+Streamlit 下 __main__ 是页面脚本 app.py，工作进程会把整个页面再执行一遍。这里的工作进程不导入 __main__：
+初始化函数和任务都在本模块中，不需要 __main__ 里的任何对象；启动信息中重新导入 __main__ 的项
+只在启动渲染工作进程的那一刻去掉（见 _WorkerProcess.start），不影响其它子进程。
+"""
+import multiprocessing.context
+import multiprocessing.spawn
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# 渲染工作进程的名称前缀
+WORKER_NAME = 'dcm-render-'
+
+# 工作进程内的字体路径
+_font_path = None
+_start_lock = threading.Lock()
+
+
+def init(font_path):
+    """工作进程初始化：Agg 后端 + 注册字体"""
+    global _font_path
+    import matplotlib
+    matplotlib.use('Agg')
+    import charts
+    charts.get_font_properties(font_path)
+    _font_path = font_path
+
+
+def render(spec):
+    import charts
+    return charts.render_chart(spec, _font_path)
+
+
+def noop():
+    return None
+
+
+def _without_main(get_preparation_data):
+    """子进程启动信息：渲染工作进程去掉重新导入 __main__ 的项（按进程名区分）"""
+    def prepare(name):
+        data = get_preparation_data(name)
+        if name.startswith(WORKER_NAME):
+            data.pop('init_main_from_path', None)
+            data.pop('init_main_from_name', None)
+        return data
+    return prepare
+
+
+class _WorkerProcess(multiprocessing.context.SpawnProcess):
+    """渲染工作进程：启动时不重新导入 __main__"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = WORKER_NAME + self.name
+
+    def start(self):
+        # 启动信息在 start 中生成：只在此期间替换，启动后恢复
+        with _start_lock:
+            original = multiprocessing.spawn.get_preparation_data
+            multiprocessing.spawn.get_preparation_data = _without_main(original)
+            try:
+                super().start()
+            finally:
+                multiprocessing.spawn.get_preparation_data = original
+
+
+class _WorkerContext(multiprocessing.context.SpawnContext):
+    Process = _WorkerProcess
+
+
+def start_pool(workers, font_path=None):
+    """启动 workers 个渲染工作进程的进程池，提前启动所有工作进程（工作进程在 submit 时按需启动）"""
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=_WorkerContext(), initializer=init, initargs=(font_path,))
+    for _ in range(workers):
+        pool.submit(noop)
+    return pool
@@ -0,0 +1,499 @@
+"""保留策略：较早的原始数据聚合为小时 / 天的桶，常驻内存有上限
+
+整理后的数据集（RetainedStore）在时间上分为前后相接的三段：
+
+- 天桶：早于 hour_cut 的数据，每个传感器每天一个桶
+- 小时桶：hour_cut 到 raw_cut 之间的数据
+- 原始数据：raw_cut 之后（最近 raw_window 内）的每一行，SensorStore 或设置 hot_window 时的 CompressedStore
+
+桶与 monitor.rollup 的桶相同，保存 count / sum / min / max / last，由原始数据或更细的桶合并生成，
+合并不丢失统计量。Retention 按保留期限移动两个分界时刻（只会前移），设置 max_bytes 时常驻内存不超过上限：
+其中 CACHE_SHARE 留给按范围缓存的拼接结果和压缩原始数据的解码结果（缓存容量按此设置），
+其余是数据集本身（原始数据及其多级聚合或块头、各级桶）。数据集超出时越早的数据越先降低精度，
+依次把小时桶合并为天桶、把更多原始数据聚合为小时桶（再合并为天桶）、丢弃最早的天桶；
+最近一小时的原始数据和当天的小时桶总是保留。时间范围子集与数据集共用数组，不另计。
+
+聚合在刷新数据的后台线程中进行（见 monitor.fetch），期间页面照常读取上一个版本。
+按时间范围查询时只涉及原始数据的范围直接返回原始数据；涉及聚合时段的范围每个桶一行（桶内均值），
+统计（有效读数数 / 均值 / 最小 / 最大）和长时间窗口的图表（每个桶的最小值和最大值）取自桶的统计量，
+与聚合前的原始数据一致（按整桶计）。
+"""
+import threading
+import time
+
+import numpy as np
+
+from monitor.compressed import CompressedStore
+from monitor.lru import LRUCache
+from monitor.rollup import TIERS, Tier, combine, reduce_groups
+from monitor.store import SENSOR_KEYS, SensorStore
+
+# 每个数据集缓存的拼接结果（按时间范围）的容量（未设置内存上限时）
+CACHE_BYTES = 64 * 1024 * 1024
+# 设置内存上限时按范围缓存占上限的比例
+CACHE_SHARE = 0.25
+STATS = ('count', 'sum', 'min', 'max', 'last')
+
+_TIER_SPECS = {name: (width, origin) for name, width, origin in TIERS}
+
+
+def _empty_tier(name):
+    width, origin = _TIER_SPECS[name]
+    return Tier.empty(name, width, origin, SENSOR_KEYS)
+
+
+# 只用于按小时 / 天取整
+_HOURS = _empty_tier('hour')
+_DAYS = _empty_tier('day')
+# 每个桶的字节数：起始时刻 + 各传感器的 count / sum / min / max / last
+BUCKET_BYTES = 8 + len(SENSOR_KEYS) * (8 + 8 + 4 + 4 + 4)
+
+
+def _later(a, b):
+    if a is None:
+        return b
+    return a if b is None else max(a, b)
+
+
+def _empty_stats(n):
+    return {'count': np.zeros(n, np.int64), 'sum': np.zeros(n), 'min': np.full(n, np.nan, np.float32),
+            'max': np.full(n, np.nan, np.float32), 'last': np.full(n, np.nan, np.float32)}
+
+
+def merge_tiers(first, second):
+    """合并同一级的两组桶，同一时刻的桶合并统计量"""
+    if len(second) == 0:
+        return first
+    if len(first) == 0:
+        return second
+    tier = first.concat(second)
+    if first.start[-1] < second.start[0]:
+        return tier
+    order = np.argsort(tier.start, kind='stable')
+    start = tier.start[order]
+    groups = np.concatenate([[0], np.flatnonzero(start[1:] != start[:-1]) + 1])
+    stats = {key: reduce_groups(groups, *(s[stat][order] for stat in STATS)) for key, s in tier.stats.items()}
+    return Tier(tier.name, tier.width, tier.origin, start[groups], stats)
+
+
+def _only(tier, keys):
+    """只保留 keys 的统计量，其余传感器的桶为空"""
+    return Tier(tier.name, tier.width, tier.origin, tier.start,
+                {key: s if key in keys else _empty_stats(len(tier)) for key, s in tier.stats.items()})
+
+
+def _bucket_rows(tier, start, end):
+    """桶起始时刻在 [start, end) 内的桶，每个桶一行（桶内均值）：(时间, {列键: 数值})"""
+    i0 = 0 if start is None else int(np.searchsorted(tier.start, start))
+    i1 = len(tier) if end is None else int(np.searchsorted(tier.start, end))
+    columns = {}
+    for key, s in tier.stats.items():
+        count = s['count'][i0:i1]
+        columns[key] = np.where(count > 0, s['sum'][i0:i1] / np.maximum(count, 1), np.nan).astype(np.float32)
+    return tier.start[i0:i1], columns
+
+
+def _split(store, cut):
+    """(早于 cut 的行, 其余行)：其余行复制出来，不再引用原数组；没有更早的行时前者为 None"""
+    if len(store) == 0 or store.first_time >= cut:
+        return None, store
+    if isinstance(store, CompressedStore):
+        return store.split(cut)
+    lo, _ = store.range_index(cut)
+    newer = SensorStore(store.time[lo:].copy(), {key: values[lo:].copy() for key, values in store.columns.items()},
+                        assume_sorted=True)
+    return store.between(None, cut), newer
+
+
+def _raw_nbytes(store):
+    """原始数据常驻内存：列数组（或压缩的块、块头和未压缩部分）+ 已生成的多级聚合"""
+    if isinstance(store, CompressedStore):
+        return store.nbytes
+    return store.nbytes + store.rollup_nbytes
+
+
+def _time_at(store, row):
+    """原始数据第 row 行（含）之前的行都在其之前的时刻；压缩存储取所在块的最后时刻"""
+    if isinstance(store, CompressedStore):
+        if row < store.sealed_rows:
+            return store.index.end[int(np.searchsorted(np.cumsum(store.index.rows), row, side='right'))]
+        return store.hot.time[row - store.sealed_rows]
+    return store.time[row]
+
+
+class CompactedIndex:
+    """聚合时段的桶与其后原始数据拼接成的数据集的统计接口（与 monitor.rollup.Rollups 相同的
+    range_stats / envelope）：聚合时段合并桶的统计量，原始数据部分用原始数据自己的多级聚合或块头"""
+
+    def __init__(self, days, hours, raw_cut, raw):
+        self.days = days
+        self.hours = hours
+        self.raw_cut = raw_cut
+        self.raw = raw  # 拼接进数据集的原始数据（SensorStore），没有时为 None
+
+    def _buckets(self, start, end):
+        """桶起始时刻在 [start, end) 内的各级桶：[(级, 起始桶号, 结束桶号), ...]"""
+        end = min(end, self.raw_cut)
+        if start >= end:
+            return []
+        return [(tier, *tier.slice(start, end)) for tier in (self.days, self.hours)]
+
+    def _raw(self, start, end):
+        start = max(start, self.raw_cut)
+        if self.raw is None or start >= end:
+            return None
+        return self.raw.between(start, end)
+
+    def range_stats(self, store, key, start, end):
+        """[start, end) 内该列的 (count, sum, min, max)"""
+        parts = []
+        for tier, i0, i1 in self._buckets(start, end):
+            s = tier.stats[key]
+            count = int(s['count'][i0:i1].sum())
+            parts.append((count, float(s['sum'][i0:i1].sum()),
+                          float(np.fmin.reduce(s['min'][i0:i1], initial=np.nan)) if count else None,
+                          float(np.fmax.reduce(s['max'][i0:i1], initial=np.nan)) if count else None))
+        raw = self._raw(start, end)
+        if raw is not None and len(raw):
+            parts.append(raw.totals(key))
+        return combine(parts)
+
+    def envelope(self, store, key, start, end, max_points):
+        """图表用的 (时间, 数值)：每个桶取最小值和最大值，原始数据部分先降到 max_points 个点"""
+        times, values = [], []
+        for tier, i0, i1 in self._buckets(start, end):
+            s = tier.stats[key]
+            keep = s['count'][i0:i1] > 0
+            times.append(np.repeat(tier.start[i0:i1][keep], 2))
+            values.append(np.column_stack([s['min'][i0:i1][keep], s['max'][i0:i1][keep]]).ravel())
+        raw = self._raw(start, end)
+        if raw is not None and len(raw):
+            raw_times, raw_values = raw.decimated_since(key, raw.time[-1] - raw.time[0], max_points)
+            times.append(raw_times)
+            values.append(raw_values)
+        if not times:
+            return np.zeros(0, 'datetime64[ns]'), np.zeros(0, np.float32)
+        return np.concatenate(times), np.concatenate(values)
+
+    @property
+    def nbytes(self):
+        # 桶由所属的 RetainedStore 持有
+        return 0
+
+
+class RetainedStore:
+    """按保留策略整理的只读数据集：天桶 + 小时桶 + 最近的原始数据
+
+    对外用法与整个数据集的 SensorStore / CompressedStore 相同的部分：len / first_date / latest_date / last_time /
+    compacted_until / chunks / times / append / between / last；between / last 返回普通的 SensorStore。
+    """
+
+    def __init__(self, days, hours, recent, raw_cut=None, hour_cut=None, cache_bytes=CACHE_BYTES):
+        self.days = days
+        self.hours = hours
+        self.recent = recent
+        self.raw_cut = raw_cut    # 原始数据的起点（整点），之前的数据都已聚合；None 表示没有聚合过
+        self.hour_cut = hour_cut  # 小时桶的起点（零点），之前的是天桶；None 表示没有天桶
+        self._ranges = LRUCache(cache_bytes)
+
+    @classmethod
+    def wrap(cls, store):
+        """还没有聚合过的原始数据"""
+        return cls(_empty_tier('day'), _empty_tier('hour'), store)
+
+    def with_recent(self, recent):
+        """原始数据换为 recent（如压缩后的同一份数据），聚合部分共用"""
+        if recent is self.recent:
+            return self
+        return RetainedStore(self.days, self.hours, recent, self.raw_cut, self.hour_cut, self._ranges.max_bytes)
+
+    def compacted(self, raw_cut=None, hour_cut=None):
+        """返回把早于 raw_cut 的原始数据聚合为小时桶、早于 hour_cut 的小时桶合并为天桶的数据集；
+        两个时刻只会前移（已聚合的数据不能还原）"""
+        raw_cut = _later(self.raw_cut, raw_cut)
+        hour_cut = _later(self.hour_cut, hour_cut)
+        if raw_cut == self.raw_cut and hour_cut == self.hour_cut:
+            return self
+        days, hours, recent = self.days, self.hours, self.recent
+        if raw_cut is not None:
+            older, recent = _split(recent, raw_cut)
+            if older is not None and len(older):
+                width, origin = _TIER_SPECS['hour']
+                hours = merge_tiers(hours, Tier.from_rows('hour', width, origin, older.time, older.columns))
+        if hour_cut is not None and len(hours) and hours.start[0] < hour_cut:
+            width, origin = _TIER_SPECS['day']
+            days = merge_tiers(days, Tier.from_tier('day', width, origin, hours.head(hour_cut)))
+            hours = hours.tail(hour_cut)
+        return RetainedStore(days, hours, recent, raw_cut, hour_cut, self._ranges.max_bytes)
+
+    def drop_before(self, start):
+        """丢弃起始时刻早于 start 的天桶（start 为 None 时全部丢弃）"""
+        days = self.days.tail(start) if start is not None else _empty_tier('day')
+        return RetainedStore(days, self.hours, self.recent, self.raw_cut, self.hour_cut, self._ranges.max_bytes)
+
+    def append(self, other):
+        """返回追加了 other 各行的新数据集；早于原始数据起点的行直接并入对应的桶"""
+        if len(other) == 0:
+            return self
+        if self.raw_cut is None or other.time[0] >= self.raw_cut:
+            return self.with_recent(self.recent.append(other))
+        older = other.between(None, self.raw_cut)
+        width, origin = _TIER_SPECS['hour']
+        hours = merge_tiers(self.hours, Tier.from_rows('hour', width, origin, older.time, older.columns))
+        store = RetainedStore(self.days, hours, self.recent.append(other.between(self.raw_cut)), self.raw_cut,
+                              None, self._ranges.max_bytes)
+        return store.compacted(self.raw_cut, self.hour_cut)
+
+    # ---- 大小和时间 ----
+
+    def __len__(self):
+        """行数：每个桶算一行"""
+        return len(self.days) + len(self.hours) + len(self.recent)
+
+    @property
+    def recent_nbytes(self):
+        return _raw_nbytes(self.recent)
+
+    @property
+    def nbytes(self):
+        """常驻内存：原始数据（含多级聚合或块头）+ 各级桶，不含按范围缓存的拼接结果"""
+        return self.recent_nbytes + self.hours.nbytes + self.days.nbytes
+
+    @property
+    def cache_nbytes(self):
+        return self._ranges.nbytes + (self.recent.cache_nbytes if isinstance(self.recent, CompressedStore) else 0)
+
+    def limit_caches(self, max_bytes):
+        """按范围缓存的总容量限制为 max_bytes：原始数据压缩时拼接结果和解码结果各占一半"""
+        if isinstance(self.recent, CompressedStore):
+            self.recent.limit_cache(max_bytes // 2)
+            max_bytes -= max_bytes // 2
+        self._ranges.resize(max_bytes)
+
+    def memory(self):
+        """常驻内存的组成（字节）"""
+        return {
+            'raw_rows': len(self.recent),
+            'raw_bytes': self.recent_nbytes,
+            'hour_buckets': len(self.hours),
+            'hour_bytes': self.hours.nbytes,
+            'day_buckets': len(self.days),
+            'day_bytes': self.days.nbytes,
+            'cache_bytes': self.cache_nbytes,
+            'total_bytes': self.nbytes,
+            'raw_since': self.raw_cut,
+            'hourly_since': self.hour_cut,
+        }
+
+    @property
+    def first_time(self):
+        for tier in (self.days, self.hours):
+            if len(tier):
+                return tier.start[0]
+        return self.recent.first_time
+
+    @property
+    def last_time(self):
+        if len(self.recent):
+            return self.recent.last_time
+        for tier in (self.hours, self.days):
+            if len(tier):
+                return tier.start[-1]
+        return None
+
+    @property
+    def compacted_until(self):
+        """与 SensorStore 相同的属性：之前的行是聚合桶"""
+        return self.raw_cut
+
+    def first_date(self):
+        return None if self.first_time is None else self.first_time.astype('datetime64[D]').item()
+
+    def latest_date(self):
+        return None if self.last_time is None else self.last_time.astype('datetime64[D]').item()
+
+    # ---- 查询 ----
+
+    def _bucket_store(self, start, end):
+        """桶起始时刻在 [start, end) 内的各级桶，每个桶一行"""
+        parts = [_bucket_rows(tier, start, end) for tier in (self.days, self.hours)]
+        return SensorStore(np.concatenate([p[0] for p in parts]),
+                           {key: np.concatenate([p[1][key] for p in parts]) for key in SENSOR_KEYS},
+                           assume_sorted=True)
+
+    def chunks(self, start=None):
+        """按时间顺序分块返回数据：聚合时段的桶（每个桶一行）为一块，之后是原始数据的各块；跳过早于 start 的部分"""
+        if self.raw_cut is not None and (start is None or start < self.raw_cut):
+            buckets = self._bucket_store(start, self.raw_cut)
+            if len(buckets):
+                yield buckets
+        yield from self.recent.chunks(start)
+
+    def times(self):
+        """按时间顺序分块返回时间数组（与 chunks 对应）"""
+        if self.raw_cut is not None:
+            buckets = np.concatenate([self.days.start, self.hours.start])
+            if len(buckets):
+                yield buckets
+        yield from self.recent.between().times()
+
+    def between(self, start=None, end=None):
+        """时间在 [start, end) 内的数据：只涉及原始数据时直接返回原始数据的子集，
+        否则拼接聚合时段的桶和原始数据（按范围缓存）"""
+        start = None if start is None else np.datetime64(start, 'ns')
+        end = None if end is None else np.datetime64(end, 'ns')
+        if self.raw_cut is None or (start is not None and start >= self.raw_cut):
+            return self.recent.between(start, end)
+        store = self._ranges.get((start, end))
+        if store is None:
+            store = self._combine(start, end)
+            self._ranges.put((start, end), store, store.nbytes)
+        return store
+
+    def last(self, window):
+        """最近 window（timedelta64）时间内的数据，以整个数据集的最后时刻为终点"""
+        if len(self) == 0:
+            return self.recent.between()
+        return self.between(self.last_time - window)
+
+    def _combine(self, start, end):
+        buckets = self._bucket_store(start, self.raw_cut if end is None else min(end, self.raw_cut))
+        raw = None
+        if end is None or end > self.raw_cut:
+            raw = self.recent.between(_later(start, self.raw_cut), end)
+            # 压缩的原始数据按需解码的视图：拼接前解码（只有保留期限内的原始数据）
+            if not isinstance(raw, SensorStore):
+                raw = raw.to_store()
+        time = np.concatenate([buckets.time] + ([raw.time] if raw is not None else []))
+        columns = {key: np.concatenate([buckets.columns[key]] + ([raw.columns[key]] if raw is not None else []))
+                   for key in SENSOR_KEYS}
+        return SensorStore(time, columns, assume_sorted=True, compacted_until=self.raw_cut,
+                           rollups=CompactedIndex(self.days, self.hours, self.raw_cut, raw))
+
+    # ---- 磁盘缓存 ----
+
+    def tier_arrays(self):
+        """各级桶和分界时刻，{名称: 数组}（写入磁盘缓存，原始数据另存）"""
+        arrays = {'cuts': np.array([np.datetime64('NaT') if cut is None else cut for cut in (self.raw_cut, self.hour_cut)],
+                                   dtype='datetime64[ns]')}
+        for tier in (self.days, self.hours):
+            arrays[f'{tier.name}.start'] = tier.start
+            for key, s in tier.stats.items():
+                for stat in STATS:
+                    arrays[f'{tier.name}.{key}.{stat}'] = s[stat]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, recent):
+        """由 tier_arrays 的结果和原始数据恢复"""
+        tiers = {}
+        for name in ('day', 'hour'):
+            width, origin = _TIER_SPECS[name]
+            tiers[name] = Tier(name, width, origin, arrays[f'{name}.start'],
+                               {key: {stat: arrays[f'{name}.{key}.{stat}'] for stat in STATS} for key in SENSOR_KEYS})
+        raw_cut, hour_cut = (None if np.isnat(cut) else cut for cut in arrays['cuts'])
+        return cls(tiers['day'], tiers['hour'], recent, raw_cut, hour_cut)
+
+
+def merge_sources(parts, recent):
+    """多个数据源各自整理过的数据集 [(RetainedStore, 传感器键列表), ...] 的桶按传感器合并，
+    recent 为各数据源原始数据合并的结果；分界时刻取各数据源中最晚的，合并后更早的原始数据随之聚合"""
+    days, hours = _empty_tier('day'), _empty_tier('hour')
+    raw_cut = hour_cut = None
+    for store, keys in parts:
+        days = merge_tiers(days, _only(store.days, keys))
+        hours = merge_tiers(hours, _only(store.hours, keys))
+        raw_cut, hour_cut = _later(raw_cut, store.raw_cut), _later(hour_cut, store.hour_cut)
+    return RetainedStore(days, hours, recent).compacted(raw_cut, hour_cut)
+
+
+def memory_usage(store):
+    """任一种数据集（SensorStore / CompressedStore / RetainedStore，或 None）常驻内存的组成，与 RetainedStore.memory 相同"""
+    if isinstance(store, RetainedStore):
+        return store.memory()
+    usage = {'raw_rows': 0, 'raw_bytes': 0, 'hour_buckets': 0, 'hour_bytes': 0, 'day_buckets': 0, 'day_bytes': 0,
+             'cache_bytes': 0, 'total_bytes': 0, 'raw_since': None, 'hourly_since': None}
+    if store is not None:
+        usage.update(raw_rows=len(store), raw_bytes=_raw_nbytes(store), total_bytes=_raw_nbytes(store),
+                     cache_bytes=store.cache_nbytes if isinstance(store, CompressedStore) else 0)
+    return usage
+
+
+class Retention:
+    """保留策略：原始数据保留 raw_window，更早的聚合为小时桶，早于 hour_window 的合并为天桶
+    （timedelta64，None 表示不按时间聚合）；max_bytes 为常驻内存上限（含按范围缓存，None 表示不限）"""
+
+    def __init__(self, raw_window=None, hour_window=None, max_bytes=None):
+        self.raw_window = raw_window
+        self.hour_window = hour_window
+        self.max_bytes = max_bytes
+        # 上限中按范围缓存的容量和留给数据集本身的部分
+        self.cache_bytes = None if max_bytes is None else int(max_bytes * CACHE_SHARE)
+        self.data_bytes = None if max_bytes is None else max_bytes - self.cache_bytes
+        self.compactions = 0
+        self.last_elapsed = None
+        self.dropped_days = 0
+        self._lock = threading.Lock()
+
+    def targets(self, store):
+        """(raw_cut, hour_cut)：按保留期限应聚合到的时刻"""
+        last = store.last_time
+        if last is None:
+            return None, None
+        raw_cut = None if self.raw_window is None else _HOURS.floor(last - self.raw_window)
+        hour_cut = None if self.hour_window is None else _DAYS.floor(last - self.hour_window)
+        return raw_cut, hour_cut
+
+    def due(self, store):
+        """是否有需要聚合的数据（追加新行后判断，不需要时不必启动后台聚合）"""
+        if not isinstance(store, RetainedStore):
+            return True
+        raw_cut, hour_cut = self.targets(store)
+        first = store.recent.first_time
+        return ((raw_cut is not None and first is not None and first < raw_cut)
+                or (hour_cut is not None and len(store.hours) > 0 and store.hours.start[0] < hour_cut)
+                or (self.max_bytes is not None and store.nbytes > self.data_bytes))
+
+    def apply(self, store, prepare=None):
+        """按保留期限和内存上限整理数据集，返回 RetainedStore；
+        prepare(原始数据) 在每次聚合后整理剩下的原始数据（生成多级聚合或压缩），计入内存"""
+        prepare = prepare or (lambda recent: recent)
+        with self._lock:
+            started = time.perf_counter()
+            retained = store if isinstance(store, RetainedStore) else RetainedStore.wrap(store)
+            result = retained.compacted(*self.targets(retained))
+            result = result.with_recent(prepare(result.recent))
+            if self.max_bytes is not None:
+                result = self._fit(result, prepare)
+                result.limit_caches(self.cache_bytes)
+            if result.raw_cut != retained.raw_cut or result.hour_cut != retained.hour_cut or len(result.days) < len(retained.days):
+                self.compactions += 1
+                self.last_elapsed = time.perf_counter() - started
+            return result
+
+    def _fit(self, store, prepare):
+        """数据集超过上限中留给它的部分时依次：今天以前的小时桶合并为天桶、更多原始数据聚合为小时桶、
+        丢弃最早的天桶；需要聚合的桶数 / 行数按平均每桶 / 每行的字节数估算，不够时继续"""
+        while store.nbytes > self.data_bytes:
+            excess = store.nbytes - self.data_bytes
+            recent, hours, days = store.recent, store.hours, store.days
+            this_hour = _HOURS.floor(store.last_time)
+            today = _DAYS.floor(store.last_time)
+            if len(hours) and hours.start[0] < today:
+                n = min(int(np.ceil(excess / (hours.nbytes / len(hours)))), len(hours) - 1)
+                store = store.compacted(hour_cut=min(_DAYS.floor(hours.start[n]) + _DAYS.width, today))
+            elif len(recent) and recent.first_time < this_hour:
+                # 每聚合一行净省下的字节数：扣除新小时桶的大小
+                span = max((store.last_time - recent.first_time) / _HOURS.width, 1)
+                saving = store.recent_nbytes / len(recent) - BUCKET_BYTES * span / len(recent)
+                rows = min(int(np.ceil(excess / max(saving, 1))), len(recent) - 1)
+                cut = min(_HOURS.floor(_time_at(recent, rows)) + _HOURS.width, this_hour)
+                store = store.compacted(raw_cut=cut)
+                store = store.with_recent(prepare(store.recent))
+            elif len(days):
+                n = int(np.ceil(excess / (days.nbytes / len(days))))
+                self.dropped_days += min(n, len(days))
+                store = store.drop_before(days.start[n] if n < len(days) else None)
+            else:
+                break
+        return store
@@ -0,0 +1,257 @@
+"""多级预聚合（分钟 / 小时 / 天 / 周）
+
+每一级按固定宽度的时间桶（从 UTC 纪元对齐，周从周一开始）保存每个传感器的
+count / sum / min / max / last，只保存有数据的桶：
+
+- 最细一级由原始数据一次向量化生成（reduceat），上一级由下一级合并生成；
+  平均每桶不到 MIN_ROWS_PER_BUCKET 行的级别（如分钟级数据上的分钟级）不生成，比原始数据还大
+- 追加数据时保留最后一个周桶之前的部分，只重算之后的数据
+- 范围统计：范围内完整的粗桶直接合并，两端不足一个桶的部分逐级改用更细的桶，
+  最细处用原始数据，结果与直接计算原始数据相同
+- 图表：选择范围内桶数足够填满图表宽度的最粗一级，每个桶画最小值和最大值
+"""
+import numpy as np
+
+# (名称, 桶宽度, 对齐起点)：1970-01-01 是周四，周桶从 1970-01-05（周一）起算
+TIERS = [
+    ('minute', np.timedelta64(1, 'm'), np.datetime64('1970-01-01', 'ns')),
+    ('hour', np.timedelta64(1, 'h'), np.datetime64('1970-01-01', 'ns')),
+    ('day', np.timedelta64(1, 'D'), np.datetime64('1970-01-01', 'ns')),
+    ('week', np.timedelta64(7, 'D'), np.datetime64('1970-01-05', 'ns')),
+]
+
+MIN_ROWS_PER_BUCKET = 2
+
+
+def _bucket_ids(time, width, origin):
+    return (time.view(np.int64) - origin.astype(np.int64)) // np.timedelta64(width, 'ns').astype(np.int64)
+
+
+def reduce_groups(starts, count, total, low, high, last):
+    """按 starts 分组合并一列的 count/sum/min/max/last（各组最后一个有值的 last）"""
+    valid = np.flatnonzero(count)
+    ends = np.append(starts[1:], len(count))
+    pos = np.searchsorted(valid, ends) - 1
+    has_last = pos >= 0
+    has_last[has_last] = valid[pos[has_last]] >= starts[has_last]
+    last_values = np.full(len(starts), np.nan, dtype=np.float32)
+    last_values[has_last] = last[valid[pos[has_last]]]
+    return {
+        'count': np.add.reduceat(count, starts, dtype=np.int64),
+        'sum': np.add.reduceat(total, starts, dtype=np.float64),
+        'min': np.fmin.reduceat(low, starts),
+        'max': np.fmax.reduceat(high, starts),
+        'last': last_values,
+    }
+
+
+def row_stats(starts, columns):
+    """原始数据按行分组（starts 为各组起始行号）后各列的 count/sum/min/max/last"""
+    stats = {}
+    for key, values in columns.items():
+        valid = ~np.isnan(values)
+        stats[key] = reduce_groups(starts, valid, np.where(valid, values, 0), values, values, values)
+    return stats
+
+
+class Tier:
+    """一级聚合：start 为各桶起始时刻，stats[列键][统计名] 为与之对齐的数组"""
+
+    def __init__(self, name, width, origin, start, stats):
+        self.name = name
+        self.width = width
+        self.origin = origin
+        self.start = start
+        self.stats = stats
+
+    def __len__(self):
+        return len(self.start)
+
+    def floor(self, t):
+        """t 所在桶的起始时刻"""
+        ns = np.datetime64(t, 'ns')
+        width = np.timedelta64(self.width, 'ns')
+        return ns - (ns - self.origin) % width
+
+    def ceil(self, t):
+        ns = np.datetime64(t, 'ns')
+        floor = self.floor(ns)
+        return floor if floor == ns else floor + self.width
+
+    def slice(self, start, end):
+        """桶起始时刻在 [start, end) 内的桶号区间"""
+        return int(np.searchsorted(self.start, start)), int(np.searchsorted(self.start, end))
+
+    @classmethod
+    def from_rows(cls, name, width, origin, time, columns, min_rows_per_bucket=0):
+        """由原始数据生成；平均每桶行数少于 min_rows_per_bucket 时返回 None"""
+        if len(time) == 0:
+            return cls.empty(name, width, origin, columns)
+        ids = _bucket_ids(time, width, origin)
+        starts = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1])
+        if len(starts) * min_rows_per_bucket > len(time):
+            return None
+        return cls(name, width, origin, _bucket_time(ids[starts], width, origin), row_stats(starts, columns))
+
+    @classmethod
+    def from_tier(cls, name, width, origin, finer):
+        """由更细一级合并生成"""
+        if len(finer) == 0:
+            return cls.empty(name, width, origin, finer.stats)
+        ids = _bucket_ids(finer.start, width, origin)
+        starts = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1])
+        stats = {key: reduce_groups(starts, s['count'], s['sum'], s['min'], s['max'], s['last'])
+                 for key, s in finer.stats.items()}
+        return cls(name, width, origin, _bucket_time(ids[starts], width, origin), stats)
+
+    @classmethod
+    def empty(cls, name, width, origin, keys):
+        stats = {key: {'count': np.zeros(0, np.int64), 'sum': np.zeros(0), 'min': np.zeros(0, np.float32),
+                       'max': np.zeros(0, np.float32), 'last': np.zeros(0, np.float32)} for key in keys}
+        return cls(name, width, origin, np.zeros(0, 'datetime64[ns]'), stats)
+
+    def head(self, end):
+        """起始时刻早于 end 的桶"""
+        n = int(np.searchsorted(self.start, end))
+        return Tier(self.name, self.width, self.origin, self.start[:n],
+                    {key: {stat: values[:n] for stat, values in s.items()} for key, s in self.stats.items()})
+
+    def tail(self, start):
+        """起始时刻不早于 start 的桶"""
+        n = int(np.searchsorted(self.start, start))
+        return Tier(self.name, self.width, self.origin, self.start[n:],
+                    {key: {stat: values[n:] for stat, values in s.items()} for key, s in self.stats.items()})
+
+    def concat(self, other):
+        return Tier(self.name, self.width, self.origin, np.concatenate([self.start, other.start]),
+                    {key: {stat: np.concatenate([values, other.stats[key][stat]]) for stat, values in s.items()}
+                     for key, s in self.stats.items()})
+
+    @property
+    def nbytes(self):
+        return self.start.nbytes + sum(v.nbytes for s in self.stats.values() for v in s.values())
+
+
+def _bucket_time(ids, width, origin):
+    return origin + ids * np.timedelta64(width, 'ns')
+
+
+def combine(parts):
+    """合并若干 (count, sum, min, max)"""
+    count = sum(p[0] for p in parts)
+    total = sum(p[1] for p in parts)
+    low = min((p[2] for p in parts if p[0]), default=None)
+    high = max((p[3] for p in parts if p[0]), default=None)
+    return count, total, low, high
+
+
+class Rollups:
+    """一个数据集的各级聚合（按 TIERS 从细到粗）"""
+
+    def __init__(self, tiers, rows):
+        self.tiers = tiers
+        self.rows = rows  # 覆盖的原始行数
+
+    @classmethod
+    def build(cls, time, columns, names=None):
+        """names 指定生成哪几级（增量更新时与已有的级别一致），默认跳过过细的级别"""
+        tiers = []
+        for name, width, origin in TIERS:
+            if names is not None and name not in names:
+                continue
+            if tiers:
+                tiers.append(Tier.from_tier(name, width, origin, tiers[-1]))
+                continue
+            tier = Tier.from_rows(name, width, origin, time, columns,
+                                  min_rows_per_bucket=MIN_ROWS_PER_BUCKET if names is None else 0)
+            if tier is not None:
+                tiers.append(tier)
+        return cls(tiers, len(time))
+
+    def extend(self, time, columns):
+        """time/columns 是追加了新行的完整数据（前 rows 行不变），返回新的聚合；
+        只重算最后一个周桶起的数据"""
+        cut = self.cut
+        if cut is None:
+            return Rollups.build(time, columns)
+        lo = int(np.searchsorted(time, cut))
+        return self.replace_tail(time[lo:], {key: values[lo:] for key, values in columns.items()}, len(time))
+
+    @property
+    def cut(self):
+        """最后一个周桶的起始时刻：之前的桶不会再变，追加数据时从这里重算；没有聚合时为 None"""
+        if not self.tiers or len(self.tiers[-1]) == 0:
+            return None
+        return self.tiers[-1].start[-1]
+
+    def replace_tail(self, time, columns, rows):
+        """time/columns 为 cut 及之后的全部原始数据，重算这一部分，rows 为新的总行数"""
+        cut = self.cut
+        tail = Rollups.build(time, columns, names=[tier.name for tier in self.tiers])
+        tiers = [old.head(cut).concat(new) for old, new in zip(self.tiers, tail.tiers)]
+        return Rollups(tiers, rows)
+
+    # ---- 查询 ----
+
+    def range_stats(self, store, key, start, end, level=None):
+        """[start, end) 内该列的 (count, sum, min, max)：完整的粗桶直接合并，两端逐级细化"""
+        if level is None:
+            level = len(self.tiers) - 1
+        if level < 0:
+            return raw_stats(store, key, start, end)
+        tier = self.tiers[level]
+        inner_start, inner_end = tier.ceil(start), tier.floor(end)
+        if inner_start >= inner_end:
+            return self.range_stats(store, key, start, end, level - 1)
+        i0, i1 = tier.slice(inner_start, inner_end)
+        s = tier.stats[key]
+        count = int(s['count'][i0:i1].sum())
+        middle = (count, float(s['sum'][i0:i1].sum()),
+                  float(np.fmin.reduce(s['min'][i0:i1], initial=np.nan)) if count else None,
+                  float(np.fmax.reduce(s['max'][i0:i1], initial=np.nan)) if count else None)
+        return combine([self.range_stats(store, key, start, inner_start, level - 1), middle,
+                         self.range_stats(store, key, inner_end, end, level - 1)])
+
+    def tier_for(self, start, end, min_buckets):
+        """范围内至少有 min_buckets 个桶的最粗一级，都不够时返回 None（直接用原始数据）"""
+        for tier in reversed(self.tiers):
+            i0, i1 = tier.slice(tier.floor(start), end)
+            if i1 - i0 >= min_buckets:
+                return tier
+        return None
+
+    def envelope(self, store, key, start, end, max_points):
+        """图表用的 (时间, 数值)：范围内完整的桶取最小值和最大值，两端不足一个桶的部分取原始数据；
+        没有合适的级别时返回 None"""
+        tier = self.tier_for(start, end, max_points // 2)
+        if tier is None:
+            return None
+        inner_start, inner_end = tier.ceil(start), tier.floor(end)
+        i0, i1 = tier.slice(inner_start, inner_end)
+        s = tier.stats[key]
+        keep = s['count'][i0:i1] > 0
+        times = np.repeat(tier.start[i0:i1][keep], 2)
+        values = np.column_stack([s['min'][i0:i1][keep], s['max'][i0:i1][keep]]).ravel()
+        head = raw_values(store, key, start, inner_start)
+        tail = raw_values(store, key, inner_end, end)
+        return np.concatenate([head[0], times, tail[0]]), np.concatenate([head[1], values, tail[1]])
+
+    @property
+    def nbytes(self):
+        return sum(tier.nbytes for tier in self.tiers)
+
+
+def raw_values(store, key, start, end):
+    """原始数据 [start, end) 内该列的有效值 (时间, 数值)"""
+    lo, hi = store.range_index(start, end) if start < end else (0, 0)
+    index = store.valid_index(key)
+    index = index[np.searchsorted(index, lo):np.searchsorted(index, hi)]
+    return store.time[index], store.columns[key][index]
+
+
+def raw_stats(store, key, start, end):
+    """原始数据 [start, end) 内该列的 (count, sum, min, max)"""
+    _, values = raw_values(store, key, start, end)
+    if len(values) == 0:
+        return 0, 0.0, None, None
+    return len(values), float(values.sum(dtype=np.float64)), float(values.min()), float(values.max())
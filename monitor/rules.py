@@ -0,0 +1,248 @@
+"""告警规则引擎
+
+规则是声明式的字典，对整个历史数据做一次向量化计算，输出告警区间（而不只是最新一个点的状态）：
+
+    {'name': '氢气浓度超限', 'sensors': ['hydr'], 'kind': 'above', 'value': 50, 'clear': 45,
+     'min_duration': np.timedelta64(0, 's'), 'severity': 'critical'}
+
+- kind: 'above' 高于 value 告警；'below' 低于 value 告警；'rate' 变化速率（每小时）绝对值超过 value 告警
+- window: 'rate' 规则计算变化速率的时间跨度（默认 RATE_WINDOW）：每个读数与至少 window 之前的最近一个读数比较，
+  相邻读数之间的量化跳变（如分钟级数据上 0.1 ℃ 即 6 ℃/h）不会误报
+- clear: 回差，告警后要越过 clear 才解除（不设时等于 value）
+- min_duration: 条件至少持续这么久才算告警
+- 缺失值（NaN）保持之前的状态
+
+滞回状态机由触发/解除事件的翻转点累加得到，不需要逐点循环；数据逐块扫描，块末尾的告警状态延续到下一块。
+"""
+import numpy as np
+
+from monitor.store import SENSOR_LABELS
+
+TEMP_KEYS = ['ZJFTemp', 'LTDTemp', 'DCJTemp', 'YYJTemp', 'PDJTemp']
+HUM_KEYS = ['ZJFHum', 'LTDHum', 'DCJHum', 'YYJHum', 'PDJHum']
+
+# PUE 等级上限：低于 1.5 优秀，低于 1.6 良好，低于 1.8 一般，其余较差
+PUE_LEVELS = [1.5, 1.6, 1.8]
+# 氢气安全阈值（ppm）
+HYDROGEN_LIMIT = 50
+# 变化速率规则的默认时间跨度
+RATE_WINDOW = np.timedelta64(15, 'm')
+
+SEVERITY_LABELS = {'critical': '严重', 'warning': '警告'}
+
+DEFAULT_RULES = [
+    {'name': 'PUE偏高', 'sensors': ['PUE'], 'kind': 'above', 'value': PUE_LEVELS[1], 'clear': 1.58,
+     'min_duration': np.timedelta64(0, 's'), 'severity': 'warning'},
+    {'name': 'PUE超警戒线', 'sensors': ['PUE'], 'kind': 'above', 'value': PUE_LEVELS[2], 'clear': 1.75,
+     'min_duration': np.timedelta64(0, 's'), 'severity': 'critical'},
+    {'name': '氢气浓度超限', 'sensors': ['hydr'], 'kind': 'above', 'value': HYDROGEN_LIMIT, 'clear': 45,
+     'min_duration': np.timedelta64(0, 's'), 'severity': 'critical'},
+    {'name': '温度过高', 'sensors': TEMP_KEYS, 'kind': 'above', 'value': 27, 'clear': 26,
+     'min_duration': np.timedelta64(10, 'm'), 'severity': 'warning'},
+    {'name': '温度过低', 'sensors': TEMP_KEYS, 'kind': 'below', 'value': 15, 'clear': 16,
+     'min_duration': np.timedelta64(10, 'm'), 'severity': 'warning'},
+    {'name': '温度变化过快', 'sensors': TEMP_KEYS, 'kind': 'rate', 'value': 5, 'clear': 3, 'window': RATE_WINDOW,
+     'min_duration': np.timedelta64(5, 'm'), 'severity': 'warning'},
+    {'name': '湿度过高', 'sensors': HUM_KEYS, 'kind': 'above', 'value': 80, 'clear': 75,
+     'min_duration': np.timedelta64(10, 'm'), 'severity': 'warning'},
+    {'name': '湿度过低', 'sensors': HUM_KEYS, 'kind': 'below', 'value': 20, 'clear': 25,
+     'min_duration': np.timedelta64(10, 'm'), 'severity': 'warning'},
+]
+
+
+def pue_level(value):
+    """PUE 等级：0 优秀，1 良好，2 一般，3 较差"""
+    return int(np.searchsorted(PUE_LEVELS, value, side='right'))
+
+
+def hysteresis_edges(on, off, active=False):
+    """on 为触发条件，off 为解除条件，两者都不满足时保持前一状态；active 为初始状态（默认未告警）
+
+    返回 (告警开始行号, 告警解除行号) 两个数组；仍未解除的告警解除行号为 len(on)，
+    初始已在告警时第一个区间的开始行号为 0。
+    """
+    # 只看触发/解除事件，相邻的同类事件只保留第一个，剩下的就是状态翻转点
+    index = np.flatnonzero(on | off)
+    kind = on[index]
+    flip = kind != np.concatenate([[active], kind[:-1]])
+    index, kind = index[flip], kind[flip]
+    starts = index[kind]
+    ends = index[~kind]
+    if active:
+        starts = np.concatenate([[0], starts]).astype(index.dtype)
+    if len(ends) < len(starts):
+        ends = np.append(ends, len(on))
+    return starts, ends
+
+
+def hysteresis_state(on, off):
+    """逐点的告警状态（布尔数组）"""
+    starts, ends = hysteresis_edges(on, off)
+    step = np.zeros(len(on) + 1, dtype=np.int8)
+    step[starts] = 1
+    step[ends] = -1
+    return np.cumsum(step[:-1], dtype=np.int8).astype(bool)
+
+
+def _conditions(values, kind, value, clear):
+    if clear is None:
+        clear = value
+    if kind == 'below':
+        return values < value, values >= clear
+    return values > value, values <= clear
+
+
+class _IntervalScan:
+    """逐块把条件序列转换为告警区间：上一块末尾仍未解除的告警延续到下一块"""
+
+    def __init__(self, min_duration, use_max):
+        self.min_duration = min_duration
+        self.reduce = np.fmax if use_max else np.fmin
+        self.parts = []
+        self.open = None       # 仍未解除的告警 (开始时刻, 峰值)
+        self.last_time = None
+
+    def add(self, on, off, time, metric):
+        n = len(time)
+        if n == 0:
+            return
+        self.last_time = time[-1]
+        starts, ends = hysteresis_edges(on, off, active=self.open is not None)
+        if len(starts) == 0:
+            return
+        start_time = time[starts]
+        end_time = time[np.minimum(ends, n - 1)]
+        # 每个区间内的峰值：开始/解除行号交替作为 reduceat 的分段点，取偶数段（fmax/fmin 忽略缺失值）
+        bounds = np.column_stack([starts, ends]).ravel()
+        if bounds[-1] == n:
+            bounds = bounds[:-1]
+        peak = self.reduce.reduceat(metric.astype(np.float64), bounds)[::2]
+        if self.open is not None:
+            # 延续的告警：开始时刻和峰值取自之前的块（在本块第一行就解除时本块不贡献峰值）
+            start_time[0] = self.open[0]
+            peak[0] = self.open[1] if ends[0] == 0 else self.reduce(peak[0], self.open[1])
+        closed = ends < n
+        self.open = None if closed[-1] else (start_time[-1], peak[-1])
+        self.parts.append((start_time[closed], end_time[closed], peak[closed]))
+
+    def result(self):
+        """(开始时间, 结束时间, 是否仍在告警, 峰值) 四个数组，只保留持续 min_duration 以上的区间"""
+        parts = [(start, end, np.zeros(len(start), dtype=bool), peak) for start, end, peak in self.parts]
+        if self.open is not None:
+            parts.append((np.array([self.open[0]]), np.array([self.last_time]), np.array([True]),
+                          np.array([self.open[1]])))
+        if not parts:
+            empty = np.array([], dtype='datetime64[ns]')
+            return empty, empty, np.array([], dtype=bool), np.array([], dtype=np.float64)
+        start, end, active, peak = (np.concatenate(arrays) for arrays in zip(*parts))
+        keep = (end - start) >= self.min_duration
+        return start[keep], end[keep], active[keep], peak[keep]
+
+
+def _rate(times, values, window, previous):
+    """每个有效读数与 window 之前（不晚于 t - window）最近一个读数之间的变化速率（每小时）绝对值，
+    之前没有这样的读数时为 NaN（保持之前的状态）；previous 为上一块末尾仍可能被比较的 (时间, 读数)，
+    返回 (速率, 本块的同一元组)"""
+    if previous is not None:
+        times_all, values_all = np.concatenate([previous[0], times]), np.concatenate([previous[1], values])
+    else:
+        times_all, values_all = times, values
+    ns = times_all.view(np.int64)
+    width = int(window.astype('timedelta64[ns]').astype(np.int64))
+    current = ns[len(ns) - len(times):]
+    j = np.searchsorted(ns, current - width, side='right') - 1
+    earlier = np.maximum(j, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.abs(values.astype(np.float64) - values_all[earlier]) / ((current - ns[earlier]) / 3.6e12)
+    rate[j < 0] = np.nan
+    # 之后的读数只会与末尾 window 内的读数或其前一个读数比较
+    k = max(int(np.searchsorted(ns, ns[-1] - width, side='right')) - 1, 0)
+    return rate, (times_all[k:].copy(), values_all[k:].copy())
+
+
+class _RuleScan:
+    """一条规则在一个传感器列上的逐块计算"""
+
+    def __init__(self, rule, key):
+        self.rule = rule
+        self.key = key
+        self.intervals = _IntervalScan(rule.get('min_duration', np.timedelta64(0, 's')), use_max=rule['kind'] != 'below')
+        self.previous = None  # 变化速率规则：上一块末尾仍可能被比较的有效读数
+
+    def add(self, chunk):
+        rule = self.rule
+        if rule['kind'] == 'rate':
+            times, values = chunk.valid(self.key)
+            if len(times) == 0:
+                return
+            metric, self.previous = _rate(times, values, rule.get('window', RATE_WINDOW), self.previous)
+            on, off = _conditions(metric, 'above', rule['value'], rule.get('clear'))
+        else:
+            times, metric = chunk.time, chunk.columns[self.key]
+            on, off = _conditions(metric, rule['kind'], rule['value'], rule.get('clear'))
+        self.intervals.add(on, off, times, metric)
+
+
+def _scan(store, scans):
+    """逐块（store.chunks）扫描一次，所有规则共用解码出的块；压缩的数据集不需要整体解码"""
+    for chunk in store.chunks():
+        for scan in scans:
+            scan.add(chunk)
+    return [scan.intervals.result() for scan in scans]
+
+
+def evaluate_rule(store, rule, key):
+    """对一个传感器列计算一条规则，返回 (开始时间, 结束时间, 是否仍在告警, 峰值) 四个数组"""
+    return _scan(store, [_RuleScan(rule, key)])[0]
+
+
+def evaluate(store, rules=None):
+    """对整个数据集计算所有规则，返回结果列表，每项包含一条规则在一个传感器上的全部告警区间"""
+    scans = [_RuleScan(rule, key) for rule in rules or DEFAULT_RULES for key in rule['sensors']]
+    results = []
+    for scan, (start, end, active, peak) in zip(scans, _scan(store, scans)):
+        results.append({
+            'rule': scan.rule['name'], 'sensor': scan.key, 'severity': scan.rule['severity'],
+            'start': start, 'end': end, 'active': active, 'peak': peak,
+        })
+    return results
+
+
+def is_active(results, sensor):
+    """该传感器当前是否有未解除的告警"""
+    return any(result['sensor'] == sensor and result['active'].any() for result in results)
+
+
+def alarm_entries(results, active_only=False, limit=None):
+    """把计算结果展开为按开始时间倒序排列的告警列表，每项包含 rule / sensor / severity / start / end（进行中为 None）/
+    active / peak；页面的告警记录和查询 API 的告警列表都由此生成"""
+    entries = []
+    for result in results:
+        index = np.flatnonzero(result['active']) if active_only else np.arange(len(result['start']))
+        if limit is not None:
+            index = index[-limit:]
+        for i in index:
+            active = bool(result['active'][i])
+            entries.append({
+                'rule': result['rule'],
+                'sensor': result['sensor'],
+                'severity': result['severity'],
+                'start': result['start'][i],
+                'end': None if active else result['end'][i],
+                'active': active,
+                'peak': float(result['peak'][i]),
+            })
+    entries.sort(key=lambda entry: entry['start'], reverse=True)
+    return entries[:limit] if limit is not None else entries
+
+
+def alarm_records(results, active_only=False, limit=None):
+    """页面显示的告警记录（中文列名），见 alarm_entries"""
+    return [{
+        '规则': entry['rule'],
+        '传感器': SENSOR_LABELS[entry['sensor']],
+        '级别': SEVERITY_LABELS[entry['severity']],
+        '开始': entry['start'].astype('datetime64[s]').item(),
+        '结束': None if entry['end'] is None else entry['end'].astype('datetime64[s]').item(),
+        '峰值': round(entry['peak'], 2),
+    } for entry in alarm_entries(results, active_only, limit)]
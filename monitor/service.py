@@ -0,0 +1,253 @@
+"""数据源、时间范围选择和查询：Streamlit 页面（app.py）与 JSON API（monitor.api）共用
+
+Monitor 持有进程内共享的数据源（单个 CSV，或 DCM_SOURCES 配置的多个 CSV 导出；可选多站点分区）
+和保留策略，配置从 DCM_* 环境变量读取。
+查询函数的结果只含 str / int / float / bool / None / list / dict，可以直接序列化为 JSON；
+计算结果通过 store.derived 随数据集缓存，与页面上同名的缓存共用。
+"""
+import os
+
+import numpy as np
+
+from monitor import metrics, online, quality, retention, rules
+from monitor.disk_cache import DiskCache
+from monitor.fetch import CsvSource
+from monitor.multisource import MultiSource, parse_sources
+from monitor.partitions import PartitionedStore
+from monitor.store import SENSOR_KEYS, SENSOR_LABELS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_URL = "https://raw.githubusercontent.com/1574602830lck-cmd/data-center-monitor/1ae0c6874e16ad216a229cc1451e8dfed81e282d/data_centre_df.csv"
+# 随仓库提供的本地数据（与 DEFAULT_DATA_URL 的内容相同），使用默认数据源时首次启动不必等待网络
+SEED_CSV = os.path.join(REPO_DIR, 'data_centre_df.csv')
+
+# 数据时间范围（以数据集的最后时刻为终点）
+CUSTOM_RANGE = "自定义"
+TIME_RANGES = {
+    "全部": None,
+    "最近24小时": np.timedelta64(1, 'D'),
+    "最近7天": np.timedelta64(7, 'D'),
+    "最近30天": np.timedelta64(30, 'D'),
+    "最近90天": np.timedelta64(90, 'D'),
+    "最近1年": np.timedelta64(365, 'D'),
+    CUSTOM_RANGE: None,
+}
+# API 参数中的时间范围简写
+RANGE_ALIASES = {'all': "全部", '24h': "最近24小时", '7d': "最近7天", '30d': "最近30天", '90d': "最近90天", '1y': "最近1年"}
+
+PUE_STATUS = ["优秀", "良好", "需关注", "需关注"]
+
+
+def _window(days):
+    """天数 -> timedelta64，未设置（0 / None）时为 None"""
+    return np.timedelta64(int(days * 86400), 's') if days else None
+
+
+def select_range(store, time_range, dates=None):
+    """所选时间范围内的子数据集（二分查找定位，共享内存；压缩存储只解码相交的块）；
+    dates 为自定义的 (起始日期, 结束日期)"""
+    if time_range == CUSTOM_RANGE and dates:
+        start, end = dates[0], dates[-1]
+        return store.between(np.datetime64(start, 'D'), np.datetime64(end, 'D') + np.timedelta64(1, 'D'))
+    window = TIME_RANGES.get(time_range)
+    return store.between() if window is None else store.last(window)
+
+
+class Monitor:
+    """进程内共享的数据源和范围选择"""
+
+    def __init__(self, data_url=DEFAULT_DATA_URL, seed_path=SEED_CSV, cache_dir=None, chunk_rows=None,
+                 sites_dir=None, refresh_interval=3600, sources=None, hot_days=None, raw_days=None, hourly_days=None,
+                 memory_budget=None):
+        # 设置 hot_days 时只有最近这么多天的数据不压缩（见 monitor.compressed）
+        hot_window = _window(hot_days)
+        # 设置 raw_days 或 memory_budget（字节）时较早的数据按小时 / 天聚合（见 monitor.retention）
+        self.retention = None
+        if raw_days or memory_budget:
+            self.retention = retention.Retention(_window(raw_days), _window(hourly_days), memory_budget or None)
+        if sources:
+            # 多个导出文件（见 monitor.multisource）：磁盘缓存为每个数据源保留最近两个版本
+            disk_cache = DiskCache(cache_dir, max_entries=2 * len(sources) + 1) if cache_dir else None
+            self.source = MultiSource(sources, disk_cache=disk_cache, chunk_rows=chunk_rows or None, hot_window=hot_window,
+                                      retention=self.retention)
+        else:
+            # 随仓库提供的数据只代表默认数据源，配置了其他 URL 时不用它充当首个版本
+            seed_path = seed_path if data_url == DEFAULT_DATA_URL else None
+            self.source = CsvSource(data_url, seed_path=seed_path, disk_cache=DiskCache(cache_dir) if cache_dir else None,
+                                    chunk_rows=chunk_rows or None, hot_window=hot_window, retention=self.retention)
+        # 多站点分区存储（见 monitor.partitions），未设置时为 None
+        self.partitions = PartitionedStore(sites_dir) if sites_dir else None
+        self.refresh_interval = refresh_interval
+
+    @classmethod
+    def from_env(cls):
+        """按 DCM_DATA_URL / DCM_SOURCES / DCM_CACHE_DIR / DCM_CHUNK_ROWS / DCM_SITES_DIR / DCM_REFRESH_INTERVAL /
+        DCM_HOT_DAYS / DCM_RAW_DAYS / DCM_HOURLY_DAYS / DCM_MEMORY_BUDGET_MB 创建"""
+        sources = os.environ.get('DCM_SOURCES')
+        return cls(os.environ.get('DCM_DATA_URL', DEFAULT_DATA_URL),
+                   sources=parse_sources(sources) if sources else None,
+                   cache_dir=os.environ.get('DCM_CACHE_DIR', os.path.join(REPO_DIR, '.data_cache')),
+                   chunk_rows=int(os.environ.get('DCM_CHUNK_ROWS', 0)),
+                   sites_dir=os.environ.get('DCM_SITES_DIR') or None,
+                   refresh_interval=int(os.environ.get('DCM_REFRESH_INTERVAL', 3600)),
+                   hot_days=float(os.environ.get('DCM_HOT_DAYS') or 0),
+                   raw_days=float(os.environ.get('DCM_RAW_DAYS') or 0),
+                   hourly_days=float(os.environ.get('DCM_HOURLY_DAYS') or 0),
+                   memory_budget=int(float(os.environ.get('DCM_MEMORY_BUDGET_MB') or 0) * 1024 * 1024))
+
+    def current(self):
+        """(版本号, 数据集)：立即返回进程内共享的当前版本，过期时在后台刷新；还没有数据时数据集为 None"""
+        self.source.refresh_in_background(self.refresh_interval)
+        return self.source.dataset.current()
+
+    def snapshot(self):
+        """当前共享版本的数据集（不触发刷新）"""
+        return self.source.snapshot()
+
+    def stale_keys(self):
+        """数据源更新失败、数据可能过期的传感器（只有多个数据源时才会部分过期）"""
+        return self.source.stale_keys() if isinstance(self.source, MultiSource) else set()
+
+    def memory(self):
+        """当前数据集的常驻内存（字节，按原始数据 / 小时桶 / 天桶，另列按范围缓存的部分）、内存上限、
+        聚合次数和进程常驻内存（见 monitor.retention.memory_usage）"""
+        usage = retention.memory_usage(self.snapshot())
+        usage['raw_since'] = _time(usage['raw_since'])
+        usage['hourly_since'] = _time(usage['hourly_since'])
+        policy = self.retention
+        usage.update({
+            'budget_bytes': policy.max_bytes if policy else None,
+            'compactions': policy.compactions if policy else 0,
+            'last_compaction_seconds': policy.last_elapsed if policy else None,
+            'dropped_days': policy.dropped_days if policy else 0,
+        })
+        usage['process_resident_bytes'], usage['process_peak_bytes'] = metrics.process_memory()
+        if isinstance(self.source, MultiSource):
+            usage['sources'] = {status['name']: status['bytes'] for status in self.source.status()}
+        return usage
+
+    def sites(self):
+        return self.partitions.sites() if self.partitions else []
+
+    def site_range(self, site, time_range, dates=None):
+        """站点在所选时间范围内的数据：只读取该站点与范围相交的日期分区（结果按站点数据版本缓存）"""
+        if time_range == CUSTOM_RANGE and dates:
+            return self.partitions.read(site, np.datetime64(dates[0], 'D'), np.datetime64(dates[-1], 'D') + np.timedelta64(1, 'D'))
+        window = TIME_RANGES.get(time_range)
+        last = self.partitions.last_time(site) if window is not None else None
+        return self.partitions.read(site, None if last is None else last - window)
+
+    def select(self, time_range="全部", dates=None, site=None):
+        """(数据版本, 所选范围的数据)；站点的版本是分区目录的修改时间，还没有数据时数据为 None"""
+        if site is not None:
+            if self.partitions is None or site not in self.sites():
+                raise KeyError(site)
+            return ('site', site, self.partitions.version(site)), self.site_range(site, time_range, dates)
+        version, store = self.current()
+        return version, None if store is None else select_range(store, time_range, dates)
+
+
+# ---- 查询（结果可直接序列化为 JSON） ----
+
+def _time(value):
+    return None if value is None else str(np.datetime64(value, 's'))
+
+
+def _number(value, digits=4):
+    if value is None:
+        return None
+    value = float(value)
+    return None if value != value else round(value, digits)
+
+
+def _seconds(delta):
+    return None if delta is None else float(delta / np.timedelta64(1, 's'))
+
+
+def _span(store):
+    return {
+        'rows': len(store),
+        'start': _time(store.first_time) if len(store) else None,
+        'end': _time(store.last_time) if len(store) else None,
+    }
+
+
+def latest(store, engine=None, stale=()):
+    """各传感器的最新读数、平滑值（EWMA）和趋势；engine 为共享的在线统计（已并入实时推送的读数）时取自 engine，
+    stale 中的传感器标记为过期（数据源更新失败）"""
+    if engine is not None:
+        engine.sync(store)
+    sensors = {}
+    for key in SENSOR_KEYS:
+        stats = engine.get(key) if engine is not None else store.derived(f'online_{key}', lambda s, key=key: online.recent(s, key))
+        if stats is None:
+            continue
+        sensors[key] = {
+            'label': SENSOR_LABELS[key],
+            'time': _time(stats['time']),
+            'value': _number(stats['value']),
+            'ewma': _number(stats['ewma']),
+            'trend': _number(stats['trend']),
+            'stale': key in stale,
+        }
+    result = {**_span(store), 'sensors': sensors}
+    if 'PUE' in sensors:
+        result['pue_status'] = PUE_STATUS[rules.pue_level(sensors['PUE']['ewma'])]
+    if 'hydr' in sensors:
+        result['hydrogen_alarm'] = rules.is_active(store.derived('alarms', rules.evaluate), 'hydr')
+    return result
+
+
+def window_stats(store, keys=None):
+    """所选范围内各传感器的有效读数数、均值、最小/最大值和最新值"""
+    sensors = {}
+    for key in keys or SENSOR_KEYS:
+        summary = store.summary(key)
+        sensors[key] = {
+            'label': SENSOR_LABELS[key],
+            'count': store.totals(key)[0],
+            'mean': _number(summary and summary['mean']),
+            'min': _number(summary and summary['min']),
+            'max': _number(summary and summary['max']),
+            'latest': _number(summary and summary['latest']),
+            'latest_time': _time(store.latest_time(key)),
+        }
+    return {**_span(store), 'sensors': sensors}
+
+
+def alarms(store, active_only=False, limit=None):
+    """告警记录（按开始时间倒序，见 rules.alarm_entries），active_only 时只返回未解除的"""
+    records = [{
+        **entry,
+        'label': SENSOR_LABELS[entry['sensor']],
+        'start': _time(entry['start']),
+        'end': _time(entry['end']),
+        'peak': _number(entry['peak'], 2),
+    } for entry in rules.alarm_entries(store.derived('alarms', rules.evaluate), active_only, limit)]
+    return {**_span(store), 'alarms': records}
+
+
+def quality_report(store):
+    """数据质量概况（见 monitor.quality.profile），时间长度以秒表示"""
+    profile = store.derived('quality', quality.profile)
+    sensors = {}
+    for key, sensor in profile['sensors'].items():
+        sensors[key] = {
+            'label': SENSOR_LABELS[key],
+            'valid': sensor['valid'],
+            'missing_ratio': _number(sensor['missing_ratio']),
+            'gaps': len(sensor['gap_starts']),
+            'longest_gap_seconds': _seconds(sensor['longest_gap']),
+            'latest': _time(sensor['latest']),
+            'lag_seconds': _seconds(sensor['lag']),
+            'stuck_runs': len(sensor['stuck_starts']),
+        }
+    return {
+        **_span(store),
+        'cadence_seconds': _seconds(profile['cadence']),
+        'dates': profile['dates'],
+        'calendar_days': profile['calendar_days'],
+        'missing_dates': [str(day) for day in profile['missing_dates']],
+        'row_gaps': len(profile['row_gap_starts']),
+        'sensors': sensors,
+    }
@@ -0,0 +1,54 @@
+"""本地传感器模拟器：按固定频率向推送服务发送随机游走的读数
+
+氢气每 interval 秒推送一次，其余传感器每 slow_every 次推送一次。
+
+用法: python -m monitor.simulator [推送地址] [间隔秒数]
+      python -m monitor.simulator http://127.0.0.1:8765 0.2
+"""
+import json
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+from monitor.store import SENSOR_KEYS
+
+# 各传感器的起始值和每步波动
+START_VALUES = {'hydr': (3.0, 0.3), 'PUE': (1.52, 0.005)}
+
+
+def start_value(key):
+    if key in START_VALUES:
+        return START_VALUES[key]
+    return (22.0, 0.05) if key.endswith('Temp') else (50.0, 0.2)
+
+
+def post(url, readings, timeout=5):
+    request = urllib.request.Request(url + '/readings', data=json.dumps(readings).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())['accepted']
+
+
+def run(url, interval=0.2, slow_every=10, seed=None):
+    rng = np.random.default_rng(seed)
+    state = {key: start_value(key)[0] for key in SENSOR_KEYS}
+    tick = 0
+    while True:
+        keys = SENSOR_KEYS if tick % slow_every == 0 else ['hydr']
+        readings = []
+        for key in keys:
+            state[key] = max(0.0, state[key] + rng.normal(0, start_value(key)[1]))
+            readings.append({'sensor': key, 'value': round(state[key], 3), 'time': time.time()})
+        try:
+            post(url, readings)
+        except OSError as e:
+            print(f"推送失败: {e}", file=sys.stderr)
+        tick += 1
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    run(sys.argv[1] if len(sys.argv) > 1 else 'http://127.0.0.1:8765',
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.2)
@@ -0,0 +1,346 @@
+"""列式时序数据存储
+
+时间索引为排序后的 datetime64[ns] 数组，每个传感器一列 float32 数组，
+缺失值用 NaN 表示（不再用 0 占位），各页面直接读取切片。
+数据集对外只提供只读视图，可以在会话和线程之间共享。
+按时间范围查询用二分查找定位行号区间，返回共享内存的子数据集，O(log n + k)。
+数据量较大时，统计和长时间窗口的图表取自多级预聚合（见 monitor.rollup）。
+按保留策略聚合过的时段（见 monitor.retention）每个桶是一行（桶内均值），统计和图表总是取自桶的统计量。
+"""
+import threading
+import weakref
+
+import numpy as np
+
+from monitor.downsample import minmax_decimate
+from monitor.rollup import Rollups
+
+# CSV列名 -> 内部键
+COLUMN_MAPPING = {
+    'computer_room_temp': 'ZJFTemp', 'computer_room_humidity': 'ZJFHum',
+    'cold_aisle_temp': 'LTDTemp', 'cold_aisle_humidity': 'LTDHum',
+    'battery_room_temp': 'DCJTemp', 'battery_room_humidity': 'DCJHum',
+    'carrier_room_temp': 'YYJTemp', 'carrier_room_humidity': 'YYJHum',
+    'power_room_temp': 'PDJTemp', 'power_room_humidity': 'PDJHum',
+    'hydrogen_sensor': 'hydr', 'pue': 'PUE'
+}
+
+SENSOR_KEYS = list(COLUMN_MAPPING.values())
+
+# 内部键 -> 显示名称
+SENSOR_LABELS = {
+    'ZJFTemp': '主机房温度', 'ZJFHum': '主机房湿度',
+    'LTDTemp': '冷通道温度', 'LTDHum': '冷通道湿度',
+    'DCJTemp': '电池间温度', 'DCJHum': '电池间湿度',
+    'YYJTemp': '运营间温度', 'YYJHum': '运营间湿度',
+    'PDJTemp': '配电间温度', 'PDJHum': '配电间湿度',
+    'hydr': '氢气浓度', 'PUE': 'PUE'
+}
+
+# 机房区域 -> (温度键, 湿度键)；氢气和 PUE 属于整个站点
+ROOM_SENSORS = {
+    '主机房': ('ZJFTemp', 'ZJFHum'), '冷通道': ('LTDTemp', 'LTDHum'), '电池间': ('DCJTemp', 'DCJHum'),
+    '运营间': ('YYJTemp', 'YYJHum'), '配电间': ('PDJTemp', 'PDJHum'),
+}
+
+DATE_COLUMNS = ['record_date', 'date', '时间', '日期']
+
+# 每个数据集缓存的时间范围子集个数，超过时全部清空
+MAX_CACHED_RANGES = 16
+# 行数达到这个数量时才生成和使用多级聚合，更少时直接扫描原始数据同样快
+ROLLUP_MIN_ROWS = 100_000
+
+
+def find_date_column(columns):
+    """返回第一个日期列名，找不到时返回 None"""
+    for col in columns:
+        if col.lower() in DATE_COLUMNS:
+            return col
+    return None
+
+
+def _read_only(array):
+    """共享内存的只读视图（不影响调用方持有的原数组）"""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class SensorStore:
+    """只读的列式传感器数据集"""
+
+    def __init__(self, time, columns, assume_sorted=False, rollups=None, compacted_until=None):
+        time = np.asarray(time, dtype='datetime64[ns]')
+        n = len(time)
+        data = {}
+        for key in SENSOR_KEYS:
+            values = columns.get(key)
+            if values is None:
+                values = np.full(n, np.nan, dtype=np.float32)
+            values = np.asarray(values, dtype=np.float32)
+            if len(values) != n:
+                raise ValueError(f"列 {key} 长度 {len(values)} 与时间索引长度 {n} 不一致")
+            data[key] = values
+
+        # 保证时间索引有序（稳定排序，保留同一时刻的原始顺序）
+        if not assume_sorted and n > 1 and np.any(time[1:] < time[:-1]):
+            order = np.argsort(time, kind='stable')
+            time = time[order]
+            data = {key: values[order] for key, values in data.items()}
+
+        self.time = _read_only(time)
+        self.columns = {key: _read_only(values) for key, values in data.items()}
+        self._valid_index = {}
+        self._derived = {}
+        self._ranges = {}
+        # 时间范围子集：(所属数据集的弱引用, 起始行号)，有效值索引从所属数据集的索引中截取
+        self._parent = None
+        # 多级聚合，或实现相同查询接口（range_stats / envelope）的索引，如压缩存储的块头
+        self._rollups = rollups
+        self._rollup_lock = threading.Lock()
+        # 早于这个时刻的行是聚合桶（桶内均值），None 表示都是原始数据
+        self.compacted_until = compacted_until
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """由原始CSV对应的 DataFrame 构建"""
+        import pandas as pd
+
+        date_col = find_date_column(df.columns)
+        if date_col is None:
+            # 没有日期列时按行号（从 1 开始）编号，第 i 行记为 1970-01-01 之后的第 i 天；
+            # 分块读取时 DataFrame 的行号接续上一块
+            time = (np.asarray(df.index, dtype=np.int64) + 1).astype('datetime64[D]').astype('datetime64[ns]')
+        else:
+            time = pd.to_datetime(df[date_col]).to_numpy(dtype='datetime64[ns]')
+
+        columns = {}
+        for csv_col, key in COLUMN_MAPPING.items():
+            if csv_col in df.columns:
+                columns[key] = pd.to_numeric(df[csv_col], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+        return cls(time, columns)
+
+    def append(self, other):
+        """返回追加了 other 各行的新数据集（原数据集不变）；
+        新行都不早于已有数据时，已生成的多级聚合增量更新"""
+        if len(other) == 0:
+            return self
+        in_order = len(self) == 0 or other.time[0] >= self.time[-1]
+        time = np.concatenate([self.time, other.time])
+        columns = {key: np.concatenate([self.columns[key], other.columns[key]]) for key in SENSOR_KEYS}
+        result = SensorStore(time, columns, assume_sorted=in_order)
+        if in_order and self._rollups is not None and len(result) >= ROLLUP_MIN_ROWS:
+            result._rollups = self._rollups.extend(result.time, result.columns)
+        return result
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def nbytes(self):
+        return self.time.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    @property
+    def rollup_nbytes(self):
+        """已生成的多级聚合占用的字节数，未生成时为 0"""
+        return self._rollups.nbytes if self._rollups is not None else 0
+
+    def derived(self, name, compute):
+        """按名称缓存由本数据集计算出的结果（数据集只读，结果随数据集一起失效）"""
+        if name not in self._derived:
+            self._derived[name] = compute(self)
+        return self._derived[name]
+
+    def rollups(self):
+        """整个数据集的多级聚合，首次调用时生成；数据量太小时返回 None"""
+        if self._rollups is not None:
+            return self._rollups
+        if len(self) < ROLLUP_MIN_ROWS:
+            return None
+        if self._rollups is None:
+            with self._rollup_lock:
+                if self._rollups is None:
+                    self._rollups = Rollups.build(self.time, self.columns)
+        return self._rollups
+
+    def _rollup_source(self):
+        """(最上层的数据集, 其多级聚合)：子集使用所属数据集的聚合"""
+        store = self
+        while store._parent is not None:
+            parent = store._parent[0]()
+            if parent is None:
+                return None, None
+            store = parent
+        return store, store.rollups()
+
+    def _use_rollups(self):
+        """统计和图表是否取自聚合：数据量大，或包含按保留策略聚合过的行"""
+        return len(self) >= ROLLUP_MIN_ROWS or (
+            self.compacted_until is not None and len(self) > 0 and self.time[0] < self.compacted_until)
+
+    def totals(self, key):
+        """该列有效值的 (count, sum, min, max)：数据量大时由多级聚合合并，不扫描原始数据"""
+        if self._use_rollups():
+            root, rollups = self._rollup_source()
+            if rollups is not None:
+                return rollups.range_stats(root, key, self.time[0], self.time[-1] + np.timedelta64(1, 'ns'))
+        _, values = self.valid(key)
+        if len(values) == 0:
+            return 0, 0.0, None, None
+        return len(values), float(values.sum(dtype=np.float64)), float(values.min()), float(values.max())
+
+    def valid_index(self, key):
+        """该列有效值（非 NaN）的行号，按列缓存"""
+        index = self._valid_index.get(key)
+        if index is None:
+            parent = self._parent and self._parent[0]()
+            if parent is not None:
+                lo = self._parent[1]
+                parent_index = parent.valid_index(key)
+                index = parent_index[np.searchsorted(parent_index, lo):np.searchsorted(parent_index, lo + len(self))] - lo
+            else:
+                index = np.flatnonzero(~np.isnan(self.columns[key]))
+            self._valid_index[key] = index
+        return index
+
+    def has_data(self, key):
+        return len(self.valid_index(key)) > 0
+
+    def valid_count(self, key):
+        return len(self.valid_index(key))
+
+    def valid(self, key, recent_points=None):
+        """返回 (时间, 数值) 两个数组，只包含有效值；recent_points 限定为最近 N 个"""
+        index = self.valid_index(key)
+        if recent_points is not None:
+            index = index[-recent_points:]
+        return self.time[index], self.columns[key][index]
+
+    def valid_since(self, key, window):
+        """最近 window（timedelta64）时间内的有效值，以整个数据集的最后时刻为终点"""
+        if len(self.time) == 0:
+            return self.valid(key)
+        start = np.searchsorted(self.time, self.time[-1] - window, side='left')
+        index = self.valid_index(key)
+        index = index[np.searchsorted(index, start):]
+        return self.time[index], self.columns[key][index]
+
+    def range_index(self, start=None, end=None):
+        """时间在 [start, end) 内的行号区间 (lo, hi)，None 表示不限"""
+        lo = 0 if start is None else int(np.searchsorted(self.time, np.datetime64(start, 'ns'), side='left'))
+        hi = len(self.time) if end is None else int(np.searchsorted(self.time, np.datetime64(end, 'ns'), side='left'))
+        return lo, max(lo, hi)
+
+    def between(self, start=None, end=None):
+        """时间在 [start, end) 内的子数据集（共享内存），同一区间的子集缓存在本数据集上"""
+        lo, hi = self.range_index(start, end)
+        if lo == 0 and hi == len(self.time):
+            return self
+        subset = self._ranges.get((lo, hi))
+        if subset is None:
+            subset = SensorStore(self.time[lo:hi], {key: values[lo:hi] for key, values in self.columns.items()},
+                                 assume_sorted=True)
+            subset._parent = (weakref.ref(self), lo)
+            subset.compacted_until = self.compacted_until
+            if len(self._ranges) >= MAX_CACHED_RANGES:
+                self._ranges.clear()
+            self._ranges[(lo, hi)] = subset
+        return subset
+
+    def last(self, window):
+        """最近 window（timedelta64）时间内的子数据集，以整个数据集的最后时刻为终点"""
+        if len(self.time) == 0:
+            return self
+        return self.between(self.time[-1] - window)
+
+    def decimated_since(self, key, window, max_points):
+        """最近 window 时间内的有效值，降到约 max_points 个点（保留峰谷）；
+        数据量大时取范围内桶数足够的最粗一级聚合，不读取原始数据"""
+        if self._use_rollups():
+            root, rollups = self._rollup_source()
+            if rollups is not None:
+                end = self.time[-1] + np.timedelta64(1, 'ns')
+                start = max(self.time[-1] - window, self.time[0])
+                envelope = rollups.envelope(root, key, start, end, max_points)
+                if envelope is not None:
+                    return minmax_decimate(*envelope, max_points)
+        return minmax_decimate(*self.valid_since(key, window), max_points)
+
+    def latest(self, key):
+        """最新有效值，没有数据时返回 None"""
+        index = self.valid_index(key)
+        if len(index) == 0:
+            return None
+        return float(self.columns[key][index[-1]])
+
+    def latest_time(self, key):
+        """最新有效值的时刻，没有数据时返回 None"""
+        index = self.valid_index(key)
+        if len(index) == 0:
+            return None
+        return self.time[index[-1]]
+
+    def summary(self, key):
+        """最新值/均值/最大值/最小值，没有数据时返回 None"""
+        count, total, low, high = self.totals(key)
+        if count == 0:
+            return None
+        return {
+            'latest': self.latest(key),
+            'mean': total / count,
+            'max': high,
+            'min': low,
+        }
+
+    def pooled_mean(self, keys):
+        """多列有效值合并后的均值，没有数据时返回 None"""
+        total = 0.0
+        count = 0
+        for key in keys:
+            key_count, key_total, _, _ = self.totals(key)
+            total += key_total
+            count += key_count
+        return total / count if count else None
+
+    def unique_dates(self):
+        """不同日期数（时间有序，相邻比较即可）"""
+        if len(self.time) == 0:
+            return 0
+        days = self.time.astype('datetime64[D]')
+        return 1 + int(np.count_nonzero(days[1:] != days[:-1]))
+
+    @property
+    def first_time(self):
+        """第一条记录的时刻，空数据集返回 None"""
+        return self.time[0] if len(self.time) else None
+
+    @property
+    def last_time(self):
+        """最后一条记录的时刻，空数据集返回 None"""
+        return self.time[-1] if len(self.time) else None
+
+    def chunks(self, start=None):
+        """按时间顺序分块返回数据（与 monitor.compressed.CompressedStore 相同的接口），
+        可以跳过早于 start 的部分；不压缩的数据集只有一块"""
+        yield self
+
+    def times(self):
+        """按时间顺序分块返回时间数组（与 chunks 对应）"""
+        yield self.time
+
+    def rows(self, lo, hi):
+        """第 [lo, hi) 行（共享内存，不缓存），与压缩数据集的按需解码范围接口相同"""
+        return SensorStore(self.time[lo:hi], {key: values[lo:hi] for key, values in self.columns.items()},
+                           assume_sorted=True)
+
+    def first_date(self):
+        """第一条记录的日期，空数据集返回 None"""
+        if len(self.time) == 0:
+            return None
+        return self.time[0].astype('datetime64[D]').item()
+
+    def latest_date(self):
+        """最后一条记录的日期，空数据集返回 None"""
+        if len(self.time) == 0:
+            return None
+        return self.time[-1].astype('datetime64[D]').item()
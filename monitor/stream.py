@@ -0,0 +1,249 @@
+"""实时推送数据：每个传感器一个固定容量的环形缓冲区，进程内所有会话共享
+
+传感器（或本地模拟器）通过 HTTP 推送读数：
+
+    POST /readings
+    {"sensor": "hydr", "value": 3.2, "time": "2026-01-01T12:00:00"}
+
+也可以一次推送多条（JSON 数组），或按 CSV 行的形式推送多个传感器：
+
+    {"time": "2026-01-01T12:00:00", "hydrogen_sensor": 3.2, "pue": 1.52}
+
+sensor 可以是内部键（hydr）或 CSV 列名（hydrogen_sensor）；time 可省略（取接收时刻），
+可以是 ISO 8601 字符串或 Unix 时间戳（秒），带时区时转换为本地时间。数值缺少或为 null 时整次推送返回 400。
+
+GET /readings/latest 返回各传感器最新读数。
+读数同时并入 StreamHub.online 的在线统计（见 monitor.online）。
+"""
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from monitor.online import OnlineEngine
+from monitor.store import COLUMN_MAPPING, SENSOR_KEYS, SensorStore
+
+# 每个传感器保留的读数条数
+DEFAULT_CAPACITY = 3600
+# 单次推送的最大字节数
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class RingBuffer:
+    """固定容量的 (时间, 数值) 环形缓冲区，写满后覆盖最旧的读数（不加锁，由 StreamHub 加锁）"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._time = np.zeros(capacity, dtype='datetime64[ns]')
+        self._values = np.full(capacity, np.nan, dtype=np.float32)
+        self._written = 0
+
+    def __len__(self):
+        return min(self._written, self.capacity)
+
+    def extend(self, times, values):
+        times = np.asarray(times, dtype='datetime64[ns]')[-self.capacity:]
+        values = np.asarray(values, dtype=np.float32)[-self.capacity:]
+        pos = (self._written + np.arange(len(times))) % self.capacity
+        self._time[pos] = times
+        self._values[pos] = values
+        self._written += len(times)
+
+    def latest(self):
+        if self._written == 0:
+            return None
+        i = (self._written - 1) % self.capacity
+        return self._time[i], float(self._values[i])
+
+    def snapshot(self):
+        """按写入顺序返回 (时间, 数值) 的副本"""
+        if self._written <= self.capacity:
+            return self._time[:self._written].copy(), self._values[:self._written].copy()
+        start = self._written % self.capacity
+        return (np.concatenate([self._time[start:], self._time[:start]]),
+                np.concatenate([self._values[start:], self._values[:start]]))
+
+
+class StreamHub:
+    """各传感器的环形缓冲区"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.received = 0
+        self.last_received = None
+        self.server = None
+        self.server_error = None
+        self._buffers = {key: RingBuffer(capacity) for key in SENSOR_KEYS}
+        self._lock = threading.Lock()
+        # 各传感器的在线统计：实时读数逐条并入，历史数据由页面通过 online.sync 并入
+        self.online = OnlineEngine(replay=self.series)
+
+    def ingest(self, readings):
+        """写入 [(传感器键, datetime64, 数值), ...]，返回写入条数"""
+        grouped = {}
+        for key, time, value in readings:
+            times, values = grouped.setdefault(key, ([], []))
+            times.append(time)
+            values.append(value)
+
+        with self._lock:
+            for key, (times, values) in grouped.items():
+                self._buffers[key].extend(times, values)
+            count = sum(len(times) for times, _ in grouped.values())
+            self.received += count
+            if count:
+                self.last_received = datetime.now()
+        self.online.ingest(readings)
+        return count
+
+    def latest(self, key):
+        """最新读数 (datetime64, 数值)，没有读数时返回 None"""
+        with self._lock:
+            return self._buffers[key].latest()
+
+    def latest_value(self, key, after=None):
+        """最新读数的数值；没有读数、或读数不晚于 after（datetime64）时返回 None"""
+        reading = self.latest(key)
+        if reading is None or (after is not None and reading[0] <= after):
+            return None
+        return reading[1]
+
+    def series(self, key):
+        with self._lock:
+            return self._buffers[key].snapshot()
+
+    def store(self, key):
+        """单个传感器读数组成的数据集（用于告警规则、图表）"""
+        times, values = self.series(key)
+        return SensorStore(times, {key: values})
+
+    def start_server(self, host, port):
+        """在后台线程启动推送服务，端口被占用等错误记录在 server_error 中"""
+        if self.server is not None:
+            return self.server
+        try:
+            self.server = PushServer(self, host, port)
+        except OSError as e:
+            self.server_error = e
+            return None
+        threading.Thread(target=self.server.serve_forever, name='stream-push', daemon=True).start()
+        return self.server
+
+
+def parse_time(value):
+    """推送的时间字段 -> datetime64[ns]（本地时间），无法表示的时刻抛出 ValueError"""
+    if value is None:
+        dt = datetime.now()
+    elif isinstance(value, (int, float)):
+        try:
+            dt = datetime.fromtimestamp(value)
+        except (OSError, OverflowError, ValueError) as e:
+            raise ValueError(f"时间戳超出范围: {value}") from e
+    else:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if dt.tzinfo is not None:
+            dt = dt.astimezone().replace(tzinfo=None)
+    # datetime64[ns] 只能表示 1678 ~ 2262 年，超出时转换会静默溢出
+    micros = np.datetime64(dt, 'us')
+    time = micros.astype('datetime64[ns]')
+    if time.astype('datetime64[us]') != micros:
+        raise ValueError(f"时间超出范围: {value}")
+    return time
+
+
+def _sensor_key(name):
+    key = COLUMN_MAPPING.get(name, name)
+    if key not in SENSOR_KEYS:
+        raise ValueError(f"未知传感器: {name}")
+    return key
+
+
+def _reading_value(name, value):
+    """读数的数值：缺少或为 null 时抛出 ValueError（不存成 NaN）"""
+    if value is None:
+        raise ValueError(f"缺少读数: {name}")
+    return float(value)
+
+
+def parse_readings(payload):
+    """推送内容（已解析的 JSON）-> [(传感器键, datetime64, 数值), ...]，格式错误时抛出 ValueError"""
+    items = payload if isinstance(payload, list) else [payload]
+    readings = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("每条读数必须是 JSON 对象")
+        try:
+            time = parse_time(item.get('time'))
+            if 'sensor' in item:
+                readings.append((_sensor_key(item['sensor']), time, _reading_value(item['sensor'], item.get('value'))))
+            else:
+                for name, value in item.items():
+                    if name != 'time':
+                        readings.append((_sensor_key(name), time, _reading_value(name, value)))
+        except (TypeError, OverflowError) as e:
+            raise ValueError(str(e)) from e
+    return readings
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != '/readings':
+            self._send(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send(400, {'error': 'invalid Content-Length'})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send(413, {'error': 'payload too large'})
+            return
+        try:
+            readings = parse_readings(json.loads(self.rfile.read(length)))
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+            return
+        self._send(200, {'accepted': self.server.hub.ingest(readings)})
+
+    def do_GET(self):
+        if self.path != '/readings/latest':
+            self._send(404, {'error': 'not found'})
+            return
+        latest = {}
+        for key in SENSOR_KEYS:
+            reading = self.server.hub.latest(key)
+            if reading is not None:
+                latest[key] = {'time': str(reading[0].astype('datetime64[ms]')), 'value': reading[1]}
+        self._send(200, latest)
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class PushServer(ThreadingHTTPServer):
+    """接收推送读数的 HTTP 服务，读数写入 hub"""
+
+    daemon_threads = True
+
+    def __init__(self, hub, host='127.0.0.1', port=8765):
+        self.hub = hub
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
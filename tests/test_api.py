@@ -0,0 +1,106 @@
+"""查询 API：各接口的响应、ETag 和 304、参数错误 400、未知路径和站点 404（端口 0 启动 ThreadingHTTPServer）"""
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from benchmarks.bench_rules import make_store
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv
+from monitor import api, rules, service
+
+ROWS = 5000
+SITE = '北京'
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('api')
+    path = os.path.join(directory, 'data.csv')
+    generate_csv(path, ROWS)
+    with LocalServer({'/data.csv': path}) as data_server:
+        monitor = service.Monitor(data_server.url('/data.csv'), seed_path=None,
+                                  sites_dir=os.path.join(directory, 'sites'))
+        assert monitor.source.refresh()
+        monitor.partitions.write(SITE, make_store(3000))
+        server = api.ApiServer(api.QueryApi(monitor), port=0).start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+
+def get(server, path, etag=None):
+    """(状态码, ETag, JSON)"""
+    request = urllib.request.Request(server.url + path, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            body = response.read()
+            return response.status, response.headers.get('ETag'), json.loads(body) if body else None
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        return e.code, e.headers.get('ETag'), json.loads(body) if body else None
+
+
+def test_version_and_latest(server):
+    status, _, body = get(server, '/api/version')
+    assert status == 200 and body['rows'] == ROWS and body['sites'] == [SITE]
+    status, _, body = get(server, '/api/latest')
+    assert status == 200 and body['sensors']['PUE']['value'] is not None
+    assert body['pue_status'] and isinstance(body['hydrogen_alarm'], bool)
+
+
+def test_stats(server):
+    status, _, body = get(server, '/api/stats?range=7d&keys=PUE,hydr')
+    assert status == 200 and list(body['sensors']) == ['PUE', 'hydr']
+    pue = body['sensors']['PUE']
+    assert 0 < pue['count'] <= ROWS and pue['min'] <= pue['mean'] <= pue['max']
+
+
+def test_alarms_match_page_records(server):
+    status, _, body = get(server, '/api/alarms')
+    assert status == 200 and len(body['alarms']) > 1
+    store = server.api.monitor.select()[1]
+    records = rules.alarm_records(store.derived('alarms', rules.evaluate))
+    # 与页面的告警记录来自同一份列表
+    assert [(a['rule'], a['label'], a['start'], a['peak']) for a in body['alarms']] == \
+        [(r['规则'], r['传感器'], r['开始'].isoformat(), r['峰值']) for r in records]
+    assert [a['start'] for a in body['alarms']] == sorted((a['start'] for a in body['alarms']), reverse=True)
+    assert get(server, '/api/alarms?limit=1')[2]['alarms'] == body['alarms'][:1]
+    status, _, body = get(server, '/api/alarms?active=1')
+    assert status == 200 and all(a['active'] and a['end'] is None for a in body['alarms'])
+
+
+def test_quality_and_memory(server):
+    status, _, body = get(server, '/api/quality?range=30d')
+    assert status == 200 and body['cadence_seconds'] == 60 and set(body['sensors']) == set(rules.SENSOR_LABELS)
+    status, _, body = get(server, '/api/memory')
+    assert status == 200 and body['raw_rows'] == ROWS and body['process_resident_bytes']
+
+
+def test_etag_not_modified(server):
+    status, etag, _ = get(server, '/api/stats?range=30d')
+    assert status == 200 and etag
+    assert get(server, '/api/stats?range=30d', etag)[:2] == (304, etag)
+
+
+def test_site(server):
+    status, _, body = get(server, f'/api/stats?site={urllib.parse.quote(SITE)}&range=all')
+    assert status == 200 and body['sensors']['PUE']['count'] > 0
+    status, _, body = get(server, '/api/stats?site=nowhere')
+    assert status == 404 and 'nowhere' in body['error']
+
+
+@pytest.mark.parametrize('path', ['/api/unknown', '/other', '/'])
+def test_not_found(server, path):
+    status, _, body = get(server, path)
+    assert status == 404 and body['error']
+
+
+@pytest.mark.parametrize('path', ['/api/stats?range=2w', '/api/stats?keys=PUE,nope', '/api/alarms?limit=x',
+                                  '/api/stats?start=2024-13-01'])
+def test_bad_parameters(server, path):
+    status, _, body = get(server, path)
+    assert status == 400 and body['error']
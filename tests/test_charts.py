@@ -0,0 +1,61 @@
+"""图表缓存键和渲染进程池"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+import charts
+from monitor import render_worker
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 主脚本每次执行都在文件中记一行；渲染进程池启动工作进程后不应再执行
+MAIN = """
+import os, sys
+with open(sys.argv[1], 'a') as f:
+    f.write(__name__ + '\\n')
+if __name__ == '__main__':
+    import multiprocessing.spawn
+    original = multiprocessing.spawn.get_preparation_data
+    import charts
+    from monitor import render_worker
+    pool = charts.get_render_pool()
+    assert pool is not None
+    assert pool.submit(render_worker.noop).result(timeout=60) is None
+    # 只在启动工作进程时替换启动信息，之后恢复
+    assert multiprocessing.spawn.get_preparation_data is original
+    pool.shutdown()
+"""
+
+
+def make_spec():
+    times = np.datetime64('2024-01-01', 'ns') + np.arange(10) * np.timedelta64(1, 'm')
+    return charts.make_spec('温度', '°C', [('主机房', times, np.arange(10, dtype=np.float32), 'red')], (8, 3), [])
+
+
+def test_spec_key_includes_backend():
+    spec = make_spec()
+    assert charts.spec_key(spec) == charts.spec_key(spec, backend='matplotlib')
+    assert charts.spec_key(spec, backend='vega') != charts.spec_key(spec)
+    assert charts.spec_key(spec, 'SimHei.ttf') != charts.spec_key(spec)
+
+
+def test_pool_renders_like_serial():
+    charts.render_cache.clear()
+    specs = [make_spec(), charts.make_spec('湿度', '%', [('主机房', make_spec()['series'][0][1], np.ones(10, np.float32), 'blue')],
+                                          (8, 3), [])]
+    serial = [charts.render_chart(spec) for spec in specs]
+    pool = render_worker.start_pool(1)
+    try:
+        assert [pool.submit(render_worker.render, spec).result(timeout=60) for spec in specs] == serial
+    finally:
+        pool.shutdown()
+
+
+def test_workers_do_not_rerun_main_script(tmp_path):
+    script, log = tmp_path / 'main.py', tmp_path / 'runs.log'
+    script.write_text(MAIN, encoding='utf-8')
+    subprocess.run([sys.executable, str(script), str(log)], check=True, timeout=120, cwd=tmp_path,
+                   env={**os.environ, 'PYTHONPATH': REPO_DIR, 'DCM_RENDER_WORKERS': '2'})
+    assert log.read_text().split() == ['__main__']
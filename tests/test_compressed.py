@@ -0,0 +1,113 @@
+"""压缩存储的编解码边界情况：缺失值连续段、±inf、常数列、单行块、不均匀和重复的时间戳、不能按定点编码的数值，
+以及解码结果缓存的默认容量"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_rules import make_store
+from monitor import compressed
+from monitor.compressed import CompressedStore, decode_time, decode_values, encode_time, encode_values
+from monitor.store import SENSOR_KEYS, SensorStore
+
+START = np.datetime64('2024-01-01T00:00', 'ns')
+
+
+def round_trip(values):
+    """编码再解码，按位比较（NaN、-0.0 也必须原样还原）"""
+    values = np.asarray(values, dtype=np.float32)
+    encoded = encode_values(values)
+    decoded = decode_values(encoded, len(values))
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded.view(np.uint32), values.view(np.uint32))
+    return encoded
+
+
+def test_nan_runs():
+    values = np.round(np.linspace(20, 25, 200), 1).astype(np.float32)
+    values[:17] = np.nan
+    values[50:120] = np.nan
+    values[-1] = np.nan
+    assert round_trip(values)['decimals'] == 1
+    assert round_trip(np.full(100, np.nan))['mask'] is not None
+    round_trip(np.array([np.nan], dtype=np.float32))
+    round_trip(np.zeros(0, dtype=np.float32))
+
+
+def test_infinities():
+    values = np.array([1.5, np.inf, 2.25, -np.inf, np.nan, 3.0], dtype=np.float32)
+    # inf 不能按定点编码，整列按位异或
+    assert round_trip(values)['decimals'] is None
+    round_trip(np.full(10, np.inf, dtype=np.float32))
+
+
+@pytest.mark.parametrize('value', [0.0, 22.5, -7.0, 1e-8, 3.0e38])
+def test_constant_column(value):
+    round_trip(np.full(1000, value, dtype=np.float32))
+
+
+@pytest.mark.parametrize('values', [
+    # 换算回 float32 不一致的小数、超出定点范围的大数、很小的数、-0.0、随机数
+    np.float32(0.1) + np.arange(100, dtype=np.float32) * np.float32(1e-7),
+    np.array([1e30, -2e25, 5.0], dtype=np.float32),
+    np.array([1e-12, 2e-12, 3.5e-12], dtype=np.float32),
+    np.array([0.0, -0.0, 1.0, -0.0], dtype=np.float32),
+    np.random.default_rng(0).normal(0, 1, 500).astype(np.float32),
+])
+def test_values_failing_fixed_point(values):
+    assert round_trip(values)['decimals'] is None
+
+
+def test_fixed_point_limits():
+    assert round_trip(np.array([0.1234, 5.5, -3.0], dtype=np.float32))['decimals'] == 4
+    assert round_trip(np.array([0.12345], dtype=np.float32))['decimals'] is None
+
+
+@pytest.mark.parametrize('offsets', [
+    [0],
+    [0, 60],
+    [0, 60, 60, 60, 61, 3600, 3600, 7200, 7201],
+    [0, 1, 86400 * 365, 86400 * 365 + 1],
+])
+def test_time_round_trip(offsets):
+    time = START + np.array(offsets) * np.timedelta64(1, 's')
+    np.testing.assert_array_equal(decode_time(encode_time(time), len(time)), time)
+
+
+@pytest.mark.parametrize('block_rows', [1, 3, 1000])
+def test_store_with_irregular_time(block_rows):
+    # 不均匀的间隔、同一时刻的多行（不跨块）、整段缺失和 ±inf
+    rng = np.random.default_rng(1)
+    steps = rng.choice([0, 1, 1, 1, 2, 30], 600)
+    time = START + np.cumsum(steps) * np.timedelta64(1, 'm')
+    columns = {key: np.round(rng.normal(20, 3, 600), 2).astype(np.float32) for key in SENSOR_KEYS}
+    columns['PUE'][100:300] = np.nan
+    columns['hydr'][::50] = np.inf
+    columns['ZJFHum'][:] = 45.0
+    store = SensorStore(time, columns, assume_sorted=True)
+    packed = CompressedStore.from_store(store, np.timedelta64(0, 'm'), block_rows=block_rows)
+    for block in packed.blocks:
+        block_time = decode_time(block['time'], block['rows'])
+        # 同一时刻的行在同一块中
+        assert block['rows'] >= 1 and not np.isin(block_time[-1], time[np.searchsorted(time, block_time[-1], 'right'):])
+    restored = packed.to_store()
+    np.testing.assert_array_equal(restored.time, store.time)
+    for key in SENSOR_KEYS:
+        np.testing.assert_array_equal(restored.columns[key].view(np.uint32), store.columns[key].view(np.uint32))
+    t = time[250]
+    np.testing.assert_array_equal(packed.between(t).time, store.between(t).time)
+    assert packed.between(t).totals('ZJFHum') == store.between(t).totals('ZJFHum')
+
+
+def test_cache_defaults_to_fraction_of_compressed_size():
+    store = make_store(50_000)
+    packed = CompressedStore.from_store(store, np.timedelta64(0, 'm'), block_rows=1000)
+    assert packed.cache_bytes is None
+    assert packed._ranges.max_bytes == max(int(packed.nbytes * compressed.CACHE_RATIO), compressed.CACHE_MIN_BYTES)
+    # 放不进缓存的范围按需解码，不整体解码
+    packed.limit_cache(100_000)
+    subset = packed.between(store.time[1000], store.time[20_000])
+    assert isinstance(subset, compressed.CompressedRange) and len(subset) == 19_000
+    assert isinstance(packed.between(store.time[1000], store.time[1500]), SensorStore)
+    assert packed.cache_nbytes <= 100_000
+    # 追加后沿用设置的容量
+    more = make_store(51_000).between(store.time[-1] + np.timedelta64(1, 'ns'))
+    assert packed.append(more)._ranges.max_bytes == 100_000
@@ -0,0 +1,40 @@
+"""磁盘缓存：按最近使用清理，格式版本改变后旧缓存不再命中"""
+import os
+
+import numpy as np
+
+from benchmarks.bench_rules import make_store
+from monitor import disk_cache
+from monitor.disk_cache import DiskCache
+
+
+def age(cache, digest, seconds):
+    """把数据集目录的修改时间往前调 seconds 秒"""
+    entry = cache._entry_dir(digest)
+    mtime = os.path.getmtime(entry) - seconds
+    os.utime(entry, (mtime, mtime))
+
+
+def test_prune_keeps_recently_used_entry(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=2)
+    store = make_store(100)
+    cache.save('a', store)
+    cache.save('b', store)
+    age(cache, 'a', 20)
+    age(cache, 'b', 10)
+    # 最早写入的 a 正在使用：命中后不会被下一次写入挤掉
+    assert cache.load('a') is not None
+    cache.save('c', store)
+    assert cache.load('a') is not None
+    assert cache.load('b') is None
+    np.testing.assert_array_equal(cache.load('c').time, store.time)
+
+
+def test_format_version_in_key(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+    cache.save('a', make_store(100))
+    assert cache.load('a') is not None
+    monkeypatch.setattr(disk_cache, 'FORMAT_VERSION', disk_cache.FORMAT_VERSION + 1)
+    assert cache.load('a') is None
+    cache.save('a', make_store(50))
+    assert len(cache.load('a')) == 50
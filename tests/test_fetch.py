@@ -0,0 +1,172 @@
+"""CSV 数据源的增量下载：304、Range 追加与重叠校验、416 重新下载、不支持 Range 时的前缀校验、未写完的末行，
+以及追加后在后台按间隔写入磁盘缓存（替身 Session 模拟服务器）"""
+import hashlib
+import time
+
+import numpy as np
+import pytest
+
+from monitor.disk_cache import DiskCache
+from monitor.fetch import OVERLAP_BYTES, CsvSource
+
+HEADER = b'record_date,pue\n'
+
+
+def rows(first, n):
+    """从第 first 天起每天一行"""
+    days = np.datetime64('2024-01-01') + np.arange(first, first + n)
+    return b''.join(f'{day},{1.5 + i % 10 / 100:.2f}\n'.encode() for i, day in zip(range(first, first + n), days))
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f'HTTP {self.status_code}')
+
+
+class FakeSession:
+    """按 data 的当前内容应答：ETag 为内容摘要，支持 Range（range_support=False 时忽略 Range 返回全文）"""
+
+    def __init__(self, data, range_support=True):
+        self.data = data
+        self.range_support = range_support
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        headers = headers or {}
+        self.requests.append(headers)
+        etag = f'"{hashlib.sha1(self.data).hexdigest()}"'
+        if headers.get('If-None-Match') == etag:
+            return FakeResponse(304)
+        if 'Range' in headers and self.range_support:
+            start = int(headers['Range'].split('=')[1].rstrip('-'))
+            if start >= len(self.data):
+                return FakeResponse(416)
+            return FakeResponse(206, self.data[start:], {
+                'ETag': etag, 'Content-Range': f'bytes {start}-{len(self.data) - 1}/{len(self.data)}'})
+        return FakeResponse(200, self.data, {'ETag': etag})
+
+
+def pue(source):
+    return source.snapshot().columns['PUE'].tolist()
+
+
+def expected(data):
+    return [float(np.float32(line.split(b',')[1])) for line in data.splitlines()[1:] if line]
+
+
+def test_not_modified():
+    session = FakeSession(HEADER + rows(0, 10))
+    source = CsvSource('http://test/data.csv', session=session)
+    assert source.refresh() and len(source.snapshot()) == 10
+    assert not source.refresh()
+    assert session.requests[-1]['If-None-Match'] and session.requests[-1]['Range'] == f'bytes={len(session.data) - OVERLAP_BYTES}-'
+    assert len(source.snapshot()) == 10
+
+
+def test_range_appends_new_rows():
+    session = FakeSession(HEADER + rows(0, 10))
+    source = CsvSource('http://test/data.csv', session=session)
+    source.refresh()
+    first = source.snapshot()
+    session.data += rows(10, 5)
+    assert source.refresh()
+    assert len(session.requests) == 2 and pue(source) == expected(session.data)
+    # 追加：原有的行共用，不重新解析
+    assert len(source.snapshot()) == 15 and source.snapshot() is not first
+
+
+def test_range_overlap_mismatch_refetches_full():
+    session = FakeSession(HEADER + rows(0, 10))
+    source = CsvSource('http://test/data.csv', session=session)
+    source.refresh()
+    # 最后一行被改写后又追加了新行：重叠部分与已有数据的末尾不同
+    lines = session.data.splitlines(keepends=True)
+    session.data = b''.join(lines[:-1]) + lines[-1].replace(b'1.59', b'9.99') + rows(10, 2)
+    assert source.refresh()
+    assert 'Range' not in session.requests[-1] and len(session.requests) == 3
+    assert pue(source) == expected(session.data) and pue(source)[9] == pytest.approx(9.99)
+
+
+def test_shorter_file_refetches_full():
+    session = FakeSession(HEADER + rows(0, 10))
+    source = CsvSource('http://test/data.csv', session=session)
+    source.refresh()
+    session.data = HEADER + rows(100, 3)
+    assert source.refresh()
+    assert [r.get('Range') is None for r in session.requests[1:]] == [False, True]
+    assert pue(source) == expected(session.data) and len(source.snapshot()) == 3
+
+
+def test_full_response_checks_prefix():
+    session = FakeSession(HEADER + rows(0, 10), range_support=False)
+    source = CsvSource('http://test/data.csv', session=session)
+    source.refresh()
+    # 服务器忽略 Range：前缀相同时只解析新增部分
+    session.data += rows(10, 4)
+    first = source.snapshot()
+    assert source.refresh()
+    assert pue(source) == expected(session.data) and source.snapshot().time[0] == first.time[0]
+    # 前缀变了：全部重新解析
+    session.data = HEADER + rows(50, 20)
+    assert source.refresh()
+    assert pue(source) == expected(session.data) and len(source.snapshot()) == 20
+
+
+def test_partial_last_line_waits_for_next_fetch():
+    session = FakeSession(HEADER + rows(0, 10))
+    source = CsvSource('http://test/data.csv', session=session)
+    source.refresh()
+    complete = rows(10, 3)
+    session.data += complete[:-6]
+    assert source.refresh()
+    # 只解析完整的两行，不记录校验信息，下次从未写完的行继续
+    assert len(source.snapshot()) == 12 and source._etag != f'"{hashlib.sha1(session.data).hexdigest()}"'
+    session.data += complete[-6:]
+    assert source.refresh()
+    assert pue(source) == expected(session.data) and len(source.snapshot()) == 13
+    assert session.requests[-1]['Range'] == f'bytes={len(HEADER + rows(0, 12)) - OVERLAP_BYTES}-'
+    assert not source.refresh()
+
+
+def wait_saved(source, timeout=10):
+    deadline = time.time() + timeout
+    while source._saver is not None or source._saved_digest != source.digest:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_appended_snapshot_saved_in_background(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    session = FakeSession(HEADER + rows(0, 10))
+    source = CsvSource('http://test/data.csv', session=session, disk_cache=cache, save_interval=0)
+    source.refresh()
+    session.data += rows(10, 5)
+    source.refresh()
+    wait_saved(source)
+    restored = CsvSource('http://test/data.csv', session=FakeSession(session.data), disk_cache=cache)
+    assert restored.digest == source.digest and len(restored.snapshot()) == 15
+    assert not restored.refresh()
+
+
+def test_appends_within_interval_share_one_save(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    session = FakeSession(HEADER + rows(0, 10))
+    source = CsvSource('http://test/data.csv', session=session, disk_cache=cache, save_interval=3600)
+    source.refresh()
+    saved = source.digest
+    source._last_save = time.time()
+    for first in (10, 11, 12):
+        session.data += rows(first, 1)
+        source.refresh()
+    # 间隔未满：磁盘缓存和校验信息仍是上次写入的快照，重启后从那里继续追加
+    assert source._saver is not None and source._saved_digest == saved
+    assert cache.load_source_state('http://test/data.csv')['digest'] == saved
+    restored = CsvSource('http://test/data.csv', session=FakeSession(session.data), disk_cache=cache)
+    assert len(restored.snapshot()) == 10
+    assert restored.refresh() and len(restored.snapshot()) == 13
@@ -0,0 +1,100 @@
+"""分块流式导入：峰值内存不随文件大小增长，结果与一次性 pd.read_csv 相同"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_csv
+from monitor.ingest import read_csv_stream
+from monitor.rollup import Rollups
+from monitor.store import SENSOR_KEYS, SensorStore
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK_ROWS = 20_000
+SMALL_ROWS, LARGE_ROWS = 200_000, 800_000
+
+# 子进程：导入依赖后记下常驻内存，分块导入一次，输出峰值内存（VmHWM）的增长
+CHILD = """
+import json, sys
+import pandas
+from monitor.ingest import read_csv_stream
+
+def status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+try:
+    # 把峰值重置为当前值，不计导入时的峰值
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+except OSError:
+    pass
+base = status_kb('VmRSS')
+with open(sys.argv[1], 'rb') as f:
+    store, ordered = read_csv_stream(f, sys.argv[2], int(sys.argv[3]))
+print(json.dumps({'rows': len(store), 'ordered': ordered, 'growth_mb': (status_kb('VmHWM') - base) / 1024}))
+"""
+
+
+@pytest.fixture(scope='module')
+def csv_files(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('ingest')
+    files = {}
+    for rows in (SMALL_ROWS, LARGE_ROWS):
+        files[rows] = os.path.join(directory, f'{rows}.csv')
+        generate_csv(files[rows], rows)
+    return files
+
+
+def peak_growth(path, directory):
+    directory.mkdir()
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', CHILD, path, str(directory), str(CHUNK_ROWS)],
+                         capture_output=True, text=True, check=True, cwd=REPO_DIR,
+                         env={**os.environ, 'PYTHONPATH': REPO_DIR})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason="需要 /proc/self/status 读取峰值内存")
+def test_peak_memory_independent_of_file_size(csv_files, tmp_path):
+    small = peak_growth(csv_files[SMALL_ROWS], tmp_path / 'small')
+    large = peak_growth(csv_files[LARGE_ROWS], tmp_path / 'large')
+    assert small['rows'] == SMALL_ROWS and large['rows'] == LARGE_ROWS
+    assert small['ordered'] and large['ordered']
+    # 列数组写入文件不常驻：文件大 4 倍，峰值只多出多级聚合（每行约 6 字节）等小部分，
+    # 远小于多出的行整体读入时的列数组
+    extra_mb = (LARGE_ROWS - SMALL_ROWS) * (8 + 4 * len(SENSOR_KEYS)) / 1024 ** 2
+    assert large['growth_mb'] - small['growth_mb'] < 0.5 * extra_mb, (small, large)
+
+
+def test_columns_and_rollups_match_one_shot_read(csv_files, tmp_path):
+    path = csv_files[SMALL_ROWS]
+    with open(path, 'rb') as f:
+        streamed, ordered = read_csv_stream(f, str(tmp_path), CHUNK_ROWS)
+    expected = SensorStore.from_dataframe(pd.read_csv(path))
+    assert ordered
+    np.testing.assert_array_equal(streamed.time, expected.time)
+    for key in SENSOR_KEYS:
+        np.testing.assert_array_equal(streamed.columns[key], expected.columns[key])
+
+    # 随块增量生成的多级聚合与整体生成的相同
+    reference = Rollups.build(expected.time, expected.columns)
+    assert [tier.name for tier in streamed._rollups.tiers] == [tier.name for tier in reference.tiers]
+    for tier, ref in zip(streamed._rollups.tiers, reference.tiers):
+        np.testing.assert_array_equal(tier.start, ref.start)
+        for key in SENSOR_KEYS:
+            for stat in ('count', 'min', 'max', 'last'):
+                np.testing.assert_array_equal(tier.stats[key][stat], ref.stats[key][stat], err_msg=f'{tier.name} {key} {stat}')
+            np.testing.assert_allclose(tier.stats[key]['sum'], ref.stats[key]['sum'], rtol=1e-12)
+
+    # 统计查询结果相同
+    start, end = expected.time[len(expected) // 3], expected.time[-1]
+    for key in SENSOR_KEYS:
+        a, b = streamed.between(start, end).totals(key), expected.between(start, end).totals(key)
+        assert a[0] == b[0] and a[2:] == b[2:]
+        assert a[1] == pytest.approx(b[1], rel=1e-12)
@@ -0,0 +1,117 @@
+"""多数据源并发下载：超时、退避重试、过期传感器和并发耗时（本地替身服务器模拟慢速和故障的数据源）"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_multisource import EXPORTS, split_exports
+from benchmarks.local_server import LocalServer
+from benchmarks.synthetic import generate_csv
+from monitor.multisource import MultiSource
+
+ROWS = 2000
+
+
+@pytest.fixture(scope='module')
+def exports(tmp_path_factory):
+    """{名称: (URL 路径, 文件路径)}，每个导出文件包含 EXPORTS 中的传感器"""
+    directory = tmp_path_factory.mktemp('exports')
+    full = os.path.join(directory, 'full.csv')
+    generate_csv(full, ROWS)
+    return {name: (f'/{os.path.basename(path)}', path) for name, path in split_exports(full, directory).items()}
+
+
+def serve(exports, delays=None, failures=None):
+    """替身服务器，delays / failures 按导出名称给出"""
+    return LocalServer({url: path for url, path in exports.values()},
+                       delays={exports[name][0]: delay for name, delay in (delays or {}).items()},
+                       failures={exports[name][0]: count for name, count in (failures or {}).items()})
+
+
+def configs(server, exports, timeout=10, retries=0, **overrides):
+    """各数据源的配置，overrides: 名称 -> 覆盖的配置项"""
+    return [{'name': name, 'url': server.url(url), 'timeout': timeout, 'retries': retries, 'sensors': EXPORTS[name],
+             **overrides.get(name, {})} for name, (url, _) in exports.items()]
+
+
+def entry(multi, name):
+    return next(entry for entry in multi.sources if entry['name'] == name)
+
+
+def test_timeout_is_enforced_per_source(exports):
+    slow = list(exports)[0]
+    with serve(exports, delays={slow: 5}) as server:
+        multi = MultiSource(configs(server, exports, **{slow: {'timeout': 0.5}}))
+        start = time.perf_counter()
+        multi.refresh()
+        elapsed = time.perf_counter() - start
+    assert elapsed < 3
+    assert not entry(multi, slow)['ok']
+    assert entry(multi, slow)['elapsed'] < 3
+    assert all(e['ok'] for e in multi.sources if e['name'] != slow)
+
+
+def test_retries_with_backoff_after_transient_errors(exports):
+    flaky = list(exports)[1]
+    backoff = 0.2
+    with serve(exports, failures={flaky: 2}) as server:
+        multi = MultiSource(configs(server, exports, retries=2), backoff=backoff)
+        assert multi.refresh()
+    status = entry(multi, flaky)
+    assert status['ok'] and status['error'] is None
+    assert status['attempts'] == 3
+    # 两次重试前分别等待 backoff * 1 和 backoff * 2（随机抖动 0.5 ~ 1.5 倍）
+    assert status['elapsed'] >= backoff * 0.5 * (1 + 2)
+    assert multi.last_error is None
+    assert multi.snapshot().has_data(EXPORTS[flaky][0])
+
+
+def test_retries_exhausted_marks_source_failed(exports):
+    failing = list(exports)[1]
+    with serve(exports, failures={failing: float('inf')}) as server:
+        multi = MultiSource(configs(server, exports, retries=1), backoff=0.01)
+        multi.refresh()
+    status = entry(multi, failing)
+    assert not status['ok'] and status['attempts'] == 2
+    assert multi.last_error is status['error']
+
+
+def test_stale_keys_only_cover_failed_source(exports):
+    names = list(exports)
+    failing = names[2]
+    with serve(exports, failures={failing: float('inf')}) as server:
+        multi = MultiSource(configs(server, exports))
+        multi.refresh()
+        assert multi.stale_keys() == set(EXPORTS[failing])
+        store = multi.snapshot()
+        for name in names:
+            for key in EXPORTS[name]:
+                assert store.has_data(key) == (name != failing)
+
+    # 已加载过的数据源之后失败：保留上次的数据，只把它的传感器标记为过期
+    with serve(exports) as server:
+        multi = MultiSource(configs(server, exports))
+        multi.refresh()
+        assert multi.stale_keys() == set()
+        before = multi.snapshot()
+        server.httpd.failures[exports[failing][0]] = float('inf')
+        multi.refresh()
+    assert multi.stale_keys() == set(EXPORTS[failing])
+    for key in EXPORTS[failing]:
+        np.testing.assert_array_equal(multi.snapshot().columns[key], before.columns[key])
+
+
+def test_refresh_time_close_to_slowest_source(exports):
+    names = list(exports)
+    delays = {name: 0.5 for name in names}
+    delays[names[0]] = 1.5
+    with serve(exports, delays=delays) as server:
+        multi = MultiSource(configs(server, exports))
+        start = time.perf_counter()
+        multi.refresh()
+        elapsed = time.perf_counter() - start
+    assert all(e['ok'] for e in multi.sources)
+    assert elapsed >= 1.5
+    # 串行需要约 sum(delays) 秒
+    assert elapsed < 1.5 + 1.0 < sum(delays.values())
@@ -0,0 +1,79 @@
+"""在线统计并入新版本的数据集：追加时只并入新行，不是追加的结果时从整个数据集重建"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_rules import make_store
+from monitor.online import OnlineEngine
+from monitor.retention import RetainedStore
+from monitor.store import SensorStore
+from monitor.stream import StreamHub
+
+KEY = 'ZJFTemp'
+
+
+def fresh(store):
+    """只并入 store 的在线统计"""
+    engine = OnlineEngine()
+    engine.sync(store)
+    return engine.get(KEY)
+
+
+def assert_same(actual, expected):
+    assert actual['count'] == expected['count']
+    for field in ('mean', 'std', 'min', 'max', 'value', 'ewma', 'trend'):
+        assert actual[field] == pytest.approx(expected[field], rel=1e-9), field
+    assert actual['time'] == expected['time']
+
+
+def test_append_only_merges_new_rows():
+    store = make_store(5000)
+    engine = OnlineEngine()
+    engine.sync(store.between(None, store.time[3000]))
+    assert engine.sync(store) == sum(store.between(store.time[3000]).valid_count(key) for key in engine._stats)
+    assert engine.resets == 0
+    assert_same(engine.get(KEY), fresh(store))
+
+
+@pytest.mark.parametrize('change', ['refetch', 'reordered', 'dropped'])
+def test_non_append_version_rebuilds(change):
+    store = make_store(5000)
+    old = store.between(None, store.time[3000])
+    new = store
+    if change == 'refetch':
+        # 重新下载后历史数据被修订
+        new = SensorStore(store.time, {key: values + np.float32(1) for key, values in store.columns.items()},
+                          assume_sorted=True)
+    elif change == 'reordered':
+        # 迟到的行早于上次最后时刻（乱序数据重建）
+        old = store.between(None, store.time[1000]).append(store.between(store.time[1001], store.time[3000]))
+    else:
+        new = store.between(store.time[100])
+    engine = OnlineEngine()
+    engine.sync(old)
+    engine.sync(new)
+    assert engine.resets == 1
+    assert_same(engine.get(KEY), fresh(new))
+
+
+def test_retention_compaction_rebuilds():
+    store = make_store(5000)
+    engine = OnlineEngine()
+    retained = RetainedStore.wrap(store)
+    engine.sync(retained)
+    compacted = retained.compacted(raw_cut=store.time[2400].astype('datetime64[h]').astype('datetime64[ns]'))
+    engine.sync(compacted)
+    assert engine.resets == 1
+    assert_same(engine.get(KEY), fresh(compacted))
+
+
+def test_rebuild_keeps_live_readings():
+    store = make_store(2000)
+    hub = StreamHub()
+    hub.online.sync(store)
+    live = store.last_time + np.arange(1, 4) * np.timedelta64(1, 'm')
+    hub.ingest([(KEY, t, 30.0 + i) for i, t in enumerate(live)])
+    hub.online.sync(store.between(store.time[10]))
+    assert hub.online.resets == 1
+    stats = hub.online.get(KEY)
+    assert stats['time'] == live[-1] and stats['value'] == 32.0
+    assert stats['count'] == store.between(store.time[10]).valid_count(KEY) + 3
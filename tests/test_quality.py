@@ -0,0 +1,100 @@
+"""数据质量：采样间隔、中断区间、卡滞区间、缺失日期，逐块扫描与整体扫描一致，聚合过的桶不算中断"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_rules import make_store
+from monitor import compressed as compressed_module, quality
+from monitor.compressed import CompressedStore
+from monitor.retention import Retention
+from monitor.store import SENSOR_KEYS, SensorStore
+
+MINUTE = np.timedelta64(1, 'm')
+
+
+def faulty_store():
+    """每分钟一行、3 天的数据：第 2 天整天缺失，ZJFTemp 有一段 40 分钟的卡滞，PUE 中断 2 小时"""
+    store = make_store(3 * 1440)
+    keep = store.time.astype('datetime64[D]') != store.time[0].astype('datetime64[D]') + np.timedelta64(1, 'D')
+    columns = {key: values[keep].copy() for key, values in store.columns.items()}
+    columns['ZJFTemp'][100:140] = 23.5
+    columns['PUE'][200:320] = np.nan
+    return SensorStore(store.time[keep], columns, assume_sorted=True)
+
+
+def test_cadence_and_gaps():
+    time = np.datetime64('2024-01-01', 'ns') + np.array([0, 1, 2, 3, 10, 11, 11, 12]) * MINUTE
+    assert quality.cadence(time) == MINUTE
+    starts, ends = quality.gaps(time, quality.cadence(time))
+    assert list(starts) == [time[3]] and list(ends) == [time[4]]
+    assert quality.cadence(time[:1]) is None
+
+
+def test_stuck_runs():
+    time = np.datetime64('2024-01-01', 'ns') + np.arange(100) * MINUTE
+    values = np.arange(100, dtype=np.float32)
+    values[10:45] = 5
+    values[60:70] = 7
+    starts, ends, stuck, lengths = quality.stuck_runs(time, values)
+    assert list(starts) == [time[10]] and list(ends) == [time[44]]
+    assert stuck.tolist() == [5] and lengths.tolist() == [35]
+
+
+def test_profile_finds_gaps_stuck_runs_and_missing_dates():
+    store = faulty_store()
+    report = quality.profile(store)
+    assert report['rows'] == len(store) and report['cadence'] == MINUTE
+    day = store.time[0].astype('datetime64[D]')
+    assert report['dates'] == 2 and report['calendar_days'] == 3
+    assert list(report['missing_dates']) == [day + np.timedelta64(1, 'D')]
+    # 缺失的一整天是所有列共同的中断
+    assert len(report['row_gap_starts']) == 1
+    assert report['row_gap_ends'][0] - report['row_gap_starts'][0] == np.timedelta64(1441, 'm')
+
+    zjf = report['sensors']['ZJFTemp']
+    assert list(zjf['stuck_starts']) == [store.time[100]] and zjf['stuck_lengths'].tolist() == [40]
+
+    pue = report['sensors']['PUE']
+    _, values = store.valid('PUE')
+    assert pue['valid'] == len(values)
+    assert pue['missing_ratio'] == pytest.approx(1 - len(values) / len(store))
+    assert store.time[199] in pue['gap_starts']
+    assert pue['longest_gap'] == np.timedelta64(1441, 'm')
+
+
+@pytest.mark.parametrize('block_rows', [50, 1000])
+def test_chunked_profile_matches_whole(block_rows, monkeypatch):
+    # 每块单独解码扫描
+    monkeypatch.setattr(compressed_module, 'CHUNK_ROWS', 1)
+    store = faulty_store()
+    whole = quality.profile(store)
+    compressed = CompressedStore.from_store(store, np.timedelta64(0, 'm'), block_rows=block_rows)
+    chunked = quality.profile(compressed.between())
+    for field in ('rows', 'start', 'end', 'cadence', 'dates', 'calendar_days'):
+        assert whole[field] == chunked[field], field
+    for field in ('missing_dates', 'row_gap_starts', 'row_gap_ends'):
+        np.testing.assert_array_equal(whole[field], chunked[field])
+    for key in SENSOR_KEYS:
+        for field, value in whole['sensors'][key].items():
+            if isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(value, chunked['sensors'][key][field], err_msg=f'{key} {field}')
+            else:
+                assert value == chunked['sensors'][key][field], (key, field)
+
+
+def test_compacted_buckets_are_not_gaps():
+    # 60 天每分钟一行、没有缺失的数据：原始数据保留 7 天，14 天前的小时桶合并为天桶
+    store = make_store(60 * 1440)
+    store = SensorStore(store.time, {key: np.nan_to_num(values, nan=1) for key, values in store.columns.items()},
+                        assume_sorted=True)
+    retained = Retention(np.timedelta64(7, 'D'), np.timedelta64(14, 'D')).apply(store)
+    assert len(retained.days) and len(retained.hours) and retained.raw_cut is not None
+    for data in (retained, retained.between(), retained.between(store.time[30 * 1440])):
+        report = quality.profile(data)
+        assert report['compacted_until'] == retained.raw_cut
+        assert report['cadence'] == MINUTE and len(report['row_gap_starts']) == 0
+        assert report['rows'] == len(retained.recent)
+        assert report['dates'] == report['calendar_days'] and len(report['missing_dates']) == 0
+        for key in SENSOR_KEYS:
+            assert len(report['sensors'][key]['gap_starts']) == 0, key
+            assert report['sensors'][key]['missing_ratio'] == 0, key
+    assert quality.profile(retained)['dates'] == 60
@@ -0,0 +1,123 @@
+"""保留策略：跨分界时刻的统计与原始数据一致、迟到的行并入桶、内存上限、磁盘缓存的往返、桶的图表数据"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_rules import make_store
+from monitor.retention import CompactedIndex, Retention, RetainedStore
+from monitor.store import SENSOR_KEYS, SensorStore
+
+DAY = np.timedelta64(1, 'D')
+HOUR = np.timedelta64(1, 'h')
+MINUTE = np.timedelta64(1, 'm')
+
+
+@pytest.fixture(scope='module')
+def raw():
+    # 30 天每分钟一行，从零点开始
+    return make_store(30 * 1440)
+
+
+@pytest.fixture(scope='module')
+def retained(raw):
+    store = Retention(np.timedelta64(5, 'D'), np.timedelta64(12, 'D')).apply(raw)
+    assert len(store.days) and len(store.hours) and len(store.recent)
+    return store
+
+
+def raw_stats(store, key, start=None, end=None):
+    """原始数据 [start, end) 内该列的 (count, sum, min, max)"""
+    _, values = store.between(start, end).valid(key)
+    return len(values), float(values.sum(dtype=np.float64)), float(values.min()), float(values.max())
+
+
+def assert_stats_equal(actual, expected):
+    assert actual[0] == expected[0]
+    assert actual[1] == pytest.approx(expected[1], rel=1e-9)
+    assert actual[2:] == pytest.approx(expected[2:])
+
+
+def test_cuts_follow_windows(raw, retained):
+    assert retained.raw_cut == raw.last_time.astype('datetime64[h]') - np.timedelta64(5 * 24, 'h')
+    assert retained.hour_cut == (raw.last_time - np.timedelta64(12, 'D')).astype('datetime64[D]')
+    assert retained.days.start[-1] < retained.hour_cut <= retained.hours.start[0]
+    assert retained.hours.start[-1] < retained.raw_cut <= retained.recent.first_time
+    assert retained.first_time == raw.first_time and retained.last_time == raw.last_time
+
+
+def test_totals_across_cuts_match_raw(raw, retained):
+    # 起点对齐桶（天桶时段按天、小时桶时段按小时），终点任意：与聚合前的原始数据一致
+    starts = [None, raw.first_time + 3 * DAY, retained.hour_cut - DAY, retained.hour_cut + 5 * HOUR,
+              retained.raw_cut - HOUR]
+    ends = [None, retained.raw_cut + 123 * MINUTE, retained.raw_cut + DAY + 7 * MINUTE]
+    for start in starts:
+        for end in ends:
+            subset = retained.between(start, end)
+            assert subset.compacted_until == retained.raw_cut
+            for key in SENSOR_KEYS:
+                assert_stats_equal(subset.totals(key), raw_stats(raw, key, start, end))
+    # 只涉及原始数据的范围直接返回原始数据的子集
+    assert retained.between(retained.raw_cut + HOUR).compacted_until is None
+
+
+def test_range_stats_and_envelope(raw, retained):
+    index = retained.between().rollups()
+    assert isinstance(index, CompactedIndex)
+    start, end = raw.first_time + 2 * DAY, retained.raw_cut + 90 * MINUTE
+    for key in SENSOR_KEYS:
+        assert_stats_equal(index.range_stats(None, key, start, end), raw_stats(raw, key, start, end))
+    # 每个桶取最小值和最大值，其后是原始数据降采样的点
+    times, values = index.envelope(None, 'ZJFTemp', retained.hour_cut, retained.raw_cut + 90 * MINUTE, 50)
+    buckets = times < retained.raw_cut
+    assert buckets.sum() == 2 * len(retained.hours)
+    hour_times = times[buckets][::2]
+    np.testing.assert_array_equal(hour_times, retained.hours.start)
+    for t, low, high in zip(hour_times[:10], values[buckets][::2], values[buckets][1::2]):
+        _, expected = raw.between(t, t + HOUR).valid('ZJFTemp')
+        assert (low, high) == (expected.min(), expected.max())
+    assert 0 < (~buckets).sum() <= 50 * 2 and times[~buckets].min() >= retained.raw_cut
+
+
+def test_late_rows_merge_into_buckets(raw, retained):
+    # 迟到的读数（在已聚合的小时桶和天桶时段内）直接并入对应的桶
+    late_time = np.array([retained.hour_cut - 5 * DAY + np.timedelta64(30, 's'),
+                          retained.hour_cut + 30 * HOUR + np.timedelta64(30, 's')], dtype='datetime64[ns]')
+    late = SensorStore(late_time, {key: np.array([200, 100], dtype=np.float32) for key in SENSOR_KEYS})
+    updated = retained.append(late)
+    assert (updated.raw_cut, updated.hour_cut) == (retained.raw_cut, retained.hour_cut)
+    assert len(updated.hours) == len(retained.hours) and len(updated.days) == len(retained.days)
+    expected = raw.append(late)
+    for key in ('PUE', 'ZJFTemp'):
+        assert_stats_equal(updated.between().totals(key), raw_stats(expected, key))
+    assert updated.between(retained.hour_cut + 30 * HOUR, retained.hour_cut + 31 * HOUR).totals('PUE')[3] == 100
+    # 原始数据时段内的新行照常追加
+    newer = make_store(30 * 1440 + 10).between(raw.last_time + np.timedelta64(1, 'ns'))
+    assert len(retained.append(newer).recent) == len(retained.recent) + 10
+
+
+@pytest.mark.parametrize('max_bytes', [3 * 1024 * 1024, 600 * 1024])
+def test_fit_stays_within_budget(raw, max_bytes):
+    policy = Retention(max_bytes=max_bytes)
+    store = policy.apply(raw)
+    assert store.nbytes <= policy.data_bytes
+    assert store.nbytes + store._ranges.max_bytes <= max_bytes
+    # 最近一小时的原始数据总是保留
+    assert store.recent.first_time <= raw.last_time - HOUR
+    assert store.last_time == raw.last_time
+    for key in ('PUE', 'hydr'):
+        start = store.first_time
+        assert_stats_equal(store.between().totals(key), raw_stats(raw, key, start))
+
+
+def test_tier_arrays_round_trip(retained):
+    restored = RetainedStore.from_arrays(retained.tier_arrays(), retained.recent)
+    assert (restored.raw_cut, restored.hour_cut) == (retained.raw_cut, retained.hour_cut)
+    for name in ('days', 'hours'):
+        a, b = getattr(restored, name), getattr(retained, name)
+        np.testing.assert_array_equal(a.start, b.start)
+        for key in SENSOR_KEYS:
+            for stat, values in b.stats[key].items():
+                np.testing.assert_array_equal(a.stats[key][stat], values, err_msg=f'{name} {key} {stat}')
+    # 没有聚合过的数据集：分界时刻为 NaT，恢复为 None
+    plain = RetainedStore.wrap(retained.recent)
+    restored = RetainedStore.from_arrays(plain.tier_arrays(), plain.recent)
+    assert restored.raw_cut is None and restored.hour_cut is None and len(restored) == len(plain.recent)
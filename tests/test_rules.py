@@ -0,0 +1,93 @@
+"""告警规则：回差、最短持续时间、缺失值保持状态、逐块计算与整体计算一致"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_rules import make_store
+from monitor import rules
+from monitor.compressed import CompressedStore
+from monitor.store import SENSOR_KEYS, SensorStore
+
+START = np.datetime64('2024-01-01T00:00', 'ns')
+MINUTE = np.timedelta64(1, 'm')
+
+
+def store_of(key, values):
+    """每分钟一个读数、只有 key 一列有数据的数据集"""
+    values = np.asarray(values, dtype=np.float32)
+    columns = {k: np.full(len(values), np.nan, dtype=np.float32) for k in SENSOR_KEYS}
+    columns[key] = values
+    return SensorStore(START + np.arange(len(values)) * MINUTE, columns, assume_sorted=True)
+
+
+def rule(kind='above', value=1.6, clear=1.58, minutes=0):
+    return {'name': '测试', 'sensors': ['PUE'], 'kind': kind, 'value': value, 'clear': clear,
+            'min_duration': np.timedelta64(minutes, 'm'), 'severity': 'warning'}
+
+
+def test_hysteresis_edges():
+    on = np.array([0, 1, 0, 1, 0, 0, 0, 1], dtype=bool)
+    off = np.array([0, 0, 0, 0, 1, 1, 0, 0], dtype=bool)
+    starts, ends = rules.hysteresis_edges(on, off)
+    # 第 1 行触发，第 3 行重复触发不产生新区间，第 4 行解除；第 7 行触发后仍未解除
+    assert starts.tolist() == [1, 7] and ends.tolist() == [4, 8]
+    assert rules.hysteresis_state(on, off).tolist() == [0, 1, 1, 1, 0, 0, 0, 1]
+    starts, ends = rules.hysteresis_edges(on, off, active=True)
+    assert starts.tolist() == [0, 7] and ends.tolist() == [4, 8]
+
+
+def test_clear_threshold_keeps_alarm_between_thresholds():
+    # 1.59 介于解除值和触发值之间：保持告警；1.57 才解除；NaN 保持之前的状态
+    store = store_of('PUE', [1.5, 1.65, 1.59, np.nan, 1.62, 1.57, 1.59, 1.5])
+    start, end, active, peak = rules.evaluate_rule(store, rule(), 'PUE')
+    assert list(start) == [store.time[1]] and list(end) == [store.time[5]]
+    assert not active[0]
+    assert peak[0] == pytest.approx(1.65)
+
+
+def test_min_duration_drops_short_alarms():
+    values = [22] * 5 + [28] * 5 + [22] * 5 + [28] * 15 + [22] * 5 + [28] * 12
+    store = store_of('PUE', values)
+    start, end, active, _ = rules.evaluate_rule(store, rule(value=27, clear=26, minutes=10), 'PUE')
+    # 5 分钟的超限被过滤；15 分钟的保留；末尾 11 分钟仍未解除的告警保留并标记为进行中
+    assert list(start) == [store.time[15], store.time[35]]
+    assert list(end) == [store.time[30], store.time[-1]]
+    assert active.tolist() == [False, True]
+
+
+def test_below_and_rate_rules():
+    store = store_of('PUE', [20, 14, 15.5, 16, 20, 20])
+    start, end, _, peak = rules.evaluate_rule(store, rule('below', 15, 16), 'PUE')
+    assert list(start) == [store.time[1]] and list(end) == [store.time[3]] and peak[0] == 14
+    # 1 分钟的跨度：每分钟变化 6 度 = 每小时 360 度
+    start, end, _, peak = rules.evaluate_rule(store, dict(rule('rate', 300, 100), window=MINUTE), 'PUE')
+    assert list(start) == [store.time[1]] and list(end) == [store.time[2]] and peak[0] == pytest.approx(360)
+    # 默认跨度内没有更早的读数：不计算速率
+    assert len(rules.evaluate_rule(store, rule('rate', 300, 100), 'PUE')[0]) == 0
+
+
+def test_rate_over_window_ignores_quantization_steps():
+    # 一周的日周期温度（振幅 1.5 度，最大约 0.4 度/小时），每分钟一个读数，按 0.1 度量化：
+    # 相邻读数之间 0.1 度的跳变相当于 6 度/小时，按 15 分钟跨度计算则不超过 1 度/小时
+    minutes = np.arange(7 * 1440)
+    values = np.round(24 + 1.5 * np.sin(2 * np.pi * minutes / 1440), 1)
+    store = store_of('ZJFTemp', values)
+    rate_rule = next(r for r in rules.DEFAULT_RULES if r['kind'] == 'rate')
+    assert len(rules.evaluate_rule(store, rate_rule, 'ZJFTemp')[0]) == 0
+    adjacent = dict(rate_rule, window=MINUTE, min_duration=np.timedelta64(0, 'm'))
+    assert len(rules.evaluate_rule(store, adjacent, 'ZJFTemp')[0]) > 100
+    # 15 分钟内升高 3 度（12 度/小时）持续超过最短持续时间：告警
+    values[3000:] += np.minimum(np.arange(len(values) - 3000) * 0.2, 3)
+    start, _, _, peak = rules.evaluate_rule(store_of('ZJFTemp', values), rate_rule, 'ZJFTemp')
+    assert len(start) == 1 and peak[0] > 10
+
+
+@pytest.mark.parametrize('block_rows', [7, 500])
+def test_chunked_evaluation_matches_whole(block_rows):
+    store = make_store(3000)
+    compressed = CompressedStore.from_store(store, np.timedelta64(0, 'm'), block_rows=block_rows)
+    assert len(compressed.blocks) > 1
+    for whole, chunked in zip(rules.evaluate(store), rules.evaluate(compressed)):
+        assert (whole['rule'], whole['sensor']) == (chunked['rule'], chunked['sensor'])
+        for field in ('start', 'end', 'active'):
+            np.testing.assert_array_equal(whole[field], chunked[field])
+        np.testing.assert_allclose(whole['peak'], chunked['peak'])
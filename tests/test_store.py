@@ -0,0 +1,126 @@
+"""SensorStore 的构建和范围查询、多级聚合的范围统计、压缩存储的往返"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_rules import make_store
+from monitor.compressed import CompressedStore
+from monitor.rollup import Rollups, raw_stats
+from monitor.store import ROLLUP_MIN_ROWS, SENSOR_KEYS, SensorStore
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV = os.path.join(REPO_DIR, 'data_centre_df.csv')
+
+
+def assert_stats_equal(actual, expected):
+    """(count, sum, min, max)：求和顺序不同，sum 只比较到浮点误差"""
+    assert actual[0] == expected[0]
+    assert actual[1] == pytest.approx(expected[1], rel=1e-9)
+    assert actual[2:] == expected[2:]
+
+
+def assert_store_equal(actual, expected):
+    np.testing.assert_array_equal(actual.time, expected.time)
+    for key in SENSOR_KEYS:
+        np.testing.assert_array_equal(actual.columns[key], expected.columns[key], err_msg=key)
+
+
+def test_from_dataframe_with_date_column():
+    df = pd.read_csv(CSV)
+    store = SensorStore.from_dataframe(df)
+    assert len(store) == len(df)
+    assert store.time[0] == np.datetime64(pd.to_datetime(df['record_date'].iloc[0]), 'ns')
+    np.testing.assert_array_equal(store.columns['PUE'], df['pue'].to_numpy(dtype=np.float32))
+
+
+def test_from_dataframe_without_date_column_numbers_rows():
+    df = pd.read_csv(CSV).drop(columns=['record_date'])
+    store = SensorStore.from_dataframe(df)
+    # 与原来一样按行号（从 1 开始）编号，每行一天
+    expected = np.arange(1, len(df) + 1).astype('datetime64[D]').astype('datetime64[ns]')
+    np.testing.assert_array_equal(store.time, expected)
+    assert store.unique_dates() == len(df)
+    np.testing.assert_array_equal(store.columns['hydr'], df['hydrogen_sensor'].to_numpy(dtype=np.float32))
+
+
+def test_between_and_last():
+    store = make_store(1000)
+    t = store.time
+    assert len(store.between()) == 1000
+    subset = store.between(t[100], t[200])
+    assert len(subset) == 100 and subset.time[0] == t[100] and subset.last_time == t[199]
+    # 起止时刻不在数据中：按 [start, end) 截取
+    half = np.timedelta64(30, 's')
+    assert len(store.between(t[100] - half, t[200] - half)) == 100
+    assert len(store.between(t[-1] + half)) == 0
+    assert len(store.between(None, t[0])) == 0
+    last = store.last(np.timedelta64(10, 'm'))
+    assert last.first_time == t[-11] and last.last_time == t[-1]
+    for key in SENSOR_KEYS:
+        np.testing.assert_array_equal(subset.columns[key], store.columns[key][100:200])
+        times, values = subset.valid(key)
+        assert len(times) == subset.valid_count(key) == np.count_nonzero(~np.isnan(store.columns[key][100:200]))
+
+
+def test_totals_from_rollups_match_raw():
+    store = make_store(ROLLUP_MIN_ROWS + 50_000)
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        lo, hi = np.sort(rng.integers(0, len(store), 2))
+        subset = store.between(store.time[lo], store.time[hi])
+        assert subset._use_rollups() == (len(subset) >= ROLLUP_MIN_ROWS)
+        for key in ('PUE', 'ZJFTemp', 'hydr'):
+            _, values = subset.valid(key)
+            expected = (len(values), float(values.sum(dtype=np.float64)),
+                        float(values.min()) if len(values) else None, float(values.max()) if len(values) else None)
+            assert_stats_equal(subset.totals(key), expected)
+
+
+def test_range_stats_at_any_boundary():
+    store = make_store(30_000)
+    rollups = Rollups.build(store.time, store.columns)
+    assert [tier.name for tier in rollups.tiers] == ['hour', 'day', 'week']
+    rng = np.random.default_rng(2)
+    offsets = rng.integers(0, 30_000 * 60, (20, 2)) * np.timedelta64(1, 's')
+    for a, b in np.sort(offsets, axis=1):
+        start, end = store.time[0] + a, store.time[0] + b
+        for key in SENSOR_KEYS:
+            assert_stats_equal(rollups.range_stats(store, key, start, end), raw_stats(store, key, start, end))
+
+
+@pytest.mark.parametrize('hot_window', [np.timedelta64(0, 'h'), np.timedelta64(6, 'h')])
+def test_compressed_round_trip(hot_window):
+    store = make_store(20_000)
+    # 非定点的数值和整列缺失也能无损还原
+    columns = dict(store.columns)
+    columns['PUE'] = columns['PUE'] * np.float32(1.0001)
+    columns['hydr'] = np.full(len(store), np.nan, dtype=np.float32)
+    store = SensorStore(store.time, columns, assume_sorted=True)
+    compressed = CompressedStore.from_store(store, hot_window, block_rows=1000)
+    assert len(compressed.blocks) > 10 and len(compressed) == len(store)
+    assert compressed.nbytes < store.nbytes
+    assert_store_equal(compressed.to_store(), store)
+    chunks = list(compressed.chunks())
+    np.testing.assert_array_equal(np.concatenate([chunk.time for chunk in chunks]), store.time)
+
+    # 整个数据集不整体解码：逐块读取与原数据相同
+    whole = compressed.between()
+    assert len(whole) == len(store) and whole.first_time == store.time[0] and whole.last_time == store.time[-1]
+    assert_store_equal(whole.to_store(), store)
+
+    t = store.time
+    for lo, hi in [(0, 20_000), (123, 4567), (999, 1001), (15_000, 19_999)]:
+        expected = store.between(t[lo], t[hi] if hi < len(t) else None)
+        actual = compressed.between(t[lo], t[hi] if hi < len(t) else None)
+        assert_store_equal(actual.to_store() if hasattr(actual, 'to_store') else actual, expected)
+        for key in SENSOR_KEYS:
+            assert_stats_equal(actual.totals(key), expected.totals(key))
+            assert actual.latest(key) == expected.latest(key)
+
+    # 追加的行照常压缩，已压缩的块共用
+    more = make_store(25_000).between(t[-1] + np.timedelta64(1, 'ns'))
+    appended = compressed.append(more)
+    assert appended.blocks[:len(compressed.blocks)] == compressed.blocks
+    assert_store_equal(appended.to_store(), store.append(more))
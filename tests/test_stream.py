@@ -0,0 +1,76 @@
+"""实时推送：读数格式校验，无法表示的时刻、缺少的数值和错误的 Content-Length 以 400 拒绝"""
+import http.client
+import json
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from monitor.stream import StreamHub, parse_readings
+
+
+@pytest.fixture
+def hub():
+    hub = StreamHub()
+    assert hub.start_server('127.0.0.1', 0) is not None
+    yield hub
+    hub.server.shutdown()
+    hub.server.server_close()
+
+
+def post(hub, payload):
+    request = urllib.request.Request(f'{hub.server.url}/readings', data=json.dumps(payload).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_parse_readings_formats():
+    readings = parse_readings([{'time': '2024-01-01T00:00:00', 'sensor': 'pue', 'value': 1.5},
+                               {'time': 1_700_000_000, 'ZJFTemp': 22.5, 'hydr': '3'}])
+    assert [(key, value) for key, _, value in readings] == [('PUE', 1.5), ('ZJFTemp', 22.5), ('hydr', 3.0)]
+    assert readings[0][1] == np.datetime64('2024-01-01T00:00:00', 'ns')
+
+
+@pytest.mark.parametrize('payload', [{'sensor': 'hydr'}, {'sensor': 'hydr', 'value': None},
+                                     {'PUE': 1.5, 'hydr': None}, {'sensor': 'hydr', 'value': 'high'}])
+def test_missing_value_rejected(payload):
+    with pytest.raises(ValueError):
+        parse_readings(payload)
+
+
+@pytest.mark.parametrize('time', [1e20, -1e13, 2 ** 70, '9999-01-01T00:00:00', '1000-01-01'])
+def test_out_of_range_time_rejected(time):
+    with pytest.raises(ValueError):
+        parse_readings({'time': time, 'PUE': 1.5})
+
+
+def test_server_rejects_bad_readings_with_400(hub):
+    assert post(hub, {'time': '2024-01-01T00:00:00', 'PUE': 1.5}) == (200, {'accepted': 1})
+    for payload in ({'time': 1e20, 'PUE': 1.5}, {'time': '9999-01-01', 'PUE': 1.5}, {'unknown': 1}, [1]):
+        status, body = post(hub, payload)
+        assert status == 400 and body['error']
+    assert hub.received == 1
+
+
+def test_server_rejects_missing_value(hub):
+    status, body = post(hub, [{'sensor': 'PUE', 'value': 1.5}, {'sensor': 'hydr', 'value': None}])
+    assert status == 400 and 'hydr' in body['error']
+    assert hub.received == 0 and hub.latest('hydr') is None
+
+
+@pytest.mark.parametrize('length', ['abc', '-1', '1.5'])
+def test_server_rejects_bad_content_length(hub, length):
+    host, port = hub.server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.putrequest('POST', '/readings')
+    connection.putheader('Content-Length', length)
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 400 and json.loads(response.read())['error']
+    connection.close()
+    assert hub.received == 0